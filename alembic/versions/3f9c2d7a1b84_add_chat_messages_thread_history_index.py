@@ -0,0 +1,42 @@
+"""Add composite index for chat thread history
+
+Revision ID: 3f9c2d7a1b84
+Revises: 6276a0473116
+Create Date: 2026-10-18 10:12:31.418207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2d7a1b84'
+down_revision: Union[str, None] = '6276a0473116'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Индекс строится без блокировки записи в chat_messages,
+    # поэтому CREATE INDEX CONCURRENTLY выполняется вне транзакции миграции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_chat_messages_agent_thread_timestamp_id',
+            'chat_messages',
+            ['agent_id', 'thread_id', 'timestamp', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_chat_messages_agent_thread_timestamp_id',
+            table_name='chat_messages',
+            postgresql_concurrently=True,
+            if_exists=True
+        )
@@ -0,0 +1,72 @@
+"""Add chat_threads summary table
+
+Revision ID: 8b1e4f6c2a90
+Revises: 3f9c2d7a1b84
+Create Date: 2026-10-18 11:02:47.905316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b1e4f6c2a90'
+down_revision: Union[str, None] = '3f9c2d7a1b84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('chat_threads',
+    sa.Column('agent_id', sa.String(), nullable=False),
+    sa.Column('thread_id', sa.String(), nullable=False),
+    sa.Column('first_message_content', sa.Text(), nullable=False),
+    sa.Column('first_message_timestamp', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_message_content', sa.Text(), nullable=False),
+    sa.Column('last_message_sender_type', postgresql.ENUM('USER', 'AGENT', 'SYSTEM', name='sender_type_enum', create_type=False), nullable=False),
+    sa.Column('last_message_channel', sa.String(), nullable=True),
+    sa.Column('last_activity', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('message_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['agent_id'], ['agent_configs.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('agent_id', 'thread_id')
+    )
+    op.create_index('ix_chat_threads_agent_id_last_activity', 'chat_threads', ['agent_id', 'last_activity'], unique=False)
+
+    # Заполнение сводок по существующим сообщениям
+    op.execute("""
+        INSERT INTO chat_threads (
+            agent_id, thread_id,
+            first_message_content, first_message_timestamp,
+            last_message_content, last_message_sender_type, last_message_channel, last_activity,
+            message_count
+        )
+        SELECT
+            f.agent_id, f.thread_id,
+            f.content, f.timestamp,
+            l.content, l.sender_type, l.channel, l.timestamp,
+            c.message_count
+        FROM (
+            SELECT DISTINCT ON (agent_id, thread_id) agent_id, thread_id, content, timestamp
+            FROM chat_messages
+            ORDER BY agent_id, thread_id, timestamp ASC, id ASC
+        ) AS f
+        JOIN (
+            SELECT DISTINCT ON (agent_id, thread_id) agent_id, thread_id, content, sender_type, channel, timestamp
+            FROM chat_messages
+            ORDER BY agent_id, thread_id, timestamp DESC NULLS LAST, id DESC
+        ) AS l USING (agent_id, thread_id)
+        JOIN (
+            SELECT agent_id, thread_id, count(*) AS message_count
+            FROM chat_messages
+            GROUP BY agent_id, thread_id
+        ) AS c USING (agent_id, thread_id)
+        WHERE f.timestamp IS NOT NULL AND l.timestamp IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_chat_threads_agent_id_last_activity', table_name='chat_threads')
+    op.drop_table('chat_threads')
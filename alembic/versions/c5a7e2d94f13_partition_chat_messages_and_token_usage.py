@@ -0,0 +1,140 @@
+"""Partition chat_messages and token_usage_logs by month
+
+Revision ID: c5a7e2d94f13
+Revises: 8b1e4f6c2a90
+Create Date: 2026-10-18 12:21:09.552871
+
+"""
+from datetime import date, datetime, timezone
+from typing import Dict, List, Sequence, Tuple, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5a7e2d94f13'
+down_revision: Union[str, None] = '8b1e4f6c2a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Сколько месяцев вперед создается при миграции; дальше партиции создает PartitionMaintenanceWorker
+PREMAKE_MONTHS = 3
+
+# Индексы создаются на родительской таблице и наследуются всеми партициями
+TABLE_INDEXES: Dict[str, List[Tuple[str, List[str]]]] = {
+    'chat_messages': [
+        ('ix_chat_messages_id', ['id']),
+        ('ix_chat_messages_agent_id', ['agent_id']),
+        ('ix_chat_messages_thread_id', ['thread_id']),
+        ('ix_chat_messages_timestamp', ['timestamp']),
+        ('ix_chat_messages_interaction_id', ['interaction_id']),
+        ('ix_chat_messages_agent_thread_timestamp_id', ['agent_id', 'thread_id', 'timestamp', 'id']),
+    ],
+    'token_usage_logs': [
+        ('ix_token_usage_logs_id', ['id']),
+        ('ix_token_usage_logs_agent_id', ['agent_id']),
+        ('ix_token_usage_logs_message_id', ['message_id']),
+        ('ix_token_usage_logs_interaction_id', ['interaction_id']),
+        ('ix_token_usage_logs_call_type', ['call_type']),
+        ('ix_token_usage_logs_timestamp', ['timestamp']),
+        ('ix_token_usage_logs_agent_id_timestamp', ['agent_id', 'timestamp']),
+        ('ix_token_usage_logs_call_type_timestamp', ['call_type', 'timestamp']),
+    ],
+}
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _month_range(table: str) -> List[date]:
+    """Месяцы от самой старой записи таблицы до текущего месяца + PREMAKE_MONTHS."""
+    now = datetime.now(timezone.utc)
+    current = date(now.year, now.month, 1)
+    oldest = op.get_bind().execute(sa.text(f'SELECT min("timestamp") FROM {table}')).scalar()
+    first = date(oldest.year, oldest.month, 1) if oldest else current
+    first = min(first, current)
+
+    months = []
+    month = first
+    while month <= _add_months(current, PREMAKE_MONTHS):
+        months.append(month)
+        month = _add_months(month, 1)
+    return months
+
+
+def _month_bound(month: date) -> str:
+    # Явное смещение UTC: граница не зависит от TimeZone сессии ("timestamp" - timestamptz)
+    return f"{month:%Y-%m}-01 00:00:00+00"
+
+
+def _create_indexes(table: str) -> None:
+    for name, columns in TABLE_INDEXES[table]:
+        op.create_index(name, table, columns, unique=False)
+
+
+def _partition_table(table: str) -> None:
+    """Перенос таблицы в партиционированную по месяцам таблицу с тем же именем."""
+    legacy = f'{table}_legacy'
+    months = _month_range(table)
+
+    op.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY NONE')
+    op.execute(f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")')
+    op.execute(
+        f'ALTER TABLE {table} ADD CONSTRAINT {table}_agent_id_fkey '
+        f'FOREIGN KEY (agent_id) REFERENCES agent_configs (id) ON DELETE CASCADE'
+    )
+    for month in months:
+        op.execute(
+            f"CREATE TABLE {table}_p{month:%Y%m} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{_month_bound(month)}') TO ('{_month_bound(_add_months(month, 1))}')"
+        )
+    # Строки вне созданных партиций не ломают вставку; PartitionMaintenanceWorker переносит их
+    op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+
+    op.execute(f'INSERT INTO {table} SELECT * FROM {legacy}')
+    op.execute(f'DROP TABLE {legacy}')
+    # Ключ партиционирования обязан входить в первичный ключ.
+    # Ограничения с индексами создаются после удаления старой таблицы, чтобы не было конфликта имен
+    op.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, "timestamp")')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+    _create_indexes(table)
+
+
+def _unpartition_table(table: str) -> None:
+    """Обратный перенос данных в обычную таблицу."""
+    partitioned = f'{table}_partitioned'
+
+    op.execute(f'ALTER TABLE {table} RENAME TO {partitioned}')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY NONE')
+    op.execute(f'CREATE TABLE {table} (LIKE {partitioned} INCLUDING DEFAULTS)')
+    op.execute(
+        f'ALTER TABLE {table} ADD CONSTRAINT {table}_agent_id_fkey '
+        f'FOREIGN KEY (agent_id) REFERENCES agent_configs (id) ON DELETE CASCADE'
+    )
+    op.execute(f'INSERT INTO {table} SELECT * FROM {partitioned}')
+    op.execute(f'DROP TABLE {partitioned} CASCADE')
+    op.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id)')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+    _create_indexes(table)
+
+
+def upgrade() -> None:
+    # Внешний ключ на партиционированную таблицу должен включать ключ партиционирования,
+    # поэтому связь token_usage_logs.message_id -> chat_messages.id поддерживается приложением
+    op.execute('ALTER TABLE token_usage_logs DROP CONSTRAINT IF EXISTS token_usage_logs_message_id_fkey')
+    _partition_table('chat_messages')
+    _partition_table('token_usage_logs')
+
+
+def downgrade() -> None:
+    _unpartition_table('token_usage_logs')
+    _unpartition_table('chat_messages')
+    op.create_foreign_key(
+        'token_usage_logs_message_id_fkey', 'token_usage_logs', 'chat_messages',
+        ['message_id'], ['id'], ondelete='CASCADE'
+    )
@@ -0,0 +1,64 @@
+"""Add hourly and daily token usage rollups
+
+Revision ID: e2d8b9a41c67
+Revises: c5a7e2d94f13
+Create Date: 2026-10-18 13:40:55.127604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2d8b9a41c67'
+down_revision: Union[str, None] = 'c5a7e2d94f13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+ROLLUPS = (
+    ('token_usage_hourly', 'hour'),
+    ('token_usage_daily', 'day'),
+)
+
+
+def upgrade() -> None:
+    for table, unit in ROLLUPS:
+        op.create_table(table,
+        sa.Column('agent_id', sa.String(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('model_id', sa.String(), nullable=False),
+        sa.Column('call_type', sa.String(), nullable=False),
+        sa.Column('call_count', sa.BigInteger(), nullable=False),
+        sa.Column('prompt_tokens', sa.BigInteger(), nullable=False),
+        sa.Column('completion_tokens', sa.BigInteger(), nullable=False),
+        sa.Column('total_tokens', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['agent_id'], ['agent_configs.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('agent_id', 'bucket_start', 'model_id', 'call_type')
+        )
+
+        # Заполнение агрегатов по существующим записям (границы интервалов в UTC)
+        op.execute(f"""
+            INSERT INTO {table} (
+                agent_id, bucket_start, model_id, call_type,
+                call_count, prompt_tokens, completion_tokens, total_tokens
+            )
+            SELECT
+                agent_id,
+                date_trunc('{unit}', "timestamp" AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' AS bucket_start,
+                model_id,
+                call_type,
+                count(*),
+                sum(prompt_tokens),
+                sum(completion_tokens),
+                sum(total_tokens)
+            FROM token_usage_logs
+            GROUP BY 1, 2, 3, 4
+        """)
+
+
+def downgrade() -> None:
+    for table, _ in reversed(ROLLUPS):
+        op.drop_table(table)
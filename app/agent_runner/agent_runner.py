@@ -3,7 +3,7 @@ import asyncio
 import logging
 import json
 import uuid
-from typing import Dict, Optional, Any, List, Tuple
+from typing import TYPE_CHECKING, Dict, Optional, Any, List, Set, Tuple
 
 import httpx
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
@@ -14,15 +14,23 @@ from redis import exceptions as redis_exceptions
 
 from app.agent_runner.langgraph.factory import create_agent_app # Updated import
 from app.agent_runner.langgraph.models import TokenUsageData # Updated import
+from app.agent_runner.langgraph.tracing_callbacks import TracingCallbackHandler
 from app.agent_runner.common.config_mixin import AgentConfigMixin # Added import
 from app.db.alchemy_models import ChatMessageDB, SenderType
 from app.db.crud.chat_crud import db_get_recent_chat_history
 from app.core.config import settings
+from app.core.message_codec import MessageCodecError, decode_message, encode_message
+from app.core.tracing import STAGE_CACHE_LOOKUP, STAGE_DB_QUERY, STAGE_PUBLISH, extract_trace_context, inject_trace_context, observe_queue_wait, tracer
 from app.core.base.service_component import ServiceComponentBase # Added import
-from app.services.voice.voice_orchestrator import VoiceServiceOrchestrator
 from app.services.redis_wrapper import RedisService
+from app.services.storage import close_object_storage
+from app.services.user_cache import PROFILE_FIELDS
 from app.api.schemas.voice_schemas import VoiceSettings
 
+if TYPE_CHECKING:
+    from app.services.semantic_cache import CacheLookup, SemanticAnswerCache
+    from app.services.voice.voice_orchestrator import VoiceServiceOrchestrator
+
 # --- Helper Functions (some might become methods or stay as utilities) ---
 
 async def fetch_config(config_url: str, logger: logging.Logger) -> Optional[Dict]:
@@ -121,7 +129,11 @@ class AgentRunner(ServiceComponentBase, AgentConfigMixin): # Added AgentConfigMi
         # Конфигурации извлекаются напрямую из agent_config по мере необходимости
 
         # Voice processing orchestrator
-        self.voice_orchestrator: Optional[VoiceServiceOrchestrator] = None
+        self.voice_orchestrator: Optional["VoiceServiceOrchestrator"] = None
+        # Семантический кэш ответов (только если включен в конфигурации агента)
+        self.semantic_cache: Optional["SemanticAnswerCache"] = None
+        # Узлы графа, выполненные при последнем вызове _invoke_agent
+        self._invoked_nodes: Set[str] = set()
 
         self.logger.info(f"AgentRunner for agent {self._component_id} initialized. PID: {os.getpid()}")
 
@@ -163,6 +175,8 @@ class AgentRunner(ServiceComponentBase, AgentConfigMixin): # Added AgentConfigMi
         # Initialize Voice Service Orchestrator if voice settings are present
         await self._setup_voice_orchestrator()
 
+        self._setup_semantic_cache()
+
         self.logger.info(f"LangGraph application created successfully.")
         return True
 
@@ -172,11 +186,14 @@ class AgentRunner(ServiceComponentBase, AgentConfigMixin): # Added AgentConfigMi
         Обрабатывает входящее сообщение от Redis Pub/Sub.
 
         Этапы обработки:
-        1. Декодирует данные сообщения (ожидается JSON).
+        1. Декодирует данные сообщения (`decode_message`).
         2. Извлекает `chat_id`, `text` (пользовательский ввод) и `interaction_id`.
         3. Если обязательные поля отсутствуют, логирует предупреждение и завершает обработку.
         4. Определяет глубину истории контекста на основе конфигурации агента.
         5. Если включена работа с БД, сохраняет сообщение пользователя в БД.
+           Если включен семантический кэш, у треда нет предыдущих сообщений в контексте
+           и в кэше найден ответ на похожий вопрос, шаги 6-8 и 10 пропускаются
+           (см. app/services/semantic_cache.py).
         6. Формирует входные данные для графа LangGraph, включая пользовательский ввод и статические параметры
            (system_prompt, temperature, model_id, provider), которые извлекаются из конфигурации агента.
         7. Асинхронно вызывает основной поток (stream) агента `self.agent_app.astream`.
@@ -189,12 +206,12 @@ class AgentRunner(ServiceComponentBase, AgentConfigMixin): # Added AgentConfigMi
         11. Публикует ответ агента в соответствующий канал Redis (`agent:{self.agent_id}:output`).
         12. Обновляет время последней активности агента.
 
-        В случае ошибок (например, JSONDecodeError или других исключений) логирует ошибку
+        В случае ошибок (например, MessageCodecError или других исключений) логирует ошибку
         и, если возможно, публикует уведомление об ошибке в канал ответов.
 
         Args:
             message (Dict[str, Any]): Сообщение, полученное из Redis Pub/Sub.
-                                      Ожидается, что `message['data']` содержит JSON-строку.
+                                      `message['data']` разбирается `decode_message` (JSON или MessagePack).
         """
 
         try:
@@ -203,12 +220,12 @@ class AgentRunner(ServiceComponentBase, AgentConfigMixin): # Added AgentConfigMi
             self.logger.error(f"Redis client not available for handling pubsub message: {e}")
             return
         
-        data_str: Optional[str] = None
         payload: Optional[Dict[str, Any]] = None # Инициализируем payload
         try:
-            data_str = message_data.decode('utf-8')
-            payload = json.loads(data_str)
+            payload = decode_message(message_data)
             self.logger.info(f"Processing message for chat_id: {payload.get('chat_id')}")
+            traceparent, sent_at = extract_trace_context(payload)
+            observe_queue_wait("agent_input", sent_at)
 
             user_text = payload.get("text")
             chat_id = payload.get("chat_id")
@@ -228,65 +245,83 @@ class AgentRunner(ServiceComponentBase, AgentConfigMixin): # Added AgentConfigMi
                 self.logger.warning(f"Missing 'text' or 'chat_id' in Redis payload: {payload}")
                 return
 
-            await self._save_history(
-                sender_type="user",
-                thread_id=chat_id,
-                content=user_text,
-                channel=channel,
-                interaction_id=interaction_id
-            )
-
+            turn_attributes = {"agent_id": self._component_id, "chat_id": chat_id, "channel": channel, "interaction_id": interaction_id}
+            with tracer.start_span("agent.turn", parent=traceparent, attributes=turn_attributes):
+                await self._save_history(
+                    sender_type="user",
+                    thread_id=chat_id,
+                    content=user_text,
+                    channel=channel,
+                    interaction_id=interaction_id
+                )
 
-            history_db = await self._get_history(thread_id=chat_id)
 
-            response_content, final_message = await self._invoke_agent(
-                history_db=history_db,
-                user_input=user_text,
-                user_data=user_data,
-                thread_id=chat_id,
-                channel=channel,
-                interaction_id=interaction_id,
-                image_urls=image_urls
-            )
+                history_db = await self._get_history(thread_id=chat_id)
 
-            await self._save_history(
-                sender_type="agent",
-                thread_id=chat_id,
-                content=response_content,
-                channel=channel,
-                interaction_id=interaction_id
-            )
+                cache_lookup = await self._lookup_semantic_cache(user_text, image_urls, history_db, chat_id, user_data)
+                cache_hit = cache_lookup is not None and cache_lookup.entry is not None
 
-            await self._save_tokens(
-                interaction_id=interaction_id,
-                thread_id=chat_id
-            )
+                if cache_hit:
+                    response_content = cache_lookup.entry.answer
+                    await self._remember_cached_turn(history_db, user_text, response_content, chat_id)
+                else:
+                    response_content, final_message = await self._invoke_agent(
+                        history_db=history_db,
+                        user_input=user_text,
+                        user_data=user_data,
+                        thread_id=chat_id,
+                        channel=channel,
+                        interaction_id=interaction_id,
+                        image_urls=image_urls
+                    )
+                    if cache_lookup is not None:
+                        self._store_semantic_cache_answer(cache_lookup, response_content, final_message)
+
+                await self._save_history(
+                    sender_type="agent",
+                    thread_id=chat_id,
+                    content=response_content,
+                    channel=channel,
+                    interaction_id=interaction_id
+                )
 
-            # Process TTS if enabled and keywords detected
-            audio_url = await self._process_response_with_tts(
-                response_content=response_content,
-                user_message=user_text,
-                chat_id=chat_id,
-                channel=channel
-            )
+                # При попадании в кэш модель не вызывалась, а состояние графа содержит события прошлого вызова
+                if not cache_hit:
+                    await self._save_tokens(
+                        interaction_id=interaction_id,
+                        thread_id=chat_id
+                    )
+
+                # Process TTS if enabled and keywords detected
+                audio_url = await self._process_response_with_tts(
+                    response_content=response_content,
+                    user_message=user_text,
+                    chat_id=chat_id,
+                    channel=channel
+                )
 
-            response_payload = {
-                "chat_id": chat_id,
-                "response": response_content,
-                "channel": channel
-            }
+                response_payload = {
+                    "chat_id": chat_id,
+                    "response": response_content,
+                    "channel": channel
+                }
             
-            # Add audio URL if TTS was processed
-            if audio_url:
-                response_payload["audio_url"] = audio_url
+                # Add audio URL if TTS was processed
+                if audio_url:
+                    response_payload["audio_url"] = audio_url
+
+                with tracer.start_span("agent.publish_response", stage=STAGE_PUBLISH) as publish_span:
+                    inject_trace_context(response_payload, publish_span)
+                    await redis_cli.publish(self.response_channel, encode_message(response_payload))
+                self.logger.debug(f"Published to {self.response_channel} response: {response_payload}")
 
-            await redis_cli.publish(self.response_channel, json.dumps(response_payload))
-            self.logger.debug(f"Published to {self.response_channel} response: {json.dumps(response_payload)}")
+                await self.update_last_active_time()
 
-            await self.update_last_active_time()
+                if self.semantic_cache is not None:
+                    await self.semantic_cache.push_metrics(redis_cli)
 
-        except json.JSONDecodeError as e:
-            self.logger.error(f"JSONDecodeError processing PubSub message: {e}. Data: {data_str}", exc_info=True)
+        except MessageCodecError as e:
+            self.logger.error(f"Failed to decode PubSub message: {e}. Data: {message_data[:200]!r}")
         except Exception as e:
             self.logger.error(f"Error processing PubSub message: {e}", exc_info=True)
             # Optionally, publish an error response
@@ -353,7 +388,9 @@ class AgentRunner(ServiceComponentBase, AgentConfigMixin): # Added AgentConfigMi
                             "total_tokens": token_data.total_tokens,
                             "timestamp": token_data.timestamp
                         }
-                        await redis_cli.lpush(settings.REDIS_TOKEN_USAGE_QUEUE_NAME, json.dumps(token_payload))
+                        with tracer.start_span("token_usage.enqueue", stage=STAGE_PUBLISH) as enqueue_span:
+                            inject_trace_context(token_payload, enqueue_span)
+                            await redis_cli.lpush(settings.REDIS_TOKEN_USAGE_QUEUE_NAME, encode_message(token_payload))
                         self.logger.debug(f"Queued token usage data to '{settings.REDIS_TOKEN_USAGE_QUEUE_NAME}': {token_payload}")
                     except redis_exceptions.RedisError as e:
                         self.logger.error(f"Failed to queue token usage data for InteractionID {interaction_id}: {e}")
@@ -437,26 +474,169 @@ class AgentRunner(ServiceComponentBase, AgentConfigMixin): # Added AgentConfigMi
         self.logger.info(f"Invoking graph for thread_id: {thread_id} (Initial history messages: {len(history_db)})")
         response_content = "No response generated."
         final_message = None
-
-        async for output in self.agent_app.astream(graph_input, self.config, stream_mode="updates"):
-            if not self._running or self.needs_restart:
-                self.logger.warning("Shutdown or restart requested during graph stream.")
-                break
-
-            for key, value in output.items():
-                self.logger.debug(f"Graph node '{key}' output: {value}")
-                if key == "agent" or key == "generate":
-                    if "messages" in value and value["messages"]:
-                        last_msg = value["messages"][-1]
-                        if isinstance(last_msg, AIMessage):
-                            response_content = last_msg.content
-                            final_message = last_msg
+        self._invoked_nodes = set()
+
+        # Колбэк трассировки передается только в этот вызов: self.config используется и в get_state
+        with tracer.start_span("graph.invoke", attributes={"thread_id": str(thread_id)}) as graph_span:
+            invoke_config = {**self.config, "callbacks": [TracingCallbackHandler(parent=graph_span)]}
+
+            async for output in self.agent_app.astream(graph_input, invoke_config, stream_mode="updates"):
+                if not self._running or self.needs_restart:
+                    self.logger.warning("Shutdown or restart requested during graph stream.")
+                    break
+
+                for key, value in output.items():
+                    self.logger.debug(f"Graph node '{key}' output: {value}")
+                    self._invoked_nodes.add(key)
+                    if key == "agent" or key == "generate":
+                        if "messages" in value and value["messages"]:
+                            last_msg = value["messages"][-1]
+                            if isinstance(last_msg, AIMessage):
+                                response_content = last_msg.content
+                                final_message = last_msg
 
         self.logger.info(f"Graph execution finished. Final response: {response_content[:100]}...")
 
         return response_content, final_message
 
 
+    def _setup_semantic_cache(self) -> None:
+        """
+        Создает семантический кэш ответов, если он включен в конфигурации агента
+        (config.simple.settings.semanticCache.enabled).
+        """
+        try:
+            cache_config = self._get_semantic_cache_config()
+            if not cache_config["enabled"]:
+                self.logger.debug(f"Semantic cache not enabled for agent {self._component_id}")
+                return
+            # Кэш (и numpy для его индекса) загружается только для агентов, где он включен
+            from app.services.semantic_cache import SemanticAnswerCache, config_fingerprint
+
+            self.semantic_cache = SemanticAnswerCache(
+                agent_id=self._component_id,
+                embeddings=self._create_semantic_cache_embeddings(),
+                similarity_threshold=cache_config["similarity_threshold"],
+                ttl_seconds=cache_config["ttl_seconds"],
+                max_entries=cache_config["max_entries"],
+                fingerprint=config_fingerprint(self._get_agent_settings()),
+                knowledge_base_ids=self._get_knowledge_base_ids(),
+                logger=self.logger,
+            )
+            self.logger.info(f"Semantic cache enabled: threshold {cache_config['similarity_threshold']}, "
+                             f"TTL {cache_config['ttl_seconds']}s, max {cache_config['max_entries']} entries.")
+        except Exception as e:
+            self.logger.error(f"Error setting up semantic cache, continuing without it: {e}", exc_info=True)
+            self.semantic_cache = None
+
+    def _create_semantic_cache_embeddings(self) -> Any:
+        """Модель эмбеддингов вопросов для семантического кэша."""
+        from langchain_openai import OpenAIEmbeddings
+
+        return OpenAIEmbeddings(model=settings.SEMANTIC_CACHE_EMBEDDING_MODEL)
+
+    async def _lookup_semantic_cache(self, user_input: str, image_urls: Optional[List[str]],
+                                     history_db: List[BaseMessage], thread_id: str,
+                                     user_data: Optional[Dict[str, Any]] = None) -> Optional["CacheLookup"]:
+        """
+        Ищет ответ в семантическом кэше.
+
+        Returns:
+            None, если кэш выключен или сообщение обрабатывается в обход кэша
+            (изображения, пустой вопрос, авторизованный пользователь или его профиль
+            в user_data, вопрос в контексте предыдущих сообщений треда);
+            иначе результат поиска (entry задан при попадании).
+        """
+        if self.semantic_cache is None:
+            return None
+        if image_urls:
+            self.semantic_cache.record_bypass("images")
+            return None
+        if not user_input.strip():
+            self.semantic_cache.record_bypass("empty")
+            return None
+        # Граф и инструменты видят user_data: ответ авторизованному пользователю
+        # может содержать его данные
+        if self._is_personalized(user_data):
+            self.semantic_cache.record_bypass("personalized")
+            return None
+        # Кэш общий для всех тредов агента: ответ на уточняющий вопрос зависит от переписки
+        # и не должен попасть в другой чат (ни из кэша, ни в кэш)
+        if await self._thread_has_context(history_db, thread_id):
+            self.semantic_cache.record_bypass("context")
+            return None
+
+        with tracer.start_span("semantic_cache.lookup", stage=STAGE_CACHE_LOOKUP) as lookup_span:
+            cache_lookup = await self.semantic_cache.lookup(user_input)
+            lookup_span.set_attribute("hit", cache_lookup.entry is not None)
+            lookup_span.set_attribute("similarity", cache_lookup.similarity)
+        if cache_lookup.entry is not None:
+            self.logger.info(f"Semantic cache hit (similarity {cache_lookup.similarity:.3f}) for question: {user_input[:100]}")
+        return cache_lookup
+
+    @staticmethod
+    def _is_personalized(user_data: Optional[Dict[str, Any]]) -> bool:
+        """Передает ли интеграция авторизацию или профиль пользователя (user_id есть всегда)."""
+        if not user_data:
+            return False
+        return bool(user_data.get("is_authenticated")) or any(user_data.get(field) for field in PROFILE_FIELDS)
+
+    async def _thread_has_context(self, history_db: List[BaseMessage], thread_id: str) -> bool:
+        """
+        Есть ли у треда сообщения, которые граф увидит вместе с вопросом: история из БД
+        или память графа (checkpointer). При выключенной памяти контекста граф видит только вопрос.
+        """
+        if not self._get_model_config()["enable_context_memory"]:
+            return False
+        if history_db:
+            return True
+        if getattr(self.agent_app, "checkpointer", None) is None:
+            return False
+        config = {"configurable": {"thread_id": str(thread_id), "agent_id": self._component_id}}
+        try:
+            state = await self.agent_app.aget_state(config)
+        except Exception as e:
+            # Без уверенности в отсутствии контекста ответ не кэшируется
+            self.logger.warning(f"Failed to read graph memory for thread {thread_id}, bypassing semantic cache: {e}")
+            return True
+        return bool((state.values or {}).get("messages"))
+
+    def _store_semantic_cache_answer(self, cache_lookup: "CacheLookup", response_content: str,
+                                     final_message: Optional[BaseMessage]) -> None:
+        """
+        Сохраняет ответ графа в семантический кэш. Ответы, для которых вызывались
+        инструменты кроме поиска по базам знаний (узел safe_tools), зависят от пользователя
+        или момента запроса и не кэшируются.
+        """
+        if "safe_tools" in self._invoked_nodes:
+            self.semantic_cache.record_bypass("tools")
+            return
+        if (final_message is None or getattr(final_message, "tool_calls", None)
+                or not isinstance(response_content, str) or not response_content.strip()
+                or not self._running or self.needs_restart):
+            self.semantic_cache.record_bypass("incomplete")
+            return
+        self.semantic_cache.store(cache_lookup, response_content)
+
+    async def _remember_cached_turn(self, history_db: List[BaseMessage], user_input: str,
+                                    response_content: str, thread_id: str) -> None:
+        """
+        Добавляет вопрос и ответ из кэша в память графа (checkpointer), чтобы следующий
+        вызов графа в этом треде видел обмен так же, как после обычного ответа.
+        """
+        if getattr(self.agent_app, "checkpointer", None) is None:
+            return
+        config = {"configurable": {"thread_id": str(thread_id), "agent_id": self._component_id}}
+        try:
+            await self.agent_app.aupdate_state(
+                config,
+                {"messages": history_db + [HumanMessage(content=user_input), AIMessage(content=response_content)]},
+                as_node="agent",
+            )
+        except Exception as e:
+            self.logger.warning(f"Failed to add cached answer to graph memory for thread {thread_id}: {e}")
+
+
     async def _get_history(
             self,
             thread_id: str
@@ -492,14 +672,15 @@ class AgentRunner(ServiceComponentBase, AgentConfigMixin): # Added AgentConfigMi
                     is_loaded = await redis_cli.sismember(self.loaded_threads_key, thread_id)
                     if not is_loaded:
                         self.logger.info(f"Thread '{thread_id}' not found in cache '{self.loaded_threads_key}'. Loading history from DB with depth {history_limit}.")
-                        async with self.db_session_factory() as session:
-                            history_from_db = await db_get_recent_chat_history(
-                                db=session,
-                                agent_id=self._component_id,
-                                thread_id=thread_id,
-                                limit=history_limit
-                            )
-                            loaded_msgs = convert_db_to_langchain(history_from_db, self.logger)
+                        with tracer.start_span("history.load", stage=STAGE_DB_QUERY, attributes={"limit": history_limit}):
+                            async with self.db_session_factory() as session:
+                                history_from_db = await db_get_recent_chat_history(
+                                    db=session,
+                                    agent_id=self._component_id,
+                                    thread_id=thread_id,
+                                    limit=history_limit
+                                )
+                                loaded_msgs = convert_db_to_langchain(history_from_db, self.logger)
 
                         self.logger.info(f"Loaded {len(loaded_msgs)} messages from DB for thread '{thread_id}'.")
 
@@ -548,7 +729,9 @@ class AgentRunner(ServiceComponentBase, AgentConfigMixin): # Added AgentConfigMi
             "interaction_id": interaction_id
         }
         try:
-            await redis_cli.lpush(settings.REDIS_HISTORY_QUEUE_NAME, json.dumps(message_data))
+            with tracer.start_span("history.enqueue", stage=STAGE_PUBLISH) as enqueue_span:
+                inject_trace_context(message_data, enqueue_span)
+                await redis_cli.lpush(settings.REDIS_HISTORY_QUEUE_NAME, encode_message(message_data))
             self.logger.info(f"Queued {sender_type} message for history (Thread: {thread_id}, InteractionID: {interaction_id})")
         except redis_exceptions.RedisError as e:
             self.logger.error(f"Failed to queue message for history (Thread: {thread_id}): {e}", exc_info=True)
@@ -565,6 +748,9 @@ class AgentRunner(ServiceComponentBase, AgentConfigMixin): # Added AgentConfigMi
                 self.logger.debug(f"Voice settings not enabled for agent {self._component_id}")
                 return
 
+            # Голосовой стек загружается только для агентов с включенным голосом
+            from app.services.voice.voice_orchestrator import VoiceServiceOrchestrator
+
             # Создаем Redis service wrapper для VoiceOrchestrator
             redis_service = RedisService()
             await redis_service.initialize()
@@ -697,6 +883,7 @@ class AgentRunner(ServiceComponentBase, AgentConfigMixin): # Added AgentConfigMi
             if self.voice_orchestrator:
                 await self.voice_orchestrator.cleanup()
                 self.voice_orchestrator = None
+            await close_object_storage()
                 
             redis_cli = await self.redis_client
             try:
@@ -722,6 +909,7 @@ class AgentRunner(ServiceComponentBase, AgentConfigMixin): # Added AgentConfigMi
                 self.logger.error(f"Error during LangGraph application cleanup: {e}", exc_info=True)
 
         self.agent_app = None
+        self.semantic_cache = None
         self.agent_config = None
         self.config = None
         self.config_url = None
@@ -761,6 +949,9 @@ class AgentRunner(ServiceComponentBase, AgentConfigMixin): # Added AgentConfigMi
         # Регистрируем _pubsub_listener_loop как основную задачу
         # self._pubsub_channel уже установлен в __init__
         self._register_main_task(self._pubsub_listener_loop(), name="AgentPubSubListener")
+        if self.semantic_cache is not None:
+            self._register_main_task(self.semantic_cache.listen_invalidations(self.get_pubsub_client()),
+                                     name="SemanticCacheInvalidationListener")
 
         try:
             await super().run_loop()
@@ -6,6 +6,8 @@
 from typing import Dict, Any, List, Optional
 import logging
 
+from app.core.config import settings
+
 logger = logging.getLogger(__name__)
 
 
@@ -172,7 +174,40 @@ class AgentConfigMixin:
             "context_memory_depth": model_settings.get("contextMemoryDepth", 10),
             "streaming": model_settings.get("streaming", True)
         }
-    
+
+    def _get_semantic_cache_config(self) -> Dict[str, Any]:
+        """
+        Получает настройки семантического кэша ответов (config.simple.settings.semanticCache).
+        Незаданные параметры берутся из глобальных настроек SEMANTIC_CACHE_*.
+
+        Returns:
+            Dict[str, Any]: Конфигурация кэша; по умолчанию кэш выключен
+        """
+        cache_settings = self._get_agent_settings().get("semanticCache") or {}
+        if not isinstance(cache_settings, dict):
+            logger.warning(f"semanticCache configuration is not a dict: {type(cache_settings)}. Cache disabled.")
+            cache_settings = {}
+
+        return {
+            "enabled": bool(cache_settings.get("enabled", False)),
+            "similarity_threshold": float(cache_settings.get("similarityThreshold", settings.SEMANTIC_CACHE_SIMILARITY_THRESHOLD)),
+            "ttl_seconds": int(cache_settings.get("ttlSeconds", settings.SEMANTIC_CACHE_TTL)),
+            "max_entries": int(cache_settings.get("maxEntries", settings.SEMANTIC_CACHE_MAX_ENTRIES)),
+        }
+
+    def _get_knowledge_base_ids(self) -> List[str]:
+        """
+        Получает ID всех баз знаний из инструментов knowledgeBase агента.
+
+        Returns:
+            List[str]: Список ID баз знаний
+        """
+        kb_ids: List[str] = []
+        for tool in self._get_tools_settings():
+            if tool.get("type") == "knowledgeBase":
+                kb_ids.extend(str(kb_id) for kb_id in (tool.get("settings") or {}).get("knowledgeBaseIds") or [])
+        return kb_ids
+
     def get_max_rewrites(self, agent_config: Dict[str, Any]) -> int:
         """
         Получает настройку maxRewrites из конфигурации агента.
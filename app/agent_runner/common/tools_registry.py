@@ -19,7 +19,6 @@ This replaces multiple duplicated implementations found in:
 
 import logging
 import requests
-import cloudscraper
 import json
 from typing import Annotated, Dict, List, Tuple, Set, Optional, Any, Union
 from functools import partial
@@ -312,6 +311,8 @@ def make_api_request(
         # Try cloudscraper first (for Cloudflare bypass)
         try:
             effective_logger.info(f"Attempting Cloudflare bypass with cloudscraper for {url}")
+            import cloudscraper
+
             scraper = cloudscraper.create_scraper(
                 browser={
                     'browser': 'chrome',
@@ -6,11 +6,6 @@ from functools import partial
 
 from langchain_core.tools import tool, BaseTool, Tool
 from langgraph.prebuilt import InjectedState
-from langchain_openai import OpenAIEmbeddings
-from qdrant_client import QdrantClient, models
-from langchain_qdrant import QdrantVectorStore
-from langchain.tools.retriever import create_retriever_tool
-from langchain_community.tools.tavily_search import TavilySearchResults
 
 from app.core.config import settings as app_settings
 from app.agent_runner.common.config_mixin import AgentConfigMixin
@@ -120,6 +115,12 @@ def configure_tools(agent_config: Dict, agent_id: str, logger) -> Tuple[List[Bas
              logger.warning("QDRANT_URL or QDRANT_COLLECTION not set. Knowledge base tools disabled.")
         else:
             try:
+                # Qdrant и эмбеддинги загружаются только для агентов с базами знаний
+                from langchain_openai import OpenAIEmbeddings
+                from qdrant_client import QdrantClient, models
+                from langchain_qdrant import QdrantVectorStore
+                from langchain.tools.retriever import create_retriever_tool
+
                 embeddings = OpenAIEmbeddings()
                 qdrant_client = QdrantClient(
                     url=qdrant_url,
@@ -208,6 +209,8 @@ def configure_tools(agent_config: Dict, agent_id: str, logger) -> Tuple[List[Bas
         if not tavily_api_key:
             logger.warning("TAVILY_API_KEY not set. Web search tools disabled.")
         else:
+            from langchain_community.tools.tavily_search import TavilySearchResults
+
             for ws_config in web_search_configs:
                 ws_settings = ws_config.get("settings", {})
                 ws_id = ws_config.get("id", f"web_search_{web_search_configs.index(ws_config)}") # Use ID from config with fallback
@@ -0,0 +1,128 @@
+"""
+Спаны для узлов графа, вызовов LLM, инструментов и поиска по базам знаний
+
+Колбэк LangChain передается в config вызова графа и строит дерево спанов
+по run_id/parent_run_id, поэтому вложенность сохраняется независимо от того,
+в каком контексте LangGraph выполняет узлы.
+"""
+
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+from app.core.tracing import (
+    STAGE_GRAPH_NODE, STAGE_LLM_CALL, STAGE_RETRIEVAL, STAGE_TOOL, Span, tracer,
+)
+
+
+class TracingCallbackHandler(AsyncCallbackHandler):
+    """
+    Создает спаны для одного вызова графа.
+
+    Узел графа - цепочка с именем, совпадающим с metadata["langgraph_node"];
+    остальные цепочки (промпты, парсеры) спанов не создают, их потомки
+    привязываются к ближайшему отслеживаемому предку.
+    """
+
+    def __init__(self, parent: Span):
+        super().__init__()
+        self.parent = parent
+        # run_id -> спан, к которому привязываются потомки запуска
+        self._scopes: Dict[UUID, Span] = {}
+        # run_id запусков, для которых спан создан этим обработчиком
+        self._owned: Dict[UUID, Span] = {}
+
+    def _scope(self, parent_run_id: Optional[UUID]) -> Span:
+        return self._scopes.get(parent_run_id, self.parent) if parent_run_id else self.parent
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: str, stage: Optional[str],
+               attributes: Optional[Dict[str, Any]] = None) -> None:
+        span = tracer.start_span(name, stage=stage, parent=self._scope(parent_run_id), attributes=attributes)
+        self._scopes[run_id] = span
+        self._owned[run_id] = span
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None, attributes: Optional[Dict[str, Any]] = None) -> None:
+        self._scopes.pop(run_id, None)
+        span = self._owned.pop(run_id, None)
+        if span is None:
+            return
+        if attributes:
+            span.attributes.update(attributes)
+        if error is not None:
+            span.record_exception(error)
+        span.end()
+
+    # --- Узлы графа ---
+
+    async def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], *, run_id: UUID,
+                             parent_run_id: Optional[UUID] = None, metadata: Optional[Dict[str, Any]] = None,
+                             **kwargs: Any) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            self._start(run_id, parent_run_id, f"graph.node.{node}", STAGE_GRAPH_NODE, {"node": node})
+        else:
+            self._scopes[run_id] = self._scope(parent_run_id)
+
+    async def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    async def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    # --- LLM ---
+
+    async def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID,
+                                  parent_run_id: Optional[UUID] = None, metadata: Optional[Dict[str, Any]] = None,
+                                  **kwargs: Any) -> None:
+        self._start_llm(run_id, parent_run_id, metadata, kwargs)
+
+    async def on_llm_start(self, serialized: Dict[str, Any], prompts: Any, *, run_id: UUID,
+                           parent_run_id: Optional[UUID] = None, metadata: Optional[Dict[str, Any]] = None,
+                           **kwargs: Any) -> None:
+        self._start_llm(run_id, parent_run_id, metadata, kwargs)
+
+    def _start_llm(self, run_id: UUID, parent_run_id: Optional[UUID], metadata: Optional[Dict[str, Any]],
+                   kwargs: Dict[str, Any]) -> None:
+        invocation_params = kwargs.get("invocation_params") or {}
+        model = invocation_params.get("model") or invocation_params.get("model_name") or (metadata or {}).get("ls_model_name")
+        node = (metadata or {}).get("langgraph_node")
+        self._start(run_id, parent_run_id, f"llm.{node}" if node else "llm", STAGE_LLM_CALL, {"model": model})
+
+    async def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        attributes = {}
+        llm_output = getattr(response, "llm_output", None) or {}
+        usage = llm_output.get("token_usage") or llm_output.get("usage")
+        if isinstance(usage, dict):
+            attributes["total_tokens"] = usage.get("total_tokens")
+        self._end(run_id, attributes=attributes)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    # --- Инструменты и базы знаний ---
+
+    async def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID,
+                            parent_run_id: Optional[UUID] = None, metadata: Optional[Dict[str, Any]] = None,
+                            **kwargs: Any) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or "tool"
+        # Инструменты баз знаний выполняются в узле retrieve графа (см. GraphFactory.create_graph)
+        stage = STAGE_RETRIEVAL if (metadata or {}).get("langgraph_node") == "retrieve" else STAGE_TOOL
+        self._start(run_id, parent_run_id, f"tool.{name}", stage, {"tool": name})
+
+    async def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    async def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    async def on_retriever_start(self, serialized: Dict[str, Any], query: str, *, run_id: UUID,
+                                 parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        # Без этапа: время поиска уже учтено спаном инструмента
+        self._start(run_id, parent_run_id, "retriever", None)
+
+    async def on_retriever_end(self, documents: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, attributes={"documents": len(documents) if documents is not None else 0})
+
+    async def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
@@ -4,9 +4,11 @@ import argparse
 import sys
 
 from app.db.session import get_async_session_factory, close_db_engine
+from app.services.redis_service import close_redis_pool
 from app.core.config import settings
 from app.agent_runner.agent_runner import AgentRunner
 from app.core.logging_config import setup_logging
+from app.core.tracing import configure_tracing
 
 
 def setup_logging_for_agent(agent_id: str) -> logging.LoggerAdapter:
@@ -63,10 +65,12 @@ async def main_async_runner(agent_id: str):
                 log_adapter.info("Database engine closed.")
             except Exception as e_db_close:
                 log_adapter.error(f"Error closing database engine: {e_db_close}", exc_info=True)
+        await close_redis_pool()
         log_adapter.info(f"Agent runner for {agent_id} has been shut down.")
 
 if __name__ == "__main__":
     setup_logging()
+    configure_tracing("agent_runner")
 
     parser = argparse.ArgumentParser(description="Agent Runner Main Program")
     parser.add_argument("--agent-id", required=True, help="Unique ID of the agent to run")
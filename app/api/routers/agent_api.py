@@ -2,16 +2,19 @@ import logging
 import os
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
 import httpx
 import asyncio
 import json
+import redis.asyncio as redis
 
-from app.core.dependencies import get_db
-from app.api.schemas.agent_schemas import AgentConfigInput, AgentConfigOutput, AgentStatus, AgentListItem, AgentConfigStructure
+from app.core.dependencies import get_db, get_redis_client
+from app.api.schemas.agent_schemas import AgentConfigInput, AgentConfigOutput, AgentStatus, AgentListItem, AgentConfigStructure, TokenUsageSummaryOutput
 from app.api.schemas.common_schemas import IntegrationType
-from app.db.crud import agent_crud, user_crud
+from app.db.crud import agent_crud, user_crud, token_usage_crud
 from app.services.process_manager import ProcessManager
+from app.services.semantic_cache import publish_semantic_cache_invalidation
 from app.api.schemas.user_schemas import UserOutput
 from app.core.config import settings
 
@@ -489,6 +492,35 @@ async def restart_agent_api(
 
     return {"message": "Agent restart initiated"}
 
+@router.post(
+    "/semantic-cache/invalidate",
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Invalidate semantic answer caches of agents using a knowledge base"
+)
+async def invalidate_knowledge_base_semantic_cache_api(
+    knowledge_base_id: Optional[str] = Query(None, description="Knowledge base whose sources changed; all agents if omitted"),
+    r: redis.Redis = Depends(get_redis_client)
+):
+    """
+    Сбрасывает семантический кэш ответов агентов, использующих базу знаний
+    (вызывается после пересинхронизации источников).
+    """
+    await publish_semantic_cache_invalidation(r, knowledge_base_id=knowledge_base_id)
+    return {"message": "Semantic cache invalidation published"}
+
+@router.post(
+    "/{agent_id}/semantic-cache/invalidate",
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Invalidate the semantic answer cache of an agent"
+)
+async def invalidate_agent_semantic_cache_api(
+    agent_id: str,
+    r: redis.Redis = Depends(get_redis_client)
+):
+    """Сбрасывает семантический кэш ответов запущенного процесса агента."""
+    await publish_semantic_cache_invalidation(r, agent_id=agent_id)
+    return {"message": "Semantic cache invalidation published"}
+
 @router.get(
     "/{agent_id}/status",
     response_model=AgentStatus,
@@ -548,6 +580,48 @@ async def list_agent_users_api(
         
     return response_users
 
+@router.get(
+    "/{agent_id}/usage",
+    response_model=TokenUsageSummaryOutput,
+    summary="Get aggregated token usage for an agent",
+)
+async def get_agent_token_usage_api(
+    agent_id: str,
+    start: Optional[datetime] = Query(None, description="Start of the range (inclusive). Defaults to 30 days before 'end'"),
+    end: Optional[datetime] = Query(None, description="End of the range (exclusive). Defaults to now"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Returns token usage of the agent over [start, end) grouped by model and call type.
+    Served from hourly/daily rollups, so the cost depends on the number of buckets, not calls.
+    """
+    db_agent = await agent_crud.db_get_agent_config(db, agent_id)
+    if not db_agent:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Agent not found")
+
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=30)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'start' must be earlier than 'end'")
+
+    try:
+        items = await token_usage_crud.db_get_token_usage_summary(db, agent_id, start, end)
+    except Exception as e:
+        logger.error(f"Error fetching token usage for agent {agent_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to retrieve token usage.")
+
+    return TokenUsageSummaryOutput(
+        agent_id=agent_id,
+        start=start,
+        end=end,
+        total_tokens=sum(item["total_tokens"] for item in items),
+        items=items
+    )
+
 # Эндпоинты для интеграций были перенесены в app.api.routers.integration_api.py
 # Убедимся, что здесь нет старых эндпоинтов, связанных с интеграциями.
 
@@ -1,7 +1,7 @@
 import logging
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.dependencies import get_db
@@ -48,25 +48,44 @@ async def list_agent_chats_api(
 async def get_chat_history_api(
     agent_id: str,
     thread_id: str,
-    skip: int = Query(0, ge=0, description="Number of messages to skip"),
+    response: Response,
+    skip: int = Query(0, ge=0, description="Number of messages to skip (offset mode)"),
     limit: int = Query(100, ge=1, le=1000, description="Maximum number of messages to return"),
+    cursor: Optional[str] = Query(None, description="Return messages older than this cursor (keyset mode). Taken from the X-Next-Cursor header of the previous page"),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Retrieves the chat message history for a specific agent and thread ID,
     ordered by timestamp in descending order (newest first).
+
+    Supports two pagination modes:
+    - offset: `skip`/`limit` (kept for backwards compatibility);
+    - keyset: `cursor`/`limit`, constant cost regardless of page depth.
+    When a full page is returned, the `X-Next-Cursor` response header contains
+    the cursor for the next (older) page in both modes.
     """
     db_agent = await agent_crud.db_get_agent_config(db, agent_id) # Проверка существования агента
     if not db_agent:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Agent configuration not found")
 
+    if cursor is not None and skip:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Use either 'skip' or 'cursor', not both.")
+
     try:
-        history = await chat_crud.db_get_chat_history(db, agent_id, thread_id, skip=skip, limit=limit)
-        return history
+        if cursor is not None:
+            history = await chat_crud.db_get_chat_history_before(db, agent_id, thread_id, cursor=cursor, limit=limit)
+        else:
+            history = await chat_crud.db_get_chat_history(db, agent_id, thread_id, skip=skip, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching chat history for agent {agent_id}, thread {thread_id}: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to retrieve chat history.")
 
+    if len(history) == limit:
+        response.headers["X-Next-Cursor"] = chat_crud.encode_history_cursor(history[-1])
+    return history
+
 @router.delete(
     "/{thread_id}",
     status_code=status.HTTP_204_NO_CONTENT,
@@ -9,6 +9,8 @@ from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.base.redis_manager import RedisClientManager
+from app.core.message_codec import MessageCodecError, decode_message, encode_message, message_to_json_text
+from app.core.tracing import STAGE_PUBLISH, extract_trace_context, inject_trace_context, observe_queue_wait, tracer
 from app.db.session import get_db_session
 from app.db.crud import agent_crud
 
@@ -23,14 +25,13 @@ async def sse_stream(agent_id: str, thread_id: str) -> AsyncGenerator[str, None]
     Включает механизм keep-alive.
     """
     await redis.setup()
-    redis_cli = redis._redis_client
     pubsub = None
     keep_alive_interval = 30.0  # секунды
     last_event_time = asyncio.get_event_loop().time()
 
     try:
         output_channel = f"agent:{agent_id}:output"
-        pubsub = redis_cli.pubsub()
+        pubsub = redis.get_pubsub_client().pubsub()
         await pubsub.subscribe(output_channel)
 
         yield "event: connected\ndata: {\"message\": \"SSE connection established\"}\n\n" # Send structured connected event
@@ -47,12 +48,14 @@ async def sse_stream(agent_id: str, thread_id: str) -> AsyncGenerator[str, None]
 
             if message and message.get("type") == "message":
                 try:
-                    data = json.loads(message["data"])
+                    data = decode_message(message["data"])
                     if data.get("chat_id") == thread_id:
-                        yield f"data: {json.dumps(data)}\n\n"
+                        _, sent_at = extract_trace_context(data)
+                        observe_queue_wait("agent_output", sent_at)
+                        yield f"data: {message_to_json_text(data)}\n\n"
                         last_event_time = current_time
-                except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON received in SSE stream for agent {agent_id}, thread {thread_id}: {message['data']}")
+                except MessageCodecError as e:
+                    logger.error(f"Invalid message received in SSE stream for agent {agent_id}, thread {thread_id}: {e}")
                 except Exception as e:
                     logger.error(f"Error processing message in SSE stream for agent {agent_id}, thread {thread_id}: {e}", exc_info=True)
             else:  # message is None (timeout pubsub.get_message)
@@ -152,7 +155,9 @@ async def send_message_to_agent(
 
     input_channel = f"agent:{agent_id}:input"
     try:
-        await redis_cli.publish(input_channel, json.dumps(payload))
+        with tracer.start_span("integration.publish", stage=STAGE_PUBLISH, attributes={"channel": channel}) as publish_span:
+            inject_trace_context(payload, publish_span)
+            await redis_cli.publish(input_channel, encode_message(payload))
         logger.info(f"Message published to {input_channel} for agent {agent_id}, thread {thread_id}")
         return {"status": "success", "message": "Message sent to agent."}
     except RedisConnectionError as e:
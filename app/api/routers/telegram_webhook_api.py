@@ -0,0 +1,47 @@
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Request, status
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.integrations.telegram.telegram_webhook_host import telegram_webhook_host
+
+logger = logging.getLogger(__name__)
+router = APIRouter(tags=["Telegram Webhook"])
+
+
+@router.post("/telegram/webhook/{agent_id}", include_in_schema=False)
+async def telegram_webhook_api(
+    agent_id: str,
+    request: Request,
+    x_telegram_bot_api_secret_token: Optional[str] = Header(None)
+):
+    """
+    Single ingress for Telegram updates of all bots hosted in webhook mode.
+    The update is handled in the background so Telegram gets an immediate 200.
+    Any API worker can accept it: updates for bots hosted by another worker are forwarded there.
+    """
+    if not settings.TELEGRAM_WEBHOOK_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Telegram webhook mode is disabled")
+
+    try:
+        update = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid update payload")
+    if not isinstance(update, dict):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid update payload")
+
+    try:
+        accepted = await telegram_webhook_host.accept_update(agent_id, x_telegram_bot_api_secret_token, update)
+    except RedisError as e:
+        # Telegram retries updates that were not answered with 2xx
+        logger.error(f"Telegram update for agent {agent_id} not accepted: Redis error: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Temporarily unavailable")
+    if accepted is None:
+        logger.warning(f"Telegram update {update.get('update_id')} for agent {agent_id} dropped: bot is not running.")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Bot is not running")
+    if not accepted:
+        logger.warning(f"Telegram update for agent {agent_id} rejected: invalid secret token.")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid secret token")
+    return {"ok": True}
@@ -1,12 +1,14 @@
 import logging
 from typing import List, Optional
 
+import redis.asyncio as redis
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.dependencies import get_db
+from app.core.dependencies import get_db, get_redis_client
 from app.api.schemas import user_schemas
 from app.db.crud import user_crud
+from app.services.user_cache import publish_user_cache_invalidation
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["Users"])
@@ -38,5 +40,53 @@ async def read_user_api(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден.")
     return db_user
 
+@router.patch("/{user_id}", response_model=user_schemas.UserOutput)
+async def update_user_api(
+    user_id: int,
+    user_update: user_schemas.UserUpdate,
+    db: AsyncSession = Depends(get_db),
+    r: redis.Redis = Depends(get_redis_client)
+):
+    """
+    Обновить профиль пользователя. Кэш профиля в интеграциях сбрасывается для всех агентов.
+    """
+    db_user = await user_crud.get_user(db, user_id=user_id)
+    if db_user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден.")
+    updated_user = await user_crud.create_or_update_user(
+        db, platform=db_user.platform, platform_user_id=db_user.platform_user_id,
+        user_details=user_update.model_dump(exclude_unset=True)
+    )
+    if updated_user is None:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Не удалось обновить пользователя.")
+    if r:
+        await publish_user_cache_invalidation(r, platform=updated_user.platform, platform_user_id=updated_user.platform_user_id)
+    return updated_user
+
+@router.put("/{user_id}/authorizations/{agent_id}", response_model=user_schemas.AgentUserAuthorizationOutput)
+async def update_user_authorization_api(
+    user_id: int,
+    agent_id: str,
+    authorization: user_schemas.AgentUserAuthorizationUpdate,
+    db: AsyncSession = Depends(get_db),
+    r: redis.Redis = Depends(get_redis_client)
+):
+    """
+    Установить статус авторизации пользователя для агента. Кэш интеграций агента сбрасывается.
+    """
+    db_user = await user_crud.get_user(db, user_id=user_id)
+    if db_user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден.")
+    auth_record = await user_crud.update_agent_user_authorization(
+        db, agent_id=agent_id, user_id=user_id, is_authorized=authorization.is_authorized
+    )
+    if auth_record is None:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Не удалось обновить статус авторизации.")
+    if r:
+        await publish_user_cache_invalidation(
+            r, platform=db_user.platform, platform_user_id=db_user.platform_user_id, agent_id=agent_id
+        )
+    return auth_record
+
 # TODO: Реализовать аутентификацию и авторизацию для этих эндпоинтов.
-# TODO: Эндпоинты для обновления и удаления пользователей могут быть добавлены позже, если потребуется.
+# TODO: Эндпоинт для удаления пользователей может быть добавлен позже, если потребуется.
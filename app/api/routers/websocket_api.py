@@ -10,6 +10,7 @@ import redis.asyncio as redis
 import redis as redis_base # For exceptions
 
 from app.core.dependencies import get_redis_client, get_db
+from app.core.message_codec import encode_message
 from app.db.crud import agent_crud # Corrected: agent_crud was used, not user_crud directly here
 # Updated imports for ConnectionManager and central_redis_listener
 from app.services.websocket_manager import ConnectionManager, central_redis_listener
@@ -98,7 +99,7 @@ async def websocket_endpoint(
                 "user_data": payload.get("user_data", {})
             }
             try:
-                await r.publish(input_channel, json.dumps(agent_payload))
+                await r.publish(input_channel, encode_message(agent_payload))
             except redis_base.exceptions.ConnectionError as e:
                 logger.error(f"Redis connection error publishing WS message to {input_channel}: {e}")
                 if websocket.client_state == WebSocketState.CONNECTED:
@@ -159,3 +159,18 @@ class IntegrationStatus(BaseModel):
     agent_id: str # ID агента, к которому относится интеграция
     error_detail: Optional[str] = None
     last_active: Optional[float] = None # Timestamp последней активности, если применимо
+
+class TokenUsageSummaryItem(BaseModel):
+    model_id: str
+    call_type: str
+    call_count: int
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+
+class TokenUsageSummaryOutput(BaseModel):
+    agent_id: str
+    start: datetime
+    end: datetime
+    total_tokens: int # Сумма по всем моделям и типам вызовов
+    items: List[TokenUsageSummaryItem]
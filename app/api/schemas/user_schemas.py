@@ -15,6 +15,22 @@ class UserOutput(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class UserUpdate(BaseModel):
+    phone_number: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    username: Optional[str] = None
+
+class AgentUserAuthorizationUpdate(BaseModel):
+    is_authorized: bool
+
+class AgentUserAuthorizationOutput(BaseModel):
+    agent_id: str
+    user_id: int
+    is_authorized: bool
+
+    model_config = ConfigDict(from_attributes=True)
+
 class TokenUsageLogOutput(BaseModel):
     id: int
     agent_id: str
@@ -200,8 +200,9 @@ class VoiceSettings(BaseModel):
         elif self.intent_detection_mode == IntentDetectionMode.DISABLED:
             return False
         elif self.intent_detection_mode == IntentDetectionMode.KEYWORDS:
-            text_lower = text.lower()
-            return any(keyword.lower() in text_lower for keyword in self.intent_keywords)
+            # Lazy import: app.services.voice imports these schemas
+            from app.services.voice.intent_utils import get_keyword_matcher
+            return get_keyword_matcher(self.intent_keywords, whole_words=False).matches(text)
         return False
 
 
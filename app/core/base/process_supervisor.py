@@ -0,0 +1,266 @@
+"""
+Наблюдение за дочерними процессами по событиям их завершения
+
+Вместо опроса `os.kill(pid, 0)` каждые 100 мс завершение процесса ожидается
+напрямую:
+
+- для процессов, запущенных текущим процессом, - через `Process.wait()`
+  (asyncio получает SIGCHLD/pidfd от child watcher);
+- для остальных PID (например, запущенных другим экземпляром API) - через
+  pidfd на Linux, который становится читаемым в момент выхода процесса;
+- опрос с нарастающим интервалом остается только запасным вариантом
+  на платформах без `os.pidfd_open`.
+
+Для каждого запущенного процесса ChildProcessSupervisor держит задачу-наблюдатель,
+которая вызывает обработчик выхода сразу после завершения, поэтому статус
+в Redis меняется в момент падения, а не при следующей проверке.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать подтверждения выхода после SIGKILL
+KILL_CONFIRM_TIMEOUT = 5.0
+# Границы интервала опроса, если pidfd недоступен
+_POLL_MIN_INTERVAL = 0.01
+_POLL_MAX_INTERVAL = 0.5
+
+# on_exit(pid, returncode, expected): expected=True, если выход вызван terminate()
+ExitHandler = Callable[[int, Optional[int], bool], Awaitable[None]]
+
+
+class ProcessSupervisorMetrics:
+    """Счетчики завершений, остановок и перезапусков дочерних процессов."""
+
+    def __init__(self):
+        self.exits = 0
+        self.unexpected_exits = 0
+        self.stops = 0
+        self.kills = 0
+        self.total_stop_seconds = 0.0
+        self.max_stop_seconds = 0.0
+        self.restarts = 0
+        self.restart_failures = 0
+        self.total_restart_seconds = 0.0
+        self.max_restart_seconds = 0.0
+        self.restarts_by_process: Dict[str, int] = {}
+        self.last_restart_utc: Optional[str] = None
+
+    def on_exit(self, expected: bool) -> None:
+        self.exits += 1
+        if not expected:
+            self.unexpected_exits += 1
+
+    def on_stop(self, seconds: float) -> None:
+        self.stops += 1
+        self.total_stop_seconds += seconds
+        self.max_stop_seconds = max(self.max_stop_seconds, seconds)
+
+    def on_restart(self, name: str, seconds: float, succeeded: bool) -> None:
+        self.restarts += 1
+        if not succeeded:
+            self.restart_failures += 1
+        self.total_restart_seconds += seconds
+        self.max_restart_seconds = max(self.max_restart_seconds, seconds)
+        self.restarts_by_process[name] = self.restarts_by_process.get(name, 0) + 1
+        self.last_restart_utc = datetime.now(timezone.utc).isoformat()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "exits": self.exits,
+            "unexpected_exits": self.unexpected_exits,
+            "stops": self.stops,
+            "kills": self.kills,
+            "avg_stop_seconds": self.total_stop_seconds / self.stops if self.stops else 0.0,
+            "max_stop_seconds": self.max_stop_seconds,
+            "restarts": self.restarts,
+            "restart_failures": self.restart_failures,
+            "avg_restart_seconds": self.total_restart_seconds / self.restarts if self.restarts else 0.0,
+            "max_restart_seconds": self.max_restart_seconds,
+            "restarts_by_process": dict(self.restarts_by_process),
+            "last_restart_utc": self.last_restart_utc,
+        }
+
+
+class ChildProcessSupervisor:
+    """
+    Отслеживает дочерние процессы и ожидает их завершения без опроса.
+
+    Экземпляр общий для процесса (см. `process_supervisor`): ProcessManager
+    создается на каждый запрос API, а процесс, запущенный в одном запросе,
+    останавливается в другом.
+    """
+
+    def __init__(self):
+        self.metrics = ProcessSupervisorMetrics()
+        self._children: Dict[int, asyncio.subprocess.Process] = {}
+        self._names: Dict[int, str] = {}
+        self._watchers: Dict[int, asyncio.Task] = {}
+        self._stopping: Set[int] = set()
+
+    def watch(self, process: asyncio.subprocess.Process, name: str, on_exit: Optional[ExitHandler] = None) -> None:
+        """Начинает наблюдение за запущенным процессом."""
+        pid = process.pid
+        self._children[pid] = process
+        self._names[pid] = name
+        self._watchers[pid] = asyncio.create_task(
+            self._watch(pid, process, name, on_exit), name=f"ProcessWatcher-{name}-{pid}"
+        )
+
+    def is_alive(self, pid: int) -> Optional[bool]:
+        """Жив ли отслеживаемый процесс; None, если PID не запущен этим процессом."""
+        process = self._children.get(pid)
+        if process is None:
+            return None
+        return process.returncode is None
+
+    async def _watch(self, pid: int, process: asyncio.subprocess.Process, name: str, on_exit: Optional[ExitHandler]) -> None:
+        try:
+            returncode = await process.wait()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error waiting for process {name} (PID: {pid}): {e}", exc_info=True)
+            returncode = None
+
+        expected = pid in self._stopping
+        self._stopping.discard(pid)
+        self._children.pop(pid, None)
+        self._names.pop(pid, None)
+        self._watchers.pop(pid, None)
+        self.metrics.on_exit(expected)
+        if expected:
+            logger.info(f"Process {name} (PID: {pid}) exited with code {returncode} after stop request.")
+        else:
+            logger.warning(f"Process {name} (PID: {pid}) exited unexpectedly with code {returncode}.")
+
+        if on_exit is not None:
+            try:
+                await on_exit(pid, returncode, expected)
+            except Exception as e:
+                logger.error(f"Exit handler for process {name} (PID: {pid}) failed: {e}", exc_info=True)
+
+    async def wait_for_exit(self, pid: int, timeout: float) -> bool:
+        """
+        Ждет завершения процесса не дольше timeout секунд.
+
+        Returns:
+            bool: True, если процесс завершился (или уже не существует).
+        """
+        process = self._children.get(pid)
+        if process is not None:
+            waiter: Awaitable[Any] = process.wait()
+        else:
+            waiter = self._open_pidfd_waiter(pid) or self._poll_exit(pid)
+        try:
+            await asyncio.wait_for(waiter, timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _open_pidfd_waiter(self, pid: int) -> Optional[asyncio.Future]:
+        """Future, завершающийся при выходе процесса (pidfd); None, если pidfd недоступен."""
+        pidfd_open = getattr(os, "pidfd_open", None)
+        if pidfd_open is None:
+            return None
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        try:
+            fd = pidfd_open(pid)
+        except ProcessLookupError:
+            future.set_result(None)
+            return future
+        except OSError as e:
+            logger.debug(f"pidfd_open({pid}) failed: {e}. Falling back to polling.")
+            return None
+
+        def _on_exit_ready() -> None:
+            if not future.done():
+                future.set_result(None)
+
+        def _release(_: asyncio.Future) -> None:
+            loop.remove_reader(fd)
+            os.close(fd)
+
+        loop.add_reader(fd, _on_exit_ready)
+        future.add_done_callback(_release)
+        return future
+
+    async def _poll_exit(self, pid: int) -> None:
+        interval = _POLL_MIN_INTERVAL
+        while True:
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                return
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, _POLL_MAX_INTERVAL)
+
+    async def terminate(self, pid: int, timeout: float, force: bool = False) -> bool:
+        """
+        Отправляет SIGTERM и ждет выхода; при force и истечении timeout - SIGKILL.
+
+        Returns:
+            bool: True, если процесс завершился (или уже не существовал).
+        """
+        started = time.perf_counter()
+        self._stopping.add(pid)
+        exited = False
+        try:
+            exited = await self._signal_and_wait(pid, timeout, force)
+            return exited
+        finally:
+            self.metrics.on_stop(time.perf_counter() - started)
+            # Для завершившихся отслеживаемых процессов флаг снимает наблюдатель, когда обработает выход.
+            # Процесс, переживший остановку, продолжает работу: его последующее падение не ожидаемо.
+            if not exited or pid not in self._children:
+                self._stopping.discard(pid)
+
+    async def _signal_and_wait(self, pid: int, timeout: float, force: bool) -> bool:
+        name = self._names.get(pid, "external")
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            logger.info(f"Process {name} (PID: {pid}) not found (already stopped?).")
+            return True
+        logger.info(f"SIGTERM sent to process {name} (PID: {pid})")
+        if await self.wait_for_exit(pid, timeout):
+            logger.info(f"Process {name} (PID: {pid}) terminated gracefully after SIGTERM.")
+            return True
+        logger.warning(f"Process {name} (PID: {pid}) did not terminate after SIGTERM within {timeout}s.")
+        if not force:
+            return False
+
+        logger.info(f"Forcing kill (SIGKILL) for process {name} (PID: {pid}).")
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            logger.info(f"Process {name} (PID: {pid}) was already gone before SIGKILL could be sent.")
+            return True
+        self.metrics.kills += 1
+        if await self.wait_for_exit(pid, KILL_CONFIRM_TIMEOUT):
+            logger.info(f"Process {name} (PID: {pid}) confirmed terminated after SIGKILL.")
+            return True
+        logger.warning(f"Process {name} (PID: {pid}) still exists after SIGKILL attempt.")
+        return False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "tracked_processes": len(self._children),
+            **self.metrics.snapshot(),
+        }
+
+
+process_supervisor = ChildProcessSupervisor()
+
+
+def get_process_supervisor_metrics() -> Dict[str, Any]:
+    """Отслеживаемые процессы и счетчики остановок/перезапусков текущего процесса."""
+    return process_supervisor.snapshot()
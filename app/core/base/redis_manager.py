@@ -4,9 +4,25 @@ import logging
 
 # Импортируем настройки для доступа к REDIS_URL
 from app.core.config import settings
+from app.services.redis_service import get_pubsub_redis, get_redis
 
 logger = logging.getLogger(__name__)
 
+
+def redis_connection_options() -> dict:
+    """
+    Параметры соединений Redis для долгоживущих клиентов.
+
+    Живость соединения обеспечивается TCP keepalive и health check
+    (PING только перед использованием соединения, простаивавшего дольше интервала),
+    а не периодическими проверками из кода.
+    """
+    return {
+        "socket_keepalive": settings.REDIS_SOCKET_KEEPALIVE,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL,
+    }
+
+
 class RedisClientManager:
     """
     Управляет жизненным циклом клиента Redis, обеспечивая его инициализацию,
@@ -30,6 +46,7 @@ class RedisClientManager:
     """
     _redis_client: Optional[redis.Redis] = None
     _redis_url_used: Optional[str] = None # Store the URL used for initialization
+    _owns_redis_client: bool = False # True только для выделенного клиента (URL отличается от settings.REDIS_URL)
 
     @property
     async def redis_client(self) -> redis.Redis:
@@ -66,8 +83,9 @@ class RedisClientManager:
         метод завершает работу. В противном случае, он пытается инициализировать новый клиент,
         используя один из следующих источников в порядке приоритета:
         1. Предоставленный существующий экземпляр `client`.
-        2. Предоставленный `redis_url`.
-        3. URL-адрес из глобальных настроек `settings.REDIS_URL`.
+        2. Предоставленный `redis_url`, если он отличается от `settings.REDIS_URL`
+           (выделенный клиент, закрывается в `close_redis_resources`).
+        3. Общий пул процесса для `settings.REDIS_URL` (app.services.redis_service).
 
         После попытки инициализации выполняется проверка соединения (`ping()`).
         Если соединение не удалось установить или произошла ошибка во время инициализации,
@@ -97,15 +115,19 @@ class RedisClientManager:
         if client and isinstance(client, redis.Redis): # Ensure client is a Redis instance
             self._redis_client = client
             self._redis_url_used = None # Clear URL if direct client is provided
+            self._owns_redis_client = False
             logger.info("Using provided Redis client instance.")
-        elif redis_url:
-            self._redis_client = redis.from_url(redis_url)
+        elif redis_url and redis_url != str(settings.REDIS_URL):
+            self._redis_client = redis.from_url(redis_url, **redis_connection_options())
             self._redis_url_used = redis_url # Store the URL
-            logger.debug(f"Initialized Redis client from URL: {redis_url}")
+            self._owns_redis_client = True
+            logger.debug(f"Initialized dedicated Redis client from URL: {redis_url}")
         elif settings.REDIS_URL:
-            self._redis_client = redis.from_url(str(settings.REDIS_URL))
+            # Общий для процесса пул (ответы bytes, как у прежнего клиента from_url)
+            self._redis_client = get_redis(decode_responses=False)
             self._redis_url_used = str(settings.REDIS_URL) # Store the URL
-            logger.debug(f"Initialized Redis client from settings REDIS_URL.")
+            self._owns_redis_client = False
+            logger.debug(f"Using process-wide Redis pool for settings REDIS_URL.")
         else:
             logger.error("Cannot initialize Redis client: No client instance, redis_url, or settings.REDIS_URL provided.")
             raise ValueError("Redis client cannot be initialized without a client instance or Redis URL.")
@@ -120,7 +142,7 @@ class RedisClientManager:
             logger.error(f"Failed to connect to Redis after initialization: {e}", exc_info=True)
             current_client = self._redis_client
             self._redis_client = None 
-            if current_client:
+            if current_client and self._owns_redis_client:
                 try:
                     await current_client.close() # Attempt to close the faulty client
                 except Exception as close_e:
@@ -130,12 +152,18 @@ class RedisClientManager:
     async def close_redis_resources(self):
         """
         Асинхронно закрывает активное соединение с клиентом Redis, если оно существует.
+        Клиент общего пула процесса не закрывается, сбрасывается только ссылка на него.
 
         После успешного закрытия соединения, внутренний атрибут `_redis_client`
         и `_redis_url_used` устанавливаются в `None`. Логгирует ошибки, если они
         возникают в процессе закрытия.
         """
-        if self._redis_client:
+        if self._redis_client and not self._owns_redis_client:
+            # Общий пул процесса закрывается через close_redis_pool()
+            logger.debug("Releasing reference to process-wide Redis client.")
+            self._redis_client = None
+            self._redis_url_used = None
+        elif self._redis_client:
             logger.info("Closing Redis client connection.")
             try:
                 await self._redis_client.close()
@@ -146,6 +174,17 @@ class RedisClientManager:
                 self._redis_client = None
                 self._redis_url_used = None # Clear stored URL on close
 
+    def get_pubsub_client(self) -> redis.Redis:
+        """
+        Клиент для подписок Pub/Sub.
+
+        Для общего пула подписки мультиплексируются на одно соединение Pub/Sub
+        процесса и не занимают соединения для команд; выделенный клиент используется как есть.
+        """
+        if self._owns_redis_client and self._redis_client is not None:
+            return self._redis_client
+        return get_pubsub_redis(decode_responses=False)
+
     async def is_redis_client_available(self) -> bool:
         """
         Асинхронно проверяет, инициализирован ли клиент Redis и доступен ли он.
@@ -4,6 +4,8 @@ import asyncio # Add asyncio import
 from typing import Optional, List, Coroutine # Add List and Coroutine
 import os # <--- Добавлен этот импорт
 
+from redis import exceptions as redis_exceptions
+
 from app.core.base.runnable_component import RunnableComponent
 from app.core.base.status_updater import StatusUpdater
 from app.core.config import settings # Added import for settings
@@ -211,13 +213,23 @@ class ServiceComponentBase(RunnableComponent, StatusUpdater, ABC):
         self.logger.info(f"ServiceComponent cleanup completed.")
 
     async def _pubsub_listener_loop(self):
-        """Прослушивает сообщения Pub/Sub из Redis и обрабатывает их."""
+        """
+        Прослушивает сообщения Pub/Sub из Redis и обрабатывает их.
+
+        Сообщения читаются блокирующим асинхронным итератором подписки: в простое
+        процесс не отправляет в Redis ни одной команды. Живость соединения
+        обеспечивают TCP keepalive и health check пулов (app.services.redis_service),
+        а переподключение и повторная подписка выполняются только по ошибкам соединения
+        с экспоненциальной задержкой.
+        """
         # self.redis_client is inherited from StatusUpdater -> RedisClientManager
         # and initialized by ServiceComponentBase.setup() -> StatusUpdater.setup_status_updater()
         
         # Ensure redis_client is available (it should be after setup)
         try:
-            redis_cli = await self.redis_client 
+            await self.redis_client
+            # Подписка идет через общее соединение Pub/Sub процесса, а не через пул команд
+            redis_cli = self.get_pubsub_client()
         except RuntimeError as e:
             self.logger.critical(f"[{self._component_id}] Redis client not available for Pub/Sub listener: {e}. Listener cannot start.")
             await self.mark_as_error(reason=f"Redis client unavailable for Pub/Sub: {e}")
@@ -232,69 +244,44 @@ class ServiceComponentBase(RunnableComponent, StatusUpdater, ABC):
             return
 
         channel = self._pubsub_channel
-        pubsub = None
+        reconnect_delay = settings.REDIS_RECONNECT_INTERVAL
         self.logger.info(f"Pub/Sub listener starting for channel: {channel}")
 
         while self._running:  # self._running is from RunnableComponent
+            pubsub = redis_cli.pubsub(ignore_subscribe_messages=True)
             try:
-                if not await redis_cli.ping():
-                    self.logger.warning(f"[{self._component_id}] Redis ping failed in listener. Re-establishing pubsub.")
-                    if pubsub:
-                        try:
-                            await pubsub.aclose()
-                        except Exception as e_close:
-                            self.logger.error(f"[{self._component_id}] Error closing pubsub during reconnect: {e_close}")
-                    pubsub = None
-                    await asyncio.sleep(settings.REDIS_RECONNECT_INTERVAL) # settings needs to be available
-                    continue
-
-                if pubsub is None:
-                    pubsub = redis_cli.pubsub()
-                    await pubsub.subscribe(channel)
-                    self.logger.info(f"Subscribed to Redis channel: {channel}")
-
-                # Listen for messages
-                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
-                
-                if message and message['type'] == 'message':
+                await pubsub.subscribe(channel)
+                self.logger.info(f"Subscribed to Redis channel: {channel}")
+                reconnect_delay = settings.REDIS_RECONNECT_INTERVAL
+
+                # listen() блокируется до прихода сообщения; итератор завершается только при отписке
+                async for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        self.logger.debug(f"Received non-message from {channel}: {message}")
+                        continue
                     self.logger.debug(f"Received message from {channel}: {message['data']}")
                     try:
                         # Child class must implement _handle_pubsub_message
                         await self._handle_pubsub_message(message['data'])
                     except Exception as e_handle:
                         self.logger.error(f"[{self._component_id}] Error handling pubsub message: {e_handle}", exc_info=True)
-                elif message:
-                    self.logger.debug(f"Received non-message from {channel}: {message}")
 
             except asyncio.CancelledError:
                 self.logger.info(f"Pub/Sub listener task cancelled.")
                 break
-            except (ConnectionError, TimeoutError) as e_conn:
-                self.logger.warning(f"[{self._component_id}] Pub/Sub connection error: {e_conn}. Attempting to reconnect...")
-                if pubsub:
-                    try:
-                        await pubsub.aclose()
-                    except Exception as e_close:
-                        self.logger.error(f"[{self._component_id}] Error closing pubsub during connection error: {e_close}")
-                pubsub = None
-                await asyncio.sleep(settings.REDIS_RECONNECT_INTERVAL)
+            except (redis_exceptions.ConnectionError, redis_exceptions.TimeoutError, OSError) as e_conn:
+                self.logger.warning(f"[{self._component_id}] Pub/Sub connection error: {e_conn}. Resubscribing in {reconnect_delay}s...")
+                await asyncio.sleep(reconnect_delay)
+                reconnect_delay = min(reconnect_delay * 2, settings.REDIS_RECONNECT_MAX_INTERVAL)
             except Exception as e:
                 self.logger.error(f"[{self._component_id}] Unexpected error in Pub/Sub listener loop: {e}", exc_info=True)
-                # In case of unexpected errors, also try to re-establish pubsub after a delay
-                if pubsub:
-                    try:
-                        await pubsub.aclose()
-                    except Exception as e_close:
-                        self.logger.error(f"[{self._component_id}] Error closing pubsub after unexpected error: {e_close}")
-                pubsub = None
                 await asyncio.sleep(settings.REDIS_RECONNECT_INTERVAL * 2) # Longer delay for unexpected errors
-        
-        if pubsub:
-            try:
-                self.logger.info(f"Closing Pub/Sub connection for channel: {channel}")
-                await pubsub.aclose()
-            except Exception as e:
-                self.logger.error(f"[{self._component_id}] Error closing pubsub on exit: {e}")
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception as e_close:
+                    self.logger.error(f"[{self._component_id}] Error closing pubsub for channel {channel}: {e_close}")
+
         self.logger.info(f"Pub/Sub listener loop for {channel} finished.")
 
     @abstractmethod
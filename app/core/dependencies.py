@@ -5,7 +5,7 @@ import redis.asyncio as redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.session import SessionLocal
-from app.services.redis_service import get_redis_pool
+from app.services.redis_service import get_redis
 
 logger = logging.getLogger(__name__)
 
@@ -37,24 +37,13 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             pass
 
 async def get_redis_client() -> AsyncGenerator[redis.Redis, None]:
-    """FastAPI зависимость для получения Redis клиента из пула."""
-    redis_pool = get_redis_pool() # Получаем пул из redis_service
-    if not redis_pool:
-        logger.error("Redis pool is not initialized. Check services.redis_service.py.")
-        # Аналогично get_db, здесь нужна корректная обработка ошибки конфигурации
-        yield None
-        return
+    """
+    FastAPI зависимость для получения Redis клиента.
 
-    client: redis.Redis = None
-    try:
-        client = redis.Redis.from_pool(redis_pool)
-        yield client
-    except Exception as e:
-        logger.error(f"Error getting Redis client: {e}", exc_info=True)
-        raise
-    finally:
-        if client:
-            await client.close() # Закрываем соединение, возвращая его в пул
+    Возвращает общий клиент процесса (redis_service.get_redis): соединения берутся
+    из пула на время каждой команды, поэтому клиент не создается и не закрывается на запрос.
+    """
+    yield get_redis()
 
 
 async def get_image_orchestrator():
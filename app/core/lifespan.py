@@ -4,17 +4,22 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 from app.core.logging_config import setup_logging
+from app.core.tracing import configure_tracing
 from app.db.session import close_db_engine
 from app.services.redis_service import init_redis_pool, close_redis_pool
+from app.services.storage import close_object_storage
 from app.core.config import settings
 
 from app.workers.history_saver_worker import HistorySaverWorker
 from app.workers.token_usage_worker import TokenUsageWorker
 from app.workers.inactivity_monitor_worker import InactivityMonitorWorker
+from app.workers.media_file_cleanup_worker import MediaFileCleanupWorker
+from app.workers.partition_maintenance_worker import PartitionMaintenanceWorker
 
 from app.api.schemas.common_schemas import IntegrationType
 from app.db.crud import agent_crud
 from app.services.process_manager import ProcessManager
+from app.integrations.telegram.telegram_webhook_host import telegram_webhook_host
 from app.db.session import get_async_session_factory
 
 logger = logging.getLogger(__name__)
@@ -156,7 +161,8 @@ async def start_background_tasks(app: FastAPI):
     """
     Запускает все необходимые фоновые задачи (воркеры) для приложения.
 
-    Для каждого типа воркера (HistorySaverWorker, TokenUsageWorker, InactivityMonitorWorker):
+    Для каждого типа воркера (HistorySaverWorker, TokenUsageWorker, InactivityMonitorWorker,
+    MediaFileCleanupWorker, PartitionMaintenanceWorker):
     1. Создает экземпляр воркера.
     2. Создает задачу asyncio для выполнения метода `run()` воркера.
     3. Добавляет задачу в список `background_tasks` для отслеживания.
@@ -207,7 +213,41 @@ async def start_background_tasks(app: FastAPI):
     except Exception as e:
         logger.error(f"Failed to start inactivity monitor worker: {e}", exc_info=True)
 
+    # Media File Cleanup Worker
+    try:
+        media_cleanup_worker = MediaFileCleanupWorker()
+        media_cleanup_task = asyncio.create_task(
+            media_cleanup_worker.run(),
+            name="MediaFileCleanupWorker"
+        )
+        background_tasks.append(media_cleanup_task)
+        logger.info(f"Media file cleanup worker started. Interval: {settings.VOICE_CLEANUP_INTERVAL}s, "
+                    f"Voice retention: {settings.VOICE_FILE_RETENTION_DAYS} days, "
+                    f"Image retention: {settings.IMAGE_FILE_RETENTION_DAYS} days.")
+    except Exception as e:
+        logger.error(f"Failed to start media file cleanup worker: {e}", exc_info=True)
+
+    # Partition Maintenance Worker
+    try:
+        partition_worker = PartitionMaintenanceWorker()
+        partition_task = asyncio.create_task(
+            partition_worker.run(),
+            name="PartitionMaintenanceWorker"
+        )
+        background_tasks.append(partition_task)
+        logger.info(f"Partition maintenance worker started. Interval: {settings.PARTITION_MAINTENANCE_INTERVAL}s, "
+                    f"Premake: {settings.PARTITION_PREMAKE_MONTHS} months.")
+    except Exception as e:
+        logger.error(f"Failed to start partition maintenance worker: {e}", exc_info=True)
+
     logger.info(f"{len(background_tasks)} background tasks initiated.")
+
+    # Хост Telegram-ботов в режиме webhook должен слушать команды до запуска интеграций
+    if settings.TELEGRAM_WEBHOOK_ENABLED:
+        try:
+            await telegram_webhook_host.start()
+        except Exception as e:
+            logger.error(f"Failed to start Telegram webhook host: {e}", exc_info=True)
     
     # Запускаем существующих агентов после инициализации основных фоновых задач
     try:
@@ -256,7 +296,7 @@ async def lifespan(app: FastAPI):
     Выполняет действия при старте и остановке приложения.
 
     При старте (до `yield`):
-    1. Настраивает логирование (`setup_logging()`).
+    1. Настраивает логирование (`setup_logging()`) и трассировку (`configure_tracing()`).
     2. Инициализирует пул соединений Redis (`init_redis_pool()`).
     3. Запускает фоновые задачи (`start_background_tasks(app)`), включая воркеры
        и инициализацию существующих агентов/интеграций.
@@ -266,14 +306,16 @@ async def lifespan(app: FastAPI):
     1. Логирует начало последовательности остановки.
     2. Останавливает фоновые задачи (`stop_background_tasks()`).
     3. Закрывает пул соединений Redis (`close_redis_pool()`).
-    4. Закрывает движок базы данных (`close_db_engine()`).
-    5. Логирует завершение последовательности остановки.
+    4. Закрывает клиент объектного хранилища (`close_object_storage()`).
+    5. Закрывает движок базы данных (`close_db_engine()`).
+    6. Логирует завершение последовательности остановки.
 
     Args:
         app (FastAPI): Экземпляр FastAPI приложения. Передается в `start_background_tasks`.
     """
     # --- Startup ---
     setup_logging() 
+    configure_tracing("api")
     logger.info("Application startup sequence initiated.")
 
     await init_redis_pool()
@@ -287,7 +329,9 @@ async def lifespan(app: FastAPI):
     logger.info("Application shutdown sequence initiated.")
 
     await stop_background_tasks()
+    await telegram_webhook_host.stop()
     await close_redis_pool()
+    await close_object_storage()
     await close_db_engine()
 
     logger.info("Application shutdown sequence completed.")
@@ -0,0 +1,156 @@
+"""
+Кодек сообщений каналов агентов и очередей воркеров
+
+Один формат для `agent:{id}:input`, `agent:{id}:output`, очереди истории и очереди
+токенов: продюсеры вызывают `encode_message`, потребители - `decode_message`
+ровно один раз на сообщение и дальше работают со словарем.
+
+- Формат записи задает MESSAGE_CODEC: "json" (orjson, если установлен, иначе
+  stdlib json) или "msgpack" (пакет msgpack, бинарные значения передаются как есть).
+- Чтение формат не настраивает: текст JSON начинается с ASCII-символа,
+  а словарь MessagePack - с байта 0x80 и выше. Поэтому при переходе на msgpack
+  сначала раскатываются потребители с этим модулем, затем меняется MESSAGE_CODEC.
+- Каждое сообщение несет поле PAYLOAD_VERSION_FIELD. Сообщение без него -
+  от продюсера до появления версии (версия 0), сообщение с версией новее
+  поддерживаемой отклоняется, а не разбирается наугад.
+"""
+
+import json
+import logging
+from typing import Any, Dict, Optional, Union
+
+from app.core.config import settings
+from app.core.tracing import SENT_AT_FIELD, TRACEPARENT_FIELD
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_VERSION_FIELD = "payload_version"
+# Версия, которую пишут продюсеры; потребители принимают версии до нее включительно
+PAYLOAD_VERSION = 1
+# Служебные поля конверта: внешним клиентам (WebSocket, SSE) не передаются
+ENVELOPE_FIELDS = (PAYLOAD_VERSION_FIELD, TRACEPARENT_FIELD, SENT_AT_FIELD)
+
+CODEC_JSON = "json"
+CODEC_MSGPACK = "msgpack"
+
+
+class MessageCodecError(ValueError):
+    """Сообщение не удалось закодировать или разобрать."""
+
+
+class JsonMessageCodec:
+    name = CODEC_JSON
+
+    def encode(self, payload: Dict[str, Any]) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(payload)
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def decode(self, data: bytes) -> Any:
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+
+
+class MsgpackMessageCodec:
+    name = CODEC_MSGPACK
+
+    def __init__(self):
+        if msgpack is None:
+            raise MessageCodecError("MessagePack codec requires the 'msgpack' package.")
+
+    def encode(self, payload: Dict[str, Any]) -> bytes:
+        return msgpack.packb(payload, use_bin_type=True)
+
+    def decode(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+
+_json_codec = JsonMessageCodec()
+_msgpack_codec: Optional[MsgpackMessageCodec] = None
+_writer_codec: Optional[Union[JsonMessageCodec, MsgpackMessageCodec]] = None
+
+
+def _get_msgpack_codec() -> MsgpackMessageCodec:
+    global _msgpack_codec
+    if _msgpack_codec is None:
+        _msgpack_codec = MsgpackMessageCodec()
+    return _msgpack_codec
+
+
+def get_message_codec() -> Union[JsonMessageCodec, MsgpackMessageCodec]:
+    """Кодек, которым пишет текущий процесс (MESSAGE_CODEC)."""
+    global _writer_codec
+    if _writer_codec is None:
+        if settings.MESSAGE_CODEC == CODEC_MSGPACK:
+            _writer_codec = _get_msgpack_codec()
+        else:
+            if settings.MESSAGE_CODEC != CODEC_JSON:
+                logger.warning(f"Unknown MESSAGE_CODEC '{settings.MESSAGE_CODEC}', using '{CODEC_JSON}'.")
+            _writer_codec = _json_codec
+    return _writer_codec
+
+
+def encode_message(payload: Dict[str, Any]) -> bytes:
+    """Кодирует сообщение кодеком процесса; поле версии добавляется в копию payload."""
+    envelope = {**payload, PAYLOAD_VERSION_FIELD: PAYLOAD_VERSION}
+    try:
+        return get_message_codec().encode(envelope)
+    except MessageCodecError:
+        raise
+    except Exception as e:
+        raise MessageCodecError(f"Failed to encode message: {e!r}") from e
+
+
+def is_json_message(data: Union[bytes, str]) -> bool:
+    """Закодировано ли сообщение в JSON (иначе - MessagePack)."""
+    if isinstance(data, str):
+        return True
+    return bool(data) and data[0] < 0x80
+
+
+def decode_message(data: Union[bytes, str]) -> Dict[str, Any]:
+    """
+    Разбирает сообщение любого поддерживаемого формата и проверяет его версию.
+
+    Returns:
+        Dict[str, Any]: словарь без поля версии.
+
+    Raises:
+        MessageCodecError: данные не разбираются, это не объект или версия не поддерживается.
+    """
+    try:
+        if is_json_message(data):
+            payload = _json_codec.decode(data)
+        else:
+            payload = _get_msgpack_codec().decode(data)
+    except MessageCodecError:
+        raise
+    except Exception as e:
+        raise MessageCodecError(f"Failed to decode message: {e!r}") from e
+
+    if not isinstance(payload, dict):
+        raise MessageCodecError(f"Message must be an object, got {type(payload).__name__}.")
+    version = payload.pop(PAYLOAD_VERSION_FIELD, 0)
+    if not isinstance(version, int) or version > PAYLOAD_VERSION:
+        raise MessageCodecError(f"Unsupported payload version {version!r} (supported up to {PAYLOAD_VERSION}).")
+    return payload
+
+
+def message_to_json_text(payload: Dict[str, Any]) -> str:
+    """
+    JSON-текст разобранного сообщения для внешних клиентов (WebSocket, SSE)
+    без служебных полей конверта (версия, контекст трассировки).
+    """
+    public = {key: value for key, value in payload.items() if key not in ENVELOPE_FIELDS}
+    return json.dumps(public, ensure_ascii=False, default=str)
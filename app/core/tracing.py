@@ -0,0 +1,542 @@
+"""
+Трассировка сообщения по конвейеру и гистограммы длительности этапов
+
+Сообщение пользователя проходит через процесс интеграции, Pub/Sub, AgentRunner,
+узлы LangGraph, инструменты и провайдеров голоса/зрения, очереди истории
+и токенов и их воркеры. Для сквозной картины:
+
+- спаны в модели OpenTelemetry (trace_id/span_id/parent_id, атрибуты, статус)
+  передаются между процессами в полезной нагрузке сообщений полем `traceparent`
+  (формат W3C Trace Context), а `interaction_id` записывается атрибутом
+  и служит ключом корреляции с историей и учетом токенов;
+- внутри процесса текущий спан хранится в contextvar, дочерние спаны
+  наследуют его автоматически;
+- завершенный спан с этапом (`stage`) попадает в гистограмму
+  `pipeline_stage_duration_seconds{stage, operation}` (семантика Prometheus);
+- спаны отдаются экспортеру: в памяти (тесты, бенчмарки) или в файл JSON lines
+  (TRACING_EXPORTER).
+
+Гистограммы ведутся в каждом процессе. Раз в TRACING_METRICS_PUSH_INTERVAL
+секунд процесс добавляет прирост счетчиков с прошлой отправки (HINCRBY)
+в общий хэш своего сервиса в Redis без TTL, и API собирает по ним общую
+картину (`collect_stage_histograms()`, /metrics/pipeline и /metrics/prometheus).
+Счетчики сервиса поэтому только растут: завершение или перезапуск процесса
+не уменьшает их, и rate()/increase() в Prometheus остаются корректными.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple, Union
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Этапы конвейера (значение метки stage)
+STAGE_QUEUE_WAIT = "queue_wait"
+STAGE_GRAPH_NODE = "graph_node"
+STAGE_LLM_CALL = "llm_call"
+STAGE_RETRIEVAL = "retrieval"
+STAGE_TOOL = "tool"
+STAGE_STT = "stt"
+STAGE_TTS = "tts"
+STAGE_VISION = "vision"
+STAGE_DB_INSERT = "db_insert"
+STAGE_DB_QUERY = "db_query"
+STAGE_PUBLISH = "publish"
+STAGE_CACHE_LOOKUP = "cache_lookup"
+STAGE_AUDIO_PROBE = "audio_probe"
+STAGE_AUDIO_TRANSCODE = "audio_transcode"
+
+# Поля полезной нагрузки сообщений с контекстом трассировки
+TRACEPARENT_FIELD = "traceparent"
+SENT_AT_FIELD = "sent_at"
+
+STAGE_HISTOGRAM_NAME = "pipeline_stage_duration_seconds"
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Хэш накопленных счетчиков сервиса: поле - JSON [метки..., "b<i>" | "sum" | "count"]
+METRICS_KEY_PREFIX = "tracing:stage_histogram_totals:"
+METRICS_BUCKETS_FIELD = "buckets"
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class Histogram:
+    """Гистограмма с фиксированными бакетами по набору меток (семантика Prometheus)."""
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # метки -> [счетчики по бакетам (последний - +Inf), сумма, количество]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def _get_series(self, label_values: Tuple[str, ...]) -> List[Any]:
+        series = self._series.get(label_values)
+        if series is None:
+            series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            self._series[label_values] = series
+        return series
+
+    def observe(self, value: float, **labels: str) -> None:
+        series = self._get_series(tuple(str(labels.get(n, "")) for n in self.label_names))
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        series[1] += value
+        series[2] += 1
+
+    def quantile(self, q: float, label_values: Tuple[str, ...]) -> Optional[float]:
+        """Оценка квантиля линейной интерполяцией внутри бакета, как histogram_quantile()."""
+        series = self._series.get(label_values)
+        if not series or not series[2]:
+            return None
+        counts, _, total = series
+        rank = q * total
+        cumulative = 0
+        lower = 0.0
+        for i, bound in enumerate(self.buckets):
+            if cumulative + counts[i] >= rank:
+                return lower + (bound - lower) * ((rank - cumulative) / counts[i] if counts[i] else 0.0)
+            cumulative += counts[i]
+            lower = bound
+        return self.buckets[-1]
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        """Добавляет к гистограмме снимок другой гистограммы с теми же бакетами."""
+        if tuple(snapshot.get("buckets", ())) != self.buckets:
+            logger.warning(f"Histogram {self.name}: snapshot with different buckets skipped.")
+            return
+        for item in snapshot.get("series", []):
+            series = self._get_series(tuple(str(item["labels"].get(n, "")) for n in self.label_names))
+            for i, count in enumerate(item["counts"]):
+                series[0][i] += count
+            series[1] += item["sum"]
+            series[2] += item["count"]
+
+    def diff(self, base: "Histogram") -> Dict[str, Any]:
+        """Снимок прироста относительно base (те же бакеты); серии без прироста пропускаются."""
+        series_items = []
+        for key, (counts, total_seconds, count) in self._series.items():
+            base_counts, base_sum, base_count = base._series.get(key, [[0] * len(counts), 0.0, 0])
+            if count == base_count:
+                continue
+            series_items.append({
+                "labels": dict(zip(self.label_names, key)),
+                "counts": [c - b for c, b in zip(counts, base_counts)],
+                "sum": total_seconds - base_sum,
+                "count": count - base_count,
+            })
+        return {"name": self.name, "buckets": list(self.buckets), "series": series_items}
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "buckets": list(self.buckets),
+            "series": [
+                {"labels": dict(zip(self.label_names, key)), "counts": list(series[0]), "sum": series[1], "count": series[2]}
+                for key, series in self._series.items()
+            ],
+        }
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Количество, среднее и p50/p95/p99 по каждой серии, самые медленные по p99 первыми."""
+        rows = []
+        for key, (_, total_seconds, count) in self._series.items():
+            rows.append({
+                **dict(zip(self.label_names, key)),
+                "count": count,
+                "avg_seconds": total_seconds / count if count else 0.0,
+                "p50_seconds": self.quantile(0.50, key),
+                "p95_seconds": self.quantile(0.95, key),
+                "p99_seconds": self.quantile(0.99, key),
+            })
+        rows.sort(key=lambda r: r["p99_seconds"] or 0.0, reverse=True)
+        return rows
+
+    def render_prometheus(self) -> str:
+        """Текстовый формат экспозиции Prometheus."""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total_seconds, count) in sorted(self._series.items()):
+            labels = ",".join(f'{n}="{_escape_label(v)}"' for n, v in zip(self.label_names, key))
+            prefix = f"{labels}," if labels else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total_seconds}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# ===== Экспортеры =====
+
+class SpanExporter:
+    """Получатель завершенных спанов."""
+
+    def export(self, span: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Хранит последние завершенные спаны в памяти (тесты, бенчмарки)."""
+
+    def __init__(self, max_spans: int = 10000):
+        self._spans: Deque[Dict[str, Any]] = deque(maxlen=max_spans)
+
+    def export(self, span: Dict[str, Any]) -> None:
+        self._spans.append(span)
+
+    def get_finished_spans(self, trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [s for s in self._spans if trace_id is None or s["trace_id"] == trace_id]
+
+    def clear(self) -> None:
+        self._spans.clear()
+
+
+class FileSpanExporter(SpanExporter):
+    """
+    Дописывает спаны в файл JSON lines. Файл может быть общим для всех процессов:
+    каждая строка записывается одним write() в режиме O_APPEND.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._fd: Optional[int] = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def export(self, span: Dict[str, Any]) -> None:
+        if self._fd is None:
+            return
+        line = json.dumps(span, ensure_ascii=False, default=str) + "\n"
+        try:
+            os.write(self._fd, line.encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"Failed to write span to {self.path}: {e}")
+
+    def shutdown(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def create_exporter_from_settings() -> Optional[SpanExporter]:
+    kind = settings.TRACING_EXPORTER
+    if kind == "memory":
+        return InMemorySpanExporter(settings.TRACING_MEMORY_MAX_SPANS)
+    if kind == "file":
+        return FileSpanExporter(settings.TRACING_FILE_PATH)
+    if kind not in ("", "none"):
+        logger.warning(f"Unknown TRACING_EXPORTER '{kind}'. Spans will not be exported.")
+    return None
+
+
+# ===== Спаны =====
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    Интервал работы одного этапа. Используется как контекстный менеджер
+    (`with tracer.start_span(...) as span:`) - на время блока становится текущим.
+    """
+
+    __slots__ = ("tracer", "name", "stage", "trace_id", "span_id", "parent_id", "attributes",
+                 "status", "error", "start_time", "duration", "_started", "_token", "_ended")
+
+    def __init__(self, tracer: "Tracer", name: str, stage: Optional[str], trace_id: str,
+                 parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.stage = stage
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.start_time = time.time()
+        self.duration: Optional[float] = None
+        self._started = time.perf_counter()
+        self._token: Optional[contextvars.Token] = None
+        self._ended = False
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = "error"
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def end(self) -> None:
+        if self._ended:
+            return
+        self._ended = True
+        self.duration = time.perf_counter() - self._started
+        self.tracer._on_span_end(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is not None and not isinstance(exc, asyncio.CancelledError):
+            self.record_exception(exc)
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self._token = None
+        self.end()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "stage": self.stage,
+            "service": self.tracer.service_name,
+            "pid": os.getpid(),
+            "start_time": self.start_time,
+            "duration_seconds": self.duration,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+def parse_traceparent(value: Any) -> Optional[Tuple[str, str]]:
+    """(trace_id, parent span_id) из заголовка traceparent или None."""
+    if not isinstance(value, str):
+        return None
+    match = _TRACEPARENT_RE.match(value.strip().lower())
+    return (match.group(1), match.group(2)) if match else None
+
+
+class Tracer:
+    """Создает спаны, ведет гистограмму этапов и передает спаны экспортеру."""
+
+    def __init__(self):
+        self.service_name = "platformai"
+        self.exporter: Optional[SpanExporter] = None
+        self.stage_histogram = Histogram(
+            STAGE_HISTOGRAM_NAME, "Duration of message pipeline stages in seconds.", ("stage", "operation")
+        )
+        # Часть гистограммы, уже добавленная в счетчики сервиса в Redis
+        self._pushed = Histogram(self.stage_histogram.name, self.stage_histogram.description,
+                                 self.stage_histogram.label_names, self.stage_histogram.buckets)
+        self._push_lock = asyncio.Lock()
+        self._last_push = 0.0
+        self._push_task: Optional[asyncio.Task] = None
+
+    def configure(self, service_name: str, exporter: Optional[SpanExporter] = None) -> None:
+        """Имя сервиса процесса и экспортер (по умолчанию - из TRACING_EXPORTER)."""
+        self.service_name = service_name
+        self.set_exporter(exporter if exporter is not None else create_exporter_from_settings())
+
+    def set_exporter(self, exporter: Optional[SpanExporter]) -> None:
+        if self.exporter is not None and self.exporter is not exporter:
+            self.exporter.shutdown()
+        self.exporter = exporter
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def start_span(self, name: str, stage: Optional[str] = None, parent: Union[Span, str, None] = None,
+                   attributes: Optional[Dict[str, Any]] = None) -> Span:
+        """
+        Начинает спан. parent - спан этого процесса или traceparent из сообщения;
+        без него родителем становится текущий спан, а при его отсутствии начинается новая трасса.
+        interaction_id родителя из этого процесса наследуется атрибутом.
+        """
+        attrs = dict(attributes) if attributes else {}
+        if parent is None:
+            parent = _current_span.get()
+        if isinstance(parent, Span):
+            trace_id, parent_id = parent.trace_id, parent.span_id
+            if "interaction_id" in parent.attributes:
+                attrs.setdefault("interaction_id", parent.attributes["interaction_id"])
+        else:
+            parsed = parse_traceparent(parent)
+            trace_id, parent_id = parsed if parsed else (secrets.token_hex(16), None)
+        return Span(self, name, stage, trace_id, parent_id, attrs)
+
+    def observe(self, stage: str, operation: str, seconds: float) -> None:
+        """Учитывает в гистограмме интервал, измеренный без спана (например, ожидание в очереди)."""
+        self.stage_histogram.observe(max(seconds, 0.0), stage=stage, operation=operation)
+        self._maybe_push_metrics()
+
+    def _on_span_end(self, span: Span) -> None:
+        if span.stage:
+            self.observe(span.stage, span.name, span.duration or 0.0)
+        if self.exporter is not None:
+            try:
+                self.exporter.export(span.to_dict())
+            except Exception as e:
+                logger.warning(f"Span exporter failed: {e}")
+
+    # --- Сводная картина по процессам ---
+
+    @property
+    def metrics_key(self) -> str:
+        return f"{METRICS_KEY_PREFIX}{self.service_name}"
+
+    def _maybe_push_metrics(self) -> None:
+        interval = settings.TRACING_METRICS_PUSH_INTERVAL
+        if interval <= 0 or time.monotonic() - self._last_push < interval:
+            return
+        if self._push_task is not None and not self._push_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._last_push = time.monotonic()
+        self._push_task = loop.create_task(self.push_metrics(), name="TracingMetricsPush")
+
+    def unpushed_snapshot(self) -> Dict[str, Any]:
+        """Прирост гистограммы процесса, еще не добавленный в Redis."""
+        return self.stage_histogram.diff(self._pushed)
+
+    async def push_metrics(self, redis_cli: Any = None) -> None:
+        """
+        Добавляет прирост гистограммы процесса к счетчикам сервиса в Redis.
+        Под блокировкой, чтобы параллельные вызовы не отправили один прирост дважды.
+        """
+        async with self._push_lock:
+            await self._push_delta(redis_cli)
+
+    async def _push_delta(self, redis_cli: Any) -> None:
+        delta = self.unpushed_snapshot()
+        if not delta["series"]:
+            return
+        if redis_cli is None:
+            from app.services.redis_service import get_redis
+
+            redis_cli = get_redis()
+        try:
+            pipe = redis_cli.pipeline(transaction=True)
+            pipe.hset(self.metrics_key, METRICS_BUCKETS_FIELD, json.dumps(delta["buckets"]))
+            for item in delta["series"]:
+                labels = [item["labels"].get(n, "") for n in self.stage_histogram.label_names]
+                for i, count in enumerate(item["counts"]):
+                    if count:
+                        pipe.hincrby(self.metrics_key, json.dumps(labels + [f"b{i}"]), count)
+                pipe.hincrbyfloat(self.metrics_key, json.dumps(labels + ["sum"]), item["sum"])
+                pipe.hincrby(self.metrics_key, json.dumps(labels + ["count"]), item["count"])
+            await pipe.execute()
+        except Exception as e:
+            # Прирост не учтен в _pushed и будет отправлен в следующий раз
+            logger.debug(f"Failed to push stage histograms to Redis: {e}")
+            return
+        self._pushed.merge(delta)
+
+
+tracer = Tracer()
+
+
+def configure_tracing(service_name: str, exporter: Optional[SpanExporter] = None) -> Tracer:
+    """Настраивает трассировку процесса; вызывается один раз при старте процесса."""
+    tracer.configure(service_name, exporter)
+    return tracer
+
+
+def inject_trace_context(payload: Dict[str, Any], span: Optional[Span] = None) -> Dict[str, Any]:
+    """Добавляет в сообщение traceparent текущего (или переданного) спана и время отправки."""
+    span = span or _current_span.get()
+    if span is not None:
+        payload[TRACEPARENT_FIELD] = span.traceparent
+    payload[SENT_AT_FIELD] = time.time()
+    return payload
+
+
+def extract_trace_context(payload: Dict[str, Any]) -> Tuple[Optional[str], Optional[float]]:
+    """
+    Извлекает (traceparent, sent_at) из сообщения, удаляя служебные поля,
+    чтобы они не попадали в схемы и CRUD.
+    """
+    traceparent = payload.pop(TRACEPARENT_FIELD, None)
+    sent_at = payload.pop(SENT_AT_FIELD, None)
+    try:
+        sent_at = float(sent_at) if sent_at is not None else None
+    except (TypeError, ValueError):
+        sent_at = None
+    return traceparent, sent_at
+
+
+def observe_queue_wait(operation: str, sent_at: Optional[float]) -> None:
+    """Время от отправки сообщения до начала его обработки (часы процессов одного хоста)."""
+    if sent_at is not None:
+        tracer.observe(STAGE_QUEUE_WAIT, operation, time.time() - sent_at)
+
+
+def _decode_hash(raw: Dict[Any, Any]) -> Dict[str, str]:
+    return {(k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v) for k, v in raw.items()}
+
+
+def histogram_snapshot_from_hash(raw: Dict[Any, Any], label_names: Sequence[str]) -> Dict[str, Any]:
+    """Снимок гистограммы из хэша счетчиков сервиса (формат push_metrics)."""
+    fields = _decode_hash(raw)
+    buckets = json.loads(fields.pop(METRICS_BUCKETS_FIELD, "[]"))
+    series: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+    for field, value in fields.items():
+        try:
+            *labels, kind = json.loads(field)
+        except (TypeError, ValueError):
+            continue
+        item = series.setdefault(tuple(labels), {
+            "labels": dict(zip(label_names, labels)), "counts": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0,
+        })
+        if kind == "sum":
+            item["sum"] = float(value)
+        elif kind == "count":
+            item["count"] = int(value)
+        elif kind.startswith("b") and kind[1:].isdigit() and int(kind[1:]) < len(item["counts"]):
+            item["counts"][int(kind[1:])] = int(value)
+    return {"buckets": buckets, "series": list(series.values())}
+
+
+async def collect_stage_histograms(redis_cli: Any = None) -> Histogram:
+    """
+    Гистограмма этапов по всем сервисам из накопленных счетчиков в Redis.
+    Прирост текущего процесса сначала отправляется в Redis: так он не учитывается
+    дважды и значения между опросами не уменьшаются.
+    """
+    if redis_cli is None:
+        from app.services.redis_service import get_redis
+
+        redis_cli = get_redis()
+    await tracer.push_metrics(redis_cli)
+    merged = Histogram(tracer.stage_histogram.name, tracer.stage_histogram.description,
+                       tracer.stage_histogram.label_names, tracer.stage_histogram.buckets)
+    keys = [k async for k in redis_cli.scan_iter(match=f"{METRICS_KEY_PREFIX}*", count=500)]
+    for key in keys:
+        merged.merge(histogram_snapshot_from_hash(await redis_cli.hgetall(key), merged.label_names))
+    return merged
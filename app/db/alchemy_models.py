@@ -1,5 +1,5 @@
 import logging
-from sqlalchemy import Column, String, Text, DateTime, JSON, Integer, ForeignKey, Enum as SQLEnum, Boolean, UniqueConstraint, func, Index
+from sqlalchemy import Column, String, Text, DateTime, JSON, Integer, BigInteger, ForeignKey, Enum as SQLEnum, Boolean, UniqueConstraint, func, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import uuid
@@ -25,6 +25,7 @@ class AgentConfigDB(Base):
     chat_messages = relationship("ChatMessageDB", back_populates="agent_config", cascade="all, delete-orphan")
     authorizations = relationship("AgentUserAuthorizationDB", back_populates="agent_config", cascade="all, delete-orphan")
     token_usage_logs = relationship("TokenUsageLogDB", back_populates="agent_config", cascade="all, delete-orphan") # Новая связь
+    chat_threads = relationship("ChatThreadDB", back_populates="agent_config", cascade="all, delete-orphan")
 
 class ChatMessageDB(Base):
     __tablename__ = "chat_messages"
@@ -37,13 +38,48 @@ class ChatMessageDB(Base):
     sender_type = Column(SQLEnum(SenderType, name="sender_type_enum", create_type=True), nullable=False)
     content = Column(Text, nullable=False)
     channel = Column(String, nullable=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True) # server_default оставлен, т.к. был и в старой ChatMessageDB
+    # Ключ помесячного партиционирования таблицы (в БД первичный ключ - (id, timestamp))
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True) # server_default оставлен, т.к. был и в старой ChatMessageDB
     
-    # Изменено для соответствия "один-ко-многим" и старой логике ForeignKey
-    token_usage_logs = relationship("TokenUsageLogDB", back_populates="chat_message", cascade="all, delete-orphan")
+    # Изменено для соответствия "один-ко-многим". ForeignKey в БД нет (таблицы партиционированы),
+    # поэтому условие связи задано явно
+    token_usage_logs = relationship(
+        "TokenUsageLogDB",
+        primaryjoin="ChatMessageDB.id == foreign(TokenUsageLogDB.message_id)",
+        back_populates="chat_message",
+        cascade="all, delete-orphan"
+    )
 
     agent_config = relationship("AgentConfigDB", back_populates="chat_messages")
 
+    __table_args__ = (
+        # Чтение истории треда: фильтр по агенту и треду, сортировка и keyset-пагинация по (timestamp, id)
+        Index("ix_chat_messages_agent_thread_timestamp_id", "agent_id", "thread_id", "timestamp", "id"),
+    )
+
+class ChatThreadDB(Base):
+    """
+    Сводка по треду чата для списка чатов агента.
+    Поддерживается инкрементально при сохранении каждого сообщения (см. chat_crud.db_add_chat_message).
+    """
+    __tablename__ = "chat_threads"
+
+    agent_id = Column(String, ForeignKey("agent_configs.id", ondelete="CASCADE"), primary_key=True)
+    thread_id = Column(String, primary_key=True)
+    first_message_content = Column(Text, nullable=False)
+    first_message_timestamp = Column(DateTime(timezone=True), nullable=False)
+    last_message_content = Column(Text, nullable=False)
+    last_message_sender_type = Column(SQLEnum(SenderType, name="sender_type_enum", create_type=False), nullable=False)
+    last_message_channel = Column(String, nullable=True)
+    last_activity = Column(DateTime(timezone=True), nullable=False) # Время последнего сообщения
+    message_count = Column(Integer, nullable=False, default=0)
+
+    agent_config = relationship("AgentConfigDB", back_populates="chat_threads")
+
+    __table_args__ = (
+        Index("ix_chat_threads_agent_id_last_activity", "agent_id", "last_activity"),
+    )
+
 class UserDB(Base):
     __tablename__ = "users"
 
@@ -87,8 +123,8 @@ class TokenUsageLogDB(Base):
     id = Column(Integer, primary_key=True, index=True)
     # Убрано ondelete="CASCADE"
     agent_id = Column(String, ForeignKey("agent_configs.id"), nullable=False, index=True)
-    # Убрано ondelete="CASCADE"
-    message_id = Column(Integer, ForeignKey("chat_messages.id"), nullable=True, index=True)
+    # Без ForeignKey: chat_messages партиционирована и id в ней уникален только вместе с timestamp
+    message_id = Column(Integer, nullable=True, index=True)
     interaction_id = Column(String, nullable=False, index=True)
 
     call_type = Column(String, nullable=False, index=True)
@@ -96,12 +132,16 @@ class TokenUsageLogDB(Base):
     prompt_tokens = Column(Integer, nullable=False)
     completion_tokens = Column(Integer, nullable=False)
     total_tokens = Column(Integer, nullable=False)
-    # Убран server_default, nullable=False (соответствует старой модели)
+    # Убран server_default, nullable=False (соответствует старой модели). Ключ помесячного партиционирования
     timestamp = Column(DateTime(timezone=True), nullable=False, index=True)
 
     # Связи, соответствующие AgentConfigDB и ChatMessageDB
     agent_config = relationship("AgentConfigDB", back_populates="token_usage_logs")
-    chat_message = relationship("ChatMessageDB", back_populates="token_usage_logs")
+    chat_message = relationship(
+        "ChatMessageDB",
+        primaryjoin="foreign(TokenUsageLogDB.message_id) == ChatMessageDB.id",
+        back_populates="token_usage_logs"
+    )
 
     # Индексы для часто запрашиваемых полей (оставляем, т.к. полезны и не противоречат)
     __table_args__ = (
@@ -110,6 +150,38 @@ class TokenUsageLogDB(Base):
         # Индексы для id, message_id, interaction_id создаются ForeignKey или primary_key=True, index=True
     )
 
+class TokenUsageHourlyDB(Base):
+    """
+    Почасовой агрегат использования токенов по агенту, модели и типу вызова.
+    Поддерживается инкрементально при сохранении каждой записи token_usage_logs.
+    """
+    __tablename__ = "token_usage_hourly"
+
+    agent_id = Column(String, ForeignKey("agent_configs.id", ondelete="CASCADE"), primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True) # Начало часа (UTC)
+    model_id = Column(String, primary_key=True)
+    call_type = Column(String, primary_key=True)
+    call_count = Column(BigInteger, nullable=False, default=0)
+    prompt_tokens = Column(BigInteger, nullable=False, default=0)
+    completion_tokens = Column(BigInteger, nullable=False, default=0)
+    total_tokens = Column(BigInteger, nullable=False, default=0)
+
+class TokenUsageDailyDB(Base):
+    """
+    Суточный агрегат использования токенов по агенту, модели и типу вызова.
+    Поддерживается инкрементально при сохранении каждой записи token_usage_logs.
+    """
+    __tablename__ = "token_usage_daily"
+
+    agent_id = Column(String, ForeignKey("agent_configs.id", ondelete="CASCADE"), primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True) # Начало суток (UTC)
+    model_id = Column(String, primary_key=True)
+    call_type = Column(String, primary_key=True)
+    call_count = Column(BigInteger, nullable=False, default=0)
+    prompt_tokens = Column(BigInteger, nullable=False, default=0)
+    completion_tokens = Column(BigInteger, nullable=False, default=0)
+    total_tokens = Column(BigInteger, nullable=False, default=0)
+
 # Необходимо убедиться, что все Enum (SenderType, IntegrationType) определены
 # и доступны для импорта в этом файле, если они используются напрямую в Column определениях.
 # В данном случае SenderType используется, IntegrationType - нет.
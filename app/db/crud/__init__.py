@@ -3,10 +3,12 @@ from . import agent_crud
 from . import user_crud
 from . import chat_crud
 from . import token_usage_crud
+from . import partition_crud
 
 __all__ = [
     "agent_crud",
     "user_crud",
     "chat_crud",
-    "token_usage_crud"
+    "token_usage_crud",
+    "partition_crud"
 ]
@@ -1,16 +1,52 @@
+import base64
+import binascii
 import logging
-from sqlalchemy import select, delete, func as sql_func
+from sqlalchemy import select, delete, update, tuple_, case, func as sql_func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime
 
-from app.db.alchemy_models import ChatMessageDB
+from app.db.alchemy_models import ChatMessageDB, ChatThreadDB, TokenUsageLogDB
 from app.api.schemas.common_schemas import SenderType
 from app.api.schemas.chat_schemas import ChatListItemOutput
 
 logger = logging.getLogger(__name__)
 
+def _build_chat_thread_upsert(message: ChatMessageDB):
+    """
+    Builds an upsert that folds a new message into its chat_threads summary row.
+    Messages may arrive out of order, so first/last fields are only replaced
+    when the new message is older/newer than the stored ones.
+    """
+    stmt = pg_insert(ChatThreadDB).values(
+        agent_id=message.agent_id,
+        thread_id=message.thread_id,
+        first_message_content=message.content,
+        first_message_timestamp=message.timestamp,
+        last_message_content=message.content,
+        last_message_sender_type=message.sender_type,
+        last_message_channel=message.channel,
+        last_activity=message.timestamp,
+        message_count=1
+    )
+    excluded = stmt.excluded
+    is_newer = excluded.last_activity >= ChatThreadDB.last_activity
+    is_older = excluded.first_message_timestamp < ChatThreadDB.first_message_timestamp
+    return stmt.on_conflict_do_update(
+        index_elements=[ChatThreadDB.agent_id, ChatThreadDB.thread_id],
+        set_={
+            "message_count": ChatThreadDB.message_count + 1,
+            "last_message_content": case((is_newer, excluded.last_message_content), else_=ChatThreadDB.last_message_content),
+            "last_message_sender_type": case((is_newer, excluded.last_message_sender_type), else_=ChatThreadDB.last_message_sender_type),
+            "last_message_channel": case((is_newer, excluded.last_message_channel), else_=ChatThreadDB.last_message_channel),
+            "last_activity": sql_func.greatest(ChatThreadDB.last_activity, excluded.last_activity),
+            "first_message_content": case((is_older, excluded.first_message_content), else_=ChatThreadDB.first_message_content),
+            "first_message_timestamp": sql_func.least(ChatThreadDB.first_message_timestamp, excluded.first_message_timestamp),
+        }
+    )
+
 async def db_add_chat_message(
     db: AsyncSession,
     agent_id: str,
@@ -21,7 +57,7 @@ async def db_add_chat_message(
     timestamp: datetime,
     interaction_id: Optional[str] = None
 ) -> ChatMessageDB:
-    """Adds a new chat message to the database."""
+    """Adds a new chat message to the database and updates the thread summary in the same transaction."""
     logger.debug(f"Adding chat message to DB: Agent={agent_id}, Thread={thread_id}, Sender={sender_type}, InteractionID={interaction_id}")
     db_message = ChatMessageDB(
         agent_id=agent_id,
@@ -34,6 +70,7 @@ async def db_add_chat_message(
     )
     db.add(db_message)
     try:
+        await db.execute(_build_chat_thread_upsert(db_message))
         await db.commit()
         await db.refresh(db_message)
         logger.debug(f"Chat message added successfully (ID: {db_message.id})")
@@ -47,14 +84,37 @@ async def db_add_chat_message(
         logger.error(f"Unexpected error adding chat message for Agent={agent_id}, Thread={thread_id}: {e}", exc_info=True)
         raise
 
+def encode_history_cursor(message: ChatMessageDB) -> str:
+    """Encodes the (timestamp, id) position of a message into an opaque pagination cursor."""
+    raw = f"{message.timestamp.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decodes a pagination cursor produced by encode_history_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        timestamp_str, message_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp_str), int(message_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid history cursor: {cursor}") from e
+
 async def db_get_chat_history(db: AsyncSession, agent_id: str, thread_id: str, skip: int = 0, limit: int = 100) -> List[ChatMessageDB]:
-    """Retrieves chat history for a specific agent and thread, ordered by timestamp (newest first)."""
+    """
+    Retrieves chat history for a specific agent and thread, ordered by timestamp (newest first).
+    Offset pagination; prefer db_get_chat_history_before for deep pages.
+    """
     logger.debug(f"Fetching chat history for Agent={agent_id}, Thread={thread_id} (skip={skip}, limit={limit})")
     try:
         stmt = (
             select(ChatMessageDB)
             .where(ChatMessageDB.agent_id == agent_id, ChatMessageDB.thread_id == thread_id)
-            .order_by(ChatMessageDB.timestamp.desc())
+            .order_by(ChatMessageDB.timestamp.desc(), ChatMessageDB.id.desc())
             .offset(skip)
             .limit(limit)
         )
@@ -69,6 +129,45 @@ async def db_get_chat_history(db: AsyncSession, agent_id: str, thread_id: str, s
         logger.error(f"Unexpected error fetching chat history for Agent={agent_id}, Thread={thread_id}: {e}", exc_info=True)
         return []
 
+async def db_get_chat_history_before(
+    db: AsyncSession,
+    agent_id: str,
+    thread_id: str,
+    cursor: Optional[str] = None,
+    limit: int = 100
+) -> List[ChatMessageDB]:
+    """
+    Retrieves chat history for a specific agent and thread using keyset pagination,
+    ordered by (timestamp, id) descending (newest first).
+
+    Returns messages strictly older than the cursor position, or the newest messages
+    when no cursor is given. The cost does not grow with page depth because the
+    query seeks directly into ix_chat_messages_agent_thread_timestamp_id.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    logger.debug(f"Fetching chat history (keyset) for Agent={agent_id}, Thread={thread_id} (cursor={cursor}, limit={limit})")
+    stmt = (
+        select(ChatMessageDB)
+        .where(ChatMessageDB.agent_id == agent_id, ChatMessageDB.thread_id == thread_id)
+    )
+    if cursor:
+        before_timestamp, before_id = decode_history_cursor(cursor)
+        stmt = stmt.where(tuple_(ChatMessageDB.timestamp, ChatMessageDB.id) < (before_timestamp, before_id))
+    stmt = stmt.order_by(ChatMessageDB.timestamp.desc(), ChatMessageDB.id.desc()).limit(limit)
+    try:
+        result = await db.execute(stmt)
+        messages = result.scalars().all()
+        logger.debug(f"Fetched {len(messages)} messages (keyset) for Agent={agent_id}, Thread={thread_id}")
+        return messages
+    except SQLAlchemyError as e:
+        logger.error(f"Error fetching chat history (keyset) for Agent={agent_id}, Thread={thread_id}: {e}", exc_info=True)
+        return []
+    except Exception as e:
+        logger.error(f"Unexpected error fetching chat history (keyset) for Agent={agent_id}, Thread={thread_id}: {e}", exc_info=True)
+        return []
+
 async def db_get_recent_chat_history(db: AsyncSession, agent_id: str, thread_id: str, limit: int) -> List[ChatMessageDB]:
     """
     Retrieves the most recent 'limit' chat messages for a specific agent and thread,
@@ -79,14 +178,14 @@ async def db_get_recent_chat_history(db: AsyncSession, agent_id: str, thread_id:
         subquery = (
             select(ChatMessageDB.id)
             .where(ChatMessageDB.agent_id == agent_id, ChatMessageDB.thread_id == thread_id)
-            .order_by(ChatMessageDB.timestamp.desc())
+            .order_by(ChatMessageDB.timestamp.desc(), ChatMessageDB.id.desc())
             .limit(limit)
             .subquery()
         )
         stmt = (
             select(ChatMessageDB)
             .join(subquery, ChatMessageDB.id == subquery.c.id)
-            .order_by(ChatMessageDB.timestamp.asc())
+            .order_by(ChatMessageDB.timestamp.asc(), ChatMessageDB.id.asc())
         )
         result = await db.execute(stmt)
         messages = result.scalars().all()
@@ -101,56 +200,17 @@ async def db_get_recent_chat_history(db: AsyncSession, agent_id: str, thread_id:
 
 async def db_get_agent_chats(db: AsyncSession, agent_id: str, skip: int = 0, limit: int = 100, channel: Optional[str] = None) -> List[ChatListItemOutput]:
     """
-    Retrieves a list of unique threads for an agent with details of the first and last messages.
+    Retrieves a list of threads for an agent with details of the first and last messages,
+    ordered by last activity (newest first). Reads the chat_threads summary table.
     Allows filtering by the channel of the last message.
     """
     logger.debug(f"Fetching chat list for Agent={agent_id} (skip={skip}, limit={limit}, channel={channel})")
     try:
-        last_message_subquery_base = (
-            select(
-                ChatMessageDB.thread_id,
-                ChatMessageDB.content.label("last_message_content"),
-                ChatMessageDB.timestamp.label("last_message_timestamp"),
-                ChatMessageDB.sender_type.label("last_message_sender_type"),
-                ChatMessageDB.channel.label("last_message_channel"),
-                sql_func.count(ChatMessageDB.id).over(partition_by=ChatMessageDB.thread_id).label("message_count"),
-                sql_func.row_number().over(partition_by=ChatMessageDB.thread_id, order_by=ChatMessageDB.timestamp.desc()).label("rn_desc")
-            )
-            .where(ChatMessageDB.agent_id == agent_id)
-        )
+        stmt = select(ChatThreadDB).where(ChatThreadDB.agent_id == agent_id)
         if channel:
-            last_message_subquery_base = last_message_subquery_base.where(ChatMessageDB.channel == channel)
-        last_message_subquery = last_message_subquery_base.subquery('last_ranked_messages')
-
-        first_message_subquery = (
-            select(
-                ChatMessageDB.thread_id,
-                ChatMessageDB.content.label("first_message_content"),
-                ChatMessageDB.timestamp.label("first_message_timestamp"),
-                sql_func.row_number().over(partition_by=ChatMessageDB.thread_id, order_by=ChatMessageDB.timestamp.asc()).label("rn_asc")
-            )
-            .where(ChatMessageDB.agent_id == agent_id)
-            .subquery('first_ranked_messages')
-        )
-
+            stmt = stmt.where(ChatThreadDB.last_message_channel == channel)
         stmt = (
-            select(
-                last_message_subquery.c.thread_id,
-                first_message_subquery.c.first_message_content,
-                first_message_subquery.c.first_message_timestamp,
-                last_message_subquery.c.last_message_content,
-                last_message_subquery.c.last_message_timestamp,
-                last_message_subquery.c.last_message_sender_type,
-                last_message_subquery.c.last_message_channel,
-                last_message_subquery.c.message_count
-            )
-            .join(
-                first_message_subquery,
-                last_message_subquery.c.thread_id == first_message_subquery.c.thread_id
-            )
-            .where(last_message_subquery.c.rn_desc == 1)
-            .where(first_message_subquery.c.rn_asc == 1)
-            .order_by(last_message_subquery.c.last_message_timestamp.desc())
+            stmt.order_by(ChatThreadDB.last_activity.desc(), ChatThreadDB.thread_id)
             .offset(skip)
             .limit(limit)
         )
@@ -158,15 +218,15 @@ async def db_get_agent_chats(db: AsyncSession, agent_id: str, skip: int = 0, lim
         result = await db.execute(stmt)
         chat_list = [
             ChatListItemOutput(
-                thread_id=row.thread_id,
-                first_message_content=row.first_message_content,
-                first_message_timestamp=row.first_message_timestamp,
-                last_message_content=row.last_message_content,
-                last_message_timestamp=row.last_message_timestamp,
-                last_message_sender_type=row.last_message_sender_type,
-                last_message_channel=row.last_message_channel,
-                message_count=row.message_count
-            ) for row in result.mappings().all()
+                thread_id=thread.thread_id,
+                first_message_content=thread.first_message_content,
+                first_message_timestamp=thread.first_message_timestamp,
+                last_message_content=thread.last_message_content,
+                last_message_timestamp=thread.last_activity,
+                last_message_sender_type=thread.last_message_sender_type,
+                last_message_channel=thread.last_message_channel,
+                message_count=thread.message_count
+            ) for thread in result.scalars().all()
         ]
         logger.debug(f"Fetched {len(chat_list)} chat threads for Agent={agent_id} matching criteria (channel={channel})")
         return chat_list
@@ -180,14 +240,26 @@ async def db_get_agent_chats(db: AsyncSession, agent_id: str, skip: int = 0, lim
 async def db_delete_chat_thread(db: AsyncSession, agent_id: str, thread_id: str) -> int:
     """Deletes all chat messages for a specific agent and thread ID."""
     logger.info(f"Deleting chat thread for Agent={agent_id}, Thread={thread_id}")
-    # Assuming ON DELETE CASCADE is set for token_usage_logs.message_id -> chat_messages.id
+    # token_usage_logs.message_id has no FK to the partitioned chat_messages table, so linked logs are deleted explicitly
+    thread_message_ids = (
+        select(ChatMessageDB.id)
+        .where(ChatMessageDB.agent_id == agent_id)
+        .where(ChatMessageDB.thread_id == thread_id)
+    )
+    token_usage_stmt = delete(TokenUsageLogDB).where(TokenUsageLogDB.message_id.in_(thread_message_ids))
     stmt = (
         delete(ChatMessageDB)
         .where(ChatMessageDB.agent_id == agent_id)
         .where(ChatMessageDB.thread_id == thread_id)
     )
     try:
+        await db.execute(token_usage_stmt)
         result = await db.execute(stmt)
+        await db.execute(
+            delete(ChatThreadDB)
+            .where(ChatThreadDB.agent_id == agent_id)
+            .where(ChatThreadDB.thread_id == thread_id)
+        )
         await db.commit()
         deleted_count = result.rowcount
         if deleted_count > 0:
@@ -247,3 +319,60 @@ async def db_get_chat_message_by_interaction_id(
     except Exception as e:
         logger.error(f"Unexpected error fetching chat message by InteractionID for Agent={agent_id}, InteractionID={interaction_id}: {e}", exc_info=True)
         return None
+
+async def db_delete_chat_threads_inactive_before(db: AsyncSession, cutoff: datetime) -> int:
+    """
+    Deletes chat_threads summaries whose last activity is older than `cutoff`.
+    Used after expired chat_messages partitions are removed by the retention policy.
+    """
+    logger.info(f"Deleting chat thread summaries inactive before {cutoff.isoformat()}")
+    stmt = delete(ChatThreadDB).where(ChatThreadDB.last_activity < cutoff)
+    try:
+        result = await db.execute(stmt)
+        await db.commit()
+        return result.rowcount
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Error deleting inactive chat thread summaries: {e}", exc_info=True)
+        raise
+
+async def db_refresh_chat_thread_summaries_before(db: AsyncSession, cutoff: datetime) -> int:
+    """
+    Recomputes message_count and first message fields of chat_threads summaries
+    whose first message is older than `cutoff`, from the messages left in chat_messages.
+    Used after expired chat_messages partitions are removed by the retention policy,
+    together with db_delete_chat_threads_inactive_before for threads with no messages left.
+    """
+    logger.info(f"Refreshing chat thread summaries with messages before {cutoff.isoformat()}")
+    affected = select(ChatThreadDB.agent_id, ChatThreadDB.thread_id).where(ChatThreadDB.first_message_timestamp < cutoff)
+    remaining = (
+        select(
+            ChatMessageDB.agent_id,
+            ChatMessageDB.thread_id,
+            ChatMessageDB.content,
+            ChatMessageDB.timestamp,
+            # DISTINCT ON keeps the first row, the window count still covers the whole thread
+            sql_func.count().over(partition_by=[ChatMessageDB.agent_id, ChatMessageDB.thread_id]).label("message_count"),
+        )
+        .where(tuple_(ChatMessageDB.agent_id, ChatMessageDB.thread_id).in_(affected))
+        .distinct(ChatMessageDB.agent_id, ChatMessageDB.thread_id)
+        .order_by(ChatMessageDB.agent_id, ChatMessageDB.thread_id, ChatMessageDB.timestamp, ChatMessageDB.id)
+        .subquery()
+    )
+    stmt = (
+        update(ChatThreadDB)
+        .where(ChatThreadDB.agent_id == remaining.c.agent_id, ChatThreadDB.thread_id == remaining.c.thread_id)
+        .values(
+            message_count=remaining.c.message_count,
+            first_message_content=remaining.c.content,
+            first_message_timestamp=remaining.c.timestamp,
+        )
+    )
+    try:
+        result = await db.execute(stmt)
+        await db.commit()
+        return result.rowcount
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Error refreshing chat thread summaries: {e}", exc_info=True)
+        raise
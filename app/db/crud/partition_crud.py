@@ -0,0 +1,164 @@
+import logging
+import re
+from datetime import date, datetime, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+# Tables partitioned by month on "timestamp" (see migration c5a7e2d94f13)
+PARTITIONED_TABLES = ("chat_messages", "token_usage_logs")
+
+_PARTITION_SUFFIX_RE = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def add_months(month: date, months: int) -> date:
+    """Returns the first day of the month shifted by `months` from `month`."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def current_month(now: Optional[datetime] = None) -> date:
+    """First day of the current UTC month."""
+    now = now or datetime.now(timezone.utc)
+    return date(now.year, now.month, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    """Partition naming convention: <table>_pYYYYMM."""
+    return f"{table}_p{month:%Y%m}"
+
+
+def default_partition_name(table: str) -> str:
+    """DEFAULT partition that catches rows outside all monthly partitions."""
+    return f"{table}_default"
+
+
+def month_bound(month: date) -> str:
+    """
+    Partition bound literal for the start of a UTC month. The offset is explicit so the
+    boundary does not depend on the session TimeZone ("timestamp" is timestamptz).
+    """
+    return f"{month:%Y-%m}-01 00:00:00+00"
+
+
+def partition_bounds(month: date) -> str:
+    return f"FOR VALUES FROM ('{month_bound(month)}') TO ('{month_bound(add_months(month, 1))}')"
+
+
+def _check_table(table: str) -> None:
+    if table not in PARTITIONED_TABLES:
+        raise ValueError(f"Table '{table}' is not a managed partitioned table")
+
+
+async def db_list_partitions(db: AsyncSession, table: str) -> List[Tuple[str, date]]:
+    """Lists attached monthly partitions of a table as (partition_name, month), oldest first."""
+    _check_table(table)
+    stmt = text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table"
+    )
+    result = await db.execute(stmt, {"table": table})
+    partitions = []
+    for (name,) in result.all():
+        match = _PARTITION_SUFFIX_RE.search(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+async def _default_partition_months(db: AsyncSession, table: str) -> List[date]:
+    result = await db.execute(text(
+        f"SELECT DISTINCT date_trunc('month', \"timestamp\" AT TIME ZONE 'UTC') "
+        f"FROM {default_partition_name(table)}"
+    ))
+    return sorted(date(value.year, value.month, 1) for (value,) in result.all())
+
+
+async def _create_partition(db: AsyncSession, table: str, month: date) -> None:
+    """
+    Creates a monthly partition. Rows of that month already in the DEFAULT partition are
+    moved into the new table before it is attached, otherwise ATTACH would fail.
+    """
+    name = partition_name(table, month)
+    default = default_partition_name(table)
+    in_month = (f"\"timestamp\" >= '{month_bound(month)}' "
+                f"AND \"timestamp\" < '{month_bound(add_months(month, 1))}'")
+    await db.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)"))
+    await db.execute(text(f"INSERT INTO {name} SELECT * FROM {default} WHERE {in_month}"))
+    await db.execute(text(f"DELETE FROM {default} WHERE {in_month}"))
+    await db.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} {partition_bounds(month)}"))
+
+
+async def db_ensure_monthly_partitions(db: AsyncSession, table: str, months_ahead: int) -> List[str]:
+    """
+    Creates missing partitions for the current month, `months_ahead` following months and
+    every month that has rows in the DEFAULT partition (moving those rows out of it).
+    Returns the names of the partitions that were created.
+    """
+    _check_table(table)
+    existing = {name for name, _ in await db_list_partitions(db, table)}
+    start = current_month()
+    created = []
+    try:
+        await db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {default_partition_name(table)} PARTITION OF {table} DEFAULT"
+        ))
+        months = {add_months(start, offset) for offset in range(months_ahead + 1)}
+        missed = await _default_partition_months(db, table)
+        if missed:
+            logger.warning(f"Rows of {table} fell into the DEFAULT partition for months "
+                           f"{[f'{m:%Y-%m}' for m in missed]}; moving them into monthly partitions.")
+        months.update(missed)
+        for month in sorted(months):
+            name = partition_name(table, month)
+            if name in existing:
+                continue
+            await _create_partition(db, table, month)
+            created.append(name)
+        await db.commit()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Error creating partitions for {table}: {e}", exc_info=True)
+        raise
+    if created:
+        logger.info(f"Created partitions for {table}: {created}")
+    return created
+
+
+async def db_apply_partition_retention(db: AsyncSession, table: str, retention_months: int, drop: bool = True) -> List[str]:
+    """
+    Removes whole partitions that only hold data older than `retention_months` full months.
+
+    Args:
+        drop: Drop expired partitions. If False, partitions are only detached and remain
+              as standalone tables for archiving.
+
+    Returns:
+        Names of the partitions that were dropped or detached.
+    """
+    _check_table(table)
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(current_month(), -retention_months)
+    expired = [name for name, month in await db_list_partitions(db, table) if add_months(month, 1) <= cutoff]
+    processed = []
+    for name in expired:
+        try:
+            await db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            if drop:
+                await db.execute(text(f"DROP TABLE {name}"))
+            await db.commit()
+            processed.append(name)
+        except SQLAlchemyError as e:
+            await db.rollback()
+            logger.error(f"Error removing partition {name} of {table}: {e}", exc_info=True)
+            break
+    if processed:
+        logger.info(f"{'Dropped' if drop else 'Detached'} expired partitions of {table}: {processed}")
+    return processed
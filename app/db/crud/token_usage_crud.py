@@ -1,20 +1,70 @@
 import logging
-from sqlalchemy import select
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, and_, or_, func as sql_func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 
-from app.db.alchemy_models import TokenUsageLogDB, ChatMessageDB
+from app.db.alchemy_models import TokenUsageLogDB, ChatMessageDB, TokenUsageHourlyDB, TokenUsageDailyDB
 from app.api.schemas.common_schemas import SenderType
 
 logger = logging.getLogger(__name__)
 
+_ROLLUP_COUNTERS = ("call_count", "prompt_tokens", "completion_tokens", "total_tokens")
+
+
+def _floor_hour(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _floor_day(value: datetime) -> datetime:
+    return _floor_hour(value).replace(hour=0)
+
+
+def _ceil_hour(value: datetime) -> datetime:
+    floored = _floor_hour(value)
+    return floored if floored == value else floored + timedelta(hours=1)
+
+
+def _ceil_day(value: datetime) -> datetime:
+    floored = _floor_day(value)
+    return floored if floored == value else floored + timedelta(days=1)
+
+
+def _build_rollup_upsert(rollup_model, bucket_start: datetime, entry: TokenUsageLogDB):
+    """Builds an upsert that adds one token usage log entry to its rollup bucket."""
+    stmt = pg_insert(rollup_model).values(
+        agent_id=entry.agent_id,
+        bucket_start=bucket_start,
+        model_id=entry.model_id,
+        call_type=entry.call_type,
+        call_count=1,
+        prompt_tokens=entry.prompt_tokens,
+        completion_tokens=entry.completion_tokens,
+        total_tokens=entry.total_tokens
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[rollup_model.agent_id, rollup_model.bucket_start, rollup_model.model_id, rollup_model.call_type],
+        set_={
+            counter: getattr(rollup_model, counter) + getattr(stmt.excluded, counter)
+            for counter in _ROLLUP_COUNTERS
+        }
+    )
+
 async def db_add_token_usage_log(db: AsyncSession, token_usage_data: Dict[str, Any]) -> Optional[TokenUsageLogDB]:
-    """Adds a new token usage log entry to the database."""
+    """
+    Adds a new token usage log entry to the database.
+    Hourly and daily rollups are updated in the same transaction.
+    """
     logger.debug(f"Adding token usage log for InteractionID: {token_usage_data.get('interaction_id')}")
     db_log_entry = TokenUsageLogDB(**token_usage_data)
+    if db_log_entry.timestamp is None:
+        db_log_entry.timestamp = datetime.now(timezone.utc)
     db.add(db_log_entry)
     try:
+        await db.execute(_build_rollup_upsert(TokenUsageHourlyDB, _floor_hour(db_log_entry.timestamp), db_log_entry))
+        await db.execute(_build_rollup_upsert(TokenUsageDailyDB, _floor_day(db_log_entry.timestamp), db_log_entry))
         await db.commit()
         await db.refresh(db_log_entry)
         logger.debug(f"Token usage log entry added successfully (ID: {db_log_entry.id}) for InteractionID: {db_log_entry.interaction_id}")
@@ -62,3 +112,96 @@ async def db_get_token_usage_for_interaction(db: AsyncSession, interaction_id: s
         logger.error(f"Unexpected error fetching token usage for InteractionID {interaction_id}: {e}", exc_info=True)
         return []
 
+
+
+def _split_usage_range(start: datetime, end: datetime) -> Tuple[List[Tuple[datetime, datetime]], List[Tuple[datetime, datetime]], List[Tuple[datetime, datetime]]]:
+    """
+    Splits [start, end) into whole days, whole hours at the day edges and raw
+    sub-hour remainders, so a report reads O(buckets) rollup rows.
+
+    Returns:
+        (daily_ranges, hourly_ranges, raw_ranges)
+    """
+    hour_start, hour_end = _ceil_hour(start), _floor_hour(end)
+    if hour_start >= hour_end:
+        return [], [], [(start, end)]
+
+    raw_ranges = [r for r in ((start, hour_start), (hour_end, end)) if r[0] < r[1]]
+    day_start, day_end = _ceil_day(hour_start), _floor_day(hour_end)
+    if day_start >= day_end:
+        return [], [(hour_start, hour_end)], raw_ranges
+
+    hourly_ranges = [r for r in ((hour_start, day_start), (day_end, hour_end)) if r[0] < r[1]]
+    return [(day_start, day_end)], hourly_ranges, raw_ranges
+
+async def db_get_token_usage_summary(
+    db: AsyncSession,
+    agent_id: str,
+    start: datetime,
+    end: datetime
+) -> List[Dict[str, Any]]:
+    """
+    Aggregates token usage of an agent over [start, end), grouped by model and call type.
+
+    Whole days are read from token_usage_daily, whole hours from token_usage_hourly,
+    and only the sub-hour edges of the range from raw token_usage_logs.
+
+    Returns:
+        A list of dicts with model_id, call_type, call_count, prompt_tokens,
+        completion_tokens and total_tokens, ordered by total_tokens descending.
+    """
+    logger.debug(f"Fetching token usage summary for Agent={agent_id} ({start.isoformat()} - {end.isoformat()})")
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start >= end:
+        return []
+
+    daily_ranges, hourly_ranges, raw_ranges = _split_usage_range(start, end)
+    statements = []
+    for rollup_model, ranges in ((TokenUsageDailyDB, daily_ranges), (TokenUsageHourlyDB, hourly_ranges)):
+        if not ranges:
+            continue
+        statements.append(
+            select(
+                rollup_model.model_id,
+                rollup_model.call_type,
+                *(sql_func.sum(getattr(rollup_model, counter)).label(counter) for counter in _ROLLUP_COUNTERS)
+            )
+            .where(rollup_model.agent_id == agent_id)
+            .where(or_(*(and_(rollup_model.bucket_start >= lo, rollup_model.bucket_start < hi) for lo, hi in ranges)))
+            .group_by(rollup_model.model_id, rollup_model.call_type)
+        )
+    if raw_ranges:
+        statements.append(
+            select(
+                TokenUsageLogDB.model_id,
+                TokenUsageLogDB.call_type,
+                sql_func.count().label("call_count"),
+                sql_func.sum(TokenUsageLogDB.prompt_tokens).label("prompt_tokens"),
+                sql_func.sum(TokenUsageLogDB.completion_tokens).label("completion_tokens"),
+                sql_func.sum(TokenUsageLogDB.total_tokens).label("total_tokens")
+            )
+            .where(TokenUsageLogDB.agent_id == agent_id)
+            .where(or_(*(and_(TokenUsageLogDB.timestamp >= lo, TokenUsageLogDB.timestamp < hi) for lo, hi in raw_ranges)))
+            .group_by(TokenUsageLogDB.model_id, TokenUsageLogDB.call_type)
+        )
+
+    try:
+        totals: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for stmt in statements:
+            result = await db.execute(stmt)
+            for row in result.mappings().all():
+                item = totals.setdefault(
+                    (row["model_id"], row["call_type"]),
+                    {"model_id": row["model_id"], "call_type": row["call_type"], **{c: 0 for c in _ROLLUP_COUNTERS}}
+                )
+                for counter in _ROLLUP_COUNTERS:
+                    item[counter] += int(row[counter] or 0)
+        summary = sorted(totals.values(), key=lambda item: item["total_tokens"], reverse=True)
+        logger.debug(f"Token usage summary for Agent={agent_id}: {len(summary)} groups")
+        return summary
+    except SQLAlchemyError as e:
+        logger.error(f"Error fetching token usage summary for Agent={agent_id}: {e}", exc_info=True)
+        raise
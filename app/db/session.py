@@ -1,6 +1,9 @@
 import logging
-from typing import AsyncGenerator # Added import
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+import time
+import uuid
+from typing import AsyncGenerator, Any, Dict # Added import
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncEngine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 
 from app.core.config import settings # Стало: импортируем settings
@@ -10,6 +13,90 @@ logger = logging.getLogger(__name__)
 engine = None
 SessionLocal = None # Для async_sessionmaker
 
+
+class PoolMetrics:
+    """Счетчики выдачи соединений пула, обновляемые событиями SQLAlchemy pool."""
+
+    def __init__(self):
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.total_hold_seconds = 0.0
+        self.max_hold_seconds = 0.0
+
+    def attach(self, async_engine: AsyncEngine) -> None:
+        """Подписка на события пула движка."""
+        sync_engine = async_engine.sync_engine
+
+        @event.listens_for(sync_engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            self.connects += 1
+
+        @event.listens_for(sync_engine, "checkout")
+        def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            connection_record.info["checkout_time"] = time.monotonic()
+
+        @event.listens_for(sync_engine, "checkin")
+        def _on_checkin(dbapi_connection, connection_record):
+            checkout_time = connection_record.info.pop("checkout_time", None)
+            if checkout_time is None:
+                return
+            self.checkins += 1
+            self.checked_out = max(0, self.checked_out - 1)
+            hold_seconds = time.monotonic() - checkout_time
+            self.total_hold_seconds += hold_seconds
+            self.max_hold_seconds = max(self.max_hold_seconds, hold_seconds)
+
+        @event.listens_for(sync_engine, "invalidate")
+        def _on_invalidate(dbapi_connection, connection_record, exception):
+            self.invalidations += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "invalidations": self.invalidations,
+            "checked_out": self.checked_out,
+            "max_checked_out": self.max_checked_out,
+            "avg_hold_seconds": self.total_hold_seconds / self.checkins if self.checkins else 0.0,
+            "max_hold_seconds": self.max_hold_seconds,
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+def _build_engine_kwargs() -> Dict[str, Any]:
+    """Параметры пула и драйвера для роли текущего процесса (settings.DB_PROCESS_ROLE)."""
+    connect_args: Dict[str, Any] = {}
+    if settings.DB_COMMAND_TIMEOUT > 0:
+        connect_args["command_timeout"] = settings.DB_COMMAND_TIMEOUT
+
+    if settings.DB_PGBOUNCER_MODE:
+        # В transaction pooling соединение с сервером меняется между транзакциями,
+        # поэтому кэши подготовленных выражений отключаются, а имена делаются уникальными
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+    else:
+        connect_args["statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
+        connect_args["prepared_statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
+
+    return {
+        **settings.get_db_pool_settings(),
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "connect_args": connect_args,
+    }
+
 if not settings.DATABASE_URL: # Стало: используем settings.DATABASE_URL
     logger.critical("DATABASE_URL is not set in the environment variables.")
     # В реальном приложении здесь может быть более строгая обработка.
@@ -19,7 +106,11 @@ else:
     if "@" in settings.DATABASE_URL: # Стало: используем settings.DATABASE_URL
         db_url_display = settings.DATABASE_URL.split("@")[-1] # Стало: используем settings.DATABASE_URL
     logger.info(f"Database URL configured for: {db_url_display}")
-    engine = create_async_engine(settings.DATABASE_URL, echo=False) # Стало: используем settings.DATABASE_URL
+    engine_kwargs = _build_engine_kwargs()
+    logger.info(f"Database pool for role '{settings.DB_PROCESS_ROLE}': pool_size={engine_kwargs['pool_size']}, "
+                f"max_overflow={engine_kwargs['max_overflow']}, pgbouncer_mode={settings.DB_PGBOUNCER_MODE}")
+    engine = create_async_engine(settings.DATABASE_URL, echo=False, **engine_kwargs) # Стало: используем settings.DATABASE_URL
+    pool_metrics.attach(engine)
     SessionLocal = async_sessionmaker(
         bind=engine,
         class_=AsyncSession,
@@ -41,6 +132,20 @@ def get_async_session_factory(): # Новая функция
         return None # Или вернуть None, чтобы обработать выше
     return SessionLocal
 
+def get_pool_metrics() -> Dict[str, Any]:
+    """Состояние пула соединений и счетчики выдачи соединений текущего процесса."""
+    if not engine:
+        return {"initialized": False}
+    pool = engine.sync_engine.pool
+    return {
+        "initialized": True,
+        "role": settings.DB_PROCESS_ROLE,
+        "pool_size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        **pool_metrics.snapshot(),
+    }
+
 async def init_db():
     """Инициализирует базу данных, создавая все таблицы (если они еще не существуют).
     Внимание: Для управления структурой БД в продакшене рекомендуется использовать Alembic.
@@ -1,33 +1,59 @@
 import asyncio
-import json
+import hmac
 import logging
 import os
+import secrets
 import time
-from typing import Optional, Dict, Any, List
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, AsyncGenerator, AsyncIterator, Set
 
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from aiogram import Bot, Dispatcher, F
 from aiogram.filters import CommandStart, Command
-from aiogram.types import Message, ReplyKeyboardRemove, ReplyKeyboardMarkup, KeyboardButton, User, PhotoSize
+from aiogram.types import Message, ReplyKeyboardRemove, ReplyKeyboardMarkup, KeyboardButton, User, PhotoSize, InputFile
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode, ChatAction
 from aiogram.exceptions import TelegramBadRequest
 from redis import exceptions as redis_exceptions
 
 from app.core.config import settings
+from app.core.message_codec import MessageCodecError, decode_message, encode_message
+from app.core.tracing import STAGE_PUBLISH, extract_trace_context, inject_trace_context, observe_queue_wait, tracer
 from app.core.base.service_component import ServiceComponentBase
 from app.db.crud import user_crud
 from app.api.schemas.common_schemas import IntegrationType
-from app.services.voice import VoiceServiceOrchestrator
 from app.services.redis_wrapper import RedisService
+from app.services.storage import close_object_storage
+from app.services.http_client import MediaStreamError, close_http_client, get_http_client, open_media_stream
+from app.services.user_cache import (
+    PROFILE_FIELDS,
+    UserProfileCache,
+    build_user_cache_entry,
+    publish_user_cache_invalidation,
+)
+
+if TYPE_CHECKING:
+    from app.services.voice.voice_orchestrator import VoiceServiceOrchestrator
 
 
 # Constants
-REDIS_USER_CACHE_TTL = getattr(settings, "REDIS_USER_CACHE_TTL", int(os.getenv("REDIS_USER_CACHE_TTL", 3600)))
-USER_CACHE_PREFIX = "user_cache:"
 AUTH_TRIGGER = "AUTH_REQUIRED"
 
 
+class StreamingInputFile(InputFile):
+    """
+    Input file backed by an async byte iterator: the multipart upload to Telegram
+    is fed chunk by chunk as the data arrives. Can be read only once.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes], filename: str):
+        super().__init__(filename=filename)
+        self._chunks = chunks
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        async for chunk in self._chunks:
+            yield chunk
+
+
 class TelegramIntegrationBot(ServiceComponentBase):
     """
     Manages the lifecycle and execution of a Telegram Bot integration for a specific agent.
@@ -39,6 +65,9 @@ class TelegramIntegrationBot(ServiceComponentBase):
                  bot_token: str,
                  db_session_factory: Optional[async_sessionmaker[AsyncSession]],
                  logger_adapter: logging.LoggerAdapter,
+                 webhook_url: Optional[str] = None,
+                 webhook_secret: Optional[str] = None,
+                 owns_process_resources: bool = True,
                  ):
 
         # Initialize ServiceComponentBase (which calls RunnableComponent and StatusUpdater inits)
@@ -51,14 +80,24 @@ class TelegramIntegrationBot(ServiceComponentBase):
         self.db_session_factory = db_session_factory
         self._pubsub_channel = f"agent:{self.agent_id}:output"
 
+        # Webhook mode: updates are fed by TelegramWebhookHost instead of long polling.
+        # Hosted bots share the process with others and must not close process-wide clients.
+        # The host passes a secret shared by all API workers; a standalone bot generates its own.
+        self.webhook_url = webhook_url
+        self.webhook_secret: Optional[str] = (webhook_secret or secrets.token_urlsafe(32)) if webhook_url else None
+        self.owns_process_resources = owns_process_resources
+
         # --- Aiogram and Bot specific attributes ---
         self.bot: Optional[Bot] = None
         self.dp: Optional[Dispatcher] = None
 
         self.typing_tasks: Dict[int, asyncio.Task] = {} # To manage typing indicator tasks
+
+        # Two-tier user profile/authorization cache (in-process LRU + Redis)
+        self.user_cache = UserProfileCache(agent_id=self.agent_id, platform="telegram", logger=self.logger)
         
         # Voice processing orchestrator
-        self.voice_orchestrator: Optional[VoiceServiceOrchestrator] = None
+        self.voice_orchestrator: Optional["VoiceServiceOrchestrator"] = None
         
         # Image processing orchestrator
         self.image_orchestrator = None  # Will be initialized later
@@ -69,7 +108,8 @@ class TelegramIntegrationBot(ServiceComponentBase):
         # 🆕 Photo grouping for handling multiple photos sent together
         self.photo_groups: Dict[str, List[Message]] = {}  # media_group_id -> messages
         self.photo_buffers: Dict[int, List[Message]] = {}  # user_id -> buffered messages  
-        self.photo_timers: Dict[int, asyncio.Task] = {}  # user_id -> timer task
+        self.photo_timers: Dict[int, asyncio.Task] = {}  # user_id -> timer task (only while waiting)
+        self.photo_group_tasks: Set[asyncio.Task] = set()  # groups being processed
         self.photo_group_timeout = 2.0  # seconds to wait for additional photos
         
         self.logger.info(f"TelegramIntegrationBot initialized. PID: {os.getpid()}")
@@ -122,7 +162,9 @@ class TelegramIntegrationBot(ServiceComponentBase):
             self.logger.info(f"Adding {len(image_urls)} image URLs to message payload")
         
         try:
-            await redis_cli.publish(input_channel, json.dumps(payload).encode('utf-8'))
+            with tracer.start_span("integration.publish", stage=STAGE_PUBLISH, attributes={"channel": "telegram"}) as publish_span:
+                inject_trace_context(payload, publish_span)
+                await redis_cli.publish(input_channel, encode_message(payload))
             self.logger.info(f"Published message to {input_channel} for chat {chat_id}")
         except redis_exceptions.RedisError as e:
             self.logger.error(f"Redis error publishing to {input_channel}: {e}", exc_info=True)
@@ -132,57 +174,62 @@ class TelegramIntegrationBot(ServiceComponentBase):
             await self.bot.send_message(chat_id, "Произошла внутренняя ошибка при отправке сообщения.")
 
 
-    async def _check_user_authorization(self, platform_user_id: str) -> bool:
+    async def _get_user_cache_entry(self, platform_user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached profile/authorization entry for the user.
+        Lookup order: in-process LRU -> Redis -> Postgres (result is cached, including negatives).
+        """
+        platform_user_id = str(platform_user_id)
         try:
             redis_cli = await self.redis_client # Use inherited client
         except RuntimeError as e:
             self.logger.error(f"Redis client not available for auth check: {e}")
-            return False
+            redis_cli = None
+
+        entry = await self.user_cache.get(redis_cli, platform_user_id)
+        if entry is not None:
+            self.logger.debug(f"User cache hit for user {platform_user_id}, agent {self.agent_id}. Authorized: {entry.get('is_authorized')}")
+            return entry
+
+        self.logger.info(f"User cache miss for user {platform_user_id}, agent {self.agent_id}. Checking DB.")
+        if not self.db_session_factory:
+            self.logger.error("db_session_factory not configured. Cannot check DB for authorization.")
+            return None
 
-        cache_key = f"{USER_CACHE_PREFIX}telegram:{platform_user_id}:agent:{self.agent_id}"
         try:
-            self.logger.debug(f"Auth check: Attempting to get cache for key '{cache_key}'")
-            cached_auth_status_bytes = await redis_cli.get(cache_key)
-            if cached_auth_status_bytes is not None:
-                cached_auth_status = cached_auth_status_bytes.decode('utf-8') # Decode bytes to string
-                is_authorized = cached_auth_status == "true"
-                self.logger.info(f"Auth cache hit for user {platform_user_id}, agent {self.agent_id}. Status: {is_authorized}")
-                return is_authorized
-            else:
-                self.logger.info(f"Auth cache miss for user {platform_user_id}, agent {self.agent_id}. Checking DB.")
-                if not self.db_session_factory:
-                    self.logger.error("db_session_factory not configured. Cannot check DB for authorization.")
-                    return False
-
-                async with self.db_session_factory() as session:
-                    user = await user_crud.get_user_by_platform_id(session, platform="telegram", platform_user_id=platform_user_id)
-                    if not user:
-                        self.logger.info(f"User with platform_id {platform_user_id} (telegram) not found. Cannot check authorization.")
-                        # Encode string to bytes for Redis set
-                        await redis_cli.set(cache_key, "false".encode('utf-8'), ex=REDIS_USER_CACHE_TTL // 4)
-                        return False
-                    
+            async with self.db_session_factory() as session:
+                user = await user_crud.get_user_by_platform_id(session, platform="telegram", platform_user_id=platform_user_id)
+                is_authorized = False
+                if not user:
+                    self.logger.info(f"User with platform_id {platform_user_id} (telegram) not found. Cannot check authorization.")
+                else:
                     authorization_entry = await user_crud.get_agent_user_authorization(
                         session,
                         agent_id=self.agent_id,
                         user_id=user.id
                     )
-                    
-                    if authorization_entry and authorization_entry.is_authorized:
-                        self.logger.info(f"User {platform_user_id} (DBID: {user.id}) IS authorized for agent {self.agent_id} via DB.")
-                        await redis_cli.set(cache_key, "true".encode('utf-8'), ex=REDIS_USER_CACHE_TTL)
-                        return True
-                    else:
-                        status_detail = f"entry found: {authorization_entry is not None}, is_authorized flag: {authorization_entry.is_authorized if authorization_entry else 'N/A'}"
-                        self.logger.info(f"User {platform_user_id} (DBID: {user.id}) IS NOT authorized for agent {self.agent_id} via DB ({status_detail}).")
-                        await redis_cli.set(cache_key, "false".encode('utf-8'), ex=REDIS_USER_CACHE_TTL // 4) 
-                        return False
-        except redis_exceptions.RedisError as e:
-            self.logger.error(f"Redis error during authorization check for agent {self.agent_id}, user {platform_user_id}: {e}", exc_info=True)
-            return False # Default to not authorized on Redis error
+                    is_authorized = bool(authorization_entry and authorization_entry.is_authorized)
+                    self.logger.info(f"User {platform_user_id} (DBID: {user.id}) authorized for agent {self.agent_id} via DB: {is_authorized}")
+                entry = build_user_cache_entry(user, is_authorized)
         except Exception as e:
             self.logger.error(f"Unexpected error during authorization check for agent {self.agent_id}, user {platform_user_id}: {e}", exc_info=True)
-            return False # Default to not authorized on other errors
+            return None # Not cached: treated as not authorized for this message only
+
+        await self.user_cache.set(redis_cli, platform_user_id, entry)
+        return entry
+
+    async def _check_user_authorization(self, platform_user_id: str) -> bool:
+        entry = await self._get_user_cache_entry(platform_user_id)
+        return bool(entry and entry.get("is_authorized"))
+
+    async def _build_user_data(self, platform_user_id: str) -> Dict[str, Any]:
+        """Builds user_data for the agent payload from the user cache (no DB access on hit)."""
+        entry = await self._get_user_cache_entry(platform_user_id)
+        is_authorized = bool(entry and entry.get("is_authorized"))
+        user_data: Dict[str, Any] = {"is_authenticated": is_authorized, "user_id": platform_user_id}
+        if is_authorized:
+            user_data.update({field: entry.get(field) for field in PROFILE_FIELDS})
+        return user_data
 
     # --- Aiogram Handlers ---
     async def _handle_start_command(self, message: Message):
@@ -267,13 +314,16 @@ class TelegramIntegrationBot(ServiceComponentBase):
                     
                     try:
                         redis_cli = await self.redis_client # Use inherited client
-                        cache_key = f"{USER_CACHE_PREFIX}telegram:{contact_platform_user_id}:agent:{self.agent_id}"
-                        await redis_cli.delete(cache_key)
-                        self.logger.info(f"Auth cache cleared for {cache_key}")
+                        # Drops Redis entries for all agents and notifies every integration process
+                        await publish_user_cache_invalidation(redis_cli, platform="telegram", platform_user_id=contact_platform_user_id)
+                        await self.user_cache.set(
+                            redis_cli, contact_platform_user_id,
+                            build_user_cache_entry(created_or_updated_user, True)
+                        )
+                        self.logger.info(f"User cache refreshed for telegram user {contact_platform_user_id}")
                     except RuntimeError as e_redis_runtime:
-                        self.logger.error(f"Redis client not available for cache clearing: {e_redis_runtime}")
-                    except redis_exceptions.RedisError as e_redis_del:
-                        self.logger.error(f"Redis error clearing auth cache for {cache_key}: {e_redis_del}")
+                        self.user_cache.invalidate_local(contact_platform_user_id)
+                        self.logger.error(f"Redis client not available for cache invalidation: {e_redis_runtime}")
                     
                     await message.answer(
                         "Спасибо! Вы успешно авторизованы.",
@@ -317,22 +367,7 @@ class TelegramIntegrationBot(ServiceComponentBase):
         self.typing_tasks[chat_id] = asyncio.create_task(self._send_typing_periodically(chat_id))
 
         try:
-            is_authorized = await self._check_user_authorization(platform_user_id)
-            user_data: Dict[str, Any] = {"is_authenticated": is_authorized, "user_id": platform_user_id}
-
-            if is_authorized and self.db_session_factory:
-                async with self.db_session_factory() as session:
-                    db_user = await user_crud.get_user_by_platform_id(session, platform="telegram", platform_user_id=platform_user_id)
-                    if db_user:
-                        user_data.update({
-                            "phone_number": db_user.phone_number, "first_name": db_user.first_name,
-                            "last_name": db_user.last_name, "username": db_user.username
-                        })
-                    else:
-                        self.logger.warning(f"User {platform_user_id} authorized but not in DB. Sending minimal data.")
-            elif is_authorized:
-                 self.logger.warning(f"DB session factory not configured. Cannot fetch full user details for {platform_user_id}.")
-
+            user_data = await self._build_user_data(platform_user_id)
 
             await self._publish_to_agent(chat_id, platform_user_id, user_message_text, user_data)
             self.logger.info(f"Message from {platform_user_id} published to agent {self.agent_id}. User data: {user_data}")
@@ -408,20 +443,7 @@ class TelegramIntegrationBot(ServiceComponentBase):
                 return
             
             # Get user authorization info
-            is_authorized = await self._check_user_authorization(platform_user_id)
-            user_data = {"is_authenticated": is_authorized, "user_id": platform_user_id}
-            
-            # Get user details if available
-            if is_authorized and self.db_session_factory:
-                async with self.db_session_factory() as session:
-                    db_user = await user_crud.get_user_by_platform_id(session, platform="telegram", platform_user_id=platform_user_id)
-                    if db_user:
-                        user_data.update({
-                            "phone_number": db_user.phone_number,
-                            "first_name": db_user.first_name,
-                            "last_name": db_user.last_name, 
-                            "username": db_user.username
-                        })
+            user_data = await self._build_user_data(platform_user_id)
             
             # 🆕 Use cached agent config instead of loading from API each time
             agent_config = self.agent_config or self._get_fallback_agent_config()
@@ -490,7 +512,7 @@ class TelegramIntegrationBot(ServiceComponentBase):
             return
             
         # For non-media group photos, use temporal grouping
-        # Cancel any existing timer for this user
+        # The timer is in photo_timers only while it is waiting, so cancelling it never interrupts processing
         if user_id in self.photo_timers:
             self.photo_timers[user_id].cancel()
             
@@ -526,25 +548,28 @@ class TelegramIntegrationBot(ServiceComponentBase):
             await self._process_photo_group(messages)
 
     async def _process_photo_buffer_after_delay(self, user_id: int):
-        """Process buffered photos after a delay"""
+        """
+        Hands the buffered photos over for processing after a delay.
+
+        The timer and the buffer are detached before the first await and the group
+        is processed in a separate task, so a new photo starts a new group.
+        """
         try:
             await asyncio.sleep(self.photo_group_timeout)
-            
-            if user_id in self.photo_buffers and self.photo_buffers[user_id]:
-                messages = self.photo_buffers[user_id].copy()
-                self.photo_buffers[user_id].clear()
-                
-                await self._process_photo_group(messages)
-                
         except asyncio.CancelledError:
-            # Timer was cancelled, this is normal
-            pass
-        except Exception as e:
-            self.logger.error(f"Error processing photo buffer for user {user_id}: {e}", exc_info=True)
-        finally:
-            # Clean up timer
-            if user_id in self.photo_timers:
-                del self.photo_timers[user_id]
+            # Timer was restarted by a new photo, the buffer is kept
+            return
+        if self.photo_timers.get(user_id) is asyncio.current_task():
+            del self.photo_timers[user_id]
+        messages = self.photo_buffers.pop(user_id, [])
+        if messages:
+            self._start_photo_group_processing(user_id, messages)
+
+    def _start_photo_group_processing(self, user_id: int, messages: List[Message]) -> None:
+        """Processes a photo group in a tracked task that new photos cannot cancel."""
+        task = asyncio.create_task(self._process_photo_group(messages), name=f"TelegramPhotoGroup-{user_id}")
+        self.photo_group_tasks.add(task)
+        task.add_done_callback(self.photo_group_tasks.discard)
 
     async def _process_photo_group(self, messages: List[Message]):
         """Process a group of photos as a single message"""
@@ -563,76 +588,21 @@ class TelegramIntegrationBot(ServiceComponentBase):
         
         try:
             # Get user authorization info
-            is_authorized = await self._check_user_authorization(platform_user_id)
-            user_data = {"is_authenticated": is_authorized, "user_id": platform_user_id}
-            
-            # Get user details if available
-            if is_authorized and self.db_session_factory:
-                async with self.db_session_factory() as session:
-                    db_user = await user_crud.get_user_by_platform_id(session, platform="telegram", platform_user_id=platform_user_id)
-                    if db_user:
-                        user_data.update({
-                            "phone_number": db_user.phone_number,
-                            "first_name": db_user.first_name,
-                            "last_name": db_user.last_name,
-                            "username": db_user.username
-                        })
-            
-            image_urls = []
-            processed_count = 0
+            user_data = await self._build_user_data(platform_user_id)
             
-            # Process each photo in the group
-            for message in messages:
-                try:
-                    if not message.photo:
-                        continue
-                        
-                    # Select the largest photo size
-                    photo: PhotoSize = max(message.photo, key=lambda p: p.file_size or 0)
-                    
-                    self.logger.info(f"Processing photo {processed_count + 1}/{len(messages)} from {platform_user_id}: {photo.width}x{photo.height}, {photo.file_size} bytes")
-                    
-                    # Validate file size
-                    max_size = getattr(settings, 'IMAGE_MAX_FILE_SIZE_MB', 10) * 1024 * 1024
-                    if photo.file_size and photo.file_size > max_size:
-                        self.logger.warning(f"Photo {processed_count + 1} too large: {photo.file_size} bytes")
-                        continue
-                    
-                    # Download the photo
-                    file_info = await self.bot.get_file(photo.file_id)
-                    if not file_info.file_path:
-                        self.logger.warning(f"Could not get file path for photo {processed_count + 1}")
-                        continue
-                    
-                    # Download file content
-                    image_data = await self.bot.download_file(file_info.file_path)
-                    if not image_data:
-                        self.logger.warning(f"Could not download photo {processed_count + 1}")
-                        continue
-                    
-                    # Determine filename
-                    original_filename = file_info.file_path.split('/')[-1] if file_info.file_path else f"photo_{processed_count + 1}_{int(time.time())}.jpg"
-                    if not original_filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp')):
-                        original_filename += '.jpg'
-                    
-                    # Upload image to MinIO and get URL
-                    image_url = await self.image_orchestrator.upload_user_image(
-                        agent_id=self.agent_id,
-                        user_id=platform_user_id,
-                        image_data=image_data.read(),
-                        original_filename=original_filename
-                    )
-                    
-                    if image_url:
-                        image_urls.append(image_url)
-                        processed_count += 1
-                        self.logger.info(f"Successfully uploaded photo {processed_count}: {image_url}")
-                    else:
-                        self.logger.warning(f"Failed to upload photo {processed_count + 1}")
-                        
-                except Exception as e:
-                    self.logger.error(f"Error processing photo {processed_count + 1}: {e}", exc_info=True)
-                    continue
+            photo_messages = [message for message in messages if message.photo]
+            semaphore = asyncio.Semaphore(max(1, settings.IMAGE_ALBUM_CONCURRENCY))
+
+            async def process_bounded(index: int, message: Message) -> Optional[str]:
+                async with semaphore:
+                    return await self._process_single_photo(message, index, len(photo_messages), platform_user_id)
+
+            # Download and upload all photos of the album concurrently; order of URLs follows the album
+            results = await asyncio.gather(
+                *(process_bounded(index, message) for index, message in enumerate(photo_messages, start=1))
+            )
+            image_urls = [url for url in results if url]
+            failed_count = len(photo_messages) - len(image_urls)
             
             if image_urls:
                 # Prepare caption combining all captions
@@ -642,9 +612,14 @@ class TelegramIntegrationBot(ServiceComponentBase):
                 else:
                     combined_caption = f"Пользователь отправил {len(image_urls)} изображений"
                 
+                if failed_count:
+                    await first_message.answer(
+                        f"⚠️ Не удалось обработать {failed_count} из {len(photo_messages)} изображений. "
+                        f"Остальные отправлены на обработку."
+                    )
+                
                 # Send all images to agent in one message
                 await self._publish_to_agent(chat_id, platform_user_id, combined_caption, user_data, image_urls=image_urls)
-                self.logger.info(f"Adding {len(image_urls)} image URLs to message payload")
                 self.logger.info(f"Photo group uploaded and message published for chat {chat_id}: {len(image_urls)} images")
             else:
                 await first_message.answer("⚠️ Не удалось обработать ни одного изображения.")
@@ -661,6 +636,68 @@ class TelegramIntegrationBot(ServiceComponentBase):
             if chat_id in self.typing_tasks:
                 self.typing_tasks[chat_id].cancel()
 
+    async def _process_single_photo(self, message: Message, index: int, total: int, platform_user_id: str) -> Optional[str]:
+        """Downloads one photo of a group and stores it. Returns the image URL or None on failure."""
+        try:
+            # Select the largest photo size
+            photo: PhotoSize = max(message.photo, key=lambda p: p.file_size or 0)
+            
+            self.logger.info(f"Processing photo {index}/{total} from {platform_user_id}: {photo.width}x{photo.height}, {photo.file_size} bytes")
+            
+            # Validate file size
+            max_size = getattr(settings, 'IMAGE_MAX_FILE_SIZE_MB', 10) * 1024 * 1024
+            if photo.file_size and photo.file_size > max_size:
+                self.logger.warning(f"Photo {index} too large: {photo.file_size} bytes")
+                return None
+            
+            # Reuse previously stored photo without downloading it again
+            image_url = await self.image_orchestrator.get_cached_image_url(
+                agent_id=self.agent_id,
+                user_id=platform_user_id,
+                platform="telegram",
+                platform_file_id=photo.file_unique_id
+            )
+            if image_url:
+                self.logger.info(f"Reused stored photo {index}: {photo.file_unique_id}")
+                return image_url
+            
+            # Download the photo
+            file_info = await self.bot.get_file(photo.file_id)
+            if not file_info.file_path:
+                self.logger.warning(f"Could not get file path for photo {index}")
+                return None
+            
+            # Download file content
+            image_data = await self.bot.download_file(file_info.file_path)
+            if not image_data:
+                self.logger.warning(f"Could not download photo {index}")
+                return None
+            
+            # Determine filename
+            original_filename = file_info.file_path.split('/')[-1] if file_info.file_path else f"photo_{index}_{int(time.time())}.jpg"
+            if not original_filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp')):
+                original_filename += '.jpg'
+            
+            # Upload image to MinIO and get URL
+            image_url = await self.image_orchestrator.upload_user_image(
+                agent_id=self.agent_id,
+                user_id=platform_user_id,
+                image_data=image_data.getvalue(),
+                original_filename=original_filename,
+                platform="telegram",
+                platform_file_id=photo.file_unique_id
+            )
+            
+            if image_url:
+                self.logger.info(f"Successfully uploaded photo {index}: {image_url}")
+            else:
+                self.logger.warning(f"Failed to upload photo {index}")
+            return image_url
+                
+        except Exception as e:
+            self.logger.error(f"Error processing photo {index}: {e}", exc_info=True)
+            return None
+
     async def _handle_media_group_message(self, messages: List[Message]):
         """Handle media group (album) messages from users - delegate to photo group processor"""
         await self._process_photo_group(messages)
@@ -690,21 +727,16 @@ class TelegramIntegrationBot(ServiceComponentBase):
             return
 
         try:
-            data_str: Optional[str] = None
-            if isinstance(message_data, bytes):
-                data_str = message_data.decode('utf-8')
-            else:
+            if not isinstance(message_data, bytes):
                 self.logger.warning(f"Received non-bytes data in pubsub message: {type(message_data)}")
                 return
 
-            if data_str is None: # Should not happen if decode is successful
-                self.logger.warning(f"Decoded message data is None from: {message_data!r}")
-                return
-
-            payload = json.loads(data_str)
+            payload = decode_message(message_data)
             response_channel = payload.get("channel")
 
             if response_channel == "telegram":
+                _, sent_at = extract_trace_context(payload)
+                observe_queue_wait("agent_output", sent_at)
                 chat_id_str = payload.get("chat_id")
                 response = payload.get("response")
                 error = payload.get("error")
@@ -760,31 +792,18 @@ class TelegramIntegrationBot(ServiceComponentBase):
                         if audio_url:
                             self.logger.info(f"Sending audio response to chat {chat_id}: {audio_url}")
                             try:
-                                # Download audio file and send as voice message
-                                import aiohttp
-                                from aiogram.types import BufferedInputFile
-                                
-                                async with aiohttp.ClientSession() as session:
-                                    async with session.get(audio_url) as resp:
-                                        if resp.status == 200:
-                                            audio_data = await resp.read()
-                                            
-                                            # Create BufferedInputFile for voice message
-                                            voice_file = BufferedInputFile(
-                                                audio_data,
-                                                filename="voice_response.mp3"
-                                            )
-                                            
-                                            # Send as voice message without caption
-                                            await self.bot.send_voice(
-                                                chat_id=chat_id,
-                                                voice=voice_file
-                                            )
-                                            voice_sent_successfully = True
-                                            self.logger.info(f"Voice message sent successfully to chat {chat_id}")
-                                        else:
-                                            self.logger.error(f"Failed to download audio from {audio_url}: HTTP {resp.status}")
-                                            
+                                # Relay audio from storage to Telegram chunk by chunk, without buffering the file
+                                async with open_media_stream(audio_url) as audio_chunks:
+                                    voice_file = StreamingInputFile(audio_chunks, filename="voice_response.mp3")
+                                    # Send as voice message without caption
+                                    await self.bot.send_voice(
+                                        chat_id=chat_id,
+                                        voice=voice_file
+                                    )
+                                voice_sent_successfully = True
+                                self.logger.info(f"Voice message sent successfully to chat {chat_id}")
+                            except MediaStreamError as e:
+                                self.logger.error(f"Failed to open audio {audio_url}: {e}")
                             except TelegramBadRequest as e:
                                 if "VOICE_MESSAGES_FORBIDDEN" in str(e):
                                     self.logger.warning(f"Voice messages are forbidden for chat {chat_id}, falling back to text")
@@ -800,10 +819,8 @@ class TelegramIntegrationBot(ServiceComponentBase):
                 else:
                     self.logger.warning(f"Received message from agent for chat {chat_id} without response or error: {payload}")
 
-        except UnicodeDecodeError:
-            self.logger.error(f"Failed to decode UTF-8 from pubsub message data: {message_data!r}")
-        except json.JSONDecodeError:
-            self.logger.error(f"Failed to decode JSON from pubsub message: {data_str if 'data_str' in locals() else message_data!r}")
+        except MessageCodecError as e:
+            self.logger.error(f"Failed to decode pubsub message: {e}. Data: {message_data[:200]!r}")
         except TelegramBadRequest as e:
             self.logger.error(f"Telegram API error sending message to {chat_id_str if 'chat_id_str' in locals() else 'unknown chat'}: {e}", exc_info=True)
             if "chat not found" in str(e).lower() or \
@@ -836,6 +853,7 @@ class TelegramIntegrationBot(ServiceComponentBase):
 
         # Initialize voice orchestrator
         try:
+            from app.services.voice.voice_orchestrator import VoiceServiceOrchestrator
             redis_service = RedisService()
             await redis_service.initialize()
             self.voice_orchestrator = VoiceServiceOrchestrator(redis_service, self.logger)
@@ -860,7 +878,32 @@ class TelegramIntegrationBot(ServiceComponentBase):
 
         await self._register_handlers()
 
-        self.logger.info(f"TelegramIntegrationBot setup complete.")
+        if self.webhook_url:
+            await self.bot.set_webhook(
+                url=self.webhook_url,
+                secret_token=self.webhook_secret,
+                allowed_updates=self.dp.resolve_used_update_types(),
+                max_connections=settings.TELEGRAM_WEBHOOK_MAX_CONNECTIONS,
+            )
+            self.logger.info(f"Telegram webhook registered: {self.webhook_url}")
+
+        self.logger.info("TelegramIntegrationBot setup complete.")
+
+    def verify_webhook_secret(self, secret_token: Optional[str]) -> bool:
+        """Checks the X-Telegram-Bot-Api-Secret-Token header of an incoming webhook update."""
+        if not self.webhook_secret or not secret_token:
+            return False
+        return hmac.compare_digest(self.webhook_secret, secret_token)
+
+    async def feed_webhook_update(self, update: Dict[str, Any]) -> None:
+        """Dispatches a raw webhook update to the registered aiogram handlers."""
+        if not self.dp or not self.bot or not self._running:
+            self.logger.warning(f"Webhook update dropped: bot is not running.")
+            return
+        try:
+            await self.dp.feed_raw_update(self.bot, update)
+        except Exception as e:
+            self.logger.error(f"Error handling webhook update {update.get('update_id')}: {e}", exc_info=True)
 
 
     async def run_loop(self) -> None:
@@ -871,6 +914,7 @@ class TelegramIntegrationBot(ServiceComponentBase):
         self.logger.info(f"TelegramIntegrationBot run_loop started for agent {self.agent_id}. Polling for updates...")
         
         self._register_main_task(self._pubsub_listener_loop(), name="RedisOutputListener")
+        self._register_main_task(self.user_cache.listen_invalidations(self.get_pubsub_client()), name="UserCacheInvalidationListener")
         
         async def polling_wrapper():
             if not self.dp or not self.bot:
@@ -878,6 +922,8 @@ class TelegramIntegrationBot(ServiceComponentBase):
                 return
             try:
                 self.logger.info(f"Starting aiogram polling...")
+                # getUpdates is rejected while a webhook is set (e.g. after switching modes)
+                await self.bot.delete_webhook()
                 await self.dp.start_polling(self.bot, allowed_updates=self.dp.resolve_used_update_types())
             except asyncio.CancelledError:
                 self.logger.info(f"Aiogram polling task cancelled.")
@@ -888,7 +934,10 @@ class TelegramIntegrationBot(ServiceComponentBase):
             finally:
                 self.logger.info(f"Aiogram polling has stopped.")
         
-        self._register_main_task(polling_wrapper(), name="AiogramPolling")
+        if self.webhook_url:
+            self.logger.info("Webhook mode: updates are delivered by the webhook ingress, polling disabled.")
+        else:
+            self._register_main_task(polling_wrapper(), name="AiogramPolling")
 
         try:
             await super().run_loop()
@@ -919,14 +968,15 @@ class TelegramIntegrationBot(ServiceComponentBase):
             self.typing_tasks.clear()
             self.logger.info("Active typing tasks processed for cancellation.")
 
-        # Cancel photo group timers
-        if self.photo_timers:
-            self.logger.info(f"Cancelling {len(self.photo_timers)} photo group timers...")
-            for user_id, task in list(self.photo_timers.items()):
-                if task and not task.done():
-                    task.cancel()
-            await asyncio.gather(*(task for task in self.photo_timers.values() if task and not task.done()), return_exceptions=True)
-            self.photo_timers.clear()
+        # Cancel photo group timers and groups still being processed
+        photo_tasks = [task for task in [*self.photo_timers.values(), *self.photo_group_tasks] if task and not task.done()]
+        if photo_tasks:
+            self.logger.info(f"Cancelling {len(photo_tasks)} photo group tasks...")
+            for task in photo_tasks:
+                task.cancel()
+            await asyncio.gather(*photo_tasks, return_exceptions=True)
+        self.photo_timers.clear()
+        self.photo_group_tasks.clear()
             
         # Clear photo buffers
         self.photo_groups.clear()
@@ -956,6 +1006,10 @@ class TelegramIntegrationBot(ServiceComponentBase):
                 self.logger.warning(f"Error cleaning up image orchestrator: {e}")
             finally:
                 self.image_orchestrator = None
+
+        if self.owns_process_resources:
+            await close_object_storage()
+            await close_http_client()
         
         self.bot = None
         self.dp = None
@@ -968,30 +1022,29 @@ class TelegramIntegrationBot(ServiceComponentBase):
         Загружает конфигурацию агента один раз при инициализации интеграции
         """
         try:
-            import httpx
             self.logger.debug(f"Loading agent config for {self.agent_id}")
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"http://{settings.MANAGER_HOST}:{settings.MANAGER_PORT}/api/v1/agents/{self.agent_id}/config")
-                if response.status_code == 200:
-                    self.agent_config = response.json()
-                    self.logger.info(f"Successfully loaded agent config for {self.agent_id}")
+            client = get_http_client()
+            response = await client.get(f"http://{settings.MANAGER_HOST}:{settings.MANAGER_PORT}/api/v1/agents/{self.agent_id}/config")
+            if response.status_code == 200:
+                self.agent_config = response.json()
+                self.logger.info(f"Successfully loaded agent config for {self.agent_id}")
                     
-                    # Check if voice is enabled
-                    voice_enabled = (
-                        self.agent_config
-                        .get("config", {})
-                        .get("simple", {})
-                        .get("settings", {})
-                        .get("voice_settings", {})
-                        .get("enabled", False)
-                    )
-                    self.logger.info(f"Voice features enabled for agent {self.agent_id}: {voice_enabled}")
+                # Check if voice is enabled
+                voice_enabled = (
+                    self.agent_config
+                    .get("config", {})
+                    .get("simple", {})
+                    .get("settings", {})
+                    .get("voice_settings", {})
+                    .get("enabled", False)
+                )
+                self.logger.info(f"Voice features enabled for agent {self.agent_id}: {voice_enabled}")
                     
-                else:
-                    self.logger.error(f"Failed to load agent config: HTTP {response.status_code}")
-                    # Set fallback config
-                    self.agent_config = self._get_fallback_agent_config()
+            else:
+                self.logger.error(f"Failed to load agent config: HTTP {response.status_code}")
+                # Set fallback config
+                self.agent_config = self._get_fallback_agent_config()
                     
         except Exception as e:
             self.logger.error(f"Error loading agent config: {e}")
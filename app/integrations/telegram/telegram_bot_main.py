@@ -5,8 +5,10 @@ import json
 import sys
 
 from app.core.logging_config import setup_logging
+from app.core.tracing import configure_tracing
 from app.core.config import settings
 from app.db.session import get_async_session_factory, close_db_engine
+from app.services.redis_service import close_redis_pool
 from app.integrations.telegram.telegram_bot import TelegramIntegrationBot
 
 
@@ -98,10 +100,12 @@ async def main_async_runner(agent_id: str, integration_settings: str):
                 log_adapter.info("Database engine closed.")
             except Exception as e_db_close:
                 log_adapter.error(f"Error closing database engine: {e_db_close}", exc_info=True)
+        await close_redis_pool()
         log_adapter.info(f"Telegram bot runner for {agent_id} has been shut down.")
 
 if __name__ == "__main__":
     setup_logging()
+    configure_tracing("telegram_bot")
 
     parser = argparse.ArgumentParser(description="Telegram Bot Integration for Configurable Agent")
     parser.add_argument("--agent-id", required=True, help="Unique ID of the agent to run")
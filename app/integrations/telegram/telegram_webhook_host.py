@@ -0,0 +1,465 @@
+"""
+Хост Telegram-ботов в режиме webhook.
+
+Вместо отдельного процесса с long polling на каждого бота все боты работают
+внутри процесса менеджера (API). Обновления от Telegram приходят на единый
+маршрут `/telegram/webhook/{agent_id}`, проверяются по секретному токену
+и передаются в обработчики соответствующего бота.
+
+Команды запуска/остановки ботов ProcessManager публикует в канал
+TELEGRAM_WEBHOOK_CONTROL_CHANNEL, поэтому управлять ботами можно из любого
+процесса (API, воркеры).
+
+API может работать в нескольких процессах (воркеры uvicorn), а webhook у бота
+в Telegram один. Поэтому ботов запускает только лидер - процесс, владеющий
+арендой TELEGRAM_WEBHOOK_LEADER_KEY. Состояние, общее для всех процессов,
+хранится в Redis:
+  - TELEGRAM_WEBHOOK_BOTS_KEY - боты, которые должны работать (новый лидер
+    поднимает их после смены лидерства);
+  - TELEGRAM_WEBHOOK_SECRETS_KEY - секреты webhook, по которым любой процесс
+    проверяет входящее обновление.
+Обновление, пришедшее в процесс без бота, пересылается лидеру через канал
+TELEGRAM_WEBHOOK_UPDATES_CHANNEL. Об остановке бота лидер сообщает в канал
+TELEGRAM_WEBHOOK_ACK_CHANNEL.
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import os
+import secrets
+import socket
+import time
+import uuid
+from typing import Any, Dict, Optional, Set
+
+import redis.asyncio as redis
+from redis import exceptions as redis_exceptions
+
+from app.core.config import settings
+from app.db.session import get_async_session_factory
+from app.integrations.telegram.telegram_bot import TelegramIntegrationBot
+from app.services.redis_service import get_pubsub_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_WEBHOOK_CONTROL_CHANNEL = "telegram_webhook:control"
+TELEGRAM_WEBHOOK_UPDATES_CHANNEL = "telegram_webhook:updates"
+TELEGRAM_WEBHOOK_ACK_CHANNEL = "telegram_webhook:ack"
+TELEGRAM_WEBHOOK_LEADER_KEY = "telegram_webhook:leader"
+TELEGRAM_WEBHOOK_BOTS_KEY = "telegram_webhook:bots"
+TELEGRAM_WEBHOOK_SECRETS_KEY = "telegram_webhook:secrets"
+TELEGRAM_WEBHOOK_PATH = "/telegram/webhook/{agent_id}"
+
+# Продление и снятие аренды лидера только её владельцем
+_RENEW_LEADERSHIP_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_LEADERSHIP_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def build_webhook_url(agent_id: str) -> str:
+    """Публичный URL webhook для бота агента."""
+    base_url = settings.TELEGRAM_WEBHOOK_BASE_URL.rstrip("/")
+    return f"{base_url}{settings.API_V1_STR}{TELEGRAM_WEBHOOK_PATH.format(agent_id=agent_id)}"
+
+
+def extract_bot_token(integration_settings: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Токен бота из настроек интеграции (те же ключи, что и в telegram_bot_main)."""
+    if not isinstance(integration_settings, dict):
+        return None
+    return integration_settings.get("botToken") or integration_settings.get("bot_token")
+
+
+class TelegramWebhookHost:
+    """
+    Управляет ботами, работающими в режиме webhook внутри текущего процесса.
+    """
+
+    def __init__(self):
+        self.logger = logger
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._bots: Dict[str, TelegramIntegrationBot] = {}
+        self._bot_tasks: Dict[str, asyncio.Task] = {}
+        self._bot_tokens: Dict[str, str] = {}
+        self._update_tasks: Set[asyncio.Task] = set()
+        self._redis: Optional[redis.Redis] = None
+        self._pubsub_redis: Optional[redis.Redis] = None
+        self._control_task: Optional[asyncio.Task] = None
+        self._leadership_task: Optional[asyncio.Task] = None
+        self._updates_task: Optional[asyncio.Task] = None
+        # Момент (time.monotonic), до которого аренда лидера гарантированно наша
+        self._lease_deadline: float = 0.0
+        self._leadership_lock = asyncio.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self._control_task is not None and not self._control_task.done()
+
+    @property
+    def is_leader(self) -> bool:
+        return self._updates_task is not None
+
+    async def start(self) -> None:
+        """Подключается к Redis, начинает слушать команды и участвовать в выборе лидера."""
+        if self.is_running:
+            return
+        if not settings.TELEGRAM_WEBHOOK_BASE_URL:
+            self.logger.error("TELEGRAM_WEBHOOK_BASE_URL is not set. Telegram webhook host will not start.")
+            return
+        self._redis = get_redis()
+        # Подписки идут через общее соединение Pub/Sub процесса
+        self._pubsub_redis = get_pubsub_redis()
+        # Подписка выполняется до возврата, чтобы команды, отправленные сразу после старта, не терялись
+        pubsub = self._pubsub_redis.pubsub()
+        await pubsub.subscribe(TELEGRAM_WEBHOOK_CONTROL_CHANNEL)
+        self._control_task = asyncio.create_task(
+            self._listen_loop(pubsub, TELEGRAM_WEBHOOK_CONTROL_CHANNEL, self._handle_control_message),
+            name="TelegramWebhookHostControl"
+        )
+        # Первая попытка стать лидером - сразу, чтобы боты поднялись до start_existing_agents_and_integrations
+        await self._leadership_step()
+        self._leadership_task = asyncio.create_task(self._leadership_loop(), name="TelegramWebhookHostLeadership")
+        self.logger.info(f"Telegram webhook host {self.instance_id} started (leader: {self.is_leader}). "
+                         f"Base URL: {settings.TELEGRAM_WEBHOOK_BASE_URL}")
+
+    async def stop(self) -> None:
+        """Останавливает всех ботов, слушателей и отдаёт лидерство другому процессу."""
+        for task in (self._leadership_task, self._control_task):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._leadership_task = None
+        self._control_task = None
+        was_leader = self.is_leader
+        await self._step_down()
+        if was_leader:
+            try:
+                await self._redis.eval(_RELEASE_LEADERSHIP_SCRIPT, 1, TELEGRAM_WEBHOOK_LEADER_KEY, self.instance_id)
+            except redis_exceptions.RedisError as e:
+                self.logger.warning(f"Failed to release Telegram webhook leadership: {e}")
+        if self._update_tasks:
+            await asyncio.gather(*self._update_tasks, return_exceptions=True)
+        # Общие клиенты процесса не закрываются: пулы закрывает lifespan через close_redis_pool()
+        self._redis = None
+        self._pubsub_redis = None
+        self.logger.info("Telegram webhook host stopped.")
+
+    # --- Лидерство ---
+
+    async def _leadership_loop(self) -> None:
+        interval = settings.TELEGRAM_WEBHOOK_LEADER_TTL / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._leadership_step()
+            except Exception as e:
+                self.logger.error(f"Telegram webhook leadership step failed: {e}", exc_info=True)
+
+    async def _leadership_step(self) -> None:
+        """Продлевает аренду лидера или пытается её получить; при потере аренды останавливает ботов."""
+        ttl_ms = int(settings.TELEGRAM_WEBHOOK_LEADER_TTL * 1000)
+        async with self._leadership_lock:
+            attempt_started = time.monotonic()
+            try:
+                if self.is_leader:
+                    owned = bool(await self._redis.eval(
+                        _RENEW_LEADERSHIP_SCRIPT, 1, TELEGRAM_WEBHOOK_LEADER_KEY, self.instance_id, ttl_ms
+                    ))
+                else:
+                    owned = bool(await self._redis.set(TELEGRAM_WEBHOOK_LEADER_KEY, self.instance_id, nx=True, px=ttl_ms))
+            except redis_exceptions.RedisError as e:
+                self.logger.warning(f"Telegram webhook leadership check failed: {e}")
+                # Без связи с Redis лидер работает, пока аренда заведомо не истекла
+                if self.is_leader and time.monotonic() >= self._lease_deadline:
+                    self.logger.warning("Telegram webhook leadership lease expired. Stepping down.")
+                    await self._step_down()
+                return
+
+            if owned:
+                self._lease_deadline = attempt_started + settings.TELEGRAM_WEBHOOK_LEADER_TTL
+                if not self.is_leader:
+                    await self._become_leader()
+            elif self.is_leader:
+                self.logger.warning("Telegram webhook leadership taken over by another process. Stepping down.")
+                await self._step_down()
+
+    async def _become_leader(self) -> None:
+        self.logger.info(f"Telegram webhook host {self.instance_id} became the leader.")
+        pubsub = self._pubsub_redis.pubsub()
+        await pubsub.subscribe(TELEGRAM_WEBHOOK_UPDATES_CHANNEL)
+        self._updates_task = asyncio.create_task(
+            self._listen_loop(pubsub, TELEGRAM_WEBHOOK_UPDATES_CHANNEL, self._handle_forwarded_update),
+            name="TelegramWebhookHostUpdates"
+        )
+        desired = await self._redis.hgetall(TELEGRAM_WEBHOOK_BOTS_KEY)
+        for agent_id, raw_settings in desired.items():
+            try:
+                await self.start_bot(agent_id, json.loads(raw_settings))
+            except Exception as e:
+                self.logger.error(f"Failed to start Telegram bot {agent_id} after taking leadership: {e}", exc_info=True)
+
+    async def _step_down(self) -> None:
+        """Останавливает ботов процесса; секреты и список ботов в Redis остаются новому лидеру."""
+        if self._updates_task:
+            self._updates_task.cancel()
+            await asyncio.gather(self._updates_task, return_exceptions=True)
+            self._updates_task = None
+        for agent_id in set(self._bots) | set(self._bot_tasks):
+            await self.stop_bot(agent_id)
+
+    # --- Подписки ---
+
+    async def _listen_loop(self, pubsub, channel: str, handler) -> None:
+        while True:
+            try:
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    await handler(message.get("data"))
+            except asyncio.CancelledError:
+                await pubsub.aclose()
+                raise
+            except redis_exceptions.RedisError as e:
+                self.logger.error(f"Telegram webhook listener error on {channel}: {e}. Resubscribing.")
+                await asyncio.sleep(settings.REDIS_RECONNECT_INTERVAL)
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+                pubsub = self._pubsub_redis.pubsub()
+                try:
+                    await pubsub.subscribe(channel)
+                except redis_exceptions.RedisError:
+                    continue
+
+    async def _handle_control_message(self, data: Any) -> None:
+        try:
+            command = json.loads(data)
+            action = command["action"]
+            agent_id = str(command["agent_id"])
+        except (TypeError, ValueError, KeyError) as e:
+            self.logger.warning(f"Invalid Telegram webhook control message {data!r}: {e}")
+            return
+        # Команды получают все процессы, исполняет только лидер
+        if not self.is_leader:
+            return
+        try:
+            if action == "start":
+                await self.start_bot(agent_id, command.get("integration_settings"))
+            elif action == "stop":
+                await self.stop_bot(agent_id)
+                await self._redis.hdel(TELEGRAM_WEBHOOK_SECRETS_KEY, agent_id)
+            else:
+                self.logger.warning(f"Unknown Telegram webhook control action: {action}")
+        except Exception as e:
+            self.logger.error(f"Error executing '{action}' for Telegram bot {agent_id}: {e}", exc_info=True)
+        finally:
+            if action == "stop" and command.get("request_id"):
+                ack = {"request_id": command["request_id"], "agent_id": agent_id}
+                try:
+                    await self._redis.publish(TELEGRAM_WEBHOOK_ACK_CHANNEL, json.dumps(ack))
+                except redis_exceptions.RedisError as e:
+                    self.logger.error(f"Failed to acknowledge stop of Telegram bot {agent_id}: {e}")
+
+    async def _handle_forwarded_update(self, data: Any) -> None:
+        try:
+            message = json.loads(data)
+            agent_id = str(message["agent_id"])
+            update = message["update"]
+        except (TypeError, ValueError, KeyError) as e:
+            self.logger.warning(f"Invalid forwarded Telegram update {data!r}: {e}")
+            return
+        bot = self._bots.get(agent_id)
+        if bot is None:
+            self.logger.warning(f"Forwarded Telegram update {update.get('update_id')} for agent {agent_id} dropped: bot is not running.")
+            return
+        # Секрет уже проверен процессом, принявшим запрос
+        self._feed_update(bot, update)
+
+    # --- Боты ---
+
+    def _create_bot(self, agent_id: str, bot_token: str, webhook_secret: str) -> TelegramIntegrationBot:
+        module_logger = logging.getLogger(f"TELEGRAM_BOT:{agent_id}")
+        log_adapter = logging.LoggerAdapter(module_logger, {'agent_id': agent_id})
+        return TelegramIntegrationBot(
+            agent_id=agent_id,
+            bot_token=bot_token,
+            db_session_factory=get_async_session_factory(),
+            logger_adapter=log_adapter,
+            webhook_url=build_webhook_url(agent_id),
+            webhook_secret=webhook_secret,
+            owns_process_resources=False,
+        )
+
+    async def _get_webhook_secret(self, agent_id: str) -> str:
+        """Секрет webhook бота: общий для всех процессов и неизменный между перезапусками бота."""
+        secret = await self._redis.hget(TELEGRAM_WEBHOOK_SECRETS_KEY, agent_id)
+        if not secret:
+            candidate = secrets.token_urlsafe(32)
+            # HSETNX: при гонке двух лидеров оба используют один секрет
+            await self._redis.hsetnx(TELEGRAM_WEBHOOK_SECRETS_KEY, agent_id, candidate)
+            secret = await self._redis.hget(TELEGRAM_WEBHOOK_SECRETS_KEY, agent_id) or candidate
+        return secret
+
+    async def start_bot(self, agent_id: str, integration_settings: Optional[Dict[str, Any]]) -> None:
+        """Запускает (или перезапускает при смене токена) бота агента в текущем процессе."""
+        bot_token = extract_bot_token(integration_settings)
+        if not bot_token:
+            self.logger.error(f"Telegram bot token not found in integration settings for agent {agent_id}.")
+            return
+        task = self._bot_tasks.get(agent_id)
+        if task and not task.done() and self._bot_tokens.get(agent_id) == bot_token:
+            # Команду start шлёт каждый воркер API при старте - повторный webhook не нужен
+            self.logger.info(f"Telegram bot {agent_id} is already running in webhook host.")
+            return
+        if agent_id in self._bots or agent_id in self._bot_tasks:
+            await self.stop_bot(agent_id)
+        webhook_secret = await self._get_webhook_secret(agent_id)
+        self._bot_tokens[agent_id] = bot_token
+        self._bot_tasks[agent_id] = asyncio.create_task(
+            self._run_bot(agent_id, bot_token, webhook_secret), name=f"TelegramWebhookBot-{agent_id}"
+        )
+
+    async def _run_bot(self, agent_id: str, bot_token: str, webhook_secret: str) -> None:
+        """Цикл жизни бота с перезапуском по needs_restart, как в telegram_bot_main."""
+        try:
+            while True:
+                bot = self._create_bot(agent_id, bot_token, webhook_secret)
+                self._bots[agent_id] = bot
+                await bot.run()
+                if not bot.needs_restart:
+                    break
+                self.logger.info(f"Telegram bot for {agent_id} requested restart. Re-initializing...")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Telegram bot for agent {agent_id} failed in webhook host: {e}", exc_info=True)
+        finally:
+            if self._bot_tasks.get(agent_id) is asyncio.current_task():
+                self._bot_tasks.pop(agent_id, None)
+                self._bot_tokens.pop(agent_id, None)
+                self._bots.pop(agent_id, None)
+
+    async def stop_bot(self, agent_id: str) -> None:
+        """Останавливает бота агента и дожидается завершения его cleanup."""
+        bot = self._bots.get(agent_id)
+        task = self._bot_tasks.pop(agent_id, None)
+        self._bot_tokens.pop(agent_id, None)
+        if bot:
+            bot.clear_restart_request()
+            bot.initiate_shutdown()
+        if task and not task.done():
+            try:
+                await asyncio.wait_for(task, timeout=getattr(settings, 'PROCESS_GRACEFUL_SHUTDOWN_TIMEOUT', 10.0))
+            except asyncio.TimeoutError:
+                self.logger.warning(f"Telegram bot {agent_id} did not stop in time. Cancelling.")
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._bots.pop(agent_id, None)
+        self.logger.info(f"Telegram bot {agent_id} stopped in webhook host.")
+
+    # --- Приём обновлений ---
+
+    def _feed_update(self, bot: TelegramIntegrationBot, update: Dict[str, Any]) -> None:
+        # Обновление обрабатывается в фоне, чтобы сразу ответить Telegram
+        task = asyncio.create_task(bot.feed_webhook_update(update))
+        self._update_tasks.add(task)
+        task.add_done_callback(self._update_tasks.discard)
+
+    async def accept_update(self, agent_id: str, secret_token: Optional[str], update: Dict[str, Any]) -> Optional[bool]:
+        """
+        Принимает обновление: передаёт его локальному боту или пересылает лидеру.
+
+        Returns:
+            None, если бот нигде не запущен; False при неверном секрете; True при успехе.
+        """
+        bot = self._bots.get(agent_id)
+        if bot is not None:
+            if not bot.verify_webhook_secret(secret_token):
+                return False
+            self._feed_update(bot, update)
+            return True
+        if self._redis is None:
+            return None
+
+        expected_secret = await self._redis.hget(TELEGRAM_WEBHOOK_SECRETS_KEY, agent_id)
+        if not expected_secret:
+            return None
+        if not secret_token or not hmac.compare_digest(expected_secret, secret_token):
+            return False
+        receivers = await self._redis.publish(
+            TELEGRAM_WEBHOOK_UPDATES_CHANNEL, json.dumps({"agent_id": agent_id, "update": update})
+        )
+        # Лидера нет (идут выборы) - Telegram повторит доставку после ошибки
+        return True if receivers else None
+
+
+telegram_webhook_host = TelegramWebhookHost()
+
+
+async def publish_telegram_webhook_command(redis_cli: redis.Redis,
+                                           action: str,
+                                           agent_id: str,
+                                           integration_settings: Optional[Dict[str, Any]] = None,
+                                           request_id: Optional[str] = None) -> int:
+    """
+    Отправляет команду хосту webhook-ботов и обновляет список ботов, которые должны работать.
+
+    Returns:
+        Количество процессов-хостов, получивших команду (0 — хост не запущен).
+    """
+    if action == "start":
+        await redis_cli.hset(TELEGRAM_WEBHOOK_BOTS_KEY, agent_id, json.dumps(integration_settings))
+    elif action == "stop":
+        await redis_cli.hdel(TELEGRAM_WEBHOOK_BOTS_KEY, agent_id)
+    payload = {"action": action, "agent_id": agent_id, "integration_settings": integration_settings}
+    if request_id:
+        payload["request_id"] = request_id
+    return await redis_cli.publish(TELEGRAM_WEBHOOK_CONTROL_CHANNEL, json.dumps(payload))
+
+
+async def stop_telegram_webhook_bot(redis_cli: redis.Redis,
+                                    agent_id: str,
+                                    timeout: float,
+                                    pubsub_cli: Optional[redis.Redis] = None) -> bool:
+    """
+    Останавливает бота в хосте webhook-ботов и ждёт подтверждения от лидера.
+
+    Returns:
+        True, если лидер подтвердил остановку или лидера нет (бот нигде не запущен);
+        False, если подтверждение не пришло за timeout секунд.
+    """
+    request_id = uuid.uuid4().hex
+    pubsub = (pubsub_cli or get_pubsub_redis()).pubsub()
+    # Подписка до отправки команды, чтобы не пропустить подтверждение
+    await pubsub.subscribe(TELEGRAM_WEBHOOK_ACK_CHANNEL)
+    try:
+        receivers = await publish_telegram_webhook_command(redis_cli, "stop", agent_id, request_id=request_id)
+        if not receivers or not await redis_cli.exists(TELEGRAM_WEBHOOK_LEADER_KEY):
+            await redis_cli.hdel(TELEGRAM_WEBHOOK_SECRETS_KEY, agent_id)
+            return True
+        try:
+            async with asyncio.timeout(timeout):
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if not message or message.get("type") != "message":
+                        continue
+                    try:
+                        if json.loads(message["data"]).get("request_id") == request_id:
+                            return True
+                    except (TypeError, ValueError):
+                        continue
+        except TimeoutError:
+            return False
+    finally:
+        await pubsub.aclose()
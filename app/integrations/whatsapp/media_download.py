@@ -0,0 +1,126 @@
+"""
+Потоковое чтение медиа из ответа wppconnect-server
+
+wppconnect отдает медиа либо бинарным телом, либо JSON вида
+{"base64": "..."} / {"data": "data:<mime>;base64,..."}. Base64FieldExtractor
+декодирует нужное поле по мере поступления частей ответа, не собирая
+весь JSON и его base64 строку в памяти: пиковое потребление ~ размер файла,
+а не 3-4 его копии.
+"""
+
+import binascii
+import re
+from typing import Optional
+
+
+class MediaTooLargeError(Exception):
+    """Размер медиа превышает допустимый лимит"""
+
+    def __init__(self, size: int, limit: int):
+        super().__init__(f"Media size {size} exceeds limit {limit} bytes")
+        self.size = size
+        self.limit = limit
+
+
+# "base64" или "data" поле JSON ответа с началом строкового значения
+_FIELD_START = re.compile(rb'"(?:base64|data)"\s*:\s*"')
+# Префикс data URL внутри значения
+_DATA_URL_PREFIX = re.compile(rb'data:[^,"]*,')
+# Максимальная длина префикса, которую нужно держать в буфере при поиске
+_MAX_LOOKBEHIND = 64
+
+
+class Base64FieldExtractor:
+    """
+    Инкрементальный декодер base64 значения из JSON ответа.
+
+    feed() принимает части тела ответа, декодированные байты накапливаются
+    в bytearray; base64 декодируется группами по 4 символа, поэтому за раз
+    обрабатывается не больше одной части ответа.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self._state = "search"  # search -> prefix -> value -> done
+        self._pending = bytearray()
+        self._decoded = bytearray()
+        self._seen_content = False
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    @property
+    def found(self) -> bool:
+        return self._state in ("value", "done")
+
+    def feed(self, chunk: bytes) -> None:
+        if self._state == "done":
+            return
+        self._pending += chunk
+
+        if self._state == "search" and not self._seen_content:
+            stripped = self._pending.lstrip()
+            if stripped:
+                self._seen_content = True
+                if stripped.startswith(b'"'):
+                    # Весь ответ - JSON строка с base64
+                    self._pending = bytearray(stripped[1:])
+                    self._state = "prefix"
+
+        if self._state == "search":
+            match = _FIELD_START.search(self._pending)
+            if not match:
+                # Сохраняем хвост: маркер поля может быть разрезан между частями
+                del self._pending[:-_MAX_LOOKBEHIND]
+                return
+            del self._pending[:match.end()]
+            self._state = "prefix"
+
+        if self._state == "prefix":
+            if len(self._pending) < _MAX_LOOKBEHIND and b'"' not in self._pending and b"," not in self._pending:
+                return
+            match = _DATA_URL_PREFIX.match(self._pending)
+            if match:
+                del self._pending[:match.end()]
+            self._state = "value"
+
+        end = self._pending.find(b'"')
+        if end >= 0:
+            self._decode(self._pending[:end], final=True)
+            self._pending.clear()
+            self._state = "done"
+        else:
+            self._decode(self._pending, final=False)
+
+    def _decode(self, data: bytearray, final: bool) -> None:
+        # JSON может экранировать "/" как "\/"
+        if b"\\" in data:
+            data = bytearray(data.replace(b"\\/", b"/"))
+            if not final and data.endswith(b"\\"):
+                # Экранирование разрезано между частями: дождемся следующей
+                usable = len(data) - 1
+            else:
+                usable = len(data)
+        else:
+            usable = len(data)
+        if not final:
+            usable -= usable % 4
+        if usable:
+            self._decoded += binascii.a2b_base64(bytes(data[:usable]))
+            self._check_size(len(self._decoded))
+        if final:
+            return
+        remainder = bytes(data[usable:])
+        self._pending.clear()
+        self._pending += remainder
+
+    def _check_size(self, size: int) -> None:
+        if self.max_bytes is not None and size > self.max_bytes:
+            raise MediaTooLargeError(size, self.max_bytes)
+
+    def result(self) -> Optional[bytes]:
+        """Декодированные данные или None, если поле не найдено/не завершено."""
+        if self._state != "done":
+            return None
+        return bytes(self._decoded)
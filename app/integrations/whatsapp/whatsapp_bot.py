@@ -11,8 +11,7 @@ import json
 import logging
 import os
 import uuid
-from typing import Optional, Dict, Any, List
-import aiohttp
+from typing import Optional, Dict, Any, List, AsyncIterator, Set
 import httpx
 from socketio.async_client import AsyncClient
 
@@ -20,14 +19,24 @@ from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from redis import exceptions as redis_exceptions
 
 from app.core.config import settings
+from app.core.message_codec import MessageCodecError, decode_message, encode_message
+from app.core.tracing import STAGE_PUBLISH, extract_trace_context, inject_trace_context, observe_queue_wait, tracer
 from app.core.base.service_component import ServiceComponentBase
 from app.db.crud import user_crud
 from app.api.schemas.common_schemas import IntegrationType
+from app.services.storage import close_object_storage
+from app.services.http_client import MediaStreamError, close_http_client, get_http_client, open_media_stream
+from app.integrations.whatsapp.media_download import Base64FieldExtractor, MediaTooLargeError
+from app.services.user_cache import UserProfileCache, build_user_cache_entry
 
+# Допуск на JSON обвязку и data URL префикс при оценке размера по Content-Length
+MEDIA_JSON_OVERHEAD_BYTES = 1024
 
-# Constants
-REDIS_USER_CACHE_TTL = getattr(settings, "REDIS_USER_CACHE_TTL", 3600)
-USER_CACHE_PREFIX = "user_cache:"
+# Поля сообщения wppconnect, по которым изображение относится к альбому.
+# Изображения без них обрабатываются сразу, без ожидания следующих.
+# Имена полей не сверены с реальными payload альбомов wppconnect: если ни одно
+# из них не приходит, каждое изображение альбома обрабатывается отдельно.
+ALBUM_MARKER_FIELDS = ("parentMsgKey", "messageAssociation", "mediaGroupId", "albumId")
 
 
 class WhatsAppIntegrationBot(ServiceComponentBase):
@@ -66,6 +75,15 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
         # Typing indicator tracking
         self.typing_tasks: Dict[str, asyncio.Task] = {}
         
+        # Grouping of images sent one after another (albums arrive as separate messages)
+        self.image_buffers: Dict[str, List[Any]] = {}  # chat_id -> [(response, sender_info)]
+        self.image_timers: Dict[str, asyncio.Task] = {}  # chat_id -> timer task (only while waiting)
+        self.image_group_tasks: Set[asyncio.Task] = set()  # groups being processed
+        self.image_group_timeout = 2.0  # seconds to wait for additional images
+
+        # Двухуровневый кэш профилей пользователей (LRU в процессе + Redis)
+        self.user_cache = UserProfileCache(agent_id=self.agent_id, platform="whatsapp", logger=self.logger)
+        
         # Voice orchestrator (will be initialized in setup())
         self.voice_orchestrator = None
         
@@ -244,10 +262,14 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
             await self.sio.connect(socketio_url, socketio_path=settings.WPPCONNECT_SOCKETIO_PATH)
             
             # Register main tasks
-            redis_task = self._register_main_task(
-                self._listen_agent_responses(),
+            self._register_main_task(
+                self._pubsub_listener_loop(),
                 name=f"whatsapp_redis_listener_{self.agent_id}"
             )
+            self._register_main_task(
+                self.user_cache.listen_invalidations(self.get_pubsub_client()),
+                name=f"whatsapp_user_cache_listener_{self.agent_id}"
+            )
             
             # Start the service component run loop
             await super().run_loop()
@@ -273,6 +295,13 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
                     self.logger.debug(f"Failed to stop typing for {chat_id} during cleanup: {e_typing}")
             self.typing_tasks.clear()
             
+            # Cancel image group timers and groups being processed
+            for task in [*self.image_timers.values(), *self.image_group_tasks]:
+                task.cancel()
+            self.image_timers.clear()
+            self.image_group_tasks.clear()
+            self.image_buffers.clear()
+            
             if self.sio and self.sio.connected:
                 await self.sio.disconnect()
                 
@@ -296,6 +325,9 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
                     self.logger.error(f"Error cleaning up image orchestrator: {e}")
                 finally:
                     self.image_orchestrator = None
+
+            await close_object_storage()
+            await close_http_client()
                 
             await super().cleanup()
             
@@ -425,6 +457,17 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
                     fallback_data["last_name"] = last_name
                 return fallback_data
                 
+            try:
+                redis_cli = await self.redis_client
+            except RuntimeError as e:
+                self.logger.warning(f"Redis client not available for user cache: {e}")
+                redis_cli = None
+
+            # Горячий путь: профиль и авторизация из кэша, без обращения к БД
+            entry = await self.user_cache.get(redis_cli, platform_user_id)
+            if entry is not None and entry.get("found"):
+                return self._user_data_from_cache_entry(platform_user_id, entry)
+
             async with self.db_session_factory() as session:
                 # Try to get existing user
                 user_db = await user_crud.get_user_by_platform_id(
@@ -479,24 +522,10 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
                     if is_authorized:
                         self.logger.info(f"Auto-authorized WhatsApp user {platform_user_id} with phone {phone_number}")
                 
-                user_data_result = {
-                    "user_id": user_db.id,  # type: ignore
-                    "first_name": user_db.first_name,
-                    "username": user_db.username,
-                    "platform_user_id": platform_user_id,
-                    "platform": "whatsapp",
-                    "is_authenticated": is_authorized
-                }
-                
-                # Add last_name only if it's not None or empty
-                if user_db.last_name is not None and user_db.last_name.strip():
-                    user_data_result["last_name"] = user_db.last_name
-                    
-                # Add phone_number only if it's not None or empty  
-                if user_db.phone_number is not None and user_db.phone_number.strip():
-                    user_data_result["phone_number"] = user_db.phone_number
-                
-                return user_data_result
+                entry = build_user_cache_entry(user_db, is_authorized)
+
+            await self.user_cache.set(redis_cli, platform_user_id, entry)
+            return self._user_data_from_cache_entry(platform_user_id, entry)
                 
         except Exception as e:
             self.logger.error(f"Error getting/creating user {platform_user_id}: {e}", exc_info=True)
@@ -510,6 +539,38 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
                 error_fallback_data["last_name"] = last_name
             return error_fallback_data
 
+    def _user_data_from_cache_entry(self, platform_user_id: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Формирование user_data для агента из записи кэша пользователя
+        
+        Args:
+            platform_user_id: ID пользователя в WhatsApp
+            entry: Запись UserProfileCache
+            
+        Returns:
+            Данные пользователя с флагом авторизации
+        """
+        user_data_result = {
+            "user_id": entry.get("user_id"),
+            "first_name": entry.get("first_name"),
+            "username": entry.get("username"),
+            "platform_user_id": platform_user_id,
+            "platform": "whatsapp",
+            "is_authenticated": bool(entry.get("is_authorized"))
+        }
+        
+        # Add last_name only if it's not None or empty
+        last_name = entry.get("last_name")
+        if last_name is not None and last_name.strip():
+            user_data_result["last_name"] = last_name
+            
+        # Add phone_number only if it's not None or empty  
+        phone_number = entry.get("phone_number")
+        if phone_number is not None and phone_number.strip():
+            user_data_result["phone_number"] = phone_number
+        
+        return user_data_result
+
     async def _publish_to_agent(self, chat_id: str, platform_user_id: str, message_text: str, user_data: Dict[str, Any], image_urls: Optional[List[str]] = None) -> None:
         """
         Публикация сообщения в Redis канал агента
@@ -543,7 +604,9 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
             self.logger.info(f"Adding {len(image_urls)} image URLs to WhatsApp message payload")
         
         try:
-            await redis_cli.publish(input_channel, json.dumps(payload).encode('utf-8'))
+            with tracer.start_span("integration.publish", stage=STAGE_PUBLISH, attributes={"channel": "whatsapp"}) as publish_span:
+                inject_trace_context(payload, publish_span)
+                await redis_cli.publish(input_channel, encode_message(payload))
             self.logger.debug(f"Published message to {input_channel}: {payload}")
             await self.update_last_active_time()
             
@@ -553,27 +616,6 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
         except Exception as e:
             self.logger.error(f"Unexpected error publishing message: {e}", exc_info=True)
 
-    async def _listen_agent_responses(self) -> None:
-        """Слушатель ответов агента через Redis Pub/Sub"""
-        try:
-            redis_cli = await self.redis_client
-            pubsub = redis_cli.pubsub()
-            await pubsub.subscribe(self._pubsub_channel)
-            
-            self.logger.info(f"Subscribed to agent responses on {self._pubsub_channel}")
-            
-            while self._running and not self.needs_restart:
-                try:
-                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
-                    if message and message["type"] == "message":
-                        await self._handle_agent_response(message["data"])
-                except Exception as e:
-                    self.logger.error(f"Error processing agent response: {e}", exc_info=True)
-                    await asyncio.sleep(1)
-                    
-        except Exception as e:
-            self.logger.error(f"Error listening to agent responses: {e}", exc_info=True)
-
     async def _handle_agent_response(self, message_data: bytes) -> None:
         """
         Обработка ответа агента и отправка в WhatsApp
@@ -582,7 +624,7 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
             message_data: Данные сообщения от агента
         """
         try:
-            data = json.loads(message_data.decode('utf-8'))
+            data = decode_message(message_data)
             
             chat_id = data.get("chat_id")
             response_text = data.get("response")
@@ -591,6 +633,9 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
             
             if channel != "whatsapp":
                 return
+
+            _, sent_at = extract_trace_context(data)
+            observe_queue_wait("agent_output", sent_at)
                 
             if not chat_id or not response_text:
                 self.logger.warning(f"Invalid agent response data: {data}")
@@ -622,7 +667,7 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
                 self.logger.debug(f"Sending text fallback message to {chat_id}")
                 await self._send_message(chat_id, response_text)
             
-        except json.JSONDecodeError as e:
+        except MessageCodecError as e:
             self.logger.error(f"Failed to decode agent response: {e}")
         except Exception as e:
             self.logger.error(f"Error handling agent response: {e}", exc_info=True)
@@ -760,18 +805,82 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
         """
         Обработка изображений из WhatsApp
         
+        Изображения альбома (альбом приходит отдельными сообщениями с полями
+        ALBUM_MARKER_FIELDS) буферизуются по чату и обрабатываются одной группой.
+        Одиночное изображение обрабатывается сразу.
+        
         Args:
             response: Данные сообщения от wppconnect-server
             chat_id: ID чата
             sender_info: Информация об отправителе
         """
+        # Check if image processing is available
+        if not self.image_orchestrator:
+            await self._send_error_message(chat_id, "🖼️ Функции обработки изображений временно недоступны.")
+            return
+        
+        if not any(response.get(field) for field in ALBUM_MARKER_FIELDS):
+            self.logger.info(f"Received WhatsApp image in chat {chat_id}: processing immediately")
+            self._start_image_group_processing(chat_id, [(response, sender_info)])
+            return
+        
+        # Timer is in image_timers only while it is waiting, so cancelling it never interrupts processing
+        if chat_id in self.image_timers:
+            self.image_timers[chat_id].cancel()
+        
+        self.image_buffers.setdefault(chat_id, []).append((response, sender_info))
+        
+        # Start/restart timer to process buffered images
+        self.image_timers[chat_id] = asyncio.create_task(self._process_image_buffer_after_delay(chat_id))
+        self.logger.info(f"Received WhatsApp album image in chat {chat_id}: buffered (total: {len(self.image_buffers[chat_id])})")
+
+    async def _process_image_buffer_after_delay(self, chat_id: str) -> None:
+        """
+        Передача буфера изображений чата на обработку после паузы
+        
+        После паузы таймер и буфер снимаются до первого await, а группа
+        обрабатывается отдельной задачей: новое изображение начинает новую группу.
+        
+        Args:
+            chat_id: ID чата
+        """
         try:
-            # Check if image processing is available
-            if not self.image_orchestrator:
-                await self._send_error_message(chat_id, "🖼️ Функции обработки изображений временно недоступны.")
-                return
-            
-            # Extract user information
+            await asyncio.sleep(self.image_group_timeout)
+        except asyncio.CancelledError:
+            # Timer was restarted by a new image, the buffer is kept
+            return
+        if self.image_timers.get(chat_id) is asyncio.current_task():
+            del self.image_timers[chat_id]
+        buffered = self.image_buffers.pop(chat_id, [])
+        if buffered:
+            self._start_image_group_processing(chat_id, buffered)
+
+    def _start_image_group_processing(self, chat_id: str, buffered: List[Any]) -> None:
+        """
+        Запуск обработки группы изображений отдельной задачей
+        
+        Args:
+            chat_id: ID чата
+            buffered: Пары (данные сообщения, информация об отправителе)
+        """
+        task = asyncio.create_task(self._process_image_group(chat_id, buffered), name=f"WhatsAppImageGroup-{chat_id}")
+        self.image_group_tasks.add(task)
+        task.add_done_callback(self.image_group_tasks.discard)
+
+    async def _process_image_group(self, chat_id: str, buffered: List[Any]) -> None:
+        """
+        Обработка группы изображений одним сообщением агенту
+        
+        Скачивание и загрузка в хранилище выполняются параллельно
+        (не более IMAGE_ALBUM_CONCURRENCY одновременно).
+        
+        Args:
+            chat_id: ID чата
+            buffered: Пары (данные сообщения, информация об отправителе)
+        """
+        try:
+            # Extract user information from the latest message
+            sender_info = buffered[-1][1]
             user_name = sender_info.get("pushname", "Unknown")
             platform_user_id = chat_id
             
@@ -786,7 +895,7 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
             first_name = name_parts[0]
             last_name = name_parts[1] if len(name_parts) > 1 else None
             
-            self.logger.info(f"Received WhatsApp image from {user_name} ({platform_user_id}), phone: {phone_number}")
+            self.logger.info(f"Processing {len(buffered)} WhatsApp image(s) from {user_name} ({platform_user_id}), phone: {phone_number}")
             
             # Start typing indicator
             if chat_id in self.typing_tasks:
@@ -797,87 +906,130 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
             user_data = await self._get_or_create_user(platform_user_id, first_name, last_name, phone_number)
             if not user_data:
                 self.logger.warning(f"Failed to get/create user for image message: {platform_user_id}")
-                if chat_id in self.typing_tasks:
-                    self.typing_tasks[chat_id].cancel()
                 return
             
+            semaphore = asyncio.Semaphore(max(1, settings.IMAGE_ALBUM_CONCURRENCY))
+            
+            async def ingest_bounded(index: int, response: Dict[str, Any]) -> Optional[str]:
+                async with semaphore:
+                    return await self._ingest_whatsapp_image(response, platform_user_id, index, len(buffered))
+            
+            results = await asyncio.gather(
+                *(ingest_bounded(index, response) for index, (response, _) in enumerate(buffered, start=1))
+            )
+            image_urls = [url for url in results if url]
+            failed_count = len(buffered) - len(image_urls)
+            
+            if not image_urls:
+                await self._send_error_message(chat_id, "⚠️ Не удалось обработать изображение." if len(buffered) == 1 else "⚠️ Не удалось обработать ни одного изображения.")
+                return
+            
+            if failed_count:
+                await self._send_error_message(
+                    chat_id,
+                    f"⚠️ Не удалось обработать {failed_count} из {len(buffered)} изображений. Остальные отправлены на обработку."
+                )
+            
+            # Prepare message text
+            captions = [response.get("caption") for response, _ in buffered if response.get("caption")]
+            if captions:
+                message_text = " | ".join(captions)
+            elif len(image_urls) == 1:
+                message_text = "Пользователь отправил изображение"
+            else:
+                message_text = f"Пользователь отправил {len(image_urls)} изображений"
+            
+            # Send to agent with image URLs
+            await self._publish_to_agent(chat_id, platform_user_id, message_text, user_data, image_urls=image_urls)
+            self.logger.info(f"WhatsApp images uploaded and message published for chat {chat_id}: {len(image_urls)} images")
+            
+        except Exception as e:
+            self.logger.error(f"Error handling WhatsApp image message: {e}", exc_info=True)
+            await self._send_error_message(chat_id, "⚠️ Ошибка при обработке изображения.")
+        finally:
+            # Stop typing indicator
+            if chat_id in self.typing_tasks:
+                self.typing_tasks[chat_id].cancel()
+
+    async def _ingest_whatsapp_image(self, response: Dict[str, Any], platform_user_id: str, index: int, total: int) -> Optional[str]:
+        """
+        Скачивание одного изображения WhatsApp и загрузка в хранилище
+        
+        Args:
+            response: Данные сообщения от wppconnect-server
+            platform_user_id: ID пользователя в WhatsApp
+            index: Порядковый номер изображения в группе
+            total: Размер группы
+            
+        Returns:
+            URL изображения или None при ошибке
+        """
+        try:
             # Extract image data from response
             message_id = response.get("id", response.get("messageId", ""))
             media_key = response.get("mediaKey", "")
             mimetype = response.get("mimetype", "image/jpeg")
             filename = response.get("filename", f"image_{message_id}.jpg")
-            caption = response.get("caption", "")
             
-            self.logger.debug(f"Image details: messageId={message_id}, mediaKey={media_key[:20] if media_key else 'None'}..., mimetype={mimetype}, filename={filename}")
+            self.logger.debug(f"Image {index}/{total} details: messageId={message_id}, mediaKey={media_key[:20] if media_key else 'None'}..., mimetype={mimetype}, filename={filename}")
             
             if not media_key:
                 self.logger.error(f"No media key found for image message {message_id}")
-                await self._send_error_message(chat_id, "⚠️ Не удалось получить изображение.")
-                if chat_id in self.typing_tasks:
-                    self.typing_tasks[chat_id].cancel()
-                return
+                return None
             
-            # Download image using universal WhatsApp media download method
-            try:
-                image_data = await self._download_whatsapp_media(media_key, mimetype, message_id)
-                
-                if not image_data:
-                    self.logger.error("Failed to download WhatsApp image")
-                    await self._send_error_message(chat_id, "⚠️ Не удалось скачать изображение.")
-                    if chat_id in self.typing_tasks:
-                        self.typing_tasks[chat_id].cancel()
-                    return
-                
-                # Validate image size
-                max_size = getattr(settings, 'IMAGE_MAX_FILE_SIZE_MB', 10) * 1024 * 1024
-                if len(image_data) > max_size:
-                    await self._send_error_message(chat_id, f"📁 Изображение слишком большое. Максимальный размер: {settings.IMAGE_MAX_FILE_SIZE_MB}MB")
-                    if chat_id in self.typing_tasks:
-                        self.typing_tasks[chat_id].cancel()
-                    return
-                
-                # Ensure filename has proper extension
-                if not filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp')):
-                    if 'jpeg' in mimetype:
-                        filename += '.jpg'
-                    elif 'png' in mimetype:
-                        filename += '.png'
-                    elif 'gif' in mimetype:
-                        filename += '.gif'
-                    elif 'webp' in mimetype:
-                        filename += '.webp'
-                    else:
-                        filename += '.jpg'  # default
-                
-                # Upload image to MinIO and get URL
-                image_url = await self.image_orchestrator.upload_user_image(
+            # filehash is the SHA-256 of the media, stable across forwards and resends
+            file_hash = response.get("filehash")
+            if file_hash:
+                image_url = await self.image_orchestrator.get_cached_image_url(
                     agent_id=self.agent_id,
                     user_id=platform_user_id,
-                    image_data=image_data,
-                    original_filename=filename
+                    platform="whatsapp",
+                    platform_file_id=file_hash
                 )
-                
                 if image_url:
-                    # Prepare message text
-                    message_text = caption or "Пользователь отправил изображение"
-                    
-                    # Send to agent with image URL
-                    await self._publish_to_agent(chat_id, platform_user_id, message_text, user_data, image_urls=[image_url])
-                    self.logger.info(f"WhatsApp image uploaded and message published for chat {chat_id}: {image_url}")
+                    self.logger.info(f"Reused stored WhatsApp image {index}/{total}: {image_url}")
+                    return image_url
+            
+            # Download image using universal WhatsApp media download method, size is enforced while streaming
+            max_size = getattr(settings, 'IMAGE_MAX_FILE_SIZE_MB', 10) * 1024 * 1024
+            try:
+                image_data = await self._download_whatsapp_media(media_key, mimetype, message_id, max_bytes=max_size)
+            except MediaTooLargeError as e:
+                self.logger.warning(f"WhatsApp image {message_id} too large: {e}")
+                return None
+            if not image_data:
+                self.logger.error(f"Failed to download WhatsApp image {message_id}")
+                return None
+            
+            # Ensure filename has proper extension
+            if not filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp')):
+                if 'jpeg' in mimetype:
+                    filename += '.jpg'
+                elif 'png' in mimetype:
+                    filename += '.png'
+                elif 'gif' in mimetype:
+                    filename += '.gif'
+                elif 'webp' in mimetype:
+                    filename += '.webp'
                 else:
-                    await self._send_error_message(chat_id, "⚠️ Не удалось загрузить изображение для обработки.")
-                    
-            except Exception as e:
-                self.logger.error(f"Error downloading/processing WhatsApp image: {e}", exc_info=True)
-                await self._send_error_message(chat_id, "⚠️ Ошибка при обработке изображения.")
+                    filename += '.jpg'  # default
+            
+            # Upload image to MinIO and get URL
+            image_url = await self.image_orchestrator.upload_user_image(
+                agent_id=self.agent_id,
+                user_id=platform_user_id,
+                image_data=image_data,
+                original_filename=filename,
+                platform="whatsapp" if file_hash else None,
+                platform_file_id=file_hash
+            )
+            if not image_url:
+                self.logger.warning(f"Failed to upload WhatsApp image {message_id}")
+            return image_url
             
         except Exception as e:
-            self.logger.error(f"Error handling WhatsApp image message: {e}", exc_info=True)
-            await self._send_error_message(chat_id, "⚠️ Ошибка при обработке изображения.")
-        finally:
-            # Stop typing indicator
-            if chat_id in self.typing_tasks:
-                self.typing_tasks[chat_id].cancel()
+            self.logger.error(f"Error downloading/processing WhatsApp image {index}/{total}: {e}", exc_info=True)
+            return None
 
     async def _handle_voice_message(self, response: Dict[str, Any], chat_id: str, sender_info: Dict[str, Any]) -> None:
         """
@@ -941,7 +1093,15 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
             
             # Download audio file
             message_id = response.get("id", response.get("messageId", ""))
-            audio_data = await self._download_whatsapp_media(media_key, mimetype, message_id)
+            try:
+                audio_data = await self._download_whatsapp_media(
+                    media_key, mimetype, message_id,
+                    max_bytes=settings.VOICE_MAX_FILE_SIZE_MB * 1024 * 1024
+                )
+            except MediaTooLargeError as e:
+                self.logger.warning(f"Voice message {message_id} too large: {e}")
+                await self._send_error_message(chat_id, f"📁 Файл слишком большой. Максимальный размер: {settings.VOICE_MAX_FILE_SIZE_MB}MB")
+                return
             if not audio_data:
                 self.logger.error("Failed to download voice message audio")
                 await self._send_error_message(chat_id, "Извините, не удалось загрузить голосовое сообщение.")
@@ -970,17 +1130,25 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
                 except:
                     pass
 
-    async def _download_whatsapp_media(self, media_key: str, mimetype: str, message_id: str) -> Optional[bytes]:
+    async def _download_whatsapp_media(self, media_key: str, mimetype: str, message_id: str, max_bytes: Optional[int] = None) -> Optional[bytes]:
         """
         Скачивание медиа файла из WhatsApp
         
+        Тело ответа читается потоково: бинарный ответ собирается как есть,
+        base64 из JSON ответа декодируется по мере поступления частей.
+        Лимит размера проверяется до и во время скачивания.
+        
         Args:
             media_key: Ключ медиа файла
             mimetype: MIME тип файла
             message_id: ID сообщения для скачивания медиа
+            max_bytes: Максимальный размер файла в байтах (None - без лимита)
             
         Returns:
             Данные файла или None при ошибке
+            
+        Raises:
+            MediaTooLargeError: Файл превышает max_bytes
         """
         try:
             url = f"{self.wppconnect_base_url}/api/{self.session_name}/download-media"
@@ -995,50 +1163,47 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
                 payload["mimetype"] = mimetype
             
             self.logger.debug(f"Downloading media with payload: {payload}")
-            response = await self.http_client.post(url, json=payload)
-            
-            self.logger.debug(f"Download response status: {response.status_code}")
-            if response.status_code == 200:
-                # Log raw response for debugging
-                raw_response = response.text
-                self.logger.debug(f"Raw response (first 200 chars): {raw_response[:200]}")
+            async with self.http_client.stream("POST", url, json=payload) as response:
+                self.logger.debug(f"Download response status: {response.status_code}")
+                if response.status_code != 200:
+                    await response.aread()
+                    self.logger.error(f"Failed to download WhatsApp media. Status: {response.status_code}, Response: {response.text[:500]}")
+                    return None
                 
-                # Response should contain base64 encoded data
-                response_data = response.json()
+                content_type = response.headers.get("content-type", "")
+                is_encoded = "json" in content_type or content_type.startswith("text/")
                 
-                # Проверяем различные форматы ответа
-                base64_data = None
-                if "base64" in response_data:
-                    # Формат: {"base64": "..."}
-                    base64_data = response_data["base64"]
-                    self.logger.debug("Found base64 data in 'base64' field")
-                elif "data" in response_data:
-                    # Формат: {"data": "..."}
-                    base64_data = response_data["data"]
-                    self.logger.debug("Found base64 data in 'data' field")
-                else:
-                    # Попробуем интерпретировать весь ответ как base64
-                    if isinstance(response_data, str):
-                        base64_data = response_data
-                        self.logger.debug("Using entire response as base64")
+                # Отсекаем заведомо большие файлы по Content-Length (base64 в 4/3 раза больше данных)
+                content_length = response.headers.get("content-length")
+                if max_bytes is not None and content_length and content_length.isdigit():
+                    expected_size = int(content_length) * 3 // 4 if is_encoded else int(content_length)
+                    if expected_size > max_bytes + MEDIA_JSON_OVERHEAD_BYTES:
+                        raise MediaTooLargeError(expected_size, max_bytes)
                 
-                if base64_data:
-                    import base64
-                    try:
-                        audio_bytes = base64.b64decode(base64_data)
-                        self.logger.debug(f"Successfully decoded base64 media data, size: {len(audio_bytes)} bytes")
-                        return audio_bytes
-                    except Exception as e:
-                        self.logger.error(f"Failed to decode base64 data: {e}")
+                if is_encoded:
+                    extractor = Base64FieldExtractor(max_bytes=max_bytes)
+                    async for chunk in response.aiter_bytes():
+                        extractor.feed(chunk)
+                        if extractor.done:
+                            break
+                    media_bytes = extractor.result()
+                    if media_bytes is None:
+                        self.logger.error(f"No base64 media found in wppconnect response for message {message_id}")
                         return None
-                else:
-                    # Some implementations return raw bytes
-                    self.logger.debug(f"No base64 field found, using raw response data, size: {len(response.content)} bytes")
-                    return response.content
-            else:
-                self.logger.error(f"Failed to download WhatsApp media. Status: {response.status_code}, Response: {response.text}")
-                return None
+                    self.logger.debug(f"Successfully decoded base64 media data, size: {len(media_bytes)} bytes")
+                    return media_bytes
+                
+                # Some implementations return raw bytes
+                buffer = bytearray()
+                async for chunk in response.aiter_bytes():
+                    buffer += chunk
+                    if max_bytes is not None and len(buffer) > max_bytes:
+                        raise MediaTooLargeError(len(buffer), max_bytes)
+                self.logger.debug(f"Using raw response data, size: {len(buffer)} bytes")
+                return bytes(buffer)
                 
+        except MediaTooLargeError:
+            raise
         except Exception as e:
             self.logger.error(f"Error downloading WhatsApp media: {e}", exc_info=True)
             return None
@@ -1068,9 +1233,12 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
             import uuid
             from datetime import datetime
             from app.services.voice.base import AudioFileProcessor
+            from app.services.voice.audio_processing import probe_audio
             
             # Detect real audio format instead of hardcoding
             detected_format = AudioFileProcessor.detect_audio_format(audio_data, filename)
+            # Duration is read from container headers, no decoding
+            probe = probe_audio(audio_data)
             mime_type = "audio/ogg"  # Default for WhatsApp
             
             if detected_format:
@@ -1093,7 +1261,7 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
                 mime_type=mime_type,
                 size_bytes=len(audio_data),
                 format=detected_format,  # Use detected format
-                duration_seconds=None,
+                duration_seconds=probe.duration_seconds if probe else None,
                 created_at=datetime.utcnow().isoformat(),
                 minio_bucket="voice-messages",  # Default bucket
                 minio_key=f"whatsapp/{chat_id}/{str(uuid.uuid4())}.ogg"
@@ -1179,35 +1347,19 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
             True если сообщение отправлено успешно
         """
         try:
-            import aiohttp
-            import base64
-            
-            self.logger.debug(f"Downloading audio from URL: {audio_url}")
-            
-            # Скачиваем аудиофайл по URL
-            async with aiohttp.ClientSession() as session:
-                async with session.get(audio_url) as resp:
-                    if resp.status != 200:
-                        self.logger.error(f"Failed to download audio from {audio_url}: HTTP {resp.status}")
-                        return False
-                        
-                    audio_data = await resp.read()
-                    self.logger.debug(f"Downloaded audio data: {len(audio_data)} bytes")
-            
-            # Кодируем в base64 для wppconnect API
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-            self.logger.debug(f"Encoded audio to base64: {len(audio_base64)} characters")
+            self.logger.debug(f"Relaying audio from URL: {audio_url}")
             
-            # Отправляем через wppconnect API используя send-voice-base64 endpoint
+            # Отправляем через wppconnect API используя send-voice-base64 endpoint.
+            # Тело JSON формируется потоково: аудио читается из хранилища частями
+            # и сразу кодируется в base64, файл целиком в памяти не держится
             url = f"/api/{self.session_name}/send-voice-base64"
-            payload = {
-                "phone": chat_id,
-                "isGroup": False,
-                "base64Ptt": audio_base64
-            }
-            
-            self.logger.debug(f"Sending voice message to {chat_id} via {url}")
-            response = await self.http_client.post(url, json=payload)
+            async with open_media_stream(audio_url) as audio_chunks:
+                self.logger.debug(f"Sending voice message to {chat_id} via {url}")
+                response = await self.http_client.post(
+                    url,
+                    content=self._stream_voice_payload(chat_id, audio_chunks),
+                    headers={"Content-Type": "application/json"}
+                )
             
             if response.status_code in [200, 201]:
                 self.logger.info(f"Voice message sent successfully to {chat_id}: HTTP {response.status_code}")
@@ -1217,10 +1369,39 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
                 self.logger.error(f"WhatsApp voice send failed: HTTP {response.status_code}, Response: {response.text}")
                 return False
                 
+        except MediaStreamError as e:
+            self.logger.error(f"Failed to open audio {audio_url}: {e}")
+            return False
         except Exception as e:
             self.logger.error(f"Error sending WhatsApp voice message: {e}", exc_info=True)
             return False
 
+    @staticmethod
+    async def _stream_voice_payload(chat_id: str, audio_chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """
+        Потоковое JSON тело запроса send-voice-base64
+        
+        Args:
+            chat_id: ID чата WhatsApp
+            audio_chunks: Части аудиофайла
+            
+        Returns:
+            Части JSON документа {"phone", "isGroup", "base64Ptt"}
+        """
+        head = json.dumps({"phone": chat_id, "isGroup": False})[:-1]
+        yield f'{head}, "base64Ptt": "'.encode("utf-8")
+        remainder = b""
+        async for chunk in audio_chunks:
+            data = remainder + chunk
+            # base64 кодирует группы по 3 байта: остаток переносится в следующую часть
+            cut = len(data) - len(data) % 3
+            remainder = data[cut:]
+            if cut:
+                yield base64.b64encode(data[:cut])
+        if remainder:
+            yield base64.b64encode(remainder)
+        yield b'"}'
+
     async def _load_agent_config(self) -> None:
         """
         Загружает конфигурацию агента один раз при инициализации интеграции
@@ -1228,27 +1409,27 @@ class WhatsAppIntegrationBot(ServiceComponentBase):
         try:
             self.logger.debug(f"Loading agent config for {self.agent_id}")
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"http://{settings.MANAGER_HOST}:{settings.MANAGER_PORT}/api/v1/agents/{self.agent_id}/config")
-                if response.status_code == 200:
-                    self.agent_config = response.json()
-                    self.logger.info(f"Successfully loaded agent config for {self.agent_id}")
+            client = get_http_client()
+            response = await client.get(f"http://{settings.MANAGER_HOST}:{settings.MANAGER_PORT}/api/v1/agents/{self.agent_id}/config")
+            if response.status_code == 200:
+                self.agent_config = response.json()
+                self.logger.info(f"Successfully loaded agent config for {self.agent_id}")
                     
-                    # Check if voice is enabled
-                    voice_enabled = (
-                        self.agent_config
-                        .get("config", {})
-                        .get("simple", {})
-                        .get("settings", {})
-                        .get("voice_settings", {})
-                        .get("enabled", False)
-                    )
-                    self.logger.info(f"Voice features enabled for agent {self.agent_id}: {voice_enabled}")
+                # Check if voice is enabled
+                voice_enabled = (
+                    self.agent_config
+                    .get("config", {})
+                    .get("simple", {})
+                    .get("settings", {})
+                    .get("voice_settings", {})
+                    .get("enabled", False)
+                )
+                self.logger.info(f"Voice features enabled for agent {self.agent_id}: {voice_enabled}")
                     
-                else:
-                    self.logger.error(f"Failed to load agent config: HTTP {response.status_code}")
-                    # Set fallback config
-                    self.agent_config = self._get_fallback_agent_config()
+            else:
+                self.logger.error(f"Failed to load agent config: HTTP {response.status_code}")
+                # Set fallback config
+                self.agent_config = self._get_fallback_agent_config()
                     
         except Exception as e:
             self.logger.error(f"Error loading agent config: {e}")
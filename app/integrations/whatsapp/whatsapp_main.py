@@ -21,7 +21,9 @@ sys.path.insert(0, str(project_root))
 from app.integrations.whatsapp.whatsapp_bot import WhatsAppIntegrationBot
 from app.core.config import settings
 from app.core.logging_config import setup_logging
+from app.core.tracing import configure_tracing
 from app.db.session import get_async_session_factory, close_db_engine
+from app.services.redis_service import close_redis_pool
 
 
 def setup_logging_for_agent(agent_id: str) -> logging.LoggerAdapter:
@@ -124,11 +126,13 @@ async def main_async_runner(agent_id: str, integration_settings: str):
                 log_adapter.info("Database engine closed.")
             except Exception as e_db_close:
                 log_adapter.error(f"Error closing database engine: {e_db_close}", exc_info=True)
+        await close_redis_pool()
         log_adapter.info(f"WhatsApp bot runner for {agent_id} has been shut down.")
 
 
 if __name__ == "__main__":
     setup_logging()
+    configure_tracing("whatsapp_bot")
 
     parser = argparse.ArgumentParser(description="WhatsApp Integration for PlatformAI-HUB")
     parser.add_argument("--agent-id", required=True, help="Unique ID of the agent to run")
@@ -1,11 +1,18 @@
 import logging
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
 from app.core.lifespan import lifespan
 from app.core.config import settings
+from app.core.base.process_supervisor import get_process_supervisor_metrics
+from app.core.tracing import collect_stage_histograms
+from app.db.session import get_pool_metrics
+from app.services.redis_service import get_redis, get_redis_pool_metrics
+from app.services.semantic_cache import collect_semantic_cache_metrics
+from app.services.voice.audio_processing import collect_audio_operation_stats
 # Импорты роутеров
-from app.api.routers import agent_api, chat_api, integration_api, sse_api, user_api, websocket_api
+from app.api.routers import agent_api, chat_api, integration_api, sse_api, telegram_webhook_api, user_api, websocket_api
 
 # Настройка логирования вызывается в lifespan, но можно получить логгер здесь
 logger = logging.getLogger(__name__)
@@ -24,12 +31,50 @@ app.include_router(user_api.router, prefix=settings.API_V1_STR + "/users", tags=
 app.include_router(chat_api.router, prefix=settings.API_V1_STR + "/chat", tags=["Chat"])
 app.include_router(sse_api.router, prefix=settings.API_V1_STR + "/agents", tags=["SSE"])
 app.include_router(websocket_api.router, prefix=settings.API_V1_STR, tags=["WebSockets"])
+app.include_router(telegram_webhook_api.router, prefix=settings.API_V1_STR, tags=["Telegram Webhook"])
 
 @app.get("/", tags=["Root"])
 async def read_root():
     logger.info("Root endpoint was called.")
     return {"message": f"Welcome to {settings.PROJECT_NAME} v{settings.PROJECT_VERSION}"}
 
+@app.get("/metrics/db-pool", tags=["Monitoring"])
+async def read_db_pool_metrics():
+    """Состояние пула соединений с БД процесса API."""
+    return get_pool_metrics()
+
+@app.get("/metrics/redis-pool", tags=["Monitoring"])
+async def read_redis_pool_metrics():
+    """Заполненность пулов Redis процесса API, ожидания соединений и время команд."""
+    return get_redis_pool_metrics()
+
+@app.get("/metrics/processes", tags=["Monitoring"])
+async def read_process_supervisor_metrics():
+    """Дочерние процессы под наблюдением, их завершения, остановки и перезапуски."""
+    return get_process_supervisor_metrics()
+
+@app.get("/metrics/pipeline", tags=["Monitoring"])
+async def read_pipeline_metrics():
+    """Перцентили длительности этапов обработки сообщений по всем процессам."""
+    histogram = await collect_stage_histograms()
+    return {"stages": histogram.summary()}
+
+@app.get("/metrics/audio", tags=["Monitoring"])
+async def read_audio_operation_metrics():
+    """Число и перцентили времени разбора и перекодирования аудио по исходам, по всем процессам."""
+    return {"operations": await collect_audio_operation_stats()}
+
+@app.get("/metrics/semantic-cache", tags=["Monitoring"])
+async def read_semantic_cache_metrics():
+    """Попадания, промахи и обходы семантического кэша ответов по агентам."""
+    return await collect_semantic_cache_metrics(get_redis())
+
+@app.get("/metrics/prometheus", tags=["Monitoring"], response_class=PlainTextResponse)
+async def read_prometheus_metrics():
+    """Гистограммы этапов обработки сообщений в текстовом формате Prometheus."""
+    histogram = await collect_stage_histograms()
+    return PlainTextResponse(histogram.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # Для локального запуска (uvicorn app.main:app --reload)
 if __name__ == "__main__":
     import uvicorn
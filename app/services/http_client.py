@@ -0,0 +1,92 @@
+"""
+Общий для процесса HTTP клиент и потоковая ретрансляция медиа
+
+Интеграции используют один долгоживущий httpx.AsyncClient с пулом keep-alive
+соединений вместо создания сессии на каждый запрос. open_media_stream отдает
+тело файла (например, синтезированного TTS аудио) частями, не загружая его
+целиком в память; при MEDIA_DIRECT_STORAGE_READ файлы нашего хранилища
+читаются напрямую через ObjectStorageClient, минуя presigned HTTP URL.
+"""
+
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.services.storage import ObjectStorageError, get_object_storage
+
+logger = logging.getLogger(__name__)
+
+MEDIA_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class MediaStreamError(Exception):
+    """Не удалось открыть поток медиафайла"""
+
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Возвращает общий для процесса HTTP клиент, создавая его при первом обращении."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS
+            ),
+            timeout=httpx.Timeout(settings.HTTP_CLIENT_TIMEOUT)
+        )
+        logger.info(f"Shared HTTP client created (max_connections={settings.HTTP_CLIENT_MAX_CONNECTIONS})")
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Закрывает общий HTTP клиент и его пул соединений."""
+    global _http_client
+    if _http_client is not None:
+        try:
+            await _http_client.aclose()
+            logger.info("Shared HTTP client closed.")
+        except Exception as e:
+            logger.error(f"Error closing shared HTTP client: {e}", exc_info=True)
+        finally:
+            _http_client = None
+
+
+@asynccontextmanager
+async def open_media_stream(url: str, chunk_size: int = MEDIA_STREAM_CHUNK_SIZE) -> AsyncIterator[AsyncIterator[bytes]]:
+    """
+    Открывает поток медиафайла по URL и возвращает итератор его частей.
+
+    Ошибка доступа (HTTP статус, отсутствие объекта) выбрасывается как MediaStreamError
+    до начала передачи, чтобы вызывающий мог выбрать fallback.
+    """
+    response: Optional[httpx.Response] = None
+    if settings.MEDIA_DIRECT_STORAGE_READ:
+        storage = get_object_storage()
+        location = storage.parse_object_url(url)
+        if location:
+            bucket, key = location
+            try:
+                response = await storage.open_object_stream(bucket, key)
+            except ObjectStorageError as e:
+                raise MediaStreamError(f"Storage read failed for {bucket}/{key}: {e}") from e
+
+    if response is None:
+        client = get_http_client()
+        try:
+            response = await client.send(client.build_request("GET", url), stream=True)
+        except httpx.HTTPError as e:
+            raise MediaStreamError(f"Download failed for {url}: {e}") from e
+        if response.status_code != 200:
+            await response.aclose()
+            raise MediaStreamError(f"Download failed for {url}: HTTP {response.status_code}")
+
+    try:
+        yield response.aiter_bytes(chunk_size)
+    finally:
+        await response.aclose()
@@ -0,0 +1,169 @@
+"""
+Нормализация изображений перед загрузкой и отправкой в Vision API
+
+Уменьшает изображение до максимальной стороны, нужной провайдерам,
+пережимает с заданным качеством и удаляет EXIF. Декодирование и кодирование
+выполняются в отдельном пуле потоков (Pillow освобождает GIL на этих операциях),
+чтобы не блокировать event loop.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+
+
+logger = logging.getLogger("image_normalizer")
+
+# Форматы, которые не пережимаются (анимация теряется при перекодировании)
+_PASSTHROUGH_FORMATS = {"gif"}
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+@dataclass
+class NormalizedImage:
+    """Результат нормализации изображения"""
+    data: bytes
+    format: str
+    dimensions: Tuple[int, int]
+    original_size: int
+    normalized: bool
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Общий пул потоков для нормализации"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.IMAGE_NORMALIZE_WORKERS),
+            thread_name_prefix="image_normalize"
+        )
+    return _executor
+
+
+def normalize_image_bytes(image_data: bytes,
+                          max_dimension: int,
+                          quality: int = 85,
+                          skip_below_bytes: int = 0) -> NormalizedImage:
+    """
+    Синхронная нормализация изображения
+
+    Args:
+        image_data: Исходные байты изображения
+        max_dimension: Максимальная длинная сторона в пикселях
+        quality: Качество JPEG/WEBP кодирования
+        skip_below_bytes: Изображения меньше этого размера без EXIF не обрабатываются
+
+    Returns:
+        NormalizedImage: Нормализованное изображение или исходное, если обработка не нужна
+    """
+    original_size = len(image_data)
+
+    with Image.open(BytesIO(image_data)) as img:
+        source_format = (img.format or "").lower()
+        dimensions = img.size
+        has_exif = bool(img.info.get("exif"))
+
+        unchanged = NormalizedImage(
+            data=image_data,
+            format=source_format,
+            dimensions=dimensions,
+            original_size=original_size,
+            normalized=False
+        )
+
+        if source_format in _PASSTHROUGH_FORMATS:
+            return unchanged
+
+        # Быстрый путь: маленькое изображение без EXIF не декодируется
+        fits = max(dimensions) <= max_dimension
+        if fits and not has_exif and original_size <= skip_below_bytes:
+            return unchanged
+
+        # JPEG декодируется сразу в уменьшенном масштабе (DCT scaling)
+        if not fits and source_format == "jpeg":
+            img.draft("RGB", (max_dimension, max_dimension))
+
+        # Учитываем ориентацию до удаления EXIF
+        processed = ImageOps.exif_transpose(img)
+        if max(processed.size) > max_dimension:
+            processed.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+        has_alpha = processed.mode in ("RGBA", "LA") or (
+            processed.mode == "P" and "transparency" in processed.info
+        )
+        output = BytesIO()
+        if has_alpha:
+            target_format = "png"
+            processed.save(output, format="PNG", optimize=True)
+        else:
+            target_format = "jpeg"
+            if processed.mode != "RGB":
+                processed = processed.convert("RGB")
+            processed.save(output, format="JPEG", quality=quality, optimize=True, progressive=True)
+
+        normalized_data = output.getvalue()
+
+    # Пережатие без уменьшения не должно увеличивать файл
+    if fits and not has_exif and len(normalized_data) >= original_size:
+        return unchanged
+
+    return NormalizedImage(
+        data=normalized_data,
+        format=target_format,
+        dimensions=processed.size,
+        original_size=original_size,
+        normalized=True
+    )
+
+
+async def normalize_image(image_data: bytes,
+                          max_dimension: int,
+                          quality: Optional[int] = None) -> NormalizedImage:
+    """
+    Асинхронная нормализация изображения в пуле потоков
+
+    Ошибки декодирования не прерывают обработку: возвращаются исходные байты,
+    а валидация изображения выполняется дальше по цепочке.
+    """
+    quality = quality or settings.IMAGE_NORMALIZE_JPEG_QUALITY
+    skip_below_bytes = settings.IMAGE_NORMALIZE_SKIP_BELOW_KB * 1024
+    loop = asyncio.get_running_loop()
+    try:
+        result = await loop.run_in_executor(
+            _get_executor(),
+            normalize_image_bytes,
+            image_data,
+            max_dimension,
+            quality,
+            skip_below_bytes
+        )
+    except Exception as e:
+        logger.warning(f"Image normalization failed, using original bytes: {e}")
+        return NormalizedImage(
+            data=image_data,
+            format="",
+            dimensions=(0, 0),
+            original_size=len(image_data),
+            normalized=False
+        )
+
+    if result.normalized:
+        logger.debug(f"Normalized image {result.original_size} -> {len(result.data)} bytes, "
+                     f"{result.dimensions[0]}x{result.dimensions[1]} {result.format}")
+    return result
+
+
+def shutdown_normalizer() -> None:
+    """Остановка пула потоков нормализации"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -4,11 +4,16 @@ ImageOrchestrator - центральный координатор для обр
 """
 
 import asyncio
+import base64
+import binascii
+import hashlib
+import json
 import logging
 import time
 from typing import List, Optional, Dict, Any
 
 from app.core.config import settings
+from app.core.tracing import STAGE_VISION, tracer
 from app.services.media.providers.base_vision_provider import (
     BaseVisionProvider, 
     VisionAnalysisResult,
@@ -16,6 +21,7 @@ from app.services.media.providers.base_vision_provider import (
 )
 from app.services.media.minio_image_manager import MinIOImageManager
 from app.services.media.image_settings import image_settings
+from app.services.media.image_normalizer import normalize_image
 
 
 class ImageOrchestrator:
@@ -26,7 +32,9 @@ class ImageOrchestrator:
     - Управление провайдерами Vision API с fallback
     - Загрузка изображений в MinIO
     - Валидация и обработка изображений
+    - Нормализация изображений (уменьшение, пережатие, удаление EXIF)
     - Анализ изображений через Vision API
+    - Кэширование результатов анализа по дайджесту изображений и промпту
     """
     
     def __init__(self):
@@ -96,6 +104,38 @@ class ImageOrchestrator:
         
         self.logger.info(f"Initialized {len(providers)} vision providers: {[p.provider_name for p in providers]}")
         return providers
+
+    def _get_target_dimension(self) -> int:
+        """
+        Максимальная сторона изображения после нормализации
+
+        Берется из настроек или как наибольший лимит среди активных провайдеров,
+        чтобы резервный провайдер не получал изображение хуже, чем ему нужно.
+        """
+        if settings.IMAGE_NORMALIZE_MAX_DIMENSION > 0:
+            dimension = settings.IMAGE_NORMALIZE_MAX_DIMENSION
+        elif self.providers:
+            dimension = max(provider.MAX_IMAGE_DIMENSION for provider in self.providers)
+        else:
+            dimension = BaseVisionProvider.MAX_IMAGE_DIMENSION
+        return min(dimension, image_settings.max_width, image_settings.max_height)
+
+    async def _normalize_images(self, images_data: List[bytes]) -> List[bytes]:
+        """Нормализация изображений перед загрузкой в хранилище"""
+        if not settings.IMAGE_NORMALIZE_ENABLED:
+            return images_data
+        
+        max_dimension = self._get_target_dimension()
+        results = await asyncio.gather(
+            *(normalize_image(image_data, max_dimension) for image_data in images_data)
+        )
+        
+        original_total = sum(result.original_size for result in results)
+        normalized_total = sum(len(result.data) for result in results)
+        if normalized_total != original_total:
+            self.logger.info(f"Normalized {len(results)} images: {original_total} -> {normalized_total} bytes "
+                             f"(max dimension {max_dimension}px)")
+        return [result.data for result in results]
     
     async def process_images(self,
                            images_data: List[bytes],
@@ -126,6 +166,8 @@ class ImageOrchestrator:
         self.logger.info(f"Processing {len(images_data)} images for user {user_id}, agent {agent_id}")
         
         try:
+            images_data = await self._normalize_images(images_data)
+
             # Загрузка изображений в MinIO
             object_keys = await self.minio_manager.upload_user_images(
                 images_data=images_data,
@@ -174,6 +216,13 @@ class ImageOrchestrator:
         
         self.logger.info(f"Analyzing {len(image_urls)} images with prompt: '{prompt[:50]}...'")
         
+        # Ключи кэша для каждого провайдера; None если изображения нельзя идентифицировать по содержимому
+        cache_keys = self._generate_vision_cache_keys(image_urls, prompt)
+        if cache_keys:
+            cached_result = await self._get_cached_vision_result(cache_keys)
+            if cached_result:
+                return cached_result
+        
         # Пробуем провайдеров по порядку приоритета
         last_error = None
         
@@ -182,7 +231,9 @@ class ImageOrchestrator:
                 start_time = time.time()
                 
                 self.logger.debug(f"Trying {provider.provider_name} provider...")
-                result = await provider.analyze_images(image_urls, prompt)
+                with tracer.start_span("vision.analyze", stage=STAGE_VISION,
+                                       attributes={"provider": provider.provider_name, "images": len(image_urls)}):
+                    result = await provider.analyze_images(image_urls, prompt)
                 
                 if result.success:
                     processing_time = time.time() - start_time
@@ -190,6 +241,8 @@ class ImageOrchestrator:
                     
                     self.logger.info(f"Successfully analyzed images using {provider.provider_name} "
                                    f"in {processing_time:.2f}s")
+                    if cache_keys:
+                        await self._cache_vision_result(cache_keys[provider.provider_name], result)
                     return result
                 else:
                     self.logger.warning(f"{provider.provider_name} provider failed: {result.error_message}")
@@ -211,6 +264,110 @@ class ImageOrchestrator:
             error_message=error_message
         )
     
+    def _get_image_digest(self, image_url: str) -> Optional[str]:
+        """
+        SHA-256 дайджест изображения по URL
+
+        Поддерживаются data URL (binary режим) и presigned URL content-addressed
+        объектов хранилища; для прочих URL содержимое неизвестно и кэш не используется.
+        """
+        if image_url.startswith("data:"):
+            try:
+                _, payload = image_url.split(",", 1)
+                return hashlib.sha256(base64.b64decode(payload, validate=False)).hexdigest()
+            except (ValueError, binascii.Error):
+                return None
+        return self.minio_manager.digest_from_url(image_url)
+
+    def _generate_vision_cache_keys(self, image_urls: List[str], prompt: str) -> Optional[Dict[str, str]]:
+        """
+        Генерирует ключи кэша результата анализа для каждого провайдера
+        
+        Args:
+            image_urls: URL изображений (порядок учитывается)
+            prompt: Промпт анализа
+            
+        Returns:
+            Словарь provider_name -> ключ кэша или None если кэш не применим
+        """
+        if not settings.IMAGE_VISION_CACHE_ENABLED or not self.minio_manager.redis_client:
+            return None
+        
+        digests = [self._get_image_digest(url) for url in image_urls]
+        if not all(digests):
+            return None
+        
+        normalized_prompt = " ".join(prompt.casefold().split())
+        keys = {}
+        for provider in self.providers:
+            model = getattr(provider, "model", "")
+            cache_data = "\n".join([provider.provider_name, model, normalized_prompt, *digests])
+            keys[provider.provider_name] = f"vision_cache:{hashlib.sha256(cache_data.encode()).hexdigest()}"
+        return keys
+
+    async def _get_cached_vision_result(self, cache_keys: Dict[str, str]) -> Optional[VisionAnalysisResult]:
+        """
+        Получает кэшированный результат анализа
+        
+        Провайдеры проверяются в порядке приоритета одним запросом к Redis.
+        
+        Args:
+            cache_keys: Ключи кэша по провайдерам
+            
+        Returns:
+            Кэшированный результат или None
+        """
+        try:
+            provider_names = [provider.provider_name for provider in self.providers]
+            cached_values = await self.minio_manager.redis_client.mget(
+                [cache_keys[name] for name in provider_names]
+            )
+            for provider_name, cached_data in zip(provider_names, cached_values):
+                if cached_data:
+                    result = VisionAnalysisResult(**json.loads(cached_data))
+                    result.processing_time_seconds = 0.0
+                    self.logger.info(f"Using cached vision analysis from {provider_name}")
+                    return result
+        except Exception as e:
+            self.logger.warning(f"Failed to get cached vision result: {e}")
+        return None
+
+    async def _cache_vision_result(self, cache_key: str, result: VisionAnalysisResult) -> None:
+        """
+        Кэширует результат анализа
+        
+        Число записей ограничено IMAGE_VISION_CACHE_MAX_ENTRIES: при превышении
+        удаляются самые старые записи.
+        
+        Args:
+            cache_key: Ключ кэша
+            result: Результат для кэширования
+        """
+        redis_client = self.minio_manager.redis_client
+        index_key = "vision_cache:index"
+        try:
+            payload = json.dumps({
+                "analysis": result.analysis,
+                "provider_name": result.provider_name,
+                "success": result.success
+            })
+            now = time.time()
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.setex(cache_key, settings.IMAGE_VISION_CACHE_TTL, payload)
+            pipe.zadd(index_key, {cache_key: now})
+            # Записи с истекшим TTL удаляются из индекса
+            pipe.zremrangebyscore(index_key, "-inf", now - settings.IMAGE_VISION_CACHE_TTL)
+            pipe.zcard(index_key)
+            _, _, _, entries = await pipe.execute()
+            
+            overflow = entries - settings.IMAGE_VISION_CACHE_MAX_ENTRIES
+            if overflow > 0:
+                evicted = await redis_client.zpopmin(index_key, overflow)
+                if evicted:
+                    await redis_client.delete(*(key for key, _ in evicted))
+        except Exception as e:
+            self.logger.warning(f"Failed to cache vision result: {e}")
+
     async def process_and_analyze_images(self,
                                        images_data: List[bytes],
                                        agent_id: str,
@@ -268,7 +425,9 @@ class ImageOrchestrator:
                                user_id: str,
                                image_data: bytes,
                                original_filename: Optional[str] = None,
-                               metadata: Optional[Dict[str, Any]] = None) -> str:
+                               metadata: Optional[Dict[str, Any]] = None,
+                               platform: Optional[str] = None,
+                               platform_file_id: Optional[str] = None) -> str:
         """
         Загрузка изображения пользователя через MinIO менеджер
         
@@ -278,6 +437,8 @@ class ImageOrchestrator:
             image_data: Байты изображения
             original_filename: Исходное имя файла (опционально)
             metadata: Дополнительные метаданные
+            platform: Платформа-источник (telegram, whatsapp)
+            platform_file_id: Стабильный ID файла на платформе для повторного использования
             
         Returns:
             str: Presigned URL загруженного изображения
@@ -285,13 +446,17 @@ class ImageOrchestrator:
         if not self._initialized:
             await self.initialize()
             
+        image_data = (await self._normalize_images([image_data]))[0]
+
         # Загружаем изображение и получаем object_key
         object_key = await self.minio_manager.upload_user_image(
             image_data=image_data,
             agent_id=agent_id,
             user_id=user_id,
             original_filename=original_filename,
-            metadata=metadata
+            metadata=metadata,
+            platform=platform,
+            platform_file_id=platform_file_id
         )
         
         # Генерируем presigned URL
@@ -302,6 +467,43 @@ class ImageOrchestrator:
         
         return presigned_url
 
+    async def get_cached_image_url(self,
+                                   agent_id: str,
+                                   user_id: str,
+                                   platform: str,
+                                   platform_file_id: str) -> Optional[str]:
+        """
+        Получение URL ранее сохраненного изображения по ID файла на платформе
+        
+        Позволяет интеграциям пропустить скачивание изображения, которое
+        уже есть в хранилище. Найденное изображение получает новую ссылку.
+        
+        Args:
+            agent_id: ID агента
+            user_id: ID пользователя
+            platform: Платформа-источник (telegram, whatsapp)
+            platform_file_id: Стабильный ID файла на платформе
+            
+        Returns:
+            Optional[str]: Presigned URL или None если изображение не найдено
+        """
+        if not self._initialized:
+            await self.initialize()
+        
+        object_key = await self.minio_manager.find_image_by_platform_file_id(platform, platform_file_id)
+        if not object_key:
+            return None
+        
+        await self.minio_manager.add_image_reference(object_key, agent_id, user_id)
+        return await self.minio_manager.get_presigned_url(
+            object_key=object_key,
+            expires_hours=1
+        )
+
+    async def cleanup(self) -> None:
+        """Освобождение ресурсов оркестратора"""
+        await self.minio_manager.close()
+
     def get_available_providers(self) -> List[str]:
         """Получение списка доступных провайдеров"""
         return [provider.provider_name for provider in self.providers]
@@ -28,6 +28,9 @@ class ImageSettings:
     """
     Класс для управления настройками обработки изображений
     """
+
+    # Префикс content-addressed объектов в bucket
+    CONTENT_PREFIX = "content/"
     
     def __init__(self):
         self.logger = logging.getLogger("image_settings")
@@ -201,6 +204,18 @@ class ImageSettings:
         
         return path
 
+    def generate_content_object_path(self, digest: str) -> str:
+        """
+        Генерация content-addressed пути объекта в MinIO bucket
+        
+        Args:
+            digest: SHA-256 дайджест содержимого (hex)
+            
+        Returns:
+            str: Путь объекта в формате content/ab/cd/<digest>
+        """
+        return f"{self.CONTENT_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}"
+
 
 # Создаём глобальный экземпляр настроек
 image_settings = ImageSettings()
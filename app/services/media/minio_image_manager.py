@@ -1,21 +1,33 @@
 """
 Менеджер для работы с MinIO для хранения изображений пользователей
 Расширяет функциональность существующего MinIO manager
+
+Изображения хранятся по SHA-256 дайджесту содержимого (content-addressed):
+повторно присланное изображение не загружается заново, а получает новую ссылку.
+Ссылки агентов/пользователей на изображения учитываются в Redis и используются
+для очистки изображений, на которые давно никто не ссылался.
+
+Очистка и новые ссылки согласуются через ZSET времени последней ссылки:
+очистка захватывает изображение, записывая отрицательную отметку, а загрузка
+и поиск обновляют время ссылки до проверки наличия объекта и ждут, пока
+захваченное изображение не будет удалено. Изображения старого формата
+(agent_*/user_*/...) в ZSET не учитываются и удаляются по времени загрузки.
 """
 
 import asyncio
+import hashlib
 import logging
-import uuid
-from datetime import datetime, timedelta
+import time
+from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Dict, Any
-from io import BytesIO
+from urllib.parse import unquote, urlsplit
 
-from minio import Minio
-from minio.error import S3Error
-from urllib3.exceptions import MaxRetryError
+import redis.asyncio as redis
 
 from app.core.config import settings
 from app.services.media.image_settings import image_settings, ImageValidationResult
+from app.services.redis_service import get_redis
+from app.services.storage import ObjectStorageClient, get_object_storage
 
 
 class MinIOImageManager:
@@ -23,25 +35,76 @@ class MinIOImageManager:
     Менеджер для работы с MinIO/S3 хранилищем изображений пользователей
     """
 
-    def __init__(self, logger: Optional[logging.Logger] = None):
+    # ZSET: дайджест -> время последней ссылки на изображение
+    LAST_REF_KEY = "image_store:last_ref"
+    # HASH: "agent_id:user_id" -> количество ссылок на изображение
+    REFS_KEY_PREFIX = "image_store:refs:"
+    # STRING: идентификатор файла на платформе -> object key
+    MEDIA_KEY_PREFIX = "image_store:media:"
+    # Порог, начиная с которого дайджест считается вне event loop
+    DIGEST_OFFLOAD_THRESHOLD = 1024 * 1024
+    # Через сколько секунд захват изображения очисткой считается брошенным
+    CLEANUP_CLAIM_TIMEOUT = 300
+    # Пауза между проверками захваченного очисткой изображения
+    CLAIM_WAIT_INTERVAL = 0.2
+    # Префикс ключей изображений старого формата
+    LEGACY_PREFIX = "agent_"
+
+    # Обновляет время ссылки, если изображение уже учтено и не захвачено очисткой.
+    # Возвращает 0, если изображение сейчас удаляется
+    _TOUCH_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if score and tonumber(score) < 0 and -tonumber(score) > tonumber(ARGV[2]) - tonumber(ARGV[3]) then
+    return 0
+end
+if score then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+end
+return 1
+"""
+    # Захватывает изображения, на которые не ссылались с cutoff (или с брошенным захватом).
+    # Возвращает пары [дайджест, прежнее время ссылки]
+    _CLAIM_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cutoff = tonumber(ARGV[2])
+local timeout = tonumber(ARGV[3])
+local claimed = {}
+for i = 4, #ARGV do
+    local score = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if score then
+        score = tonumber(score)
+        if (score >= 0 and score <= cutoff) or (score < 0 and -score <= now - timeout) then
+            redis.call('ZADD', KEYS[1], -now, ARGV[i])
+            table.insert(claimed, ARGV[i])
+            table.insert(claimed, tostring(score))
+        end
+    end
+end
+return claimed
+"""
+
+    def __init__(self,
+                 logger: Optional[logging.Logger] = None,
+                 redis_client: Optional[redis.Redis] = None):
         self.logger = logger or logging.getLogger("minio_image_manager")
-        self.client: Optional[Minio] = None
+        self.client: Optional[ObjectStorageClient] = None
+        self.redis_client = redis_client
         self.bucket_name = settings.MINIO_USER_FILES_BUCKET
         self._initialized = False
 
     async def initialize(self) -> None:
         """Инициализация подключения к MinIO"""
         try:
-            # Создаем клиент MinIO
-            self.client = Minio(
-                endpoint=settings.MINIO_ENDPOINT,
-                access_key=settings.MINIO_ACCESS_KEY,
-                secret_key=settings.MINIO_SECRET_KEY,
-                secure=settings.MINIO_SECURE
-            )
+            # Общий для процесса асинхронный клиент хранилища
+            self.client = get_object_storage()
 
             # Проверяем подключение и создаем bucket если нужно
             await self._ensure_bucket_exists()
+
+            # Redis используется только для учета ссылок, без него дедупликация продолжает работать
+            if self.redis_client is None:
+                self.redis_client = get_redis()
+
             self._initialized = True
             self.logger.info(f"MinIO image manager initialized. Bucket: {self.bucket_name}")
 
@@ -55,17 +118,7 @@ class MinIOImageManager:
             raise RuntimeError("MinIO client not initialized")
 
         try:
-            # Выполняем операции с MinIO в отдельном потоке
-            loop = asyncio.get_event_loop()
-            
-            bucket_exists = await loop.run_in_executor(
-                None, self.client.bucket_exists, self.bucket_name
-            )
-            
-            if not bucket_exists:
-                await loop.run_in_executor(
-                    None, self.client.make_bucket, self.bucket_name
-                )
+            if await self.client.ensure_bucket(self.bucket_name):
                 self.logger.info(f"Created bucket: {self.bucket_name}")
             else:
                 self.logger.debug(f"Bucket already exists: {self.bucket_name}")
@@ -74,14 +127,26 @@ class MinIOImageManager:
             self.logger.error(f"Error ensuring bucket exists: {e}", exc_info=True)
             raise
 
+    @classmethod
+    async def compute_digest(cls, image_data: bytes) -> str:
+        """SHA-256 дайджест содержимого; большие файлы хэшируются в отдельном потоке"""
+        if len(image_data) >= cls.DIGEST_OFFLOAD_THRESHOLD:
+            return await asyncio.to_thread(lambda: hashlib.sha256(image_data).hexdigest())
+        return hashlib.sha256(image_data).hexdigest()
+
     async def upload_user_image(self,
                                image_data: bytes,
                                agent_id: str,
                                user_id: str,
                                original_filename: Optional[str] = None,
-                               metadata: Optional[Dict[str, Any]] = None) -> str:
+                               metadata: Optional[Dict[str, Any]] = None,
+                               platform: Optional[str] = None,
+                               platform_file_id: Optional[str] = None) -> str:
         """
         Загрузка изображения пользователя в MinIO
+
+        Объект сохраняется под ключом, вычисленным из дайджеста содержимого.
+        Если такой объект уже есть, повторная загрузка пропускается.
         
         Args:
             image_data: Байты изображения
@@ -89,6 +154,8 @@ class MinIOImageManager:
             user_id: ID пользователя  
             original_filename: Исходное имя файла (опционально)
             metadata: Дополнительные метаданные
+            platform: Платформа-источник (telegram, whatsapp) для индекса файлов
+            platform_file_id: Стабильный ID файла на платформе для поиска без скачивания
             
         Returns:
             str: Object key загруженного файла
@@ -106,44 +173,49 @@ class MinIOImageManager:
             raise ValueError(f"Image validation failed: {validation_result.error_message}")
         
         try:
-            # Генерация имени файла и пути
-            filename = image_settings.generate_filename(user_id, agent_id, validation_result.detected_format)
-            object_key = image_settings.generate_object_path(user_id, agent_id, filename)
-            
-            # Подготовка метаданных
-            file_metadata = {
-                'user-id': user_id,
-                'agent-id': agent_id,
-                'upload-timestamp': datetime.utcnow().isoformat(),
-                'file-size-mb': str(validation_result.file_size_mb),
-                'image-format': validation_result.detected_format,
-                'image-dimensions': f"{validation_result.dimensions[0]}x{validation_result.dimensions[1]}"
-            }
-            
-            if original_filename:
-                file_metadata['original-filename'] = original_filename
+            digest = await self.compute_digest(image_data)
+            object_key = image_settings.generate_content_object_path(digest)
+
+            # Ссылка учитывается до проверки наличия, иначе очистка может удалить объект после проверки
+            await self._wait_and_touch(digest)
+            if await self.client.stat_object(self.bucket_name, object_key) is not None:
+                self.logger.info(f"Image already stored, skipping upload: {object_key}")
+            else:
+                # Подготовка метаданных (описывают первую загрузку содержимого)
+                file_metadata = {
+                    'user-id': user_id,
+                    'agent-id': agent_id,
+                    'upload-timestamp': datetime.utcnow().isoformat(),
+                    'file-size-mb': str(validation_result.file_size_mb),
+                    'image-format': validation_result.detected_format,
+                    'image-dimensions': f"{validation_result.dimensions[0]}x{validation_result.dimensions[1]}",
+                    'sha256': digest
+                }
                 
-            if metadata:
-                file_metadata.update(metadata)
-            
-            # Определение MIME типа
-            content_type = image_settings.get_mime_type(validation_result.detected_format)
-            
-            # Загрузка в MinIO
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None,
-                self.client.put_object,
-                self.bucket_name,
-                object_key,
-                BytesIO(image_data),
-                len(image_data),
-                content_type,
-                file_metadata
-            )
-            
-            self.logger.info(f"Successfully uploaded image: {object_key}")
-            self.logger.debug(f"Image metadata: {file_metadata}")
+                if original_filename:
+                    file_metadata['original-filename'] = original_filename
+                    
+                if metadata:
+                    file_metadata.update(metadata)
+                
+                # Определение MIME типа
+                content_type = image_settings.get_mime_type(validation_result.detected_format)
+                
+                # Загрузка в MinIO
+                await self.client.put_object(
+                    self.bucket_name,
+                    object_key,
+                    image_data,
+                    content_type=content_type,
+                    metadata=file_metadata
+                )
+                
+                self.logger.info(f"Successfully uploaded image: {object_key}")
+                self.logger.debug(f"Image metadata: {file_metadata}")
+
+            await self.add_image_reference(object_key, agent_id, user_id)
+            if platform and platform_file_id:
+                await self._register_platform_file(platform, platform_file_id, object_key)
             
             return object_key
             
@@ -151,6 +223,230 @@ class MinIOImageManager:
             self.logger.error(f"Failed to upload image: {e}", exc_info=True)
             raise RuntimeError(f"Image upload failed: {str(e)}")
 
+    @staticmethod
+    def _digest_from_object_key(object_key: str) -> Optional[str]:
+        """Дайджест из content-addressed ключа или None для ключей старого формата"""
+        if not object_key.startswith(image_settings.CONTENT_PREFIX):
+            return None
+        return object_key.rsplit("/", 1)[-1]
+
+    def digest_from_url(self, url: str) -> Optional[str]:
+        """
+        Дайджест изображения по presigned URL этого bucket
+
+        Returns:
+            SHA-256 дайджест или None, если URL не указывает на content-addressed объект
+        """
+        path = unquote(urlsplit(url).path).lstrip("/")
+        bucket_prefix = f"{self.bucket_name}/"
+        if not path.startswith(bucket_prefix):
+            return None
+        return self._digest_from_object_key(path[len(bucket_prefix):])
+
+    async def add_image_reference(self, object_key: str, agent_id: str, user_id: str) -> None:
+        """
+        Учет ссылки агента/пользователя на изображение
+
+        Обновляет время последнего использования, по которому выполняется очистка.
+        """
+        digest = self._digest_from_object_key(object_key)
+        if not digest or not self.redis_client:
+            return
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.zadd(self.LAST_REF_KEY, {digest: time.time()})
+            pipe.hincrby(f"{self.REFS_KEY_PREFIX}{digest}", f"{agent_id}:{user_id}", 1)
+            await pipe.execute()
+        except Exception as e:
+            self.logger.warning(f"Failed to track reference for image {digest}: {e}")
+
+    async def _touch_image(self, digest: str) -> bool:
+        """
+        Обновление времени последней ссылки до проверки наличия объекта
+
+        Returns:
+            False, если изображение сейчас удаляется очисткой
+        """
+        if not self.redis_client:
+            return True
+        try:
+            return bool(await self.redis_client.eval(
+                self._TOUCH_SCRIPT, 1, self.LAST_REF_KEY, digest, time.time(), self.CLEANUP_CLAIM_TIMEOUT
+            ))
+        except Exception as e:
+            self.logger.warning(f"Failed to touch image {digest}: {e}")
+            return True
+
+    async def _wait_and_touch(self, digest: str) -> None:
+        """Ожидание завершения очистки захваченного изображения и обновление времени ссылки"""
+        deadline = time.monotonic() + self.CLEANUP_CLAIM_TIMEOUT
+        while not await self._touch_image(digest):
+            if time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(self.CLAIM_WAIT_INTERVAL)
+
+    async def _register_platform_file(self, platform: str, platform_file_id: str, object_key: str) -> None:
+        """Сохранение соответствия ID файла на платформе и object key"""
+        if not self.redis_client:
+            return
+        try:
+            await self.redis_client.set(
+                f"{self.MEDIA_KEY_PREFIX}{platform}:{platform_file_id}",
+                object_key,
+                ex=settings.IMAGE_FILE_RETENTION_DAYS * 86400
+            )
+        except Exception as e:
+            self.logger.warning(f"Failed to register {platform} file {platform_file_id}: {e}")
+
+    async def find_image_by_digest(self, digest: str) -> Optional[str]:
+        """
+        Поиск сохраненного изображения по SHA-256 дайджесту
+
+        Returns:
+            Object key или None если изображения нет в хранилище
+        """
+        if not self._initialized:
+            await self.initialize()
+        object_key = image_settings.generate_content_object_path(digest)
+        # Изображение, которое сейчас удаляется, считается отсутствующим
+        if not await self._touch_image(digest):
+            return None
+        if await self.client.stat_object(self.bucket_name, object_key) is None:
+            return None
+        return object_key
+
+    async def find_image_by_platform_file_id(self, platform: str, platform_file_id: str) -> Optional[str]:
+        """
+        Поиск ранее загруженного изображения по ID файла на платформе
+
+        Позволяет интеграциям не скачивать повторно одно и то же изображение
+        (например, Telegram file_unique_id или WhatsApp filehash).
+
+        Returns:
+            Object key или None если изображение неизвестно или уже удалено
+        """
+        if not self._initialized:
+            await self.initialize()
+        if not self.redis_client:
+            return None
+        try:
+            object_key = await self.redis_client.get(f"{self.MEDIA_KEY_PREFIX}{platform}:{platform_file_id}")
+            if not object_key:
+                return None
+            digest = self._digest_from_object_key(object_key)
+            if digest and not await self._touch_image(digest):
+                return None
+            if await self.client.stat_object(self.bucket_name, object_key) is None:
+                await self.redis_client.delete(f"{self.MEDIA_KEY_PREFIX}{platform}:{platform_file_id}")
+                return None
+            return object_key
+        except Exception as e:
+            self.logger.warning(f"Lookup of {platform} file {platform_file_id} failed: {e}")
+            return None
+
+    async def cleanup_unreferenced_images(self, retention_days: int, batch_size: int = 1000) -> int:
+        """
+        Удаление изображений, на которые не ссылались дольше retention_days
+
+        Изображения сначала захватываются в Redis с повторной проверкой времени
+        ссылки, и только захваченные удаляются из хранилища. Изображения старого
+        формата удаляются по времени загрузки (cleanup_legacy_images).
+
+        Args:
+            retention_days: Срок хранения с момента последней ссылки
+            batch_size: Количество изображений, удаляемых за одну итерацию
+
+        Returns:
+            Количество удаленных изображений
+        """
+        if not self._initialized:
+            await self.initialize()
+        if not self.redis_client:
+            return 0
+
+        cutoff = time.time() - retention_days * 86400
+        deleted_count = 0
+
+        while True:
+            digests = await self.redis_client.zrangebyscore(
+                self.LAST_REF_KEY, "-inf", cutoff, start=0, num=batch_size
+            )
+            if not digests:
+                break
+
+            claimed = await self._claim_for_cleanup(digests, cutoff)
+            if claimed:
+                keys = [image_settings.generate_content_object_path(digest) for digest in claimed]
+                errors = await self.client.remove_objects(self.bucket_name, keys)
+                failed = {self._digest_from_object_key(error.key or "") for error in errors}
+                for error in errors:
+                    self.logger.warning(f"Failed to delete image {error.key}: {error.message or error.code}")
+
+                removed = [digest for digest in claimed if digest not in failed]
+                pipe = self.redis_client.pipeline(transaction=False)
+                if removed:
+                    pipe.zrem(self.LAST_REF_KEY, *removed)
+                    pipe.delete(*(f"{self.REFS_KEY_PREFIX}{digest}" for digest in removed))
+                # Неудаленные изображения возвращаются с прежним временем ссылки
+                restored = {digest: claimed[digest] for digest in claimed if digest in failed}
+                if restored:
+                    pipe.zadd(self.LAST_REF_KEY, restored)
+                await pipe.execute()
+                deleted_count += len(removed)
+            else:
+                removed = []
+
+            if len(removed) < len(digests) or len(digests) < batch_size:
+                break
+
+        deleted_count += await self.cleanup_legacy_images(retention_days)
+        self.logger.info(f"Cleaned up {deleted_count} unreferenced images")
+        return deleted_count
+
+    async def _claim_for_cleanup(self, digests: List[str], cutoff: float) -> Dict[str, float]:
+        """
+        Захват изображений для удаления с повторной проверкой времени ссылки
+
+        Returns:
+            Захваченные дайджесты и их прежнее время ссылки
+        """
+        result = await self.redis_client.eval(
+            self._CLAIM_SCRIPT, 1, self.LAST_REF_KEY, time.time(), cutoff, self.CLEANUP_CLAIM_TIMEOUT, *digests
+        )
+        values = [value.decode() if isinstance(value, bytes) else value for value in result]
+        # Прежнее время брошенного захвата отрицательное; такие изображения восстанавливаются как давно неиспользуемые
+        return {values[i]: max(float(values[i + 1]), 0.0) for i in range(0, len(values), 2)}
+
+    async def cleanup_legacy_images(self, retention_days: int, batch_size: int = 1000) -> int:
+        """
+        Удаление изображений старого формата (agent_*/user_*/...) старше retention_days
+
+        Ссылки на них не учитываются, поэтому срок отсчитывается от загрузки.
+
+        Returns:
+            Количество удаленных изображений
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+        deleted_count = 0
+        batch: List[str] = []
+
+        async def flush() -> None:
+            nonlocal deleted_count
+            errors = await self.client.remove_objects(self.bucket_name, batch)
+            for error in errors:
+                self.logger.warning(f"Failed to delete legacy image {error.key}: {error.message or error.code}")
+            deleted_count += len(batch) - len(errors)
+            batch.clear()
+
+        async for obj in self.client.list_objects(self.bucket_name, prefix=self.LEGACY_PREFIX, recursive=True):
+            if obj.last_modified is not None and obj.last_modified < cutoff:
+                batch.append(obj.key)
+                if len(batch) >= batch_size:
+                    await flush()
+        if batch:
+            await flush()
+        return deleted_count
+
     async def upload_user_images(self,
                                 images_data: List[bytes],
                                 agent_id: str,
@@ -175,9 +471,7 @@ class MinIOImageManager:
         if not is_valid:
             raise ValueError(f"Images validation failed: {'; '.join(errors)}")
         
-        object_keys = []
-        
-        for i, image_data in enumerate(images_data):
+        async def upload_one(i: int, image_data: bytes) -> str:
             original_filename = None
             if original_filenames and i < len(original_filenames):
                 original_filename = original_filenames[i]
@@ -187,22 +481,31 @@ class MinIOImageManager:
             if metadata:
                 image_metadata.update(metadata)
             
-            try:
-                object_key = await self.upload_user_image(
-                    image_data=image_data,
-                    agent_id=agent_id,
-                    user_id=user_id,
-                    original_filename=original_filename,
-                    metadata=image_metadata
-                )
-                object_keys.append(object_key)
-                
-            except Exception as e:
-                self.logger.error(f"Failed to upload image {i+1}/{len(images_data)}: {e}")
-                # Если одно изображение не загрузилось, удаляем уже загруженные
-                if object_keys:
-                    await self._cleanup_uploaded_files(object_keys)
-                raise RuntimeError(f"Batch upload failed at image {i+1}: {str(e)}")
+            return await self.upload_user_image(
+                image_data=image_data,
+                agent_id=agent_id,
+                user_id=user_id,
+                original_filename=original_filename,
+                metadata=image_metadata
+            )
+        
+        # Загружаем параллельно; число одновременных загрузок ограничено клиентом хранилища
+        results = await asyncio.gather(
+            *(upload_one(i, image_data) for i, image_data in enumerate(images_data)),
+            return_exceptions=True
+        )
+        
+        object_keys = [result for result in results if isinstance(result, str)]
+        failures = [(i, result) for i, result in enumerate(results) if isinstance(result, BaseException)]
+        
+        if failures:
+            for i, error in failures:
+                self.logger.error(f"Failed to upload image {i+1}/{len(images_data)}: {error}")
+            # Если хотя бы одно изображение не загрузилось, удаляем уже загруженные
+            if object_keys:
+                await self._cleanup_uploaded_files(object_keys)
+            first_index, first_error = failures[0]
+            raise RuntimeError(f"Batch upload failed at image {first_index+1}: {str(first_error)}")
         
         self.logger.info(f"Successfully uploaded {len(object_keys)} images for user {user_id}")
         return object_keys
@@ -224,15 +527,11 @@ class MinIOImageManager:
             await self.initialize()
         
         try:
-            loop = asyncio.get_event_loop()
-            expires = timedelta(hours=expires_hours)
-            
-            presigned_url = await loop.run_in_executor(
-                None,
-                self.client.presigned_get_object,
+            # Подпись вычисляется локально, без обращения к серверу
+            presigned_url = self.client.presigned_get_url(
                 self.bucket_name,
                 object_key,
-                expires
+                timedelta(hours=expires_hours)
             )
             
             self.logger.debug(f"Generated presigned URL for {object_key}, expires in {expires_hours}h")
@@ -269,24 +568,24 @@ class MinIOImageManager:
         return presigned_urls
 
     async def _cleanup_uploaded_files(self, object_keys: List[str]) -> None:
-        """Удаление загруженных файлов в случае ошибки"""
-        if not object_keys:
+        """
+        Удаление загруженных файлов в случае ошибки
+
+        Content-addressed объекты могут использоваться другими ссылками, поэтому
+        они не удаляются сразу, а остаются под контролем очистки по сроку хранения.
+        """
+        legacy_keys = [key for key in object_keys if self._digest_from_object_key(key) is None]
+        if not legacy_keys:
             return
             
-        self.logger.warning(f"Cleaning up {len(object_keys)} uploaded files due to error")
+        self.logger.warning(f"Cleaning up {len(legacy_keys)} uploaded files due to error")
         
-        for object_key in object_keys:
-            try:
-                loop = asyncio.get_event_loop()
-                await loop.run_in_executor(
-                    None,
-                    self.client.remove_object,
-                    self.bucket_name,
-                    object_key
-                )
-                self.logger.debug(f"Cleaned up file: {object_key}")
-            except Exception as e:
-                self.logger.error(f"Failed to cleanup file {object_key}: {e}")
+        try:
+            errors = await self.client.remove_objects(self.bucket_name, legacy_keys)
+            for error in errors:
+                self.logger.error(f"Failed to cleanup file {error.key}: {error.message or error.code}")
+        except Exception as e:
+            self.logger.error(f"Failed to cleanup files {legacy_keys}: {e}")
 
     async def delete_user_image(self, object_key: str) -> bool:
         """
@@ -302,13 +601,14 @@ class MinIOImageManager:
             await self.initialize()
             
         try:
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None,
-                self.client.remove_object,
-                self.bucket_name,
-                object_key
-            )
+            await self.client.remove_object(self.bucket_name, object_key)
+
+            digest = self._digest_from_object_key(object_key)
+            if digest and self.redis_client:
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.zrem(self.LAST_REF_KEY, digest)
+                pipe.delete(f"{self.REFS_KEY_PREFIX}{digest}")
+                await pipe.execute()
             
             self.logger.info(f"Successfully deleted image: {object_key}")
             return True
@@ -317,6 +617,10 @@ class MinIOImageManager:
             self.logger.error(f"Failed to delete image {object_key}: {e}")
             return False
 
+    async def close(self) -> None:
+        """Освобождение Redis клиента менеджера (пулы процесса закрываются через close_redis_pool)"""
+        self.redis_client = None
+
     def is_initialized(self) -> bool:
         """Проверка инициализации менеджера"""
         return self._initialized
@@ -29,6 +29,9 @@ class BaseVisionProvider(ABC):
     2. Реализовать метод analyze_images для анализа изображений
     3. Обеспечить graceful error handling
     """
+
+    # Максимальная сторона изображения, которую модель использует без внутреннего уменьшения
+    MAX_IMAGE_DIMENSION: int = 2048
     
     def __init__(self, provider_name: str):
         self.provider_name = provider_name
@@ -24,6 +24,9 @@ class ClaudeVisionProvider(BaseVisionProvider):
     """
     Провайдер для анализа изображений через Anthropic Claude API
     """
+
+    # Claude уменьшает изображения больше 1568px по длинной стороне
+    MAX_IMAGE_DIMENSION = 1568
     
     def __init__(self):
         super().__init__("claude")
@@ -309,6 +312,7 @@ class ClaudeVisionProvider(BaseVisionProvider):
             "max_image_size_mb": 5,        # Максимальный размер изображения
             "max_total_size_mb": 25,       # Максимальный общий размер
             "supported_formats": self.get_supported_formats(),
+            "max_image_dimension": self.MAX_IMAGE_DIMENSION,
             "max_tokens": self.max_tokens,
             "requires_base64": True        # Claude требует base64 encoding
         }
@@ -289,6 +289,7 @@ class GoogleVisionProvider(BaseVisionProvider):
             "max_images_per_request": 1,   # Google Vision обрабатывает по одному изображению
             "max_image_size_mb": 20,       # Максимальный размер изображения
             "supported_formats": self.get_supported_formats(),
+            "max_image_dimension": self.MAX_IMAGE_DIMENSION,
             "features": [
                 "label_detection",
                 "text_detection", 
@@ -247,5 +247,6 @@ class OpenAIVisionProvider(BaseVisionProvider):
             "max_image_size_mb": 20,       # Максимальный размер изображения
             "max_total_size_mb": 100,      # Максимальный общий размер
             "supported_formats": self.get_supported_formats(),
+            "max_image_dimension": self.MAX_IMAGE_DIMENSION,
             "max_tokens": self.max_tokens
         }
@@ -2,9 +2,8 @@ import asyncio
 import json
 import logging
 import os
-import signal
 import time
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Hashable
 from datetime import datetime, timezone
 from pathlib import Path
 from redis import exceptions as redis_exceptions # Added import
@@ -12,6 +11,7 @@ from redis import exceptions as redis_exceptions # Added import
 from app.core.config import settings
 from app.core.base.redis_manager import RedisClientManager
 from app.core.base.process_launcher import ProcessLauncher
+from app.core.base.process_supervisor import process_supervisor
 
 # Placeholder for actual Pydantic schemas if needed later. For now, using Dicts.
 AgentStatusInfo = Dict[str, Any]
@@ -61,10 +61,13 @@ class ProcessManager(RedisClientManager):
         start_agent_process(...): Запускает процесс агента.
         stop_agent_process(...): Останавливает процесс агента.
         restart_agent_process(...): Перезапускает процесс агента.
+        stop_agent_processes(...): Конкурентно останавливает несколько агентов.
+        restart_agent_processes(...): Конкурентно перезапускает несколько агентов.
         get_agent_status(...): Получает статус агента.
         get_all_agent_statuses(...): Получает статусы всех агентов.
         start_integration_process(...): Запускает процесс интеграции.
         stop_integration_process(...): Останавливает процесс интеграции.
+        run_concurrently(...): Выполняет операции над процессами конкурентно с ограничением.
         get_integration_status(...): Получает статус интеграции.
         get_all_integration_statuses_for_agent(...): Получает статусы всех интеграций для агента.
         get_all_integration_statuses(...): Получает статусы всех интеграций.
@@ -273,6 +276,33 @@ class ProcessManager(RedisClientManager):
         await redis_cli.delete(key)
         logger.debug(f"Deleted status key {key}")
 
+    def _make_exit_handler(self, status_key: str, identity: Dict[str, Any]) -> Callable[[int, Optional[int], bool], Awaitable[None]]:
+        """
+        Создает обработчик выхода дочернего процесса для `process_supervisor`.
+
+        Остановку, запрошенную через stop_*, оформляет сам stop_*. При неожиданном выходе
+        статус, который процесс не успел снять сам ("running", "starting", "initializing"),
+        сразу переводится в "error_process_lost" с кодом выхода. Если ключом уже владеет
+        другой PID (процесс перезапущен), статус не трогается.
+        """
+        async def _on_exit(pid: int, returncode: Optional[int], expected: bool) -> None:
+            if expected:
+                return
+            status_data = await self._get_status_from_redis(status_key)
+            if status_data.get("pid") != str(pid):
+                return
+            if status_data.get("status") not in ("running", "starting", "initializing"):
+                return
+            await self._update_status_in_redis(status_key, {
+                **identity,
+                "status": "error_process_lost",
+                "pid": "",
+                "exit_code": returncode,
+                "error_detail": f"Process {pid} exited with code {returncode}",
+            })
+            logger.warning(f"Process {pid} for {status_key} exited unexpectedly (code {returncode}). Status set to 'error_process_lost'.")
+        return _on_exit
+
     # --- Public methods for complete status deletion ---
     async def delete_agent_status_completely(self, agent_id: str):
         """
@@ -310,6 +340,7 @@ class ProcessManager(RedisClientManager):
         Получает текущий статус агента. Если агент уже остановлен, ничего не делает.
         Обновляет статус в Redis на "stopping".
         Для локальных агентов отправляет SIGTERM, затем SIGKILL (при `force=True`), если процесс не завершился.
+        Завершение ожидается по событию выхода процесса (`process_supervisor`), а не опросом PID.
         После успешной остановки обновляет статус в Redis на "stopped" и удаляет динамические поля (pid и т.д.).
 
         Args:
@@ -341,42 +372,8 @@ class ProcessManager(RedisClientManager):
             if pid_to_stop:
                 logger.info(f"Stopping agent process {agent_id} (PID: {pid_to_stop}). Force: {force}")
                 try:
-                    os.kill(pid_to_stop, signal.SIGTERM)
-                    logger.info(f"SIGTERM sent to agent {agent_id} (PID: {pid_to_stop})")
-                    
                     wait_time = getattr(settings, 'PROCESS_GRACEFUL_SHUTDOWN_TIMEOUT', DEFAULT_GRACEFUL_SHUTDOWN_TIMEOUT)
-                    for _ in range(int(wait_time / 0.1)): 
-                        await asyncio.sleep(0.1)
-                        try:
-                            os.kill(pid_to_stop, 0) # Check if process exists
-                        except ProcessLookupError:
-                            stopped_successfully = True 
-                            logger.info(f"Agent {agent_id} (PID: {pid_to_stop}) terminated gracefully after SIGTERM.")
-                            break 
-                    else: # Loop completed without break
-                        logger.warning(f"Agent {agent_id} (PID: {pid_to_stop}) did not terminate after SIGTERM within {wait_time}s.")
-                        if force:
-                            logger.info(f"Forcing kill (SIGKILL) for agent {agent_id} (PID: {pid_to_stop}).")
-                            try:
-                                os.kill(pid_to_stop, signal.SIGKILL)
-                                await asyncio.sleep(0.1) # Brief moment for SIGKILL to take effect
-                                try:
-                                    os.kill(pid_to_stop, 0) # Check if truly gone
-                                    logger.warning(f"Agent {agent_id} (PID: {pid_to_stop}) still exists after SIGKILL attempt.")
-                                    # stopped_successfully remains False
-                                except ProcessLookupError:
-                                    logger.info(f"Agent {agent_id} (PID: {pid_to_stop}) confirmed terminated after SIGKILL.")
-                                    stopped_successfully = True
-                            except ProcessLookupError: 
-                                logger.info(f"Agent {agent_id} (PID: {pid_to_stop}) was already gone before SIGKILL could be sent or checked.")
-                                stopped_successfully = True
-                            except Exception as e_sigkill:
-                                logger.error(f"Error sending SIGKILL to agent {agent_id} (PID: {pid_to_stop}): {e_sigkill}", exc_info=True)
-                        # else (not force): stopped_successfully remains False if SIGTERM failed
-                
-                except ProcessLookupError:
-                    logger.warning(f"Agent process {agent_id} (PID: {pid_to_stop}) not found (already stopped?).")
-                    stopped_successfully = True # Effectively stopped
+                    stopped_successfully = await process_supervisor.terminate(pid_to_stop, wait_time, force=force)
                 except Exception as e_kill: 
                     logger.error(f"Error stopping agent {agent_id} (PID: {pid_to_stop}): {e_kill}", exc_info=True)
 
@@ -424,6 +421,12 @@ class ProcessManager(RedisClientManager):
             bool: True, если агент успешно перезапущен, иначе False.
         """
         logger.info(f"Restarting agent process for {agent_id}...")
+        started_at = time.perf_counter()
+        restarted = await self._restart_agent_process(agent_id)
+        process_supervisor.metrics.on_restart(f"agent:{agent_id}", time.perf_counter() - started_at, restarted)
+        return restarted
+
+    async def _restart_agent_process(self, agent_id: str) -> bool:
         # Force stop, as it's a restart.
         stopped = await self.stop_agent_process(agent_id, force=True) 
         
@@ -552,6 +555,9 @@ class ProcessManager(RedisClientManager):
         except Exception as e:
             logger.error(f"Error checking integration status before start for {agent_id}/{integration_type}: {e}", exc_info=True)
 
+        if self._is_webhook_hosted(integration_type):
+            return await self._start_webhook_hosted_integration(agent_id, integration_type, status_key, integration_settings)
+
         logger.info(f"Attempting to start integration process for {agent_id}/{integration_type}...")
 
         module_path = self.integration_module_paths.get(integration_type.upper())
@@ -593,13 +599,18 @@ class ProcessManager(RedisClientManager):
                 command=cmd,
                 process_id=f"integration_start_{agent_id}_{integration_type}",
                 cwd=self.project_root,
-                env_vars=self.process_env,
+                env_vars={**self.process_env, "DB_PROCESS_ROLE": "integration"},
                 capture_output=False
             )
 
             if process_obj and process_obj.pid is not None:
                 logger.info(f"Integration process {integration_type} for agent {agent_id} initiated start with PID {process_obj.pid}")
                 await self._update_status_in_redis(status_key, {"pid": str(process_obj.pid), "integration_type": integration_type})
+                process_supervisor.watch(
+                    process_obj,
+                    name=f"integration:{agent_id}:{integration_type_for_redis_key}",
+                    on_exit=self._make_exit_handler(status_key, {"agent_id": agent_id, "integration_type": integration_type})
+                )
                 return True
             else:
                 err_msg = f"Failed to launch integration process {integration_type} for agent {agent_id} (process_obj or pid is None)."
@@ -636,6 +647,7 @@ class ProcessManager(RedisClientManager):
         Получает текущий статус интеграции. Если уже остановлена, ничего не делает.
         Обновляет статус в Redis на "stopping".
         Для локальных процессов отправляет SIGTERM, затем SIGKILL (при `force=True`), если процесс не завершился.
+        Завершение ожидается по событию выхода процесса (`process_supervisor`), а не опросом PID.
         После успешной остановки обновляет статус в Redis на "stopped" и удаляет динамические поля.
 
         Args:
@@ -673,43 +685,14 @@ class ProcessManager(RedisClientManager):
         stopped_successfully = False
 
         try:
-            if pid_to_stop is not None:
+            if self._is_webhook_hosted(integration_type):
+                # The bot shares the manager process with others: never signal the PID
+                stopped_successfully = await self._stop_webhook_hosted_integration(agent_id, integration_type, status_key)
+            elif pid_to_stop is not None:
                 logger.info(f"Stopping integration {integration_type} for agent {agent_id} (PID: {pid_to_stop}). Force: {force}")
                 try:
-                    os.kill(pid_to_stop, signal.SIGTERM) 
-                    logger.info(f"SIGTERM sent to integration {integration_type} (PID: {pid_to_stop}) for agent {agent_id}")
-                    
                     wait_time = getattr(settings, 'PROCESS_GRACEFUL_SHUTDOWN_TIMEOUT', DEFAULT_GRACEFUL_SHUTDOWN_TIMEOUT)
-                    for _ in range(int(wait_time / 0.1)): 
-                        await asyncio.sleep(0.1)
-                        try:
-                            os.kill(pid_to_stop, 0)
-                        except ProcessLookupError:
-                            stopped_successfully = True 
-                            logger.info(f"Integration {integration_type} (PID: {pid_to_stop}) for agent {agent_id} terminated gracefully after SIGTERM.")
-                            break 
-                    else: 
-                        logger.warning(f"Integration {integration_type} (PID: {pid_to_stop}) for agent {agent_id} did not terminate after SIGTERM within {wait_time}s.")
-                        if force:
-                            logger.info(f"Forcing kill (SIGKILL) for integration {integration_type} (PID: {pid_to_stop}) for agent {agent_id}.")
-                            try:
-                                os.kill(pid_to_stop, signal.SIGKILL)
-                                await asyncio.sleep(0.1) 
-                                try:
-                                    os.kill(pid_to_stop, 0)
-                                    logger.warning(f"Integration {integration_type} (PID: {pid_to_stop}) for agent {agent_id} still exists after SIGKILL attempt.")
-                                except ProcessLookupError:
-                                    logger.info(f"Integration {integration_type} (PID: {pid_to_stop}) for agent {agent_id} confirmed terminated after SIGKILL.")
-                                    stopped_successfully = True
-                            except ProcessLookupError: 
-                                logger.info(f"Integration {integration_type} (PID: {pid_to_stop}) for agent {agent_id} was already gone before SIGKILL could be sent or confirmed.")
-                                stopped_successfully = True
-                            except Exception as e_sigkill:
-                                logger.error(f"Error sending SIGKILL to integration {integration_type} (PID: {pid_to_stop}) for agent {agent_id}: {e_sigkill}", exc_info=True)
-                
-                except ProcessLookupError: 
-                    logger.warning(f"Integration process {integration_type} for agent {agent_id} (PID: {pid_to_stop}) not found (already stopped?).")
-                    stopped_successfully = True 
+                    stopped_successfully = await process_supervisor.terminate(pid_to_stop, wait_time, force=force)
                 except Exception as e_kill: 
                     logger.error(f"Error stopping integration {integration_type} for agent {agent_id} (PID: {pid_to_stop}): {e_kill}", exc_info=True)
             
@@ -753,9 +736,76 @@ class ProcessManager(RedisClientManager):
                  })
             return False
 
+    def _is_webhook_hosted(self, integration_type: IntegrationTypeStr) -> bool:
+        """Telegram-боты в режиме webhook работают внутри процесса менеджера, а не отдельным процессом."""
+        return integration_type.upper() == "TELEGRAM" and settings.TELEGRAM_WEBHOOK_ENABLED
+
+    async def _start_webhook_hosted_integration(self, agent_id: str, integration_type: IntegrationTypeStr, status_key: str, integration_settings: Optional[Dict[str, Any]]) -> bool:
+        """
+        Запускает бота в хосте webhook-ботов командой через Redis.
+
+        Returns:
+            bool: True, если команду получил хотя бы один хост, иначе False.
+        """
+        logger.info(f"Requesting webhook host to start {integration_type} for agent {agent_id}...")
+        await self._update_status_in_redis(status_key, {
+            "status": "starting",
+            "agent_id": agent_id,
+            "integration_type": integration_type,
+            "start_attempt_utc": datetime.now(timezone.utc).isoformat(),
+            "last_active": str(time.time())
+        })
+        from app.integrations.telegram.telegram_webhook_host import publish_telegram_webhook_command
+        try:
+            redis_cli = await self.redis_client
+            receivers = await publish_telegram_webhook_command(redis_cli, "start", agent_id, integration_settings)
+        except (RuntimeError, redis_exceptions.RedisError) as e:
+            logger.error(f"Failed to send start command to webhook host for {agent_id}/{integration_type}: {e}", exc_info=True)
+            receivers = 0
+        if not receivers:
+            err_msg = "Telegram webhook host is not running"
+            logger.error(f"{err_msg}. Cannot start {integration_type} for agent {agent_id}.")
+            await self._update_status_in_redis(status_key, {
+                "status": "error_start_failed",
+                "error_detail": err_msg,
+                "agent_id": agent_id,
+                "integration_type": integration_type
+            })
+            return False
+        return True
+
+    async def _stop_webhook_hosted_integration(self, agent_id: str, integration_type: IntegrationTypeStr, status_key: str) -> bool:
+        """
+        Останавливает бота в хосте webhook-ботов и ждёт подтверждения остановки от лидера хоста.
+
+        Returns:
+            bool: True, если бот остановлен (или хост не запущен), иначе False.
+        """
+        from app.integrations.telegram.telegram_webhook_host import stop_telegram_webhook_bot
+        wait_time = getattr(settings, 'PROCESS_GRACEFUL_SHUTDOWN_TIMEOUT', DEFAULT_GRACEFUL_SHUTDOWN_TIMEOUT)
+        try:
+            redis_cli = await self.redis_client
+            # Хост сам отменяет бота, не остановившегося за wait_time; запас - на отправку подтверждения
+            stopped = await stop_telegram_webhook_bot(redis_cli, agent_id, timeout=wait_time + 1.0)
+        except (RuntimeError, redis_exceptions.RedisError) as e:
+            logger.error(f"Failed to send stop command to webhook host for {agent_id}/{integration_type}: {e}", exc_info=True)
+            return False
+        if stopped:
+            logger.info(f"Webhook-hosted {integration_type} for agent {agent_id} stopped.")
+        else:
+            logger.warning(f"Webhook-hosted {integration_type} for agent {agent_id} did not confirm stop within {wait_time}s.")
+        return stopped
+
     async def restart_integration_process(self, agent_id: str, integration_type: IntegrationTypeStr, integration_settings: Optional[Dict[str, Any]] = None) -> bool:
         logger.info(f"Restarting integration {integration_type} for agent {agent_id}...")
-        
+        started_at = time.perf_counter()
+        restarted = await self._restart_integration_process(agent_id, integration_type, integration_settings)
+        process_supervisor.metrics.on_restart(
+            f"integration:{agent_id}:{integration_type.lower()}", time.perf_counter() - started_at, restarted
+        )
+        return restarted
+
+    async def _restart_integration_process(self, agent_id: str, integration_type: IntegrationTypeStr, integration_settings: Optional[Dict[str, Any]]) -> bool:
         stopped = await self.stop_integration_process(agent_id, integration_type, force=True) 
         
         if not stopped:
@@ -788,6 +838,49 @@ class ProcessManager(RedisClientManager):
             )
             return False
 
+    # --- Bulk operations ---
+    async def run_concurrently(self, operations: Dict[Hashable, Callable[[], Awaitable[bool]]]) -> Dict[Hashable, bool]:
+        """
+        Выполняет операции над процессами конкурентно.
+
+        Одновременно выполняется не больше `settings.PROCESS_BULK_CONCURRENCY` операций,
+        чтобы массовый перезапуск не запускал десятки интерпретаторов разом.
+        Исключение операции логируется и считается неуспехом.
+
+        Args:
+            operations (Dict[Hashable, Callable[[], Awaitable[bool]]]): Ключ -> фабрика корутины операции.
+
+        Returns:
+            Dict[Hashable, bool]: Результат каждой операции по ее ключу.
+        """
+        semaphore = asyncio.Semaphore(max(1, settings.PROCESS_BULK_CONCURRENCY))
+
+        async def _run(key: Hashable, operation: Callable[[], Awaitable[bool]]) -> bool:
+            async with semaphore:
+                try:
+                    return await operation()
+                except Exception as e:
+                    logger.error(f"Bulk process operation for {key} failed: {e}", exc_info=True)
+                    return False
+
+        keys = list(operations)
+        results = await asyncio.gather(*(_run(key, operations[key]) for key in keys))
+        return dict(zip(keys, results))
+
+    async def stop_agent_processes(self, agent_ids: List[str], force: bool = False) -> Dict[str, bool]:
+        """Конкурентно останавливает процессы нескольких агентов (см. `stop_agent_process`)."""
+        return await self.run_concurrently({
+            agent_id: (lambda agent_id=agent_id: self.stop_agent_process(agent_id, force=force))
+            for agent_id in agent_ids
+        })
+
+    async def restart_agent_processes(self, agent_ids: List[str]) -> Dict[str, bool]:
+        """Конкурентно перезапускает процессы нескольких агентов (см. `restart_agent_process`)."""
+        return await self.run_concurrently({
+            agent_id: (lambda agent_id=agent_id: self.restart_agent_process(agent_id))
+            for agent_id in agent_ids
+        })
+
     async def get_agent_status(self, agent_id: str) -> AgentStatusInfo:
         """
         Получает информацию о статусе для указанного агента.
@@ -906,13 +999,18 @@ class ProcessManager(RedisClientManager):
                 command=cmd,
                 process_id=f"agent_start_{agent_id}", # Unique ID for launcher
                 cwd=self.project_root,
-                env_vars=self.process_env,
+                env_vars={**self.process_env, "DB_PROCESS_ROLE": "runner"},
                 capture_output=False # Agent runner handles its own logging
             )
 
             if process_obj and process_obj.pid is not None:
                 logger.info(f"Agent process {agent_id} initiated start with PID {process_obj.pid}")
                 await self._update_status_in_redis(status_key, {"pid": str(process_obj.pid)})
+                process_supervisor.watch(
+                    process_obj,
+                    name=f"agent:{agent_id}",
+                    on_exit=self._make_exit_handler(status_key, {"agent_id": agent_id})
+                )
                 # Status will be updated to "running" by the agent runner itself via StatusUpdater
                 return True
             else:
@@ -944,12 +1042,17 @@ class ProcessManager(RedisClientManager):
             command=cmd,
             process_id=f"agent_{agent_id}",
             cwd=self.project_root,
-            env_vars=self.process_env,
+            env_vars={**self.process_env, "DB_PROCESS_ROLE": "runner"},
             capture_output=False
         )
         
         if process_obj and process_obj.pid:
             logger.info(f"Successfully started agent process for {agent_id} with PID {process_obj.pid}. Command: {' '.join(cmd)}")
+            process_supervisor.watch(
+                process_obj,
+                name=f"agent:{agent_id}",
+                on_exit=self._make_exit_handler(self.agent_status_key_template.format(agent_id), {"agent_id": agent_id})
+            )
             return process_obj.pid
         else:
             logger.error(f"Failed to start agent process for {agent_id}. Command: {' '.join(cmd)}")
@@ -1,80 +1,417 @@
+"""
+Единый для процесса провайдер соединений Redis
+
+Все потребители процесса (API зависимости, компоненты через RedisClientManager,
+голосовые сервисы, кэши) получают клиентов из общих пулов:
+
+- пул команд ограничен REDIS_MAX_CONNECTIONS, при исчерпании запрос ждет
+  свободное соединение до REDIS_POOL_TIMEOUT секунд;
+- подписки Pub/Sub мультиплексируются: все подписки процесса
+  (`get_pubsub_redis().pubsub()`) делят одно соединение PubSubMultiplexer,
+  который подписывается на канал один раз и раздает сообщения подписчикам.
+  Число соединений для подписок поэтому не зависит от числа ботов, SSE и
+  WebSocket клиентов; соединение мультиплексора берется из отдельного пула
+  (REDIS_PUBSUB_MAX_CONNECTIONS) и не отнимает соединения у команд.
+
+Режим decode_responses задается на уровне соединения, поэтому для клиентов,
+работающих с bytes и со str, ведутся отдельные пулы (создаются по первому запросу).
+Выдача соединений, ожидания и время выполнения команд считаются в RedisPoolMetrics.
+"""
+
+import asyncio
 import logging
-from typing import Optional
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple, Union
+
 import redis.asyncio as redis # Используем redis.asyncio
 from redis.exceptions import ConnectionError as RedisConnectionError # Добавлено
+from redis.exceptions import RedisError
 
 from app.core.config import settings # Стало: импортируем settings
 
 logger = logging.getLogger(__name__)
 
-_redis_pool: Optional[redis.ConnectionPool] = None
+POOL_KIND_COMMANDS = "commands"
+POOL_KIND_PUBSUB = "pubsub"
+
+
+class RedisPoolMetrics:
+    """Счетчики выдачи соединений и выполнения команд одного пула."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.commands = 0
+        self.command_errors = 0
+        self.total_command_seconds = 0.0
+        self.max_command_seconds = 0.0
+
+    def on_checkout(self, wait_seconds: float) -> None:
+        self.checkouts += 1
+        # Выдача без ожидания занимает микросекунды; все, что дольше миллисекунды - ожидание свободного соединения
+        if wait_seconds > 0.001:
+            self.waits += 1
+        self.total_wait_seconds += wait_seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def on_command(self, seconds: float, failed: bool) -> None:
+        self.commands += 1
+        if failed:
+            self.command_errors += 1
+        self.total_command_seconds += seconds
+        self.max_command_seconds = max(self.max_command_seconds, seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "wait_timeouts": self.wait_timeouts,
+            "avg_wait_seconds": self.total_wait_seconds / self.checkouts if self.checkouts else 0.0,
+            "max_wait_seconds": self.max_wait_seconds,
+            "commands": self.commands,
+            "command_errors": self.command_errors,
+            "avg_command_seconds": self.total_command_seconds / self.commands if self.commands else 0.0,
+            "max_command_seconds": self.max_command_seconds,
+        }
+
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """Ограниченный пул, учитывающий выдачу соединений и ожидание свободного."""
+
+    def __init__(self, metrics: RedisPoolMetrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+
+    async def get_connection(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            connection = await super().get_connection(*args, **kwargs)
+        except RedisConnectionError:
+            # BlockingConnectionPool сообщает об истечении timeout ожидания через ConnectionError
+            if time.perf_counter() - started >= self.timeout:
+                self.metrics.wait_timeouts += 1
+            raise
+        self.metrics.on_checkout(time.perf_counter() - started)
+        return connection
+
+    def utilization(self) -> Dict[str, Any]:
+        in_use = len(getattr(self, "_in_use_connections", ()))
+        return {
+            "max_connections": self.max_connections,
+            "in_use": in_use,
+            "idle": len(getattr(self, "_available_connections", ())),
+            "utilization": in_use / self.max_connections if self.max_connections else 0.0,
+        }
+
+
+class InstrumentedRedis(redis.Redis):
+    """Клиент Redis, замеряющий время выполнения каждой команды."""
+
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await super().execute_command(*args, **options)
+            failed = False
+            return result
+        finally:
+            metrics = getattr(self.connection_pool, "metrics", None)
+            if metrics is not None:
+                metrics.on_command(time.perf_counter() - started, failed)
+
+
+def _channel_name(channel: Union[str, bytes]) -> str:
+    return channel.decode("utf-8") if isinstance(channel, bytes) else channel
+
+
+class SharedPubSub:
+    """
+    Подписка на каналы через общее соединение процесса (PubSubMultiplexer).
+
+    Повторяет используемую часть интерфейса redis.asyncio PubSub: subscribe(),
+    unsubscribe(), listen(), get_message() и aclose(). Подписчику передаются
+    только сообщения (type == "message"); при обрыве общего соединения ошибка
+    Redis поднимается из listen()/get_message(), как у собственной подписки.
+    """
+
+    def __init__(self, multiplexer: "PubSubMultiplexer"):
+        self._multiplexer = multiplexer
+        self.channels: Set[str] = set()
+        # Сообщения, ошибки соединения и None - сигнал пробуждения после отписки
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    @property
+    def subscribed(self) -> bool:
+        return bool(self.channels)
+
+    async def subscribe(self, *channels: Union[str, bytes]) -> None:
+        names = [_channel_name(c) for c in channels]
+        await self._multiplexer.subscribe(self, names)
+        self.channels.update(names)
+
+    async def unsubscribe(self, *channels: Union[str, bytes]) -> None:
+        names = [_channel_name(c) for c in channels] if channels else list(self.channels)
+        self.channels.difference_update(names)
+        if not self.channels:
+            self._queue.put_nowait(None)
+        await self._multiplexer.unsubscribe(self, names)
+
+    async def aclose(self) -> None:
+        await self.unsubscribe()
+
+    def _deliver(self, item: Union[Dict[str, Any], BaseException]) -> None:
+        self._queue.put_nowait(item)
+
+    async def get_message(self, ignore_subscribe_messages: bool = False,
+                          timeout: Optional[float] = 0.0) -> Optional[Dict[str, Any]]:
+        """Следующее сообщение; None, если за timeout секунд ничего не пришло (None - ждать без ограничения)."""
+        try:
+            if timeout is None:
+                item = await self._queue.get()
+            elif timeout <= 0:
+                item = self._queue.get_nowait()
+            else:
+                async with asyncio.timeout(timeout):
+                    item = await self._queue.get()
+        except (asyncio.QueueEmpty, TimeoutError):
+            return None
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    async def listen(self) -> AsyncIterator[Dict[str, Any]]:
+        """Сообщения подписки; итератор завершается после отписки от всех каналов."""
+        while self.channels:
+            message = await self.get_message(timeout=None)
+            if message is not None:
+                yield message
+
+
+class PubSubMultiplexer:
+    """
+    Одно соединение Pub/Sub на процесс (для каждого режима decode_responses).
+
+    Подписка на канал в Redis выполняется при появлении первого подписчика и
+    снимается после ухода последнего. Фоновая задача читает сообщения и кладет
+    их в очереди подписчиков. При обрыве соединения подписчики получают ошибку
+    (и сами решают, что делать с возможно пропущенными сообщениями), а
+    мультиплексор переподключается и восстанавливает подписки на каналы.
+    """
+
+    def __init__(self, client: redis.Redis):
+        self._client = client
+        self._pubsub: Optional[Any] = None
+        self._subscribers: Dict[str, Set[SharedPubSub]] = {}
+        self._lock = asyncio.Lock()
+        self._reader: Optional[asyncio.Task] = None
+
+    def _new_pubsub(self) -> Any:
+        return redis.Redis.pubsub(self._client)
+
+    async def subscribe(self, subscriber: SharedPubSub, channels: List[str]) -> None:
+        async with self._lock:
+            new_channels = [c for c in dict.fromkeys(channels) if c not in self._subscribers]
+            if new_channels:
+                if self._pubsub is None:
+                    self._pubsub = self._new_pubsub()
+                await self._pubsub.subscribe(*new_channels)
+            for channel in channels:
+                self._subscribers.setdefault(channel, set()).add(subscriber)
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.create_task(self._read_loop(), name="RedisPubSubMultiplexer")
+
+    async def unsubscribe(self, subscriber: SharedPubSub, channels: List[str]) -> None:
+        async with self._lock:
+            released = []
+            for channel in channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[channel]
+                    released.append(channel)
+            if released and self._pubsub is not None:
+                try:
+                    await self._pubsub.unsubscribe(*released)
+                except RedisError as e:
+                    # После переподключения восстанавливаются только каналы с подписчиками
+                    logger.warning(f"Failed to unsubscribe shared Pub/Sub from {released}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "channels": len(self._subscribers),
+            "subscriptions": sum(len(s) for s in self._subscribers.values()),
+        }
+
+    async def _read_loop(self) -> None:
+        # Чтение блокируется до прихода данных: отписка последнего подписчика будит его
+        # подтверждением unsubscribe, а close() отменяет задачу
+        while self._subscribers:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+            except (RedisError, OSError) as e:
+                logger.warning(f"Shared Pub/Sub connection error: {e}. Resubscribing {len(self._subscribers)} channels.")
+                for subscribers in list(self._subscribers.values()):
+                    for subscriber in subscribers:
+                        subscriber._deliver(e)
+                await self._reconnect()
+                continue
+            if not message or message.get("type") != "message":
+                continue
+            for subscriber in list(self._subscribers.get(_channel_name(message["channel"]), ())):
+                subscriber._deliver(message)
+
+    async def _reconnect(self) -> None:
+        async with self._lock:
+            await self._close_pubsub()
+        delay = settings.REDIS_RECONNECT_INTERVAL
+        while True:
+            await asyncio.sleep(delay)
+            async with self._lock:
+                if not self._subscribers:
+                    return
+                if self._pubsub is None:
+                    self._pubsub = self._new_pubsub()
+                try:
+                    await self._pubsub.subscribe(*self._subscribers)
+                    return
+                except (RedisError, OSError) as e:
+                    logger.warning(f"Shared Pub/Sub resubscribe failed: {e}. Retrying in {delay}s.")
+                    await self._close_pubsub()
+            delay = min(delay * 2, settings.REDIS_RECONNECT_MAX_INTERVAL)
+
+    async def _close_pubsub(self) -> None:
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+            self._pubsub = None
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+        await self._close_pubsub()
+
+
+class MultiplexedRedis(InstrumentedRedis):
+    """Клиент пула Pub/Sub: `pubsub()` возвращает подписку на общем соединении процесса."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.multiplexer = PubSubMultiplexer(self)
+
+    def pubsub(self, **kwargs) -> SharedPubSub:
+        return SharedPubSub(self.multiplexer)
+
+
+# (вид пула, decode_responses) -> пул и его клиент
+_pools: Dict[Tuple[str, bool], InstrumentedConnectionPool] = {}
+_clients: Dict[Tuple[str, bool], InstrumentedRedis] = {}
+
+
+def _create_pool(kind: str, decode_responses: bool) -> InstrumentedConnectionPool:
+    max_connections = settings.REDIS_PUBSUB_MAX_CONNECTIONS if kind == POOL_KIND_PUBSUB else settings.REDIS_MAX_CONNECTIONS
+    pool = InstrumentedConnectionPool.from_url(
+        str(settings.REDIS_URL),
+        metrics=RedisPoolMetrics(),
+        max_connections=max_connections,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        decode_responses=decode_responses,
+        socket_keepalive=settings.REDIS_SOCKET_KEEPALIVE,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+    )
+    logger.info(f"Redis {kind} pool created (decode_responses={decode_responses}, max_connections={max_connections}).")
+    return pool
+
+
+def _get_client(kind: str, decode_responses: bool) -> InstrumentedRedis:
+    key = (kind, decode_responses)
+    client = _clients.get(key)
+    if client is None:
+        pool = _create_pool(kind, decode_responses)
+        _pools[key] = pool
+        client_class = MultiplexedRedis if kind == POOL_KIND_PUBSUB else InstrumentedRedis
+        client = client_class(connection_pool=pool)
+        _clients[key] = client
+    return client
+
+
+def get_redis(decode_responses: bool = True) -> redis.Redis:
+    """
+    Общий клиент для команд. Экземпляр безопасен для конкурентного использования
+    и не должен закрываться потребителями: пул закрывается через close_redis_pool().
+    """
+    return _get_client(POOL_KIND_COMMANDS, decode_responses)
+
+
+def get_pubsub_redis(decode_responses: bool = True) -> redis.Redis:
+    """
+    Общий клиент для подписок: `get_pubsub_redis().pubsub()` возвращает подписку
+    на общем соединении Pub/Sub процесса (SharedPubSub).
+    """
+    return _get_client(POOL_KIND_PUBSUB, decode_responses)
+
 
 async def init_redis_pool() -> Optional[redis.ConnectionPool]:
-    """Инициализирует пул соединений Redis и возвращает его."""
-    global _redis_pool
-    if (_redis_pool):
-        logger.info("Redis connection pool already initialized.")
-        return _redis_pool
+    """Инициализирует пул соединений Redis (str ответы) и проверяет соединение."""
     try:
-        _redis_pool = redis.ConnectionPool.from_url(settings.REDIS_URL, decode_responses=True) # Стало: используем settings.REDIS_URL
-        # Тестируем соединение
-        client = redis.Redis.from_pool(_redis_pool)
+        client = get_redis()
         await client.ping()
-        await client.close() # Закрываем тестовый клиент, пул остается
         logger.info("Redis connection pool initialized successfully.")
-        return _redis_pool
+        return client.connection_pool
     except RedisConnectionError as e: # Изменено: используется импортированный RedisConnectionError
         logger.error(f"Failed to connect to Redis: {e}", exc_info=True)
-        _redis_pool = None # Сбрасываем пул в случае ошибки
         # В реальном приложении здесь может быть более строгая обработка,
         # например, FastAPI может не стартовать.
         return None
     except Exception as e:
         logger.error(f"An unexpected error occurred during Redis pool initialization: {e}", exc_info=True)
-        _redis_pool = None
         return None
 
 async def close_redis_pool():
-    """Закрывает пул соединений Redis."""
-    global _redis_pool
-    if (_redis_pool):
+    """Закрывает все пулы соединений Redis процесса."""
+    if not _pools:
+        logger.info("Redis connection pool was not initialized or already closed.")
+        return
+    for client in _clients.values():
+        if isinstance(client, MultiplexedRedis):
+            await client.multiplexer.close()
+    for key, pool in list(_pools.items()):
         try:
-            await _redis_pool.disconnect()
-            logger.info("Redis connection pool closed successfully.")
+            await pool.disconnect()
+            logger.info(f"Redis {key[0]} pool (decode_responses={key[1]}) closed successfully.")
         except Exception as e:
-            logger.error(f"Error closing Redis connection pool: {e}", exc_info=True)
-        finally:
-            _redis_pool = None
-    else:
-        logger.info("Redis connection pool was not initialized or already closed.")
+            logger.error(f"Error closing Redis connection pool {key}: {e}", exc_info=True)
+    _pools.clear()
+    _clients.clear()
 
 def get_redis_pool() -> Optional[redis.ConnectionPool]:
-    """Возвращает существующий пул соединений Redis."""
-    if not _redis_pool:
+    """Возвращает существующий пул соединений Redis для команд (str ответы)."""
+    pool = _pools.get((POOL_KIND_COMMANDS, True))
+    if not pool:
         logger.warning("Redis pool accessed before initialization or after closure.")
-    return _redis_pool
+    return pool
 
 async def get_redis_client() -> redis.Redis: # Changed redis.asyncio.Redis to redis.Redis
-    """
-    FastAPI dependency that provides a Redis client instance configured with the global pool.
-    The pool (redis_pool) must be initialized beforehand (e.g., during app startup).
-    """
-    pool = get_redis_pool() # ИЗМЕНЕНО: убран await, так как get_redis_pool() синхронная
-    # Create a new client instance using the connection pool.
-    # Connections are managed by the client/pool automatically.
-    return redis.Redis(connection_pool=pool)
-
-# Можно добавить другие функции для работы с Redis, если это необходимо,
-# например, для публикации сообщений, работы с очередями и т.д.,
-# чтобы инкапсулировать эту логику здесь.
-# Пример:
-# async def publish_message(channel: str, message: str):
-#     if not _redis_pool:
-#         logger.error("Cannot publish message: Redis pool not available.")
-#         return
-#     try:
-#         client = redis.Redis.from_pool(_redis_pool)
-#         await client.publish(channel, message)
-#         await client.close()
-#     except Exception as e:
-#         logger.error(f"Error publishing Redis message to {channel}: {e}", exc_info=True)
+    """Общий клиент Redis процесса для команд (str ответы)."""
+    return get_redis()
+
+def get_redis_pool_metrics() -> Dict[str, Any]:
+    """Заполненность пулов и счетчики соединений/команд текущего процесса."""
+    metrics = {}
+    for (kind, decode_responses), pool in _pools.items():
+        client = _clients.get((kind, decode_responses))
+        multiplexer_stats = client.multiplexer.stats() if isinstance(client, MultiplexedRedis) else {}
+        metrics[f"{kind}:{'str' if decode_responses else 'bytes'}"] = {
+            **pool.utilization(),
+            **pool.metrics.snapshot(),
+            **multiplexer_stats,
+        }
+    return metrics
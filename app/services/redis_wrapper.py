@@ -5,7 +5,7 @@
 import logging
 from typing import Optional, Any
 import redis.asyncio as redis
-from app.services.redis_service import init_redis_pool, close_redis_pool, _redis_pool
+from app.services.redis_service import get_redis
 
 class RedisService:
     """Простая обертка Redis сервиса для совместимости с голосовыми сервисами"""
@@ -13,30 +13,21 @@ class RedisService:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.client: Optional[redis.Redis] = None
-        self._pool: Optional[redis.ConnectionPool] = None
 
     async def initialize(self) -> None:
-        """Инициализация Redis клиента"""
+        """Инициализация Redis клиента (общий пул процесса)"""
         try:
-            self._pool = await init_redis_pool()
-            if self._pool:
-                self.client = redis.Redis.from_pool(self._pool)
-                await self.client.ping()
-                self.logger.info("Redis service initialized")
-            else:
-                raise RuntimeError("Failed to initialize Redis pool")
+            self.client = get_redis()
+            await self.client.ping()
+            self.logger.info("Redis service initialized")
         except Exception as e:
             self.logger.error(f"Failed to initialize Redis service: {e}")
+            self.client = None
             raise
 
     async def cleanup(self) -> None:
-        """Очистка ресурсов"""
-        if self.client:
-            await self.client.close()
-            self.client = None
-        if self._pool:
-            await close_redis_pool()
-            self._pool = None
+        """Очистка ресурсов: общий пул процесса не закрывается, закрывает его close_redis_pool()"""
+        self.client = None
         self.logger.info("Redis service cleaned up")
 
     async def get(self, key: str) -> Optional[str]:
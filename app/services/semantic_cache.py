@@ -0,0 +1,402 @@
+"""
+Семантический кэш ответов агента.
+
+Агенты-FAQ получают один и тот же вопрос в разных формулировках, и каждый раз
+граф проходит агент, поиск по базе знаний, оценку документов и генерацию.
+Кэш стоит перед вызовом графа в AgentRunner и включается для агента настройкой
+config.simple.settings.semanticCache:
+
+- вопрос нормализуется (регистр, пунктуация, пробелы); точное совпадение
+  нормализованного текста находится без обращения к модели эмбеддингов;
+- иначе вопрос векторизуется и ищется ближайший сохраненный вопрос
+  в индексе в памяти процесса; ответ возвращается, если косинусная близость
+  не ниже порога;
+- сохраняются только ответы, для которых граф не вызывал инструменты, кроме
+  поиска по базам знаний: ответы инструментов (API, веб-поиск, данные
+  пользователя) зависят от пользователя и момента запроса;
+- кэш общий для всех тредов агента, поэтому он используется только для
+  вопросов без контекста: если граф увидит предыдущие сообщения треда
+  (включена память контекста и тред не пустой), вопрос идет в граф в обход
+  кэша и ответ не сохраняется - ответ на уточняющий вопрос одного чата
+  не должен попасть в другой;
+- вопросы авторизованных пользователей и пользователей с профилем в user_data
+  идут в граф в обход кэша: ответ может содержать их данные;
+- записи живут TTL секунд, число записей ограничено (вытесняются давно
+  не использованные).
+
+Каждый процесс AgentRunner обслуживает одного агента, поэтому кэш изначально
+привязан к агенту. Изменение конфигурации перезапускает процесс агента
+и сбрасывает кэш; для изменения базы знаний (пересинхронизация источников)
+служит канал SEMANTIC_CACHE_INVALIDATION_CHANNEL. Счетчики кэша процесс
+сохраняет в Redis (SEMANTIC_CACHE_METRICS_KEY_PREFIX), API собирает их
+в /metrics/semantic-cache.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import redis.asyncio as redis
+from redis import exceptions as redis_exceptions
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_INVALIDATION_CHANNEL = "semantic_cache:invalidate"
+SEMANTIC_CACHE_METRICS_KEY_PREFIX = "semantic_cache:metrics:"
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    """Приводит вопрос к виду, в котором сравниваются формулировки."""
+    text = text.lower().replace("ё", "е")
+    text = _PUNCTUATION_RE.sub(" ", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def config_fingerprint(agent_settings: Dict[str, Any]) -> str:
+    """Отпечаток настроек агента (модель, промпт, инструменты и их базы знаний)."""
+    raw = json.dumps(agent_settings or {}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class InMemoryVectorIndex:
+    """
+    Индекс нормированных векторов в памяти процесса.
+
+    Поиск - скалярное произведение запроса со всей матрицей: при тысячах
+    записей это доли миллисекунды и не требует внешнего векторного хранилища.
+    """
+
+    def __init__(self):
+        self._keys: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @staticmethod
+    def _normalize(vector: Iterable[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(array))
+        return array / norm if norm else array
+
+    def add(self, key: str, vector: Iterable[float]) -> None:
+        """Добавляет или заменяет вектор ключа."""
+        array = self._normalize(vector)
+        if key in self._positions:
+            self._matrix[self._positions[key]] = array
+            return
+        size = len(self._keys)
+        if self._matrix is None:
+            self._matrix = np.empty((16, array.shape[0]), dtype=np.float32)
+        elif array.shape[0] != self._matrix.shape[1]:
+            raise ValueError(f"Vector dimension {array.shape[0]} does not match index dimension {self._matrix.shape[1]}.")
+        elif size == self._matrix.shape[0]:
+            grown = np.empty((size * 2, self._matrix.shape[1]), dtype=np.float32)
+            grown[:size] = self._matrix[:size]
+            self._matrix = grown
+        self._matrix[size] = array
+        self._positions[key] = size
+        self._keys.append(key)
+
+    def remove(self, key: str) -> None:
+        """Удаляет ключ; на его место переносится последняя строка матрицы."""
+        position = self._positions.pop(key, None)
+        if position is None:
+            return
+        last = len(self._keys) - 1
+        if position != last:
+            moved_key = self._keys[last]
+            self._matrix[position] = self._matrix[last]
+            self._keys[position] = moved_key
+            self._positions[moved_key] = position
+        self._keys.pop()
+
+    def search(self, vector: Iterable[float]) -> Optional[Tuple[str, float]]:
+        """Ближайший ключ и его косинусная близость к запросу (None для пустого индекса)."""
+        if not self._keys:
+            return None
+        query = self._normalize(vector)
+        if query.shape[0] != self._matrix.shape[1]:
+            return None
+        scores = self._matrix[:len(self._keys)] @ query
+        best = int(np.argmax(scores))
+        return self._keys[best], float(scores[best])
+
+    def clear(self) -> None:
+        self._keys.clear()
+        self._positions.clear()
+        self._matrix = None
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    expires_at: float
+    hits: int = 0
+
+
+@dataclass
+class CacheLookup:
+    """Результат поиска; при промахе передается в store, чтобы не векторизовать вопрос повторно."""
+    normalized: str
+    vector: Optional[List[float]] = None
+    entry: Optional[CachedAnswer] = None
+    similarity: Optional[float] = None
+
+
+class SemanticAnswerCache:
+    """
+    Кэш ответов одного агента: записи по нормализованному вопросу (LRU)
+    и индекс их эмбеддингов.
+    """
+
+    def __init__(self,
+                 agent_id: str,
+                 embeddings: Any,
+                 similarity_threshold: Optional[float] = None,
+                 ttl_seconds: Optional[int] = None,
+                 max_entries: Optional[int] = None,
+                 fingerprint: str = "",
+                 knowledge_base_ids: Optional[Iterable[str]] = None,
+                 logger: Optional[logging.Logger] = None):
+        self.agent_id = agent_id
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold if similarity_threshold is not None else settings.SEMANTIC_CACHE_SIMILARITY_THRESHOLD
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.SEMANTIC_CACHE_TTL
+        self.max_entries = max_entries if max_entries is not None else settings.SEMANTIC_CACHE_MAX_ENTRIES
+        self.fingerprint = fingerprint
+        self.knowledge_base_ids = {str(kb_id) for kb_id in knowledge_base_ids or []}
+        self.logger = logger or logging.getLogger(__name__)
+        # normalized question -> запись; порядок - от давно использованных к недавним
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        self._index = InMemoryVectorIndex()
+        # Увеличивается при каждой инвалидации, входит в снимок метрик
+        self.generation = 0
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+        self.bypasses: Dict[str, int] = {}
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.embedding_errors = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, normalized: str) -> None:
+        self._entries.pop(normalized, None)
+        self._index.remove(normalized)
+
+    def _get_fresh(self, normalized: str) -> Optional[CachedAnswer]:
+        entry = self._entries.get(normalized)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._drop(normalized)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(normalized)
+        return entry
+
+    async def _embed(self, normalized: str) -> Optional[List[float]]:
+        try:
+            return await self.embeddings.aembed_query(normalized)
+        except Exception as e:
+            self.embedding_errors += 1
+            self.logger.warning(f"Semantic cache embedding failed, treating as miss: {e}")
+            return None
+
+    async def lookup(self, question: str) -> CacheLookup:
+        """
+        Ищет ответ на вопрос: сначала точное совпадение нормализованного текста,
+        затем ближайший по эмбеддингу вопрос не ниже порога близости.
+        """
+        result = CacheLookup(normalized=normalize_question(question))
+        entry = self._get_fresh(result.normalized)
+        if entry is not None:
+            entry.hits += 1
+            self.hits_exact += 1
+            result.entry, result.similarity = entry, 1.0
+            return result
+
+        result.vector = await self._embed(result.normalized)
+        if result.vector is not None:
+            found = self._index.search(result.vector)
+            if found is not None and found[1] >= self.similarity_threshold:
+                entry = self._get_fresh(found[0])
+                if entry is not None:
+                    entry.hits += 1
+                    self.hits_semantic += 1
+                    result.entry, result.similarity = entry, found[1]
+                    return result
+
+        self.misses += 1
+        return result
+
+    def store(self, lookup: CacheLookup, answer: str) -> bool:
+        """Сохраняет ответ для вопроса из промаха lookup; без эмбеддинга запись не создается."""
+        if lookup.vector is None or not lookup.normalized or self.max_entries <= 0:
+            return False
+        self._purge_expired()
+        self._entries[lookup.normalized] = CachedAnswer(
+            question=lookup.normalized,
+            answer=answer,
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+        self._entries.move_to_end(lookup.normalized)
+        try:
+            self._index.add(lookup.normalized, lookup.vector)
+        except ValueError as e:
+            # Сменилась размерность эмбеддингов - старые векторы несравнимы
+            self.logger.warning(f"Semantic cache index reset: {e}")
+            self.invalidate("embedding_dimension")
+            return False
+        while len(self._entries) > self.max_entries:
+            oldest, _ = self._entries.popitem(last=False)
+            self._index.remove(oldest)
+            self.evictions += 1
+        self.stores += 1
+        return True
+
+    def _purge_expired(self) -> None:
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if entry.expires_at <= now]
+        for key in expired:
+            self._drop(key)
+        self.expirations += len(expired)
+
+    def record_bypass(self, reason: str) -> None:
+        """Учитывает сообщение, обработанное графом без обращения к кэшу."""
+        self.bypasses[reason] = self.bypasses.get(reason, 0) + 1
+
+    def invalidate(self, reason: str = "manual") -> None:
+        """Сбрасывает все записи."""
+        dropped = len(self._entries)
+        self._entries.clear()
+        self._index.clear()
+        self.generation += 1
+        self.invalidations += 1
+        self.logger.info(f"Semantic cache invalidated ({reason}), dropped {dropped} entries.")
+
+    def snapshot(self) -> Dict[str, Any]:
+        hits = self.hits_exact + self.hits_semantic
+        lookups = hits + self.misses
+        return {
+            "agent_id": self.agent_id,
+            "fingerprint": self.fingerprint,
+            "generation": self.generation,
+            "entries": len(self._entries),
+            "lookups": lookups,
+            "hits": hits,
+            "hits_exact": self.hits_exact,
+            "hits_semantic": self.hits_semantic,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "bypasses": dict(self.bypasses),
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "embedding_errors": self.embedding_errors,
+            "similarity_threshold": self.similarity_threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries,
+        }
+
+    async def push_metrics(self, redis_cli: redis.Redis) -> None:
+        """Сохраняет снимок счетчиков в Redis для /metrics/semantic-cache."""
+        try:
+            await redis_cli.set(f"{SEMANTIC_CACHE_METRICS_KEY_PREFIX}{self.agent_id}", json.dumps(self.snapshot()),
+                                ex=max(self.ttl_seconds, 3600))
+        except redis_exceptions.RedisError as e:
+            self.logger.debug(f"Failed to push semantic cache metrics: {e}")
+
+    async def listen_invalidations(self, redis_cli: redis.Redis) -> None:
+        """
+        Слушает канал инвалидации. Предназначен для запуска как основная задача
+        компонента; при обрыве соединения сбрасывает кэш и переподписывается.
+        """
+        while True:
+            pubsub = redis_cli.pubsub()
+            try:
+                await pubsub.subscribe(SEMANTIC_CACHE_INVALIDATION_CHANNEL)
+                self.logger.info(f"Subscribed to {SEMANTIC_CACHE_INVALIDATION_CHANNEL} for agent {self.agent_id} semantic cache")
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    self._apply_invalidation(message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except redis_exceptions.RedisError as e:
+                self.logger.warning(f"Semantic cache invalidation listener error: {e}. Resubscribing.")
+                # Пока подписки не было, сообщения могли быть потеряны
+                self.invalidate("listener_reconnect")
+                await asyncio.sleep(settings.REDIS_RECONNECT_INTERVAL)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def _apply_invalidation(self, data: Any) -> None:
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        try:
+            payload = json.loads(data)
+        except (TypeError, ValueError):
+            self.logger.warning(f"Invalid semantic cache invalidation payload: {data!r}")
+            return
+        agent_id = payload.get("agent_id")
+        knowledge_base_id = payload.get("knowledge_base_id")
+        if agent_id not in (None, self.agent_id):
+            return
+        if knowledge_base_id is not None and str(knowledge_base_id) not in self.knowledge_base_ids:
+            return
+        self.invalidate("knowledge_base" if knowledge_base_id is not None else "request")
+
+
+async def publish_semantic_cache_invalidation(redis_cli: redis.Redis,
+                                              agent_id: Optional[str] = None,
+                                              knowledge_base_id: Optional[str] = None) -> None:
+    """
+    Оповещает процессы агентов о сбросе семантического кэша.
+
+    С knowledge_base_id сбрасываются кэши агентов, использующих эту базу знаний;
+    без параметров - кэши всех агентов.
+    """
+    payload = {"agent_id": agent_id, "knowledge_base_id": knowledge_base_id}
+    try:
+        await redis_cli.publish(SEMANTIC_CACHE_INVALIDATION_CHANNEL, json.dumps(payload))
+    except redis_exceptions.RedisError as e:
+        logger.error(f"Failed to publish semantic cache invalidation {payload}: {e}", exc_info=True)
+
+
+async def collect_semantic_cache_metrics(redis_cli: redis.Redis) -> Dict[str, Any]:
+    """Снимки кэшей всех агентов из Redis и суммарная доля попаданий."""
+    keys = [key async for key in redis_cli.scan_iter(match=f"{SEMANTIC_CACHE_METRICS_KEY_PREFIX}*", count=500)]
+    values = await redis_cli.mget(keys) if keys else []
+    agents = [json.loads(value) for value in values if value]
+    hits = sum(agent.get("hits", 0) for agent in agents)
+    lookups = sum(agent.get("lookups", 0) for agent in agents)
+    return {
+        "hits": hits,
+        "lookups": lookups,
+        "hit_rate": hits / lookups if lookups else 0.0,
+        "agents": sorted(agents, key=lambda agent: agent.get("agent_id") or ""),
+    }
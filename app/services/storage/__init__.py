@@ -0,0 +1,21 @@
+"""
+Shared object storage layer for PlatformAI-HUB
+"""
+
+from .object_storage import (
+    ObjectStorageClient,
+    ObjectStorageError,
+    StorageObject,
+    UploadItem,
+    get_object_storage,
+    close_object_storage
+)
+
+__all__ = [
+    "ObjectStorageClient",
+    "ObjectStorageError",
+    "StorageObject",
+    "UploadItem",
+    "get_object_storage",
+    "close_object_storage"
+]
@@ -0,0 +1,668 @@
+"""
+Асинхронный клиент S3/MinIO хранилища, общий для всех сервисов процесса
+
+Работает поверх одного пула HTTP соединений (httpx) без executor-потоков:
+- подпись запросов AWS SigV4 (модуль sigv4)
+- ограничение числа одновременных загрузок
+- multipart upload для больших файлов; данные из потока (async iterator,
+  файл) загружаются частями по мере чтения, без буферизации всего объекта
+- локальная генерация presigned URL без сетевых запросов
+"""
+
+import asyncio
+import base64
+import hashlib
+import inspect
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List, AsyncIterable, AsyncIterator, BinaryIO, Iterable, Tuple, Union
+from urllib.parse import SplitResult, urlsplit, urlunsplit, quote, unquote
+from xml.etree import ElementTree
+
+import httpx
+
+from app.core.config import settings
+from app.services.storage.sigv4 import AMZ_DATE_FORMAT, UNSIGNED_PAYLOAD, presign_url, sign_headers
+
+logger = logging.getLogger(__name__)
+
+S3_XML_NAMESPACE = "http://s3.amazonaws.com/doc/2006-03-01/"
+# Минимальный размер части multipart upload, кроме последней (ограничение S3 API)
+MIN_PART_SIZE = 5 * 1024 * 1024
+# Максимальное количество ключей в одном multi-object delete (ограничение S3 API)
+MAX_DELETE_BATCH = 1000
+# Размер одного чтения из файлового объекта при потоковой загрузке
+STREAM_READ_SIZE = 1024 * 1024
+
+# Данные объекта: байты целиком, async iterator чанков или файловый объект
+# с методом read() (обычным или корутиной)
+ObjectData = Union[bytes, bytearray, memoryview, AsyncIterable[bytes], BinaryIO]
+
+
+class ObjectStorageError(Exception):
+    """Ошибка, возвращенная S3/MinIO сервером"""
+
+    def __init__(self, code: str, message: str = "", status_code: int = 0, key: Optional[str] = None):
+        self.code = code
+        self.message = message
+        self.status_code = status_code
+        self.key = key
+        super().__init__(f"{code}: {message}" if message else code)
+
+
+@dataclass
+class StorageObject:
+    """Элемент листинга bucket"""
+    key: str
+    size: int = 0
+    last_modified: Optional[datetime] = None
+    etag: Optional[str] = None
+    is_prefix: bool = False
+
+
+@dataclass
+class UploadItem:
+    """Описание одного объекта для пакетной загрузки"""
+    key: str
+    data: bytes
+    content_type: str = "application/octet-stream"
+    metadata: Optional[Dict[str, Any]] = None
+
+
+def _xml_find_text(element: ElementTree.Element, tag: str) -> Optional[str]:
+    """Текст дочернего элемента с учетом S3 namespace"""
+    child = element.find(f"{{{S3_XML_NAMESPACE}}}{tag}")
+    if child is None:
+        child = element.find(tag)
+    return child.text if child is not None else None
+
+
+def _xml_find_all(element: ElementTree.Element, tag: str) -> List[ElementTree.Element]:
+    """Все дочерние элементы с учетом S3 namespace"""
+    return element.findall(f"{{{S3_XML_NAMESPACE}}}{tag}") or element.findall(tag)
+
+
+def _xml_without_namespace(element: ElementTree.Element) -> str:
+    """Элемент ответа S3 в виде XML без namespace (для вставки в тело запроса)"""
+    def strip(source: ElementTree.Element) -> ElementTree.Element:
+        copy = ElementTree.Element(source.tag.rsplit("}", 1)[-1], source.attrib)
+        copy.text, copy.tail = source.text, source.tail
+        copy.extend(strip(child) for child in source)
+        return copy
+    return ElementTree.tostring(strip(element), encoding="unicode")
+
+
+class ObjectStorageClient:
+    """
+    Асинхронный клиент S3-совместимого хранилища
+
+    Один экземпляр на процесс (см. get_object_storage) разделяет пул соединений
+    и лимит одновременных загрузок между всеми менеджерами файлов.
+    """
+
+    def __init__(self,
+                 endpoint: str,
+                 access_key: str,
+                 secret_key: str,
+                 secure: bool = False,
+                 region: str = "us-east-1",
+                 max_connections: int = 32,
+                 upload_concurrency: int = 8,
+                 multipart_threshold: int = 16 * 1024 * 1024,
+                 part_size: int = 8 * 1024 * 1024,
+                 request_timeout: float = 30.0):
+        self.endpoint = endpoint
+        self.scheme = "https" if secure else "http"
+        self.region = region
+        self.multipart_threshold = multipart_threshold
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self._access_key = access_key
+        self._secret_key = secret_key
+        self._upload_semaphore = asyncio.Semaphore(upload_concurrency)
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            ),
+            timeout=httpx.Timeout(request_timeout)
+        )
+
+    # ------------------------------------------------------------------
+    # Низкоуровневые запросы
+    # ------------------------------------------------------------------
+
+    def _build_url(self,
+                   bucket: str,
+                   key: Optional[str] = None,
+                   query: Optional[Dict[str, str]] = None) -> SplitResult:
+        """Path-style URL с канонически закодированным query"""
+        path = f"/{bucket}"
+        if key:
+            path += "/" + quote(key, safe="/")
+        query_string = "&".join(
+            f"{quote(str(k), safe='')}={quote(str(v), safe='')}"
+            for k, v in sorted((query or {}).items())
+        )
+        return SplitResult(self.scheme, self.endpoint, path, query_string, "")
+
+    async def _request(self,
+                       method: str,
+                       bucket: str,
+                       key: Optional[str] = None,
+                       query: Optional[Dict[str, str]] = None,
+                       content: Union[bytes, memoryview, None] = None,
+                       headers: Optional[Dict[str, str]] = None,
+                       stream: bool = False) -> httpx.Response:
+        """Подписанный SigV4 запрос к хранилищу"""
+        url = self._build_url(bucket, key, query)
+        date = datetime.now(timezone.utc)
+
+        request_headers: Dict[str, str] = {
+            "Host": url.netloc,
+            "x-amz-date": date.strftime(AMZ_DATE_FORMAT),
+            "x-amz-content-sha256": UNSIGNED_PAYLOAD,
+        }
+        if headers:
+            request_headers.update(headers)
+        request_headers = sign_headers(
+            method, url, self.region, request_headers, self._access_key, self._secret_key, UNSIGNED_PAYLOAD, date
+        )
+
+        request = self._http.build_request(
+            method,
+            urlunsplit(url),
+            headers=request_headers,
+            content=bytes(content) if isinstance(content, memoryview) else content
+        )
+        response = await self._http.send(request, stream=stream)
+
+        if response.status_code >= 300:
+            if stream:
+                await response.aread()
+            raise self._error_from_response(response, key)
+        return response
+
+    @staticmethod
+    def _error_from_response(response: httpx.Response, key: Optional[str]) -> ObjectStorageError:
+        """Преобразование ответа с ошибкой в ObjectStorageError"""
+        code, message = None, ""
+        if response.content:
+            try:
+                root = ElementTree.fromstring(response.content)
+                code = _xml_find_text(root, "Code")
+                message = _xml_find_text(root, "Message") or ""
+            except ElementTree.ParseError:
+                message = response.text[:200]
+        if not code:
+            code = {404: "NoSuchKey", 403: "AccessDenied", 501: "NotImplemented"}.get(
+                response.status_code, f"HTTP{response.status_code}"
+            )
+        return ObjectStorageError(code, message, response.status_code, key)
+
+    @staticmethod
+    def _content_md5(body: bytes) -> str:
+        return base64.b64encode(hashlib.md5(body).digest()).decode("ascii")
+
+    @staticmethod
+    def _metadata_headers(metadata: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """x-amz-meta-* заголовки; не-ASCII значения кодируются percent-encoding"""
+        headers = {}
+        for name, value in (metadata or {}).items():
+            value = str(value)
+            headers[f"x-amz-meta-{name.lower()}"] = value if value.isascii() else quote(value)
+        return headers
+
+    # ------------------------------------------------------------------
+    # Buckets
+    # ------------------------------------------------------------------
+
+    async def bucket_exists(self, bucket: str) -> bool:
+        try:
+            await self._request("HEAD", bucket)
+            return True
+        except ObjectStorageError as e:
+            if e.status_code == 404:
+                return False
+            raise
+
+    async def make_bucket(self, bucket: str) -> None:
+        body = b""
+        if self.region and self.region != "us-east-1":
+            body = (
+                f'<CreateBucketConfiguration xmlns="{S3_XML_NAMESPACE}">'
+                f"<LocationConstraint>{self.region}</LocationConstraint>"
+                f"</CreateBucketConfiguration>"
+            ).encode("utf-8")
+        try:
+            await self._request("PUT", bucket, content=body)
+        except ObjectStorageError as e:
+            if e.code not in ("BucketAlreadyOwnedByYou", "BucketAlreadyExists"):
+                raise
+
+    async def ensure_bucket(self, bucket: str) -> bool:
+        """Создает bucket при отсутствии. Возвращает True если bucket был создан"""
+        if await self.bucket_exists(bucket):
+            return False
+        await self.make_bucket(bucket)
+        return True
+
+    async def get_bucket_lifecycle_rules(self, bucket: str) -> List[ElementTree.Element]:
+        """Правила lifecycle bucket; пустой список, если конфигурация не задана"""
+        try:
+            response = await self._request("GET", bucket, query={"lifecycle": ""})
+        except ObjectStorageError as e:
+            if e.code == "NoSuchLifecycleConfiguration":
+                return []
+            raise
+        return _xml_find_all(ElementTree.fromstring(response.content), "Rule")
+
+    async def set_bucket_expiration(self,
+                                    bucket: str,
+                                    prefix: str,
+                                    days: int,
+                                    rule_id: str) -> None:
+        """
+        Lifecycle-правило удаления объектов под префиксом через заданное число дней
+
+        PUT lifecycle заменяет конфигурацию целиком, поэтому остальные правила
+        bucket читаются и отправляются вместе с новым; правило с тем же ID заменяется.
+        """
+        rules = [
+            _xml_without_namespace(rule)
+            for rule in await self.get_bucket_lifecycle_rules(bucket)
+            if _xml_find_text(rule, "ID") != rule_id
+        ]
+        rules.append(
+            f"<Rule>"
+            f"<ID>{self._xml_escape(rule_id)}</ID>"
+            f"<Filter><Prefix>{self._xml_escape(prefix)}</Prefix></Filter>"
+            f"<Status>Enabled</Status>"
+            f"<Expiration><Days>{days}</Days></Expiration>"
+            f"</Rule>"
+        )
+        body = (
+            f'<LifecycleConfiguration xmlns="{S3_XML_NAMESPACE}">{"".join(rules)}</LifecycleConfiguration>'
+        ).encode("utf-8")
+        await self._request(
+            "PUT", bucket,
+            query={"lifecycle": ""},
+            content=body,
+            headers={"Content-MD5": self._content_md5(body), "Content-Type": "application/xml"}
+        )
+
+    # ------------------------------------------------------------------
+    # Objects
+    # ------------------------------------------------------------------
+
+    async def put_object(self,
+                         bucket: str,
+                         key: str,
+                         data: ObjectData,
+                         content_type: str = "application/octet-stream",
+                         metadata: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Загрузка объекта. Байты больше multipart_threshold загружаются
+        по частям параллельно.
+
+        data может быть потоком (async iterator чанков или файловым объектом):
+        он читается частями по part_size, и каждая часть отправляется сразу после
+        чтения. В памяти одновременно не больше upload_concurrency частей; поток
+        не длиннее одной части загружается обычным PUT.
+
+        Returns:
+            ETag загруженного объекта
+        """
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            return await self._put_stream(bucket, key, data, content_type, metadata)
+
+        if len(data) > self.multipart_threshold:
+            view = memoryview(data)
+            return await self._put_multipart(
+                bucket, key, self._slice_parts(view), content_type, metadata
+            )
+        return await self._put_single(bucket, key, data, content_type, metadata)
+
+    async def _put_single(self,
+                          bucket: str,
+                          key: str,
+                          data: Union[bytes, bytearray, memoryview],
+                          content_type: str,
+                          metadata: Optional[Dict[str, Any]]) -> str:
+        headers = {"Content-Type": content_type, **self._metadata_headers(metadata)}
+        async with self._upload_semaphore:
+            response = await self._request("PUT", bucket, key, content=data, headers=headers)
+        return response.headers.get("etag", "").strip('"')
+
+    async def _slice_parts(self, view: memoryview) -> AsyncIterator[memoryview]:
+        for offset in range(0, len(view), self.part_size):
+            yield view[offset:offset + self.part_size]
+
+    @staticmethod
+    async def _iter_chunks(data: Union[AsyncIterable[bytes], BinaryIO]) -> AsyncIterator[bytes]:
+        """Чанки потока: async iterator или файловый объект с read() (обычным или async)"""
+        if hasattr(data, "__aiter__"):
+            async for chunk in data:
+                yield chunk
+            return
+        if not hasattr(data, "read"):
+            raise TypeError(f"Unsupported object data type: {type(data).__name__}")
+        async_read = inspect.iscoroutinefunction(data.read)
+        while True:
+            # Синхронное чтение файла не должно блокировать event loop
+            chunk = await data.read(STREAM_READ_SIZE) if async_read else await asyncio.to_thread(data.read, STREAM_READ_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+    async def _read_parts(self, data: Union[AsyncIterable[bytes], BinaryIO]) -> AsyncIterator[bytes]:
+        """Поток, нарезанный на части по part_size (последняя может быть короче)"""
+        buffer = bytearray()
+        async for chunk in self._iter_chunks(data):
+            buffer += chunk
+            while len(buffer) >= self.part_size:
+                yield bytes(buffer[:self.part_size])
+                del buffer[:self.part_size]
+        if buffer:
+            yield bytes(buffer)
+
+    async def _put_stream(self,
+                          bucket: str,
+                          key: str,
+                          data: Union[AsyncIterable[bytes], BinaryIO],
+                          content_type: str,
+                          metadata: Optional[Dict[str, Any]]) -> str:
+        parts = self._read_parts(data)
+        first = await anext(parts, b"")
+        second = await anext(parts, None)
+        if second is None:
+            return await self._put_single(bucket, key, first, content_type, metadata)
+
+        async def all_parts() -> AsyncIterator[bytes]:
+            yield first
+            yield second
+            async for part in parts:
+                yield part
+
+        return await self._put_multipart(bucket, key, all_parts(), content_type, metadata)
+
+    async def _put_multipart(self,
+                             bucket: str,
+                             key: str,
+                             parts: AsyncIterator[Union[bytes, memoryview]],
+                             content_type: str,
+                             metadata: Optional[Dict[str, Any]]) -> str:
+        """
+        Multipart upload: каждая часть отправляется сразу после чтения.
+        Слот лимита загрузок занимается до чтения следующей части, поэтому
+        чтение не опережает загрузку больше чем на upload_concurrency частей.
+        """
+        headers = {"Content-Type": content_type, **self._metadata_headers(metadata)}
+        response = await self._request("POST", bucket, key, query={"uploads": ""}, headers=headers)
+        upload_id = _xml_find_text(ElementTree.fromstring(response.content), "UploadId")
+        if not upload_id:
+            raise ObjectStorageError("InvalidUploadId", "Server did not return UploadId", key=key)
+
+        async def upload_part(part_number: int, chunk: Union[bytes, memoryview]) -> str:
+            try:
+                part_response = await self._request(
+                    "PUT", bucket, key,
+                    query={"partNumber": str(part_number), "uploadId": upload_id},
+                    content=chunk
+                )
+            finally:
+                self._upload_semaphore.release()
+            return part_response.headers.get("etag", "")
+
+        tasks: List[asyncio.Task] = []
+        total_size = 0
+        try:
+            try:
+                part_number = 0
+                while True:
+                    await self._upload_semaphore.acquire()
+                    try:
+                        chunk = await anext(parts, None)
+                    except BaseException:
+                        self._upload_semaphore.release()
+                        raise
+                    if chunk is None or any(t.done() and not t.cancelled() and t.exception() for t in tasks):
+                        # Поток закончился или часть уже не загрузилась - дальше не читаем
+                        self._upload_semaphore.release()
+                        break
+                    part_number += 1
+                    total_size += len(chunk)
+                    tasks.append(asyncio.create_task(upload_part(part_number, chunk)))
+            finally:
+                # Начатые части дожидаемся даже при ошибке: abort не должен опережать их загрузку
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+            errors = [r for r in results if isinstance(r, BaseException)]
+            if errors:
+                raise errors[0]
+            etags: List[str] = results
+
+            parts_xml = "".join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                for number, etag in enumerate(etags, start=1)
+            )
+            body = f"<CompleteMultipartUpload>{parts_xml}</CompleteMultipartUpload>".encode("utf-8")
+            response = await self._request(
+                "POST", bucket, key,
+                query={"uploadId": upload_id},
+                content=body,
+                headers={"Content-Type": "application/xml"}
+            )
+            # S3 может вернуть ошибку в теле ответа со статусом 200
+            root = ElementTree.fromstring(response.content)
+            if root.tag.endswith("Error"):
+                raise ObjectStorageError(_xml_find_text(root, "Code") or "InternalError",
+                                         _xml_find_text(root, "Message") or "", response.status_code, key)
+            logger.debug(f"Multipart upload completed: {key} ({len(etags)} parts, {total_size} bytes)")
+            return (_xml_find_text(root, "ETag") or "").strip('"')
+
+        except Exception:
+            try:
+                await self._request("DELETE", bucket, key, query={"uploadId": upload_id})
+            except Exception as abort_error:
+                logger.warning(f"Failed to abort multipart upload {upload_id} for {key}: {abort_error}")
+            raise
+
+    async def put_objects(self,
+                          bucket: str,
+                          items: List[UploadItem]) -> List[Union[str, BaseException]]:
+        """
+        Параллельная загрузка нескольких объектов в пределах лимита загрузок
+
+        Returns:
+            Для каждого элемента ETag или исключение, порядок совпадает с items
+        """
+        return await asyncio.gather(
+            *(self.put_object(bucket, item.key, item.data, item.content_type, item.metadata)
+              for item in items),
+            return_exceptions=True
+        )
+
+    async def get_object(self, bucket: str, key: str) -> bytes:
+        response = await self._request("GET", bucket, key)
+        return response.content
+
+    async def open_object_stream(self, bucket: str, key: str) -> httpx.Response:
+        """
+        GET объекта без буферизации тела: данные читаются через response.aiter_bytes().
+        Вызывающий обязан закрыть ответ (await response.aclose()).
+        """
+        return await self._request("GET", bucket, key, stream=True)
+
+    def parse_object_url(self, url: str) -> Optional[Tuple[str, str]]:
+        """
+        (bucket, key) для path-style URL этого хранилища (в т.ч. presigned),
+        None если URL указывает на другой хост
+        """
+        parts = urlsplit(url)
+        if parts.netloc != self.endpoint:
+            return None
+        bucket, _, key = parts.path.lstrip("/").partition("/")
+        if not bucket or not key:
+            return None
+        return bucket, unquote(key)
+
+    async def stat_object(self, bucket: str, key: str) -> Optional[Dict[str, Any]]:
+        """Метаданные объекта (HEAD) или None если объект не существует"""
+        try:
+            response = await self._request("HEAD", bucket, key)
+        except ObjectStorageError as e:
+            if e.status_code == 404:
+                return None
+            raise
+        return {
+            "size": int(response.headers.get("content-length", 0)),
+            "etag": response.headers.get("etag", "").strip('"'),
+            "content_type": response.headers.get("content-type"),
+            "metadata": {
+                name[len("x-amz-meta-"):]: value
+                for name, value in response.headers.items()
+                if name.lower().startswith("x-amz-meta-")
+            },
+        }
+
+    async def remove_object(self, bucket: str, key: str) -> None:
+        await self._request("DELETE", bucket, key)
+
+    async def remove_objects(self, bucket: str, keys: Iterable[str]) -> List[ObjectStorageError]:
+        """
+        Multi-object delete пакетами до 1000 ключей
+
+        Returns:
+            Ошибки удаления отдельных объектов
+        """
+        errors: List[ObjectStorageError] = []
+        batch: List[str] = []
+
+        async def flush(batch_keys: List[str]) -> None:
+            objects_xml = "".join(
+                f"<Object><Key>{self._xml_escape(k)}</Key></Object>" for k in batch_keys
+            )
+            body = f"<Delete><Quiet>true</Quiet>{objects_xml}</Delete>".encode("utf-8")
+            response = await self._request(
+                "POST", bucket,
+                query={"delete": ""},
+                content=body,
+                headers={"Content-MD5": self._content_md5(body), "Content-Type": "application/xml"}
+            )
+            if response.content:
+                root = ElementTree.fromstring(response.content)
+                for error in _xml_find_all(root, "Error"):
+                    errors.append(ObjectStorageError(
+                        _xml_find_text(error, "Code") or "InternalError",
+                        _xml_find_text(error, "Message") or "",
+                        key=_xml_find_text(error, "Key")
+                    ))
+
+        for key in keys:
+            batch.append(key)
+            if len(batch) >= MAX_DELETE_BATCH:
+                await flush(batch)
+                batch = []
+        if batch:
+            await flush(batch)
+
+        return errors
+
+    @staticmethod
+    def _xml_escape(value: str) -> str:
+        return (value.replace("&", "&amp;").replace("<", "&lt;")
+                .replace(">", "&gt;").replace('"', "&quot;"))
+
+    async def list_objects(self,
+                           bucket: str,
+                           prefix: str = "",
+                           recursive: bool = True,
+                           max_keys: int = 1000) -> AsyncIterator[StorageObject]:
+        """
+        Постраничный листинг (ListObjectsV2). При recursive=False возвращает
+        также общие префиксы (is_prefix=True) на один уровень ниже prefix.
+        """
+        continuation_token: Optional[str] = None
+        while True:
+            query = {"list-type": "2", "prefix": prefix, "max-keys": str(max_keys)}
+            if not recursive:
+                query["delimiter"] = "/"
+            if continuation_token:
+                query["continuation-token"] = continuation_token
+
+            response = await self._request("GET", bucket, query=query)
+            root = ElementTree.fromstring(response.content)
+
+            for content in _xml_find_all(root, "Contents"):
+                last_modified = _xml_find_text(content, "LastModified")
+                yield StorageObject(
+                    key=_xml_find_text(content, "Key") or "",
+                    size=int(_xml_find_text(content, "Size") or 0),
+                    last_modified=datetime.fromisoformat(last_modified.replace("Z", "+00:00")) if last_modified else None,
+                    etag=(_xml_find_text(content, "ETag") or "").strip('"') or None,
+                )
+            for common_prefix in _xml_find_all(root, "CommonPrefixes"):
+                yield StorageObject(key=_xml_find_text(common_prefix, "Prefix") or "", is_prefix=True)
+
+            if (_xml_find_text(root, "IsTruncated") or "false").lower() != "true":
+                break
+            continuation_token = _xml_find_text(root, "NextContinuationToken")
+            if not continuation_token:
+                break
+
+    def presigned_get_url(self, bucket: str, key: str, expires: timedelta = timedelta(hours=1)) -> str:
+        """Presigned GET URL, вычисляется локально без обращения к серверу"""
+        seconds = int(expires.total_seconds())
+        if seconds < 1 or seconds > 604800:
+            raise ValueError("expires must be between 1 second and 7 days")
+        url = presign_url(
+            "GET",
+            self._build_url(bucket, key),
+            self.region,
+            self._access_key,
+            self._secret_key,
+            datetime.now(timezone.utc),
+            seconds
+        )
+        return urlunsplit(url)
+
+    async def close(self) -> None:
+        await self._http.aclose()
+
+
+_object_storage: Optional[ObjectStorageClient] = None
+
+
+def get_object_storage() -> ObjectStorageClient:
+    """Возвращает общий для процесса клиент хранилища, создавая его при первом обращении."""
+    global _object_storage
+    if _object_storage is None:
+        _object_storage = ObjectStorageClient(
+            endpoint=settings.MINIO_ENDPOINT,
+            access_key=settings.MINIO_ACCESS_KEY,
+            secret_key=settings.MINIO_SECRET_KEY,
+            secure=settings.MINIO_SECURE,
+            region=settings.MINIO_REGION,
+            max_connections=settings.MINIO_MAX_CONNECTIONS,
+            upload_concurrency=settings.MINIO_UPLOAD_CONCURRENCY,
+            multipart_threshold=settings.MINIO_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+            part_size=settings.MINIO_MULTIPART_PART_SIZE_MB * 1024 * 1024,
+            request_timeout=settings.MINIO_REQUEST_TIMEOUT,
+        )
+        logger.info(f"Object storage client created for {settings.MINIO_ENDPOINT} "
+                    f"(max_connections={settings.MINIO_MAX_CONNECTIONS}, "
+                    f"upload_concurrency={settings.MINIO_UPLOAD_CONCURRENCY})")
+    return _object_storage
+
+
+async def close_object_storage() -> None:
+    """Закрывает общий клиент хранилища и его пул соединений."""
+    global _object_storage
+    if _object_storage is not None:
+        try:
+            await _object_storage.close()
+            logger.info("Object storage client closed.")
+        except Exception as e:
+            logger.error(f"Error closing object storage client: {e}", exc_info=True)
+        finally:
+            _object_storage = None
@@ -0,0 +1,226 @@
+"""
+Двухуровневый кэш профилей пользователей интеграций.
+
+Уровень 1 — ограниченный LRU в памяти процесса интеграции.
+Уровень 2 — общая запись в Redis (JSON с профилем и статусом авторизации).
+
+Запись хранит как найденных пользователей, так и отрицательный результат
+(пользователь не найден / не авторизован), поэтому горячий путь обработки
+сообщений не обращается ни к Postgres, ни (для частых пользователей) к Redis.
+Изменения пользователя публикуются в канал USER_CACHE_INVALIDATION_CHANNEL,
+и все процессы интеграций сбрасывают свои локальные копии.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import redis.asyncio as redis
+from redis import exceptions as redis_exceptions
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_PREFIX = "user_cache:"
+USER_CACHE_INVALIDATION_CHANNEL = "user_cache:invalidate"
+
+# Поля профиля, которые кладутся в кэш и передаются агенту в user_data
+PROFILE_FIELDS = ("phone_number", "first_name", "last_name", "username")
+
+
+def user_cache_key(platform: str, platform_user_id: str, agent_id: str) -> str:
+    """Ключ записи кэша в Redis (формат совместим с прежним флагом авторизации)."""
+    return f"{USER_CACHE_PREFIX}{platform}:{platform_user_id}:agent:{agent_id}"
+
+
+def build_user_cache_entry(user: Any, is_authorized: bool) -> Dict[str, Any]:
+    """
+    Формирует запись кэша из UserDB и статуса авторизации.
+
+    Для отсутствующего пользователя (user=None) возвращает отрицательную запись.
+    """
+    if user is None:
+        return {"found": False, "is_authorized": False}
+    entry: Dict[str, Any] = {
+        "found": True,
+        "is_authorized": bool(is_authorized),
+        "user_id": user.id,
+    }
+    for field in PROFILE_FIELDS:
+        entry[field] = getattr(user, field, None)
+    return entry
+
+
+class UserProfileCache:
+    """
+    Кэш профилей и статуса авторизации пользователей одной интеграции (агент + платформа).
+    """
+
+    def __init__(self,
+                 agent_id: str,
+                 platform: str,
+                 logger: Optional[logging.Logger] = None,
+                 max_size: Optional[int] = None,
+                 local_ttl: Optional[int] = None,
+                 redis_ttl: Optional[int] = None):
+        self.agent_id = agent_id
+        self.platform = platform
+        self.logger = logger or logging.getLogger(__name__)
+        self.max_size = max_size if max_size is not None else settings.USER_CACHE_LOCAL_MAX_SIZE
+        self.local_ttl = local_ttl if local_ttl is not None else settings.USER_CACHE_LOCAL_TTL
+        self.redis_ttl = redis_ttl if redis_ttl is not None else settings.REDIS_USER_CACHE_TTL
+        # platform_user_id -> (expires_at_monotonic, entry)
+        self._local: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits_local = 0
+        self.hits_redis = 0
+        self.misses = 0
+
+    def _entry_ttl(self, entry: Dict[str, Any], base_ttl: int) -> int:
+        """Отрицательные записи живут вчетверо меньше, как и прежний флаг 'false'."""
+        if entry.get("found") and entry.get("is_authorized"):
+            return base_ttl
+        return max(1, base_ttl // 4)
+
+    def _get_local(self, platform_user_id: str) -> Optional[Dict[str, Any]]:
+        item = self._local.get(platform_user_id)
+        if item is None:
+            return None
+        expires_at, entry = item
+        if expires_at <= time.monotonic():
+            self._local.pop(platform_user_id, None)
+            return None
+        self._local.move_to_end(platform_user_id)
+        return entry
+
+    def _set_local(self, platform_user_id: str, entry: Dict[str, Any]) -> None:
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self._entry_ttl(entry, self.local_ttl)
+        self._local[platform_user_id] = (expires_at, entry)
+        self._local.move_to_end(platform_user_id)
+        while len(self._local) > self.max_size:
+            self._local.popitem(last=False)
+
+    def invalidate_local(self, platform_user_id: Optional[str] = None) -> None:
+        """Сбрасывает локальную запись пользователя (или весь локальный кэш)."""
+        if platform_user_id is None:
+            self._local.clear()
+        else:
+            self._local.pop(platform_user_id, None)
+
+    async def get(self, redis_cli: Optional[redis.Redis], platform_user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает запись кэша или None при промахе на обоих уровнях.
+        Ошибки Redis считаются промахом.
+        """
+        entry = self._get_local(platform_user_id)
+        if entry is not None:
+            self.hits_local += 1
+            return entry
+
+        if redis_cli is not None:
+            key = user_cache_key(self.platform, platform_user_id, self.agent_id)
+            try:
+                raw = await redis_cli.get(key)
+            except redis_exceptions.RedisError as e:
+                self.logger.warning(f"Redis error reading user cache {key}: {e}")
+                raw = None
+            if raw is not None:
+                if isinstance(raw, bytes):
+                    raw = raw.decode("utf-8")
+                try:
+                    entry = json.loads(raw)
+                except (TypeError, ValueError):
+                    # Старый формат ("true"/"false") не содержит профиля — считаем промахом
+                    entry = None
+                if isinstance(entry, dict):
+                    self.hits_redis += 1
+                    self._set_local(platform_user_id, entry)
+                    return entry
+
+        self.misses += 1
+        return None
+
+    async def set(self, redis_cli: Optional[redis.Redis], platform_user_id: str, entry: Dict[str, Any]) -> None:
+        """Сохраняет запись на обоих уровнях."""
+        self._set_local(platform_user_id, entry)
+        if redis_cli is None:
+            return
+        key = user_cache_key(self.platform, platform_user_id, self.agent_id)
+        try:
+            await redis_cli.set(key, json.dumps(entry), ex=self._entry_ttl(entry, self.redis_ttl))
+        except redis_exceptions.RedisError as e:
+            self.logger.warning(f"Redis error writing user cache {key}: {e}")
+
+    async def listen_invalidations(self, redis_cli: redis.Redis) -> None:
+        """
+        Слушает канал инвалидации и сбрасывает локальные записи.
+        Предназначен для запуска как основная задача компонента; при обрыве
+        соединения очищает локальный кэш целиком и переподписывается.
+        """
+        while True:
+            pubsub = redis_cli.pubsub()
+            try:
+                await pubsub.subscribe(USER_CACHE_INVALIDATION_CHANNEL)
+                self.logger.info(f"Subscribed to {USER_CACHE_INVALIDATION_CHANNEL} for {self.platform} user cache")
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    self._apply_invalidation(message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except redis_exceptions.RedisError as e:
+                self.logger.warning(f"User cache invalidation listener error: {e}. Resubscribing.")
+                # Пока подписки не было, сообщения могли быть потеряны
+                self.invalidate_local()
+                await asyncio.sleep(settings.REDIS_RECONNECT_INTERVAL)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def _apply_invalidation(self, data: Any) -> None:
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        try:
+            payload = json.loads(data)
+        except (TypeError, ValueError):
+            self.logger.warning(f"Invalid user cache invalidation payload: {data!r}")
+            return
+        if payload.get("platform") not in (None, self.platform):
+            return
+        if payload.get("agent_id") not in (None, self.agent_id):
+            return
+        platform_user_id = payload.get("platform_user_id")
+        self.invalidate_local(str(platform_user_id) if platform_user_id is not None else None)
+        self.logger.debug(f"User cache invalidated: {payload}")
+
+
+async def publish_user_cache_invalidation(redis_cli: redis.Redis,
+                                          platform: Optional[str] = None,
+                                          platform_user_id: Optional[str] = None,
+                                          agent_id: Optional[str] = None) -> None:
+    """
+    Удаляет записи пользователя из Redis и оповещает процессы интеграций.
+
+    Без agent_id удаляются записи пользователя для всех агентов; без
+    platform_user_id сбрасываются все локальные кэши платформы.
+    """
+    try:
+        if platform and platform_user_id is not None:
+            if agent_id:
+                await redis_cli.delete(user_cache_key(platform, str(platform_user_id), agent_id))
+            else:
+                pattern = user_cache_key(platform, str(platform_user_id), "*")
+                keys = [key async for key in redis_cli.scan_iter(match=pattern, count=100)]
+                if keys:
+                    await redis_cli.delete(*keys)
+        payload = {"platform": platform, "platform_user_id": platform_user_id, "agent_id": agent_id}
+        await redis_cli.publish(USER_CACHE_INVALIDATION_CHANNEL, json.dumps(payload))
+    except redis_exceptions.RedisError as e:
+        logger.error(f"Failed to publish user cache invalidation for {platform}/{platform_user_id}: {e}", exc_info=True)
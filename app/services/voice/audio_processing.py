@@ -0,0 +1,403 @@
+"""
+Обработка аудио без блокировки event loop
+
+probe_audio читает длительность и параметры из заголовков контейнера
+(OGG/Opus/Vorbis, MP3, WAV) без декодирования звука.
+transcode_to_wav выполняет неизбежные перекодирования в дочерних процессах
+ffmpeg: число одновременных процессов ограничено AUDIO_TRANSCODE_MAX_PROCESSES,
+входные данные подаются в stdin частями, результат читается из stdout.
+Время и исход каждой операции учитываются в гистограмме этапов трассировщика
+(этапы audio_probe и audio_transcode), которая собирается по всем процессам
+через Redis (/metrics/audio, /metrics/prometheus).
+"""
+
+import asyncio
+import logging
+import struct
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, Dict, Iterator, List, Optional, Union
+
+from app.api.schemas.voice_schemas import AudioFormat
+from app.core.config import settings
+from app.core.tracing import STAGE_AUDIO_PROBE, STAGE_AUDIO_TRANSCODE, collect_stage_histograms, tracer
+
+logger = logging.getLogger(__name__)
+
+TRANSCODE_CHUNK_SIZE = 64 * 1024
+
+
+class AudioTranscodeError(Exception):
+    """Ошибка перекодирования аудио"""
+
+
+@dataclass
+class AudioProbe:
+    """Параметры аудио, прочитанные из заголовков контейнера"""
+    format: AudioFormat
+    codec: str
+    duration_seconds: Optional[float] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    bitrate_kbps: Optional[int] = None
+
+
+# ---------------------------------------------------------------------------
+# Время операций
+# ---------------------------------------------------------------------------
+
+OUTCOME_OK = "ok"
+OUTCOME_UNSUPPORTED = "unsupported"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_ERROR = "error"
+OUTCOME_CANCELLED = "cancelled"
+
+AUDIO_STAGES = (STAGE_AUDIO_PROBE, STAGE_AUDIO_TRANSCODE)
+
+
+@contextmanager
+def _timed(stage: str) -> Iterator[List[str]]:
+    """
+    Учитывает время операции в гистограмме этапов (метка operation - исход).
+
+    Блок может задать исход через outcome[0]; по умолчанию "ok",
+    при исключении - "error", при отмене - "cancelled".
+    """
+    outcome = [OUTCOME_OK]
+    started = time.perf_counter()
+    try:
+        yield outcome
+    except asyncio.CancelledError:
+        outcome[0] = OUTCOME_CANCELLED
+        raise
+    except BaseException:
+        if outcome[0] == OUTCOME_OK:
+            outcome[0] = OUTCOME_ERROR
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        tracer.observe(stage, outcome[0], elapsed)
+        logger.debug(f"Audio operation '{stage}' ({outcome[0]}) took {elapsed * 1000:.2f} ms")
+
+
+async def collect_audio_operation_stats() -> List[Dict[str, Any]]:
+    """
+    Количество, среднее и перцентили времени разбора и перекодирования аудио
+    по исходам, по всем процессам (из гистограммы этапов в Redis).
+    """
+    histogram = await collect_stage_histograms()
+    return [row for row in histogram.summary() if row["stage"] in AUDIO_STAGES]
+
+
+# ---------------------------------------------------------------------------
+# Чтение заголовков
+# ---------------------------------------------------------------------------
+
+def _probe_wav(data: bytes) -> Optional[AudioProbe]:
+    if len(data) < 12 or data[:4] not in (b"RIFF", b"RF64") or data[8:12] != b"WAVE":
+        return None
+    pos = 12
+    channels = sample_rate = byte_rate = None
+    data_size = None
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        chunk_size = int.from_bytes(data[pos + 4:pos + 8], "little")
+        body = pos + 8
+        if chunk_id == b"fmt " and chunk_size >= 16 and body + 16 <= len(data):
+            _, channels, sample_rate, byte_rate, _, _ = struct.unpack_from("<HHIIHH", data, body)
+        elif chunk_id == b"data":
+            # Потоковые WAV пишут размер 0xFFFFFFFF: ограничиваемся фактическими данными
+            data_size = min(chunk_size, len(data) - body)
+            break
+        pos = body + chunk_size + (chunk_size & 1)
+
+    duration = data_size / byte_rate if data_size is not None and byte_rate else None
+    return AudioProbe(
+        format=AudioFormat.WAV,
+        codec="pcm",
+        duration_seconds=duration,
+        sample_rate=sample_rate,
+        channels=channels,
+        bitrate_kbps=byte_rate * 8 // 1000 if byte_rate else None,
+    )
+
+
+def _last_ogg_granule(data: bytes) -> Optional[int]:
+    pos = data.rfind(b"OggS")
+    while pos >= 0:
+        if pos + 14 <= len(data) and data[pos + 4] == 0:
+            granule = int.from_bytes(data[pos + 6:pos + 14], "little", signed=True)
+            # -1 означает страницу без завершенного пакета
+            if granule >= 0:
+                return granule
+        pos = data.rfind(b"OggS", 0, pos)
+    return None
+
+
+def _probe_ogg(data: bytes) -> Optional[AudioProbe]:
+    if len(data) < 28 or not data.startswith(b"OggS"):
+        return None
+    segments = data[26]
+    packet = data[27 + segments:27 + segments + 64]
+
+    if packet.startswith(b"OpusHead") and len(packet) >= 19:
+        codec = "opus"
+        channels = packet[9]
+        pre_skip = int.from_bytes(packet[10:12], "little")
+        sample_rate = int.from_bytes(packet[12:16], "little") or None
+        # Гранулы Opus всегда считаются в 48 кГц независимо от исходной частоты
+        granule_rate = 48000
+    elif packet.startswith(b"\x01vorbis") and len(packet) >= 16:
+        codec = "vorbis"
+        channels = packet[11]
+        sample_rate = int.from_bytes(packet[12:16], "little") or None
+        pre_skip = 0
+        granule_rate = sample_rate
+    else:
+        return AudioProbe(format=AudioFormat.OGG, codec="unknown")
+
+    granule = _last_ogg_granule(data)
+    duration = None
+    if granule is not None and granule_rate:
+        duration = max(granule - pre_skip, 0) / granule_rate
+    return AudioProbe(
+        format=AudioFormat.OGG,
+        codec=codec,
+        duration_seconds=duration,
+        sample_rate=sample_rate,
+        channels=channels,
+    )
+
+
+_MP3_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {
+    1: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    25: (11025, 12000, 8000),
+}
+# (версия MPEG, layer) -> отсчетов на кадр
+_MP3_SAMPLES_PER_FRAME = {
+    (1, 1): 384, (1, 2): 1152, (1, 3): 1152,
+    (2, 1): 384, (2, 2): 1152, (2, 3): 576,
+}
+
+
+def _parse_mp3_frame_header(data: bytes, pos: int) -> Optional[tuple]:
+    """(версия, layer, битрейт кбит/с, частота, каналы, длина кадра) или None."""
+    if pos + 4 > len(data) or data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+        return None
+    version_bits = (data[pos + 1] >> 3) & 0x03
+    layer_bits = (data[pos + 1] >> 1) & 0x03
+    bitrate_index = data[pos + 2] >> 4
+    rate_index = (data[pos + 2] >> 2) & 0x03
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    version = {0: 25, 2: 2, 3: 1}[version_bits]
+    layer = 4 - layer_bits
+    table_version = 1 if version == 1 else 2
+    bitrate = _MP3_BITRATES[(table_version, layer)][bitrate_index]
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    padding = (data[pos + 2] >> 1) & 0x01
+    channels = 1 if (data[pos + 3] >> 6) == 3 else 2
+    if layer == 1:
+        frame_length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+    else:
+        samples = _MP3_SAMPLES_PER_FRAME[(table_version, layer)]
+        frame_length = samples // 8 * bitrate * 1000 // sample_rate + padding
+    return version, layer, bitrate, sample_rate, channels, frame_length
+
+
+def _probe_mp3(data: bytes) -> Optional[AudioProbe]:
+    pos = 0
+    if data.startswith(b"ID3") and len(data) >= 10:
+        tag_size = ((data[6] & 0x7F) << 21) | ((data[7] & 0x7F) << 14) | ((data[8] & 0x7F) << 7) | (data[9] & 0x7F)
+        pos = 10 + tag_size + (10 if data[5] & 0x10 else 0)
+
+    # Ищем первый кадр, подтвержденный заголовком следующего кадра
+    header = None
+    search_limit = min(len(data) - 4, pos + 64 * 1024)
+    while pos < search_limit:
+        pos = data.find(b"\xff", pos, search_limit + 1)
+        if pos < 0:
+            return None
+        header = _parse_mp3_frame_header(data, pos)
+        if header:
+            next_pos = pos + header[5]
+            if next_pos + 4 > len(data) or _parse_mp3_frame_header(data, next_pos):
+                break
+        header = None
+        pos += 1
+    if header is None:
+        return None
+
+    version, layer, bitrate, sample_rate, channels, _ = header
+    table_version = 1 if version == 1 else 2
+    samples_per_frame = _MP3_SAMPLES_PER_FRAME[(table_version, layer)]
+
+    # VBR: количество кадров из заголовка Xing/Info или VBRI
+    frames = None
+    if table_version == 1:
+        side_info = 17 if channels == 1 else 32
+    else:
+        side_info = 9 if channels == 1 else 17
+    xing = pos + 4 + side_info
+    if data[xing:xing + 4] in (b"Xing", b"Info") and xing + 12 <= len(data):
+        flags = int.from_bytes(data[xing + 4:xing + 8], "big")
+        if flags & 0x01:
+            frames = int.from_bytes(data[xing + 8:xing + 12], "big")
+    elif data[pos + 36:pos + 40] == b"VBRI" and pos + 54 <= len(data):
+        frames = int.from_bytes(data[pos + 50:pos + 54], "big")
+
+    if frames:
+        duration = frames * samples_per_frame / sample_rate
+    else:
+        audio_bytes = len(data) - pos - (128 if data[-128:-125] == b"TAG" else 0)
+        duration = audio_bytes * 8 / (bitrate * 1000)
+    return AudioProbe(
+        format=AudioFormat.MP3,
+        codec=f"mpeg{'2.5' if version == 25 else version}-layer{layer}",
+        duration_seconds=duration,
+        sample_rate=sample_rate,
+        channels=channels,
+        bitrate_kbps=bitrate,
+    )
+
+
+def probe_audio(data: bytes) -> Optional[AudioProbe]:
+    """
+    Определяет формат, длительность и параметры аудио по заголовкам контейнера.
+
+    Декодирование не выполняется, поэтому функция безопасна для вызова
+    из event loop. Возвращает None для неподдерживаемых форматов.
+    """
+    if not data:
+        return None
+    with _timed(STAGE_AUDIO_PROBE) as outcome:
+        probe = None
+        try:
+            if data.startswith(b"OggS"):
+                probe = _probe_ogg(data)
+            elif data[:4] in (b"RIFF", b"RF64"):
+                probe = _probe_wav(data)
+            elif data.startswith(b"ID3") or (len(data) > 1 and data[0] == 0xFF and (data[1] & 0xE0) == 0xE0):
+                probe = _probe_mp3(data)
+        except (IndexError, KeyError, struct.error, ZeroDivisionError) as e:
+            logger.debug(f"Audio header probe failed: {e}")
+            outcome[0] = OUTCOME_ERROR
+            return None
+        if probe is None:
+            outcome[0] = OUTCOME_UNSUPPORTED
+        return probe
+
+
+# ---------------------------------------------------------------------------
+# Перекодирование
+# ---------------------------------------------------------------------------
+
+_transcode_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_transcode_semaphore() -> asyncio.Semaphore:
+    global _transcode_semaphore
+    if _transcode_semaphore is None:
+        _transcode_semaphore = asyncio.Semaphore(max(1, settings.AUDIO_TRANSCODE_MAX_PROCESSES))
+    return _transcode_semaphore
+
+
+async def _iter_chunks(source: Union[bytes, AsyncIterable[bytes]]) -> AsyncIterable[bytes]:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+        for offset in range(0, len(view), TRANSCODE_CHUNK_SIZE):
+            yield bytes(view[offset:offset + TRANSCODE_CHUNK_SIZE])
+    else:
+        async for chunk in source:
+            yield chunk
+
+
+async def _feed_stdin(process: asyncio.subprocess.Process, source: Union[bytes, AsyncIterable[bytes]]) -> None:
+    try:
+        async for chunk in _iter_chunks(source):
+            process.stdin.write(chunk)
+            await process.stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        # ffmpeg завершился раньше (ошибка формата) - причину покажет stderr
+        pass
+    finally:
+        if not process.stdin.is_closing():
+            process.stdin.close()
+
+
+async def _kill_process(process: asyncio.subprocess.Process) -> None:
+    if process.returncode is None:
+        process.kill()
+        await process.wait()
+
+
+async def transcode_to_wav(source: Union[bytes, AsyncIterable[bytes]],
+                           sample_rate: int = 16000,
+                           channels: int = 1,
+                           timeout: Optional[float] = None) -> bytes:
+    """
+    Перекодирует аудио в WAV (PCM s16le) дочерним процессом ffmpeg.
+
+    Args:
+        source: Данные аудио или асинхронный итератор их частей
+        sample_rate: Частота дискретизации результата
+        channels: Количество каналов результата
+        timeout: Таймаут в секундах (по умолчанию VOICE_PROCESSING_TIMEOUT)
+
+    Returns:
+        Данные WAV файла
+
+    Raises:
+        AudioTranscodeError: ffmpeg недоступен, завершился с ошибкой или по таймауту
+    """
+    timeout = timeout if timeout is not None else settings.VOICE_PROCESSING_TIMEOUT
+    args = [
+        settings.FFMPEG_BINARY, "-hide_banner", "-loglevel", "error",
+        "-i", "pipe:0",
+        "-ar", str(sample_rate), "-ac", str(channels),
+        "-f", "wav", "pipe:1",
+    ]
+    async with _get_transcode_semaphore():
+        with _timed(STAGE_AUDIO_TRANSCODE) as outcome:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *args,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+            except OSError as e:
+                raise AudioTranscodeError(f"Cannot start ffmpeg ({settings.FFMPEG_BINARY}): {e}") from e
+
+            feeder = asyncio.create_task(_feed_stdin(process, source))
+            try:
+                stdout, stderr = await asyncio.wait_for(
+                    asyncio.gather(process.stdout.read(), process.stderr.read()),
+                    timeout=timeout
+                )
+                await asyncio.wait_for(process.wait(), timeout=timeout)
+            except asyncio.TimeoutError as e:
+                await _kill_process(process)
+                outcome[0] = OUTCOME_TIMEOUT
+                raise AudioTranscodeError(f"ffmpeg timed out after {timeout}s") from e
+            except asyncio.CancelledError:
+                await _kill_process(process)
+                raise
+            finally:
+                feeder.cancel()
+                await asyncio.gather(feeder, return_exceptions=True)
+
+            if process.returncode != 0:
+                message = stderr.decode("utf-8", errors="replace").strip()[-500:]
+                raise AudioTranscodeError(f"ffmpeg exited with code {process.returncode}: {message}")
+    return stdout
@@ -324,22 +324,19 @@ class AudioFileProcessor:
         """
         Получить длительность аудиофайла
         
+        Длительность читается из заголовков контейнера (OGG, MP3, WAV)
+        без декодирования аудио.
+        
         Args:
             file_data: Бинарные данные файла
             
         Returns:
             Длительность в секундах или None
         """
-        try:
-            # Попытка использовать pydub для получения длительности
-            from pydub import AudioSegment
-            import io
-            
-            audio = AudioSegment.from_file(io.BytesIO(file_data))
-            return len(audio) / 1000.0  # Конвертация из миллисекунд
-        except Exception:
-            # Если pydub недоступен или файл не поддерживается
-            return None
+        from app.services.voice.audio_processing import probe_audio
+
+        probe = probe_audio(file_data)
+        return probe.duration_seconds if probe else None
 
 
 class RateLimiter:
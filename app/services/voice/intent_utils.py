@@ -3,10 +3,91 @@
 """
 
 import re
-from typing import List, Optional, Dict, Any
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any, Iterable, Tuple
 import logging
 
 
+# Сколько скомпилированных наборов ключевых слов держим в процессе
+KEYWORD_MATCHER_CACHE_SIZE = 256
+
+
+class KeywordMatcher:
+    """
+    Поиск любого из ключевых слов в тексте одним проходом.
+
+    Ключевые слова и текст приводятся к нижнему регистру (как в прежней проверке
+    каждого слова отдельным выражением), слова собираются в префиксное дерево,
+    которое компилируется в одно регулярное выражение: на каждой позиции текста
+    проверяется не более длины самого длинного слова символов, независимо
+    от количества слов. Пустые ключевые слова пропускаются.
+    """
+
+    def __init__(self, keywords: Iterable[str], whole_words: bool = True):
+        self.keywords: Tuple[str, ...] = tuple(sorted({k.lower() for k in keywords if k and k.strip()}))
+        self.whole_words = whole_words
+        self._pattern: Optional[re.Pattern] = None
+        if self.keywords:
+            body = self._trie_to_regex(self._build_trie(self.keywords))
+            if whole_words:
+                body = r'\b(?:' + body + r')\b'
+            self._pattern = re.compile(body)
+
+    @staticmethod
+    def _build_trie(keywords: Iterable[str]) -> Dict[str, Any]:
+        trie: Dict[str, Any] = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = {}  # конец слова
+        return trie
+
+    @classmethod
+    def _trie_to_regex(cls, node: Dict[str, Any]) -> str:
+        # Более длинные продолжения идут первыми, конец слова - последней альтернативой
+        branches = [re.escape(char) + cls._trie_to_regex(child) for char, child in sorted(node.items()) if char]
+        is_end = '' in node
+        if not branches:
+            return ''
+        if len(branches) == 1 and not is_end:
+            return branches[0]
+        group = '(?:' + '|'.join(branches) + ('|' if is_end else '') + ')'
+        return group
+
+    def search(self, text: str) -> Optional[str]:
+        """Первое найденное ключевое слово (в нижнем регистре) или None."""
+        if not text or self._pattern is None:
+            return None
+        match = self._pattern.search(text.lower())
+        return match.group(0) if match else None
+
+    def matches(self, text: str) -> bool:
+        return self.search(text) is not None
+
+
+_keyword_matchers: "OrderedDict[Tuple[Tuple[str, ...], bool], KeywordMatcher]" = OrderedDict()
+
+
+def get_keyword_matcher(keywords: Iterable[str], whole_words: bool = True) -> KeywordMatcher:
+    """
+    Возвращает скомпилированный матчер для набора ключевых слов.
+
+    Набор ключевых слов из конфигурации агента и есть его версия: пока он
+    не меняется, используется один и тот же скомпилированный матчер.
+    """
+    key = (tuple(keywords), whole_words)
+    matcher = _keyword_matchers.get(key)
+    if matcher is None:
+        matcher = KeywordMatcher(key[0], whole_words=whole_words)
+        _keyword_matchers[key] = matcher
+        while len(_keyword_matchers) > KEYWORD_MATCHER_CACHE_SIZE:
+            _keyword_matchers.popitem(last=False)
+    else:
+        _keyword_matchers.move_to_end(key)
+    return matcher
+
+
 class VoiceIntentDetector:
     """
     Детектор намерений пользователя для голосовых функций
@@ -29,17 +110,11 @@ class VoiceIntentDetector:
         if not text or not intent_keywords:
             return False
             
-        # Приводим к нижнему регистру для поиска
-        text_lower = text.lower()
-        
-        # Проверяем наличие ключевых слов
-        for keyword in intent_keywords:
-            keyword_lower = keyword.lower()
-            # Используем регулярное выражение для поиска целых слов
-            pattern = r'\b' + re.escape(keyword_lower) + r'\b'
-            if re.search(pattern, text_lower):
-                self.logger.debug(f"TTS intent detected with keyword: '{keyword}'")
-                return True
+        # Все ключевые слова проверяются одним скомпилированным выражением
+        keyword = get_keyword_matcher(intent_keywords).search(text)
+        if keyword is not None:
+            self.logger.debug(f"TTS intent detected with keyword: '{keyword}'")
+            return True
                 
         return False
     
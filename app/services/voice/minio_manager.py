@@ -2,45 +2,53 @@
 Менеджер для работы с MinIO для хранения аудиофайлов
 """
 
-import asyncio
 import logging
 import uuid
-from datetime import datetime, timedelta
-from typing import Optional, Tuple, Dict, Any, List
-from io import BytesIO
-
-from minio import Minio
-from minio.error import S3Error
-from urllib3.exceptions import MaxRetryError
+from datetime import datetime, timedelta, date, timezone
+from typing import Optional, Tuple, Dict, Any, List, AsyncIterator
 
 from app.core.config import settings
 from app.api.schemas.voice_schemas import VoiceFileInfo, AudioFormat
+from app.services.storage import ObjectStorageClient, ObjectStorageError, get_object_storage
+from app.services.storage.object_storage import MAX_DELETE_BATCH
 
 
 class MinioFileManager:
     """
     Менеджер для работы с MinIO/S3 хранилищем аудиофайлов
+
+    Ключи объектов партиционированы по дате (``days/voice/YYYY/MM/DD/...``), поэтому
+    очистка удаляет истекшие дни целиком по префиксу, не перебирая весь bucket.
+    Файлы в старой раскладке (``voice/{agent_id}/{user_id}/...``) лежат под
+    отдельным префиксом и удаляются по времени загрузки.
     """
 
+    # Корень дневных партиций: {PARTITION_ROOT}{file_type}/YYYY/MM/DD/
+    PARTITION_ROOT = "days/"
+    # Префикс файлов в старой раскладке ключей (без даты в начале)
+    LEGACY_PREFIX = "voice/"
+    # Служебный объект с курсором очистки (первый еще не очищенный день)
+    CLEANUP_CURSOR_KEY = "_meta/cleanup_cursor"
+    LIFECYCLE_RULE_ID = "voice-files-expiration"
+    LEGACY_LIFECYCLE_RULE_ID = "voice-files-legacy-expiration"
+
     def __init__(self, logger: Optional[logging.Logger] = None):
         self.logger = logger or logging.getLogger("minio_file_manager")
-        self.client: Optional[Minio] = None
+        self.client: Optional[ObjectStorageClient] = None
         self.bucket_name = settings.MINIO_VOICE_BUCKET_NAME
         self._initialized = False
+        self._lifecycle_enabled = False
 
     async def initialize(self) -> None:
         """Инициализация подключения к MinIO"""
         try:
-            # Создаем клиент MinIO
-            self.client = Minio(
-                endpoint=settings.MINIO_ENDPOINT,
-                access_key=settings.MINIO_ACCESS_KEY,
-                secret_key=settings.MINIO_SECRET_KEY,
-                secure=settings.MINIO_SECURE
-            )
+            # Общий для процесса асинхронный клиент хранилища
+            self.client = get_object_storage()
 
             # Проверяем подключение и создаем bucket если нужно
             await self._ensure_bucket_exists()
+            if settings.MINIO_LIFECYCLE_ENABLED and settings.VOICE_FILE_RETENTION_DAYS > 0:
+                await self.ensure_lifecycle_policy(settings.VOICE_FILE_RETENTION_DAYS)
             self._initialized = True
             self.logger.info(f"MinIO client initialized. Bucket: {self.bucket_name}")
 
@@ -54,17 +62,7 @@ class MinioFileManager:
             raise RuntimeError("MinIO client not initialized")
 
         try:
-            # Выполняем операции с MinIO в отдельном потоке
-            loop = asyncio.get_event_loop()
-            
-            bucket_exists = await loop.run_in_executor(
-                None, self.client.bucket_exists, self.bucket_name
-            )
-            
-            if not bucket_exists:
-                await loop.run_in_executor(
-                    None, self.client.make_bucket, self.bucket_name
-                )
+            if await self.client.ensure_bucket(self.bucket_name):
                 self.logger.info(f"Created bucket: {self.bucket_name}")
             else:
                 self.logger.debug(f"Bucket already exists: {self.bucket_name}")
@@ -73,9 +71,64 @@ class MinioFileManager:
             self.logger.error(f"Error ensuring bucket exists: {e}", exc_info=True)
             raise
 
+    async def ensure_lifecycle_policy(self, retention_days: int) -> bool:
+        """
+        Установка правила жизненного цикла bucket для автоматического удаления файлов
+
+        Правила для дневных партиций и для старой раскладки ключей добавляются
+        к существующим правилам bucket. Если сервер не поддерживает lifecycle-правила,
+        очистка выполняется только через cleanup_old_files.
+
+        Args:
+            retention_days: Срок хранения файлов в днях
+
+        Returns:
+            True если правило установлено сервером
+        """
+        if not self.client:
+            raise RuntimeError("MinIO client not initialized")
+
+        try:
+            await self.client.set_bucket_expiration(
+                self.bucket_name,
+                prefix=self.PARTITION_ROOT,
+                days=retention_days,
+                rule_id=self.LIFECYCLE_RULE_ID
+            )
+            await self.client.set_bucket_expiration(
+                self.bucket_name,
+                prefix=self.LEGACY_PREFIX,
+                days=retention_days,
+                rule_id=self.LEGACY_LIFECYCLE_RULE_ID
+            )
+            self._lifecycle_enabled = True
+            self.logger.info(f"Lifecycle policy set for bucket {self.bucket_name}: expire after {retention_days} days")
+        except ObjectStorageError as e:
+            self._lifecycle_enabled = False
+            self.logger.info(f"Lifecycle policy not supported for bucket {self.bucket_name} ({e.code}), "
+                             f"falling back to prefix cleanup")
+        except Exception as e:
+            self._lifecycle_enabled = False
+            self.logger.warning(f"Failed to set lifecycle policy for bucket {self.bucket_name}: {e}")
+
+        return self._lifecycle_enabled
+
+    @classmethod
+    def _partition_root(cls, file_type: str = "voice") -> str:
+        """Корень дневных партиций указанного типа файлов"""
+        return f"{cls.PARTITION_ROOT}{file_type}/"
+
+    @classmethod
+    def _day_prefix(cls, day: date, file_type: str = "voice") -> str:
+        """Префикс всех объектов указанного типа за один день"""
+        return f"{cls._partition_root(file_type)}{day.strftime('%Y/%m/%d')}/"
+
     def _generate_object_key(self, agent_id: str, user_id: str, file_type: str = "voice") -> str:
         """
         Генерация ключа объекта в S3/MinIO
+
+        Дата идет сразу после корня партиций, чтобы все объекты одного дня
+        находились под общим префиксом: days/{file_type}/YYYY/MM/DD/{agent_id}/{user_id}/HH/{uuid}
         
         Args:
             agent_id: ID агента
@@ -85,9 +138,9 @@ class MinioFileManager:
         Returns:
             Строка-ключ для S3/MinIO
         """
-        timestamp = datetime.utcnow().strftime("%Y/%m/%d/%H")
+        now = datetime.utcnow()
         unique_id = str(uuid.uuid4())
-        return f"{file_type}/{agent_id}/{user_id}/{timestamp}/{unique_id}"
+        return f"{self._day_prefix(now.date(), file_type)}{agent_id}/{user_id}/{now.strftime('%H')}/{unique_id}"
 
     async def upload_audio_file(self, 
                                audio_data: bytes,
@@ -137,17 +190,13 @@ class MinioFileManager:
             if metadata:
                 upload_metadata.update({f"custom-{k}": str(v) for k, v in metadata.items()})
 
-            # Загружаем файл
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None,
-                self.client.put_object,
+            # Загружаем файл (большие файлы уходят multipart upload)
+            await self.client.put_object(
                 self.bucket_name,
                 object_key,
-                BytesIO(audio_data),
-                len(audio_data),
-                mime_type,
-                upload_metadata
+                audio_data,
+                content_type=mime_type,
+                metadata=upload_metadata
             )
 
             # Создаем информацию о файле
@@ -190,19 +239,11 @@ class MinioFileManager:
             raise RuntimeError("MinIO client not initialized")
 
         try:
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                self.client.get_object,
+            audio_data = await self.client.get_object(
                 file_info.minio_bucket,
                 file_info.minio_key
             )
             
-            # Читаем все данные
-            audio_data = response.read()
-            response.close()
-            response.release_conn()
-            
             self.logger.debug(f"Downloaded audio file: {file_info.minio_key} ({len(audio_data)} bytes)")
             return audio_data
 
@@ -224,10 +265,7 @@ class MinioFileManager:
             raise RuntimeError("MinIO client not initialized")
 
         try:
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None,
-                self.client.remove_object,
+            await self.client.remove_object(
                 file_info.minio_bucket,
                 file_info.minio_key
             )
@@ -256,15 +294,11 @@ class MinioFileManager:
             raise RuntimeError("MinIO client not initialized")
 
         try:
-            loop = asyncio.get_event_loop()
-            expiry = timedelta(hours=expiry_hours)
-            
-            url = await loop.run_in_executor(
-                None,
-                self.client.presigned_get_object,
+            # Подпись вычисляется локально, без обращения к серверу
+            url = self.client.presigned_get_url(
                 file_info.minio_bucket,
                 file_info.minio_key,
-                expiry
+                timedelta(hours=expiry_hours)
             )
             
             self.logger.debug(f"Generated presigned URL for {file_info.minio_key}")
@@ -277,35 +311,38 @@ class MinioFileManager:
     async def list_user_files(self, 
                              agent_id: str, 
                              user_id: str,
-                             limit: int = 100) -> List[str]:
+                             limit: int = 100,
+                             since: Optional[date] = None) -> List[str]:
         """
         Получение списка файлов пользователя
+
+        Дневные партиции перебираются только с `since` (по умолчанию - начало
+        окна хранения VOICE_FILE_RETENTION_DAYS) до сегодняшнего дня: по одному
+        листингу префикса пользователя за день. Без срока хранения дни с данными
+        находятся листингом партиций с разделителем.
         
         Args:
             agent_id: ID агента
             user_id: ID пользователя
             limit: Максимальное количество файлов
+            since: Первый день, за который нужны файлы
             
         Returns:
-            Список ключей объектов
+            Список ключей объектов, от старых к новым (сначала старая раскладка ключей)
         """
         if not self._initialized or not self.client:
             raise RuntimeError("MinIO client not initialized")
 
         try:
-            prefix = f"voice/{agent_id}/{user_id}/"
-            loop = asyncio.get_event_loop()
-            
-            objects = await loop.run_in_executor(
-                None,
-                lambda: list(self.client.list_objects(
-                    self.bucket_name, 
-                    prefix=prefix,
-                    recursive=True
-                ))
-            )
-            
-            file_keys = [obj.object_name for obj in objects[:limit]]
+            file_keys: List[str] = []
+            async for prefix in self._user_prefixes(agent_id, user_id, since):
+                async for obj in self.client.list_objects(self.bucket_name, prefix=prefix):
+                    file_keys.append(obj.key)
+                    if len(file_keys) >= limit:
+                        break
+                if len(file_keys) >= limit:
+                    break
+
             self.logger.debug(f"Found {len(file_keys)} files for user {user_id}")
             return file_keys
 
@@ -313,12 +350,133 @@ class MinioFileManager:
             self.logger.error(f"Error listing user files: {e}", exc_info=True)
             return []
 
-    async def cleanup_old_files(self, days_old: int = 7) -> int:
+    async def _user_prefixes(self, agent_id: str, user_id: str, since: Optional[date]) -> AsyncIterator[str]:
+        """Префиксы файлов пользователя от старых к новым: старая раскладка, затем дни"""
+        yield f"{self.LEGACY_PREFIX}{agent_id}/{user_id}/"
+
+        today = datetime.utcnow().date()
+        if since is None and settings.VOICE_FILE_RETENTION_DAYS > 0:
+            # cleanup_old_files удаляет дни раньше today - retention, остальные еще хранятся
+            since = today - timedelta(days=settings.VOICE_FILE_RETENTION_DAYS)
+        if since is None:
+            async for day in self._iter_partitions():
+                yield f"{self._day_prefix(day)}{agent_id}/{user_id}/"
+            return
+
+        day = since
+        while day <= today:
+            yield f"{self._day_prefix(day)}{agent_id}/{user_id}/"
+            day += timedelta(days=1)
+
+    async def _list_child_partitions(self, prefix: str, digits: int, low: int, high: int) -> List[int]:
+        """
+        Числовые подкаталоги (год/месяц/день) непосредственно под префиксом
+
+        Учитываются только подкаталоги из `digits` цифр в диапазоне [low, high],
+        остальные (служебные или посторонние) пропускаются.
+        """
+        values = []
+        async for obj in self.client.list_objects(self.bucket_name, prefix=prefix, recursive=False):
+            if not obj.is_prefix:
+                continue
+            part = obj.key[len(prefix):].rstrip("/")
+            if len(part) == digits and part.isdigit() and low <= int(part) <= high:
+                values.append(int(part))
+        return sorted(values)
+
+    async def _iter_partitions(self, file_type: str = "voice") -> AsyncIterator[date]:
+        """Дни с данными от старых к новым; листинг с разделителем по уровням год/месяц/день"""
+        root = self._partition_root(file_type)
+        for year in await self._list_child_partitions(root, 4, 2000, 9999):
+            for month in await self._list_child_partitions(f"{root}{year:04d}/", 2, 1, 12):
+                for day in await self._list_child_partitions(f"{root}{year:04d}/{month:02d}/", 2, 1, 31):
+                    try:
+                        yield date(year, month, day)
+                    except ValueError:
+                        continue
+
+    async def _find_oldest_partition(self, file_type: str = "voice") -> Optional[date]:
+        """
+        Поиск самого старого дня с данными через листинг с разделителем.
+        Читает только по одной странице на уровень год/месяц/день.
+        """
+        async for day in self._iter_partitions(file_type):
+            return day
+        return None
+
+    async def _read_cleanup_cursor(self) -> Optional[date]:
+        """Чтение курсора очистки из служебного объекта bucket"""
+        try:
+            payload = await self.client.get_object(self.bucket_name, self.CLEANUP_CURSOR_KEY)
+            return date.fromisoformat(payload.decode("utf-8").strip())
+        except ObjectStorageError as e:
+            if e.code != "NoSuchKey":
+                self.logger.warning(f"Failed to read cleanup cursor: {e}")
+            return None
+        except ValueError as e:
+            self.logger.warning(f"Invalid cleanup cursor, starting from oldest partition: {e}")
+            return None
+
+    async def _write_cleanup_cursor(self, day: date) -> None:
+        """Сохранение курсора очистки в служебный объект bucket"""
+        await self.client.put_object(
+            self.bucket_name,
+            self.CLEANUP_CURSOR_KEY,
+            day.isoformat().encode("utf-8"),
+            content_type="text/plain"
+        )
+
+    async def _delete_prefix(self, prefix: str) -> Tuple[int, int]:
+        """
+        Удаление всех объектов под префиксом пакетами multi-object delete
+
+        Returns:
+            (количество удаленных, количество ошибок)
+        """
+        keys = (obj.key async for obj in self.client.list_objects(self.bucket_name, prefix=prefix))
+        return await self._delete_keys(keys, "old file")
+
+    async def _delete_keys(self, keys: AsyncIterator[str], description: str) -> Tuple[int, int]:
+        """
+        Удаление ключей по мере листинга: каждый набранный пакет удаляется сразу,
+        поэтому в памяти не больше одного пакета ключей
+
+        Returns:
+            (количество удаленных, количество ошибок)
+        """
+        deleted = failed = 0
+        batch: List[str] = []
+
+        async def flush() -> None:
+            nonlocal deleted, failed
+            errors = await self.client.remove_objects(self.bucket_name, batch)
+            for error in errors:
+                self.logger.warning(f"Failed to delete {description} {error.key}: {error.message or error.code}")
+            deleted += len(batch) - len(errors)
+            failed += len(errors)
+            batch.clear()
+
+        async for key in keys:
+            batch.append(key)
+            if len(batch) >= MAX_DELETE_BATCH:
+                await flush()
+        if batch:
+            await flush()
+        return deleted, failed
+
+    async def cleanup_old_files(self, days_old: int = 7, max_days: Optional[int] = None) -> int:
         """
         Очистка старых файлов
+
+        Удаляет истекшие дневные партиции по префиксу пакетами multi-object delete.
+        Прогресс сохраняется в курсоре, поэтому прерванный или ограниченный
+        `max_days` запуск продолжается со следующего неочищенного дня.
+        Файлы в старой раскладке ключей (без даты в начале) удаляются
+        lifecycle-правилом bucket, а без него - по времени загрузки (_cleanup_legacy_files).
         
         Args:
             days_old: Возраст файлов в днях для удаления
+            max_days: Максимальное количество дней, обрабатываемых за один запуск
             
         Returns:
             Количество удаленных файлов
@@ -327,28 +485,37 @@ class MinioFileManager:
             raise RuntimeError("MinIO client not initialized")
 
         try:
-            cutoff_date = datetime.utcnow() - timedelta(days=days_old)
-            loop = asyncio.get_event_loop()
-            
-            # Получаем все объекты
-            objects = await loop.run_in_executor(
-                None,
-                lambda: list(self.client.list_objects(self.bucket_name, recursive=True))
-            )
-            
+            cutoff_day = (datetime.utcnow() - timedelta(days=days_old)).date()
             deleted_count = 0
-            for obj in objects:
-                if obj.last_modified < cutoff_date:
-                    try:
-                        await loop.run_in_executor(
-                            None,
-                            self.client.remove_object,
-                            self.bucket_name,
-                            obj.object_name
-                        )
-                        deleted_count += 1
-                    except Exception as e:
-                        self.logger.warning(f"Failed to delete old file {obj.object_name}: {e}")
+            if not self._lifecycle_enabled:
+                deleted_count += await self._cleanup_legacy_files(days_old)
+
+            start_day = await self._read_cleanup_cursor() or await self._find_oldest_partition()
+            if not start_day or start_day >= cutoff_day:
+                self.logger.debug("No expired voice file partitions to clean up")
+                return deleted_count
+
+            processed_days = 0
+            day = start_day
+
+            while day < cutoff_day:
+                if max_days is not None and processed_days >= max_days:
+                    self.logger.info(f"Cleanup stopped after {processed_days} days, will resume from {day.isoformat()}")
+                    break
+
+                deleted, failed = await self._delete_prefix(self._day_prefix(day))
+                deleted_count += deleted
+                processed_days += 1
+
+                if failed:
+                    # Курсор не двигаем, чтобы день был повторно обработан в следующем запуске
+                    self.logger.warning(f"Cleanup of {day.isoformat()} incomplete: {failed} objects failed")
+                    break
+
+                if deleted:
+                    self.logger.debug(f"Deleted {deleted} voice files for {day.isoformat()}")
+                day += timedelta(days=1)
+                await self._write_cleanup_cursor(day)
 
             self.logger.info(f"Cleaned up {deleted_count} old files")
             return deleted_count
@@ -357,6 +524,23 @@ class MinioFileManager:
             self.logger.error(f"Error during cleanup: {e}", exc_info=True)
             return 0
 
+    async def _cleanup_legacy_files(self, days_old: int) -> int:
+        """
+        Удаление файлов старой раскладки ключей, загруженных раньше days_old дней назад
+
+        Returns:
+            Количество удаленных файлов
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(days=days_old)
+        keys = (
+            obj.key async for obj in self.client.list_objects(self.bucket_name, prefix=self.LEGACY_PREFIX)
+            if obj.last_modified is not None and obj.last_modified < cutoff
+        )
+        deleted, _ = await self._delete_keys(keys, "legacy file")
+        if deleted:
+            self.logger.info(f"Deleted {deleted} legacy voice files")
+        return deleted
+
     async def health_check(self) -> bool:
         """
         Проверка здоровья подключения к MinIO
@@ -368,11 +552,7 @@ class MinioFileManager:
             return False
 
         try:
-            loop = asyncio.get_event_loop()
-            bucket_exists = await loop.run_in_executor(
-                None, self.client.bucket_exists, self.bucket_name
-            )
-            return bucket_exists
+            return await self.client.bucket_exists(self.bucket_name)
         except Exception as e:
             self.logger.error(f"MinIO health check failed: {e}")
             return False
@@ -388,22 +568,17 @@ class MinioFileManager:
             raise RuntimeError("MinIO client not initialized")
 
         try:
-            loop = asyncio.get_event_loop()
-            
-            # Получаем все объекты и считаем статистику
-            objects = await loop.run_in_executor(
-                None,
-                lambda: list(self.client.list_objects(self.bucket_name, recursive=True))
-            )
-            
-            total_files = len(objects)
-            total_size = sum(obj.size for obj in objects)
-            
-            # Группируем по типам файлов
+            total_files = 0
+            total_size = 0
             file_types = {}
-            for obj in objects:
-                if obj.object_name.startswith("voice/"):
-                    ext = obj.object_name.split(".")[-1] if "." in obj.object_name else "unknown"
+
+            # Считаем статистику постранично, не загружая весь листинг в память
+            async for obj in self.client.list_objects(self.bucket_name):
+                total_files += 1
+                total_size += obj.size
+                # Группируем по типам файлов
+                if obj.key.startswith((self.PARTITION_ROOT, self.LEGACY_PREFIX)):
+                    ext = obj.key.split(".")[-1] if "." in obj.key else "unknown"
                     file_types[ext] = file_types.get(ext, 0) + 1
 
             return {
@@ -420,6 +595,6 @@ class MinioFileManager:
 
     async def cleanup(self) -> None:
         """Очистка ресурсов"""
-        # MinIO client не требует явного закрытия соединений
+        # Пул соединений общий для процесса и закрывается через close_object_storage
         self._initialized = False
         self.logger.info("MinIO file manager cleaned up")
@@ -1,13 +1,27 @@
 """
 STT (Speech-to-Text) services package
+
+Сервисы провайдеров импортируются при первом обращении: каждый тянет свой SDK
+(google-cloud, openai, aiohttp), а агенту нужен только настроенный провайдер.
 """
 
-from .openai_stt import OpenAISTTService
-from .google_stt import GoogleSTTService  
-from .yandex_stt import YandexSTTService
+import importlib
+
+_SERVICE_MODULES = {
+    'OpenAISTTService': '.openai_stt',
+    'GoogleSTTService': '.google_stt',
+    'YandexSTTService': '.yandex_stt',
+}
 
 __all__ = [
     'OpenAISTTService',
     'GoogleSTTService',
     'YandexSTTService',
 ]
+
+
+def __getattr__(name):
+    module_name = _SERVICE_MODULES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module_name, __name__), name)
@@ -12,6 +12,7 @@ import aiohttp
 from app.core.config import settings
 from app.api.schemas.voice_schemas import VoiceProvider, VoiceProcessingResult, VoiceFileInfo, STTConfig
 from app.services.voice.base import STTServiceBase, VoiceServiceError, VoiceServiceTimeout
+from app.services.voice.audio_processing import transcode_to_wav
 
 
 class YandexSTTService(STTServiceBase):
@@ -165,9 +166,6 @@ class YandexSTTService(STTServiceBase):
             if (file_info.original_filename.lower().endswith('.ogg') and 
                 yandex_format == 'oggopus'):
                 try:
-                    from pydub import AudioSegment
-                    import io
-                    
                     self.logger.info("Converting WhatsApp OGG file to WAV for Yandex compatibility")
                     
                     # Проверим заголовок файла
@@ -176,40 +174,17 @@ class YandexSTTService(STTServiceBase):
                     else:
                         self.logger.warning(f"File does not have OGG header: {audio_data[:10].hex()}")
                     
-                    # Попробуем различные способы загрузки
-                    audio_segment = None
+                    # ffmpeg сам определяет формат входа; перекодирование идет в дочернем процессе
+                    converted_audio_data = await transcode_to_wav(
+                        audio_data,
+                        sample_rate=16000,  # 16kHz, mono
+                        channels=1
+                    )
                     
-                    # Способ 1: Попробовать как OGG
-                    try:
-                        audio_segment = AudioSegment.from_ogg(io.BytesIO(audio_data))
-                        self.logger.debug("Successfully loaded as OGG")
-                    except Exception as e:
-                        self.logger.debug(f"Failed to load as OGG: {e}")
-                        
-                        # Способ 2: Попробовать автоопределение
-                        try:
-                            audio_segment = AudioSegment.from_file(io.BytesIO(audio_data))
-                            self.logger.debug("Successfully loaded with auto-detection")
-                        except Exception as e2:
-                            self.logger.debug(f"Failed to load with auto-detection: {e2}")
-                            raise e2
+                    # Обновляем формат для Yandex
+                    yandex_format = 'lpcm'
                     
-                    if audio_segment:
-                        # Конвертируем в WAV с параметрами для Yandex
-                        wav_buffer = io.BytesIO()
-                        audio_segment.export(
-                            wav_buffer, 
-                            format="wav",
-                            parameters=["-ar", "16000", "-ac", "1"]  # 16kHz, mono
-                        )
-                        converted_audio_data = wav_buffer.getvalue()
-                        
-                        # Обновляем формат для Yandex
-                        yandex_format = 'lpcm'
-                        
-                        self.logger.info(f"Converted OGG to WAV: {len(audio_data)} -> {len(converted_audio_data)} bytes")
-                    else:
-                        raise Exception("Could not load audio file")
+                    self.logger.info(f"Converted OGG to WAV: {len(audio_data)} -> {len(converted_audio_data)} bytes")
                     
                 except Exception as e:
                     self.logger.warning(f"Failed to convert OGG to WAV: {e}")
@@ -1,13 +1,27 @@
 """
 TTS (Text-to-Speech) services package
+
+Сервисы провайдеров импортируются при первом обращении: каждый тянет свой SDK
+(google-cloud, openai, aiohttp), а агенту нужен только настроенный провайдер.
 """
 
-from .openai_tts import OpenAITTSService
-from .google_tts import GoogleTTSService
-from .yandex_tts import YandexTTSService
+import importlib
+
+_SERVICE_MODULES = {
+    'OpenAITTSService': '.openai_tts',
+    'GoogleTTSService': '.google_tts',
+    'YandexTTSService': '.yandex_tts',
+}
 
 __all__ = [
     'OpenAITTSService',
-    'GoogleTTSService', 
+    'GoogleTTSService',
     'YandexTTSService',
 ]
+
+
+def __getattr__(name):
+    module_name = _SERVICE_MODULES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module_name, __name__), name)
@@ -9,6 +9,7 @@ from typing import Optional, Dict, Any, List, Tuple
 import json
 
 from app.core.config import settings
+from app.core.tracing import STAGE_STT, STAGE_TTS, tracer
 from app.api.schemas.voice_schemas import (
     VoiceSettings, VoiceProvider, VoiceProcessingResult, VoiceFileInfo,
     STTConfig, TTSConfig, VoiceProviderConfig
@@ -17,12 +18,6 @@ from app.services.voice.base import VoiceServiceError, VoiceConfigMixin, RateLim
 from app.services.voice.redis_rate_limiter import RedisRateLimiter
 from app.services.voice.voice_metrics import VoiceMetricsCollector, VoiceMetrics
 from app.services.voice.minio_manager import MinioFileManager
-from app.services.voice.stt.openai_stt import OpenAISTTService
-from app.services.voice.stt.google_stt import GoogleSTTService
-from app.services.voice.stt.yandex_stt import YandexSTTService
-from app.services.voice.tts.openai_tts import OpenAITTSService
-from app.services.voice.tts.google_tts import GoogleTTSService
-from app.services.voice.tts.yandex_tts import YandexTTSService
 from app.services.redis_wrapper import RedisService
 
 
@@ -188,16 +183,19 @@ class VoiceServiceOrchestrator(VoiceConfigMixin):
             try:
                 if provider == VoiceProvider.OPENAI:
                     if provider not in self.stt_services:
+                        from app.services.voice.stt.openai_stt import OpenAISTTService
                         service = OpenAISTTService(provider_config.stt_config, self.logger)
                         await service.initialize()
                         self.stt_services[provider] = service
                 elif provider == VoiceProvider.GOOGLE:
                     if provider not in self.stt_services:
+                        from app.services.voice.stt.google_stt import GoogleSTTService
                         service = GoogleSTTService(provider_config.stt_config, self.logger)
                         await service.initialize()
                         self.stt_services[provider] = service
                 elif provider == VoiceProvider.YANDEX:
                     if provider not in self.stt_services:
+                        from app.services.voice.stt.yandex_stt import YandexSTTService
                         service = YandexSTTService(provider_config.stt_config, self.logger)
                         await service.initialize()
                         self.stt_services[provider] = service
@@ -211,16 +209,19 @@ class VoiceServiceOrchestrator(VoiceConfigMixin):
             try:
                 if provider == VoiceProvider.OPENAI:
                     if provider not in self.tts_services:
+                        from app.services.voice.tts.openai_tts import OpenAITTSService
                         service = OpenAITTSService(provider_config.tts_config, self.logger)
                         await service.initialize()
                         self.tts_services[provider] = service
                 elif provider == VoiceProvider.GOOGLE:
                     if provider not in self.tts_services:
+                        from app.services.voice.tts.google_tts import GoogleTTSService
                         service = GoogleTTSService(provider_config.tts_config, self.logger)
                         await service.initialize()
                         self.tts_services[provider] = service
                 elif provider == VoiceProvider.YANDEX:
                     if provider not in self.tts_services:
+                        from app.services.voice.tts.yandex_tts import YandexTTSService
                         service = YandexTTSService(provider_config.tts_config, self.logger)
                         await service.initialize()
                         self.tts_services[provider] = service
@@ -912,7 +913,8 @@ class VoiceServiceOrchestrator(VoiceConfigMixin):
             raise VoiceServiceError(f"STT service для провайдера {provider.value} не инициализирован")
         
         stt_service = self.stt_services[provider]
-        return await stt_service.transcribe_audio(audio_data, file_info)
+        with tracer.start_span("stt.transcribe", stage=STAGE_STT, attributes={"provider": provider.value}):
+            return await stt_service.transcribe_audio(audio_data, file_info)
 
     async def _process_tts_with_provider(self, provider: 'VoiceProvider', text: str) -> 'VoiceProcessingResult':
         """
@@ -929,4 +931,5 @@ class VoiceServiceOrchestrator(VoiceConfigMixin):
             raise VoiceServiceError(f"TTS service для провайдера {provider.value} не инициализирован")
         
         tts_service = self.tts_services[provider]
-        return await tts_service.synthesize_speech(text)
+        with tracer.start_span("tts.synthesize", stage=STAGE_TTS, attributes={"provider": provider.value}):
+            return await tts_service.synthesize_speech(text)
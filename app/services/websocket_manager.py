@@ -1,11 +1,12 @@
 import asyncio
-import json
 import logging
 from typing import Dict, List, Optional, Callable, Awaitable
 
 from fastapi import WebSocket
 import redis.asyncio as redis
 import redis as redis_base # For exceptions
+from app.core.message_codec import MessageCodecError, decode_message, message_to_json_text
+from app.services.redis_service import get_pubsub_redis
 
 logger = logging.getLogger(__name__)
 
@@ -126,7 +127,8 @@ async def central_redis_listener(agent_id: str, r: redis.Redis, conn_manager: Co
 
     logger.info(f"[Central Listener {agent_id}] Subscribing to {output_channel}")
     try:
-        pubsub = r.pubsub()
+        # Подписка идет через общее соединение Pub/Sub процесса, а не через пул команд
+        pubsub = get_pubsub_redis(decode_responses=False).pubsub()
         await pubsub.subscribe(output_channel)
 
         while True:
@@ -137,15 +139,15 @@ async def central_redis_listener(agent_id: str, r: redis.Redis, conn_manager: Co
             if message and message.get("type") == "message":
                 raw_data = message["data"]
                 try:
-                    data = json.loads(raw_data)
+                    data = decode_message(raw_data)
                     response_channel = data.get("channel")
                     response_thread_id = data.get("thread_id")
 
                     if response_channel in expected_channels_for_websocket and response_thread_id:
-                        await conn_manager.send_to_thread(agent_id, response_thread_id, raw_data.decode('utf-8') if isinstance(raw_data, bytes) else raw_data)
+                        await conn_manager.send_to_thread(agent_id, response_thread_id, message_to_json_text(data))
                     
-                except json.JSONDecodeError:
-                    logger.error(f"[Central Listener {agent_id}] Failed to decode JSON: {raw_data}")
+                except MessageCodecError as e:
+                    logger.error(f"[Central Listener {agent_id}] Failed to decode message: {e}. Data: {raw_data[:200]!r}")
                 except Exception as e:
                     logger.error(f"[Central Listener {agent_id}] Error processing message: {e}", exc_info=True)
             
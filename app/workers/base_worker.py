@@ -1,6 +1,5 @@
 from abc import ABC, abstractmethod
 import asyncio
-import json
 import logging
 from typing import List, Optional, Any, Dict
 from datetime import datetime, timezone, timedelta
@@ -8,6 +7,8 @@ from datetime import datetime, timezone, timedelta
 from app.core.base.runnable_component import RunnableComponent
 from app.core.base.status_updater import StatusUpdater
 from app.core.config import settings
+from app.core.message_codec import MessageCodecError, decode_message
+from app.core.tracing import extract_trace_context, observe_queue_wait, tracer
 
 logger = logging.getLogger(__name__)
 
@@ -119,7 +120,7 @@ class QueueWorker(BaseWorker):
         Основной цикл работы воркера очередей.
 
         Непрерывно слушает указанные очереди Redis с использованием `BLPOP`.
-        При получении сообщения, декодирует его (предполагается JSON), а затем
+        При получении сообщения, декодирует его (`decode_message`), а затем
         вызывает `process_message` для его обработки с установленным таймаутом.
         Обновляет статус воркера ("LISTENING", "PROCESSING", "IDLE", "ERROR")
         в зависимости от текущей операции и результата обработки.
@@ -150,23 +151,23 @@ class QueueWorker(BaseWorker):
                     await self.update_last_active_time()
 
                     try:
-                        # Attempt to decode if bytes, then parse if JSON string
-                        if isinstance(message_data_raw, bytes):
-                            message_data_str = message_data_raw.decode('utf-8')
-                        else:
-                            message_data_str = message_data_raw # Assume it's already a string
-                        
-                        message_data_dict = json.loads(message_data_str)
+                        # JSON или MessagePack, поле версии проверяется и удаляется
+                        message_data_dict = decode_message(message_data_raw)
+                        # Служебные поля трассировки не доходят до process_message
+                        traceparent, sent_at = extract_trace_context(message_data_dict)
+                        observe_queue_wait(queue_name, sent_at)
+                        span_attributes = {"queue": queue_name, "interaction_id": message_data_dict.get("interaction_id")}
                         
                         # Process the message with a timeout
-                        await asyncio.wait_for(
-                            self.process_message(message_data_dict),
-                            timeout=self.process_timeout
-                        )
+                        with tracer.start_span(f"{self._component_id}.process", parent=traceparent, attributes=span_attributes):
+                            await asyncio.wait_for(
+                                self.process_message(message_data_dict),
+                                timeout=self.process_timeout
+                            )
                         self.logger.debug(f"[{self._component_id}] Message from '{queue_name}' processed successfully.")
-                    except json.JSONDecodeError as e:
-                        self.logger.error(f"[{self._component_id}] Failed to decode JSON message from '{queue_name}': {e}. Message: {message_data_raw[:200]}...") # Log snippet
-                        await self.set_status("ERROR", {"error": "JSONDecodeError", "queue": queue_name, "message_snippet": str(message_data_raw[:200])})
+                    except MessageCodecError as e:
+                        self.logger.error(f"[{self._component_id}] Failed to decode message from '{queue_name}': {e}. Message: {message_data_raw[:200]!r}...") # Log snippet
+                        await self.set_status("ERROR", {"error": "MessageCodecError", "queue": queue_name, "message_snippet": str(message_data_raw[:200])})
                     except asyncio.TimeoutError:
                         self.logger.error(f"[{self._component_id}] Timeout processing message from '{queue_name}'. Exceeded {self.process_timeout}s.")
                         await self.set_status("ERROR", {"error": "ProcessingTimeout", "queue": queue_name})
@@ -7,6 +7,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import ValidationError
 
 from app.core.config import settings
+from app.core.tracing import STAGE_DB_INSERT, configure_tracing, tracer
 from app.db.session import get_async_session_factory
 from app.db.crud.chat_crud import db_add_chat_message
 from app.api.schemas.chat_schemas import ChatMessageCreate, SenderType
@@ -109,16 +110,17 @@ class HistorySaverWorker(QueueWorker):
 
         async with self.async_session_factory() as db: # type: ignore
             try:
-                saved_message = await db_add_chat_message(
-                    db=db, # type: ignore
-                    agent_id=message_create_schema.agent_id,
-                    thread_id=message_create_schema.thread_id,
-                    sender_type=message_create_schema.sender_type,
-                    content=message_create_schema.content,
-                    channel=message_create_schema.channel,
-                    timestamp=message_create_schema.timestamp,
-                    interaction_id=message_create_schema.interaction_id
-                )
+                with tracer.start_span("chat_message.insert", stage=STAGE_DB_INSERT):
+                    saved_message = await db_add_chat_message(
+                        db=db, # type: ignore
+                        agent_id=message_create_schema.agent_id,
+                        thread_id=message_create_schema.thread_id,
+                        sender_type=message_create_schema.sender_type,
+                        content=message_create_schema.content,
+                        channel=message_create_schema.channel,
+                        timestamp=message_create_schema.timestamp,
+                        interaction_id=message_create_schema.interaction_id
+                    )
                 if saved_message:
                     self.logger.info(f"[{self._component_id}] Successfully saved chat message for agent_id: {message_create_schema.agent_id}, interaction_id: {message_create_schema.interaction_id}, db_id: {saved_message.id}")
                 else:
@@ -142,6 +144,7 @@ if __name__ == "__main__":
 
     main_logger.info("Initializing HistorySaverWorker...")
     
+    configure_tracing("history_saver_worker")
     worker = HistorySaverWorker()
 
     try:
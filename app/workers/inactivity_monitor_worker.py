@@ -4,6 +4,7 @@ import time # Keep for time.time()
 from datetime import datetime, timezone # Added for datetime.now(timezone.utc)
 import redis.exceptions # Added for RedisError
 import os # Added import os
+from typing import Awaitable, Callable, Dict, List, Tuple
 # Removed signal, os, json, redis.asyncio, RedisConnectionError as they are handled by base or ProcessManager
 
 from app.core.config import settings
@@ -144,7 +145,8 @@ class InactivityMonitorWorker(ScheduledTaskWorker):
         Для каждого агента со статусом "running" и имеющего `last_active_time`:
         - Рассчитывает время неактивности.
         - Если время неактивности превышает `settings.AGENT_INACTIVITY_TIMEOUT`,
-          пытается остановить процесс агента с помощью `self.process_manager.stop_agent_process()`.
+          добавляет агента в список на остановку.
+        Все неактивные агенты останавливаются конкурентно через `self.process_manager.stop_agent_processes()`.
         Логирует обнаружение неактивных агентов и ошибки во время проверки.
         """
         if not self._running:
@@ -160,6 +162,7 @@ class InactivityMonitorWorker(ScheduledTaskWorker):
             self.logger.warning(f"[{self._component_id}] ProcessManager Redis client not available for inactivity check.")
             return
 
+        inactive_agent_ids: List[str] = []
         try:
             agent_keys = await pm_redis_client.keys("agent_status:*")
             for key_bytes in agent_keys:
@@ -181,8 +184,7 @@ class InactivityMonitorWorker(ScheduledTaskWorker):
                         last_active = float(last_active_str)
                         if (current_time - last_active) > agent_inactivity_timeout:
                             self.logger.warning(f"[{self._component_id}] Agent {agent_id} is inactive (last active {last_active:.0f}, current {current_time:.0f}, timeout {agent_inactivity_timeout}s). Attempting to stop.")
-                            if self._running: # Check before stopping
-                                await self.process_manager.stop_agent_process(agent_id, force=False) # Attempt graceful stop
+                            inactive_agent_ids.append(agent_id)
                         else:
                             self.logger.debug(f"[{self._component_id}] Agent {agent_id} is active (last active {last_active:.0f}).")
                     except ValueError:
@@ -190,6 +192,8 @@ class InactivityMonitorWorker(ScheduledTaskWorker):
                 elif current_status != "running" and current_status != "stopped" and current_status != "error" and current_status != "initializing":
                      self.logger.debug(f"[{self._component_id}] Agent {agent_id} has status '{current_status}', not checking for inactivity timeout.")
 
+            if inactive_agent_ids and self._running: # Check before stopping
+                await self.process_manager.stop_agent_processes(inactive_agent_ids, force=False) # Attempt graceful stop
 
         except redis.exceptions.RedisError as e_redis:
             self.logger.error(f"[{self._component_id}] Redis error during agent inactivity check: {e_redis}", exc_info=True)
@@ -210,9 +214,12 @@ class InactivityMonitorWorker(ScheduledTaskWorker):
             - Проверяет, существует ли процесс с указанным PID (если PID есть).
             - Условия для перезапуска:
                 1. Статус "running" или "initializing", но процесс с PID не существует.
-                2. Поле `process_should_be_running` установлено в `true`, но процесс не жив
+                2. Статус "error_process_lost" (процесс завершился неожиданно, статус выставил
+                   `process_supervisor` ProcessManager в момент выхода).
+                3. Поле `process_should_be_running` установлено в `true`, но процесс не жив
                    (независимо от текущего статуса, например, "stopped" или "error").
-            - Если требуется перезапуск, вызывает `self.process_manager.restart_agent_process()`.
+        - Агенты, требующие перезапуска, перезапускаются конкурентно через
+          `self.process_manager.restart_agent_processes()`.
 
         Для интеграций:
         - Получает ключи статусов интеграций из Redis (`integration_status:*`).
@@ -223,8 +230,10 @@ class InactivityMonitorWorker(ScheduledTaskWorker):
               живучести процесса и флага `process_should_be_running`.
             - Если действие определено:
                 - Загружает конфигурацию агента из БД для получения настроек интеграции.
-                - Если настройки найдены, вызывает соответствующий метод `ProcessManager`
+                - Если настройки найдены, добавляет соответствующую операцию `ProcessManager`
                   (`restart_integration_process` или `start_integration_process`).
+        - Собранные операции над интеграциями выполняются конкурентно через
+          `self.process_manager.run_concurrently()`.
         Логирует обнаружение "упавших" процессов, попытки перезапуска и ошибки.
         """
         if not self._running:
@@ -239,6 +248,7 @@ class InactivityMonitorWorker(ScheduledTaskWorker):
             return
             
         # Check Agents
+        agents_to_restart: List[str] = []
         try:
             agent_keys = await pm_redis_client.keys("agent_status:*")
             for key_bytes in agent_keys:
@@ -276,16 +286,22 @@ class InactivityMonitorWorker(ScheduledTaskWorker):
                 if current_status in ["running", "initializing"] and pid_str and not process_alive:
                     self.logger.warning(f"[{self._component_id}] Agent {agent_id} has status '{current_status}' with PID {pid_str} but process is not alive. Flagging for restart.")
                     needs_restart = True
+                elif current_status == "error_process_lost" and not process_alive:
+                    self.logger.warning(f"[{self._component_id}] Agent {agent_id} process exited unexpectedly (exit code: {status.get('exit_code', 'N/A')}). Flagging for restart.")
+                    needs_restart = True
                 elif process_should_be_running and not process_alive : # Covers cases where it was stopped/errored but should be running
                     self.logger.warning(f"[{self._component_id}] Agent {agent_id} is marked as 'should_be_running' but process (PID: {pid_str or 'N/A'}) is not alive. Status: '{current_status}'. Flagging for restart.")
                     needs_restart = True
 
                 if needs_restart and self._running:
-                    self.logger.info(f"[{self._component_id}] Attempting to restart agent {agent_id}...")
-                    await self.process_manager.restart_agent_process(agent_id)
+                    agents_to_restart.append(agent_id)
                 elif current_status in ["stopped", "error"] and not process_should_be_running:
                      self.logger.debug(f"[{self._component_id}] Agent {agent_id} is in status '{current_status}' and not marked 'process_should_be_running'. No restart action.")
 
+            if agents_to_restart and self._running:
+                self.logger.info(f"[{self._component_id}] Attempting to restart agents: {agents_to_restart}...")
+                await self.process_manager.restart_agent_processes(agents_to_restart)
+
         except redis.exceptions.RedisError as e_redis_agent:
             self.logger.error(f"[{self._component_id}] Redis error during agent crash check: {e_redis_agent}", exc_info=True)
         except Exception as e_agent_scan:
@@ -296,6 +312,7 @@ class InactivityMonitorWorker(ScheduledTaskWorker):
             return
 
         # Check Integrations
+        integration_operations: Dict[Tuple[str, str, str], Callable[[], Awaitable[bool]]] = {}
         try:
             integration_keys = await pm_redis_client.keys("integration_status:*")
             valid_integration_type_values = [it.value for it in IntegrationType] # Get all valid enum values
@@ -365,6 +382,9 @@ class InactivityMonitorWorker(ScheduledTaskWorker):
                 if current_status in ["running", "initializing"] and pid_str and not process_alive:
                     self.logger.warning(f"[{self._component_id}] Integration {agent_id}/{integration_type_str} has status '{current_status}' with PID {pid_str} but process is not alive. Flagging for restart.")
                     action_to_take = "restart"
+                elif current_status == "error_process_lost" and not process_alive:
+                    self.logger.warning(f"[{self._component_id}] Integration {agent_id}/{integration_type_str} process exited unexpectedly (exit code: {status.get('exit_code', 'N/A')}). Flagging for restart.")
+                    action_to_take = "restart"
                 elif process_should_be_running and not process_alive: # Covers cases where it was stopped/errored but should be running
                      self.logger.warning(f"[{self._component_id}] Integration {agent_id}/{integration_type_str} is marked 'process_should_be_running' but process (PID: {pid_str or 'N/A'}) is not alive. Status: '{current_status}'. Flagging for restart.")
                      action_to_take = "restart"
@@ -403,23 +423,25 @@ class InactivityMonitorWorker(ScheduledTaskWorker):
                     
                     # Perform the action if settings were successfully retrieved (retrieved_integration_settings is not None)
                     if action_to_take == "restart":
-                        self.logger.info(f"[{self._component_id}] Attempting to restart integration {agent_id}/{integration_type_str} with retrieved settings...")
-                        restarted = await self.process_manager.restart_integration_process(agent_id, integration_type_str, integration_settings=retrieved_integration_settings)
-                        if restarted:
-                            self.logger.info(f"[{self._component_id}] Successfully initiated restart for integration {agent_id}/{integration_type_str}.")
-                        else:
-                            self.logger.error(f"[{self._component_id}] Failed to initiate restart for integration {agent_id}/{integration_type_str}.")
+                        integration_operations[(agent_id, integration_type_str, action_to_take)] = (
+                            lambda agent_id=agent_id, integration_type_str=integration_type_str, integration_settings=retrieved_integration_settings:
+                            self.process_manager.restart_integration_process(agent_id, integration_type_str, integration_settings=integration_settings)
+                        )
                     elif action_to_take == "start":
-                        self.logger.info(f"[{self._component_id}] Attempting to start integration {agent_id}/{integration_type_str} with retrieved settings...")
-                        # Assuming start_integration_process returns a boolean or similar indication of initiation
-                        started = await self.process_manager.start_integration_process(agent_id, integration_type_str, integration_settings=retrieved_integration_settings)
-                        if started: # Modify this check if start_integration_process has a different return signature
-                            self.logger.info(f"[{self._component_id}] Successfully initiated start for integration {agent_id}/{integration_type_str}.")
-                        else:
-                            self.logger.error(f"[{self._component_id}] Failed to initiate start for integration {agent_id}/{integration_type_str}.")
+                        integration_operations[(agent_id, integration_type_str, action_to_take)] = (
+                            lambda agent_id=agent_id, integration_type_str=integration_type_str, integration_settings=retrieved_integration_settings:
+                            self.process_manager.start_integration_process(agent_id, integration_type_str, integration_settings=integration_settings)
+                        )
                 elif self._running: # No action_to_take but still running (e.g. process is alive and status is fine)
                      self.logger.debug(f"[{self._component_id}] No action needed for integration {agent_id}/{integration_type_str} (Status: '{current_status}', PID: {pid_str or 'N/A'}, Alive: {process_alive}, ShouldRun: {process_should_be_running}).")
 
+            if integration_operations and self._running:
+                results = await self.process_manager.run_concurrently(integration_operations)
+                for (agent_id, integration_type_str, action), succeeded in results.items():
+                    if succeeded:
+                        self.logger.info(f"[{self._component_id}] Successfully initiated {action} for integration {agent_id}/{integration_type_str}.")
+                    else:
+                        self.logger.error(f"[{self._component_id}] Failed to initiate {action} for integration {agent_id}/{integration_type_str}.")
 
         except redis.exceptions.RedisError as e_redis_int:
             self.logger.error(f"[{self._component_id}] Redis error during integration crash check: {e_redis_int}", exc_info=True)
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.services.media.minio_image_manager import MinIOImageManager
+from app.services.voice.minio_manager import MinioFileManager
+from app.workers.base_worker import ScheduledTaskWorker
+
+
+class MediaFileCleanupWorker(ScheduledTaskWorker):
+    """
+    Периодический воркер для удаления устаревших медиафайлов из MinIO.
+
+    Голосовые файлы удаляются по дневным префиксам через `MinioFileManager.cleanup_old_files`.
+    За один запуск обрабатывается не более `settings.VOICE_CLEANUP_MAX_DAYS_PER_RUN`
+    дней, а прогресс сохраняется в курсоре, поэтому накопленный объем удаляется
+    постепенно и продолжается после перезапуска.
+
+    Изображения хранятся по дайджесту содержимого и удаляются, если на них не было
+    ссылок дольше `settings.IMAGE_FILE_RETENTION_DAYS` дней. Изображения старого
+    формата (agent_*/...) ссылки не учитывают и удаляются по времени загрузки.
+
+    Атрибуты:
+        minio_manager (MinioFileManager): Менеджер хранилища голосовых файлов.
+        image_manager (MinIOImageManager): Менеджер хранилища изображений.
+    """
+    def __init__(self):
+        super().__init__(
+            component_id="media_file_cleanup_worker", # Unique ID for this worker instance
+            interval_seconds=settings.VOICE_CLEANUP_INTERVAL,
+            status_key_prefix="worker_status:media_file_cleanup:" # Specific status key prefix
+        )
+        worker_logger = logging.getLogger("media_file_cleanup_worker")
+        self.minio_manager = MinioFileManager(logger=worker_logger)
+        self.image_manager = MinIOImageManager(logger=worker_logger)
+        self._minio_ready = False
+
+    async def setup(self):
+        """
+        Выполняет базовую настройку воркера и инициализирует менеджеры MinIO.
+        Ошибка подключения к MinIO не останавливает воркер: инициализация
+        повторяется при следующем запуске задачи.
+        """
+        await super().setup()
+        await self._ensure_minio()
+
+    async def _ensure_minio(self) -> bool:
+        """Ленивая инициализация MinIO менеджеров."""
+        if self._minio_ready:
+            return True
+        try:
+            await self.minio_manager.initialize()
+            await self.image_manager.initialize()
+            self._minio_ready = True
+        except Exception as e:
+            self.logger.error(f"[{self._component_id}] Failed to initialize MinIO managers: {e}", exc_info=True)
+        return self._minio_ready
+
+    async def perform_task(self) -> None:
+        """
+        Удаляет истекшие дневные партиции голосовых файлов и изображения без ссылок.
+        """
+        if settings.VOICE_FILE_RETENTION_DAYS <= 0 and settings.IMAGE_FILE_RETENTION_DAYS <= 0:
+            self.logger.debug(f"[{self._component_id}] Media file retention disabled. Skipping cleanup.")
+            return
+
+        if not await self._ensure_minio():
+            self.logger.warning(f"[{self._component_id}] MinIO not available. Skipping cleanup.")
+            return
+
+        if settings.VOICE_FILE_RETENTION_DAYS > 0:
+            deleted_count = await self.minio_manager.cleanup_old_files(
+                days_old=settings.VOICE_FILE_RETENTION_DAYS,
+                max_days=settings.VOICE_CLEANUP_MAX_DAYS_PER_RUN
+            )
+            self.logger.info(f"[{self._component_id}] Voice file cleanup removed {deleted_count} files.")
+
+        if settings.IMAGE_FILE_RETENTION_DAYS > 0:
+            try:
+                deleted_count = await self.image_manager.cleanup_unreferenced_images(
+                    retention_days=settings.IMAGE_FILE_RETENTION_DAYS
+                )
+                self.logger.info(f"[{self._component_id}] Image cleanup removed {deleted_count} files.")
+            except Exception as e:
+                self.logger.error(f"[{self._component_id}] Image cleanup failed: {e}", exc_info=True)
+
+    async def cleanup(self):
+        """Освобождает ресурсы MinIO менеджеров и выполняет базовую очистку воркера."""
+        await self.minio_manager.cleanup()
+        await self.image_manager.close()
+        await super().cleanup()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=settings.LOG_LEVEL,
+        format='%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+    )
+    main_logger = logging.getLogger("media_file_cleanup_worker_main")
+    main_logger.info("Initializing MediaFileCleanupWorker...")
+
+    worker = MediaFileCleanupWorker()
+
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        main_logger.info("MediaFileCleanupWorker interrupted by user (KeyboardInterrupt).")
+    except Exception as e:
+        main_logger.critical(f"MediaFileCleanupWorker failed to start or run: {e}", exc_info=True)
+    finally:
+        main_logger.info("MediaFileCleanupWorker application finished.")
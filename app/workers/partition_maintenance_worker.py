@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from datetime import datetime, time, timezone
+from typing import Callable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import get_async_session_factory
+from app.db.crud.chat_crud import db_delete_chat_threads_inactive_before, db_refresh_chat_thread_summaries_before
+from app.db.crud.partition_crud import (
+    add_months,
+    current_month,
+    db_apply_partition_retention,
+    db_ensure_monthly_partitions,
+)
+from app.workers.base_worker import ScheduledTaskWorker
+
+
+class PartitionMaintenanceWorker(ScheduledTaskWorker):
+    """
+    Периодический воркер обслуживания помесячных партиций `chat_messages` и `token_usage_logs`.
+
+    За каждый запуск:
+    1. Создает партиции на текущий и `settings.PARTITION_PREMAKE_MONTHS` следующих месяцев.
+       Строки вне созданных партиций попадают в DEFAULT партицию (вставка не падает);
+       для их месяцев создаются партиции, строки переносятся, а промах логируется.
+    2. Применяет политику хранения: партиции старше `CHAT_MESSAGES_RETENTION_MONTHS` /
+       `TOKEN_USAGE_RETENTION_MONTHS` месяцев отсоединяются или удаляются целиком
+       (`PARTITION_RETENTION_MODE`), без построчных DELETE. Сводки тредов (`chat_threads`)
+       без оставшихся сообщений удаляются, у остальных тредов с удаленными сообщениями
+       пересчитываются число сообщений и первое сообщение.
+
+    Атрибуты:
+        async_session_factory (Optional[Callable[[], AsyncSession]]): Фабрика сессий БД.
+    """
+    def __init__(self):
+        super().__init__(
+            component_id="partition_maintenance_worker", # Unique ID for this worker instance
+            interval_seconds=settings.PARTITION_MAINTENANCE_INTERVAL,
+            status_key_prefix="worker_status:partition_maintenance:" # Specific status key prefix
+        )
+        self.async_session_factory: Optional[Callable[[], AsyncSession]] = None
+
+    async def setup(self):
+        """
+        Инициализирует фабрику сессий и сразу создает недостающие партиции,
+        не дожидаясь первого интервала.
+        """
+        await super().setup()
+        self.async_session_factory = get_async_session_factory()
+        self.logger.info(f"[{self._component_id}] Database session factory initialized.")
+        try:
+            await self._ensure_partitions()
+        except Exception as e:
+            self.logger.error(f"[{self._component_id}] Initial partition creation failed: {e}", exc_info=True)
+
+    async def _ensure_partitions(self) -> None:
+        async with self.async_session_factory() as db: # type: ignore
+            for table in ("chat_messages", "token_usage_logs"):
+                await db_ensure_monthly_partitions(db, table, settings.PARTITION_PREMAKE_MONTHS)
+
+    async def _apply_retention(self) -> None:
+        drop = settings.PARTITION_RETENTION_MODE.lower() == "drop"
+        async with self.async_session_factory() as db: # type: ignore
+            removed_messages = await db_apply_partition_retention(
+                db, "chat_messages", settings.CHAT_MESSAGES_RETENTION_MONTHS, drop=drop
+            )
+            if removed_messages:
+                # Треды без сообщений в оставшихся партициях убираются из списка чатов
+                cutoff_month = add_months(current_month(), -settings.CHAT_MESSAGES_RETENTION_MONTHS)
+                cutoff = datetime.combine(cutoff_month, time.min, tzinfo=timezone.utc)
+                deleted_threads = await db_delete_chat_threads_inactive_before(db, cutoff)
+                self.logger.info(f"[{self._component_id}] Removed {deleted_threads} expired chat thread summaries.")
+                # У оставшихся тредов часть сообщений удалена: счетчик и первое сообщение пересчитываются
+                refreshed_threads = await db_refresh_chat_thread_summaries_before(db, cutoff)
+                self.logger.info(f"[{self._component_id}] Refreshed {refreshed_threads} chat thread summaries.")
+
+            await db_apply_partition_retention(
+                db, "token_usage_logs", settings.TOKEN_USAGE_RETENTION_MONTHS, drop=drop
+            )
+
+    async def perform_task(self) -> None:
+        """
+        Создает будущие партиции и применяет политику хранения.
+        """
+        if not self.async_session_factory:
+            self.logger.error(f"[{self._component_id}] Async session factory not initialized. Skipping maintenance.")
+            return
+
+        await self._ensure_partitions()
+        await self._apply_retention()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=settings.LOG_LEVEL,
+        format='%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+    )
+    main_logger = logging.getLogger("partition_maintenance_worker_main")
+    main_logger.info("Initializing PartitionMaintenanceWorker...")
+
+    worker = PartitionMaintenanceWorker()
+
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        main_logger.info("PartitionMaintenanceWorker interrupted by user (KeyboardInterrupt).")
+    except Exception as e:
+        main_logger.critical(f"PartitionMaintenanceWorker failed to start or run: {e}", exc_info=True)
+    finally:
+        main_logger.info("PartitionMaintenanceWorker application finished.")
@@ -6,6 +6,7 @@ from typing import Dict, Any, Optional, Callable
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
+from app.core.tracing import STAGE_DB_INSERT, STAGE_DB_QUERY, configure_tracing, tracer
 from app.db.session import get_async_session_factory
 from app.db.crud.token_usage_crud import db_add_token_usage_log
 from app.db.crud.chat_crud import db_get_chat_message_by_interaction_id
@@ -86,7 +87,8 @@ class TokenUsageWorker(QueueWorker):
                     self.logger.warning(f"[{self._component_id}] Could not parse timestamp string: {data['timestamp']}. Relying on DB default if set.")
                     data.pop('timestamp', None)
             
-            saved_log = await db_add_token_usage_log(db, token_usage_data=data)
+            with tracer.start_span("token_usage.insert", stage=STAGE_DB_INSERT):
+                saved_log = await db_add_token_usage_log(db, token_usage_data=data)
             
             if saved_log:
                 self.logger.info(f"[{self._component_id}] Successfully saved token usage for agent_id: {data.get('agent_id')}, interaction_id: {data.get('interaction_id')}, db_id: {saved_log.id}")
@@ -129,19 +131,20 @@ class TokenUsageWorker(QueueWorker):
             self.logger.info(f"[{self._component_id}] Attempting to find message_id for agent_id: {agent_id}, interaction_id: {interaction_id}")
             for attempt in range(3):
                 async with self.async_session_factory() as db_session: # type: ignore
-                    chat_message = await db_get_chat_message_by_interaction_id(
-                        db_session, 
-                        agent_id=agent_id, 
-                        interaction_id=interaction_id,
-                        sender_type=SenderType.AGENT
-                    )
-                    if not chat_message:
-                        self.logger.debug(f"[{self._component_id}] AGENT message not found for interaction_id {interaction_id}, attempt {attempt+1}. Trying any sender type.")
+                    with tracer.start_span("chat_message.lookup", stage=STAGE_DB_QUERY, attributes={"attempt": attempt + 1}):
                         chat_message = await db_get_chat_message_by_interaction_id(
                             db_session, 
                             agent_id=agent_id, 
-                            interaction_id=interaction_id
+                            interaction_id=interaction_id,
+                            sender_type=SenderType.AGENT
                         )
+                        if not chat_message:
+                            self.logger.debug(f"[{self._component_id}] AGENT message not found for interaction_id {interaction_id}, attempt {attempt+1}. Trying any sender type.")
+                            chat_message = await db_get_chat_message_by_interaction_id(
+                                db_session, 
+                                agent_id=agent_id, 
+                                interaction_id=interaction_id
+                            )
 
                     if chat_message:
                         message_id_to_save = chat_message.id
@@ -181,6 +184,7 @@ if __name__ == "__main__":
     main_logger = logging.getLogger("token_usage_worker_main")
     main_logger.info("Initializing TokenUsageWorker...")
 
+    configure_tracing("token_usage_worker")
     worker = TokenUsageWorker()
 
     try:
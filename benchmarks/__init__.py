@@ -0,0 +1,11 @@
+"""
+Offline benchmarks for PlatformAI Hub.
+
+Run a benchmark as a module from the project root, e.g.:
+
+    python -m benchmarks.intent_matcher
+    python -m benchmarks.agent_turn --help
+    python -m benchmarks.import_time --budget-ms 4000
+
+Results of benchmarks that save JSON go to benchmarks/results/ (not versioned).
+"""
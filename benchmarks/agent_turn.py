@@ -0,0 +1,596 @@
+"""
+End-to-end benchmark: one agent turn through the real runtime, offline.
+
+Drives load through the same path production traffic takes:
+
+    publish agent:{id}:input -> AgentRunner (LangGraph) -> publish agent:{id}:output
+                             -> history_queue -> HistorySaverWorker -> DB
+                             -> token_usage_queue -> TokenUsageWorker -> DB
+
+Only the external services are replaced: the chat model is a deterministic fake
+with configurable latency and completion size, the knowledge base (--rag) is an
+in-memory vector store over fake embeddings, and Redis is fakeredis unless
+--real-redis is given. The database is the one from DATABASE_URL: chat history
+is written with a PostgreSQL upsert, so point it at a local/scratch Postgres.
+Tables are created if missing; rows of the benchmark agents are removed at the end.
+
+With --semantic-cache the agents enable the semantic answer cache with fake
+embeddings over the in-process vector index; users repeat the same questions,
+so the report shows the hit rate and the latency of answers served from it.
+The cache only answers questions without prior context in the thread, so in
+this mode every turn is sent from a new chat (the FAQ pattern it targets).
+
+Reports throughput, p50/p95/p99 turn latency (publish -> response on the output
+channel), DB statements and Redis commands per turn, and stores the result as
+JSON so runs can be compared (--compare previous.json).
+
+    DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.agent_turn \\
+        [--users 8] [--turns 25] [--agents 1] [--llm-latency-ms 300] [--rag] [--semantic-cache]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import redis.asyncio as redis
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from sqlalchemy import delete, event
+
+from app.agent_runner.agent_runner import AgentRunner
+from app.agent_runner.langgraph.factory import GraphFactory
+from app.core.config import settings
+from app.core.message_codec import decode_message, encode_message
+from app.db import session as db_session
+from app.db.alchemy_models import AgentConfigDB, ChatMessageDB, ChatThreadDB, TokenUsageLogDB
+from app.services import redis_service
+from app.services.redis_service import POOL_KIND_COMMANDS, POOL_KIND_PUBSUB, InstrumentedConnectionPool, InstrumentedRedis, RedisPoolMetrics
+from app.workers.history_saver_worker import HistorySaverWorker
+from app.workers.token_usage_worker import TokenUsageWorker
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+KB_TOOL_NAME = "benchmark_kb"
+QUESTIONS = [
+    "Какие у вас часы работы?",
+    "Сколько стоит доставка в Москву?",
+    "Можно ли вернуть товар без чека?",
+    "What payment methods do you accept?",
+    "Как связаться с оператором?",
+]
+KB_DOCUMENTS = [
+    "Мы работаем ежедневно с 9:00 до 21:00 по московскому времени.",
+    "Доставка по Москве стоит 300 рублей, бесплатно при заказе от 5000 рублей.",
+    "Вернуть товар можно в течение 14 дней при наличии чека или выписки.",
+    "We accept cards, SBP transfers and cash on delivery.",
+    "Оператор доступен в чате и по телефону 8-800 с 9:00 до 21:00.",
+]
+
+
+# ===== Fake model =====
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic chat model: sleeps latency_ms and answers with exactly
+    completion_tokens words, reporting usage_metadata like the OpenAI client.
+
+    When tools are bound (agent node), the first call of a turn asks for the
+    first bound tool; grading via with_structured_output always returns "yes".
+    """
+
+    model_name: str = "benchmark-fake"
+    latency_ms: float = 0.0
+    completion_tokens: int = 64
+    tool_names: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake-chat"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "FakeChatModel":
+        return self.model_copy(update={"tool_names": [t.name for t in tools]})
+
+    def with_structured_output(self, schema: Any, include_raw: bool = False, **kwargs: Any):
+        async def _grade(prompt_value: Any) -> Any:
+            raw = await self.ainvoke(prompt_value)
+            parsed = schema(binary_score="yes")
+            return {"raw": raw, "parsed": parsed, "parsing_error": None} if include_raw else parsed
+        return RunnableLambda(_grade)
+
+    def _reply(self, messages: List[BaseMessage]) -> AIMessage:
+        prompt_tokens = sum(len(str(m.content).split()) for m in messages)
+        usage = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": self.completion_tokens,
+            "total_tokens": prompt_tokens + self.completion_tokens,
+        }
+        last_human = next((i for i in range(len(messages) - 1, -1, -1) if isinstance(messages[i], HumanMessage)), -1)
+        tool_answered = any(isinstance(m, ToolMessage) for m in messages[last_human + 1:])
+        if self.tool_names and not tool_answered:
+            question = str(messages[last_human].content) if last_human >= 0 else ""
+            return AIMessage(
+                content="",
+                tool_calls=[{"name": self.tool_names[0], "args": {"query": question}, "id": f"call_{uuid.uuid4().hex[:12]}"}],
+                usage_metadata=usage,
+                response_metadata={"model_name": self.model_name},
+            )
+        words = [f"w{i}" for i in range(self.completion_tokens)]
+        return AIMessage(content=" ".join(words), usage_metadata=usage, response_metadata={"model_name": self.model_name})
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+
+class BenchmarkGraphFactory(GraphFactory):
+    """GraphFactory with the fake model and, optionally, an in-memory knowledge base."""
+
+    def __init__(self, agent_config: Dict, agent_id: str, logger: logging.LoggerAdapter, args: argparse.Namespace):
+        # _create_llm_instance is called from GraphFactory.__init__
+        self.bench_args = args
+        super().__init__(agent_config, agent_id, logger)
+
+    def _create_llm_instance(self, provider: str, model_name: str, temperature: float, streaming: bool,
+                             log_adapter_override: Optional[logging.LoggerAdapter] = None) -> FakeChatModel:
+        return FakeChatModel(model_name=model_name, latency_ms=self.bench_args.llm_latency_ms,
+                             completion_tokens=self.bench_args.completion_tokens)
+
+    def _configure_tools(self) -> None:
+        if not self.bench_args.rag:
+            super()._configure_tools()
+            return
+        from langchain.tools.retriever import create_retriever_tool
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        from langchain_core.vectorstores import InMemoryVectorStore
+
+        store = InMemoryVectorStore.from_texts(KB_DOCUMENTS, DeterministicFakeEmbedding(size=256))
+        retriever_tool = create_retriever_tool(
+            store.as_retriever(search_kwargs={"k": self.bench_args.rag_docs}),
+            KB_TOOL_NAME,
+            "Knowledge base of the benchmark shop",
+            document_separator="\n---RETRIEVER_DOC---\n",
+        )
+        self.tools = [retriever_tool]
+        self.safe_tools = []
+        self.datastore_tools = [retriever_tool]
+        self.datastore_names = {KB_TOOL_NAME}
+        self.safe_tool_names = set()
+        self.max_rewrites = 0
+
+
+class BenchmarkAgentRunner(AgentRunner):
+    """AgentRunner with an in-memory config instead of the manager API."""
+
+    def __init__(self, agent_id: str, agent_config: Dict[str, Any], args: argparse.Namespace):
+        super().__init__(agent_id=agent_id,
+                         db_session_factory=db_session.get_async_session_factory(),
+                         logger_adapter=logging.LoggerAdapter(logging.getLogger(f"BENCH_AGENT:{agent_id}"), {"agent_id": agent_id}))
+        self.bench_config = agent_config
+        self.bench_args = args
+
+    async def _load_config(self) -> bool:
+        self.agent_config = self.bench_config
+        return True
+
+    async def _setup_app(self) -> bool:
+        self.agent_app = BenchmarkGraphFactory(self.agent_config, self._component_id, self.logger, self.bench_args).create_graph()
+        self._setup_semantic_cache()
+        return True
+
+    def _create_semantic_cache_embeddings(self) -> Any:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+
+        return DeterministicFakeEmbedding(size=256)
+
+
+class CountingHistorySaverWorker(HistorySaverWorker):
+    def __init__(self):
+        super().__init__()
+        self.in_flight = 0
+        self.processed = 0
+
+    async def process_message(self, message_data: Dict[str, Any]) -> None:
+        self.in_flight += 1
+        try:
+            await super().process_message(message_data)
+        finally:
+            self.in_flight -= 1
+            self.processed += 1
+
+
+class CountingTokenUsageWorker(TokenUsageWorker):
+    def __init__(self):
+        super().__init__()
+        self.in_flight = 0
+        self.processed = 0
+
+    async def process_message(self, task_data: Dict[str, Any]) -> None:
+        self.in_flight += 1
+        try:
+            await super().process_message(task_data)
+        finally:
+            self.in_flight -= 1
+            self.processed += 1
+
+
+# ===== Instrumentation =====
+
+class CountingRedis(InstrumentedRedis):
+    """InstrumentedRedis that also counts commands by name."""
+
+    command_counts: Counter = Counter()
+
+    async def execute_command(self, *args, **options):
+        CountingRedis.command_counts[str(args[0]).upper()] += 1
+        return await super().execute_command(*args, **options)
+
+
+class DbStatementCounter:
+    """Counts statements and commits on the application engine."""
+
+    def __init__(self):
+        self.by_kind: Counter = Counter()
+        self.commits = 0
+
+    def attach(self) -> None:
+        sync_engine = db_session.engine.sync_engine
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def _on_execute(conn, cursor, statement, parameters, context, executemany):
+            self.by_kind[statement.lstrip().split(None, 1)[0].upper()] += 1
+
+        @event.listens_for(sync_engine, "commit")
+        def _on_commit(conn):
+            self.commits += 1
+
+    def reset(self) -> None:
+        self.by_kind.clear()
+        self.commits = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        writes = sum(n for kind, n in self.by_kind.items() if kind in ("INSERT", "UPDATE", "DELETE"))
+        return {"writes": writes, "reads": self.by_kind.get("SELECT", 0), "commits": self.commits, "by_kind": dict(self.by_kind)}
+
+
+def install_redis(use_real_redis: bool) -> redis.Redis:
+    """
+    Installs counting clients as the process-wide Redis provider and returns
+    a separate driver client whose commands are not counted.
+    """
+    if use_real_redis:
+        def make_pool(pool_class, **kwargs):
+            return pool_class.from_url(str(settings.REDIS_URL), **kwargs)
+    else:
+        try:
+            import fakeredis
+            from fakeredis.aioredis import FakeConnection
+        except ImportError:
+            raise SystemExit("fakeredis is not installed: `pip install fakeredis` or run with --real-redis.")
+        server = fakeredis.FakeServer()
+
+        def make_pool(pool_class, **kwargs):
+            return pool_class(connection_class=FakeConnection, server=server, **kwargs)
+
+    for kind in (POOL_KIND_COMMANDS, POOL_KIND_PUBSUB):
+        max_connections = settings.REDIS_PUBSUB_MAX_CONNECTIONS if kind == POOL_KIND_PUBSUB else settings.REDIS_MAX_CONNECTIONS
+        for decode_responses in (True, False):
+            pool = make_pool(InstrumentedConnectionPool, metrics=RedisPoolMetrics(), max_connections=max_connections,
+                             timeout=settings.REDIS_POOL_TIMEOUT, decode_responses=decode_responses)
+            redis_service._pools[(kind, decode_responses)] = pool
+            redis_service._clients[(kind, decode_responses)] = CountingRedis(connection_pool=pool)
+    return redis.Redis(connection_pool=make_pool(redis.ConnectionPool, decode_responses=False))
+
+
+def redis_command_total() -> int:
+    return sum(m["commands"] for m in redis_service.get_redis_pool_metrics().values())
+
+
+# ===== Load =====
+
+def build_agent_config(agent_id: str, args: argparse.Namespace) -> Dict[str, Any]:
+    return {
+        "id": agent_id,
+        "name": f"Benchmark {agent_id}",
+        "config": {
+            "simple": {
+                "settings": {
+                    "model": {
+                        "modelId": "benchmark-fake",
+                        "provider": "OpenAI",
+                        "systemPrompt": "You are a helpful shop assistant.",
+                        "enableContextMemory": True,
+                        "contextMemoryDepth": args.history_depth,
+                        "limitToKnowledgeBase": args.rag,
+                    },
+                    "tools": [],
+                    "semanticCache": {"enabled": args.semantic_cache},
+                }
+            }
+        },
+    }
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # nearest-rank
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LoadDriver:
+    """Closed-loop users: each sends its next message after receiving the previous answer."""
+
+    def __init__(self, driver: redis.Redis, agent_ids: List[str], timeout: float):
+        self.driver = driver
+        self.agent_ids = agent_ids
+        self.timeout = timeout
+        self._waiters: Dict[str, asyncio.Future] = {}
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._pubsub = self.driver.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(*[f"agent:{a}:output" for a in self.agent_ids])
+        self._listener = asyncio.create_task(self._listen(), name="BenchmarkOutputListener")
+
+    async def stop(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+        if self._pubsub:
+            await self._pubsub.aclose()
+
+    async def _listen(self) -> None:
+        async for message in self._pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            chat_id = decode_message(message["data"]).get("chat_id")
+            waiter = self._waiters.pop(chat_id, None)
+            if waiter and not waiter.done():
+                waiter.set_result(time.perf_counter())
+
+    async def wait_for_runners(self) -> None:
+        channels = [f"agent:{a}:input" for a in self.agent_ids]
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            counts = await self.driver.pubsub_numsub(*channels)
+            if all(n > 0 for _, n in counts):
+                return
+            await asyncio.sleep(0.05)
+        raise SystemExit("Agent runners did not subscribe to their input channels in time.")
+
+    async def turn(self, agent_id: str, chat_id: str, text: str) -> Optional[float]:
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[chat_id] = waiter
+        payload = {"chat_id": chat_id, "text": text, "channel": "benchmark", "user_data": {}}
+        started = time.perf_counter()
+        await self.driver.publish(f"agent:{agent_id}:input", encode_message(payload))
+        try:
+            return await asyncio.wait_for(waiter, self.timeout) - started
+        except asyncio.TimeoutError:
+            self._waiters.pop(chat_id, None)
+            return None
+
+    async def run_users(self, users: int, turns: int, think_ms: float, tag: str,
+                        chat_per_turn: bool = False) -> List[Optional[float]]:
+        async def user(index: int) -> List[Optional[float]]:
+            agent_id = self.agent_ids[index % len(self.agent_ids)]
+            latencies = []
+            for n in range(turns):
+                chat_id = f"{tag}-user-{index}-{n}" if chat_per_turn else f"{tag}-user-{index}"
+                latencies.append(await self.turn(agent_id, chat_id, QUESTIONS[(index + n) % len(QUESTIONS)]))
+                if think_ms:
+                    await asyncio.sleep(think_ms / 1000)
+            return latencies
+        results = await asyncio.gather(*(user(i) for i in range(users)))
+        return [latency for per_user in results for latency in per_user]
+
+
+async def drain_workers(driver: redis.Redis, workers: List[Any], timeout: float) -> float:
+    """Waits until both queues are empty and no message is being processed."""
+    started = time.perf_counter()
+    queues = [settings.REDIS_HISTORY_QUEUE_NAME, settings.REDIS_TOKEN_USAGE_QUEUE_NAME]
+    while time.perf_counter() - started < timeout:
+        lengths = [await driver.llen(q) for q in queues]
+        if not any(lengths) and not any(w.in_flight for w in workers):
+            break
+        await asyncio.sleep(0.02)
+    return time.perf_counter() - started
+
+
+# ===== Setup / report =====
+
+async def prepare_database(agent_configs: List[Dict[str, Any]]) -> None:
+    await db_session.init_db()
+    async with db_session.get_async_session_factory()() as db:
+        for config in agent_configs:
+            await db.merge(AgentConfigDB(id=config["id"], name=config["name"], owner_id="benchmark", config_json=config["config"]))
+        await db.commit()
+
+
+async def cleanup_database(agent_ids: List[str]) -> None:
+    async with db_session.get_async_session_factory()() as db:
+        for model in (TokenUsageLogDB, ChatMessageDB, ChatThreadDB):
+            await db.execute(delete(model).where(model.agent_id.in_(agent_ids)))
+        await db.execute(delete(AgentConfigDB).where(AgentConfigDB.id.in_(agent_ids)))
+        await db.commit()
+
+
+def summarize(latencies: List[Optional[float]], wall_seconds: float, drain_seconds: float,
+              db_stats: Dict[str, Any], redis_commands: int, redis_by_command: Counter) -> Dict[str, Any]:
+    completed = sorted(x for x in latencies if x is not None)
+    turns = len(completed) or 1
+    return {
+        "turns": len(latencies),
+        "completed": len(completed),
+        "timeouts": len(latencies) - len(completed),
+        "wall_seconds": wall_seconds,
+        "drain_seconds": drain_seconds,
+        "throughput_turns_per_second": len(completed) / wall_seconds if wall_seconds else 0.0,
+        "latency_ms": {
+            "mean": sum(completed) / turns * 1000,
+            "p50": percentile(completed, 50) * 1000,
+            "p95": percentile(completed, 95) * 1000,
+            "p99": percentile(completed, 99) * 1000,
+            "max": (completed[-1] if completed else 0.0) * 1000,
+        },
+        "db_per_turn": {
+            "writes": db_stats["writes"] / turns,
+            "reads": db_stats["reads"] / turns,
+            "commits": db_stats["commits"] / turns,
+        },
+        "db_totals": db_stats,
+        "redis_commands_per_turn": redis_commands / turns,
+        "redis_commands_by_name_per_turn": {name: n / turns for name, n in redis_by_command.most_common()},
+    }
+
+
+def print_report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    summary = result["summary"]
+    base = baseline["summary"] if baseline else None
+    rows = [
+        ("throughput, turns/s", summary["throughput_turns_per_second"], base and base["throughput_turns_per_second"]),
+        ("latency p50, ms", summary["latency_ms"]["p50"], base and base["latency_ms"]["p50"]),
+        ("latency p95, ms", summary["latency_ms"]["p95"], base and base["latency_ms"]["p95"]),
+        ("latency p99, ms", summary["latency_ms"]["p99"], base and base["latency_ms"]["p99"]),
+        ("db writes / turn", summary["db_per_turn"]["writes"], base and base["db_per_turn"]["writes"]),
+        ("db reads / turn", summary["db_per_turn"]["reads"], base and base["db_per_turn"]["reads"]),
+        ("db commits / turn", summary["db_per_turn"]["commits"], base and base["db_per_turn"]["commits"]),
+        ("redis commands / turn", summary["redis_commands_per_turn"], base and base["redis_commands_per_turn"]),
+    ]
+    header = f"{'metric':<24} {'value':>12}"
+    if base:
+        header += f" {'baseline':>12} {'change':>8}"
+    print(header)
+    for name, value, base_value in rows:
+        line = f"{name:<24} {value:>12.2f}"
+        if base:
+            change = f"{(value - base_value) / base_value * 100:+.1f}%" if base_value else "n/a"
+            line += f" {base_value:>12.2f} {change:>8}"
+        print(line)
+    print(f"turns: {summary['completed']}/{summary['turns']} completed, {summary['timeouts']} timed out; "
+          f"workers drained in {summary['drain_seconds']:.2f}s")
+    top = list(summary["redis_commands_by_name_per_turn"].items())[:8]
+    print("redis / turn: " + ", ".join(f"{name} {n:.1f}" for name, n in top))
+    for cache in summary.get("semantic_cache", []):
+        print(f"semantic cache {cache['agent_id']}: hit rate {cache['hit_rate']:.1%} "
+              f"({cache['hits']}/{cache['lookups']}), {cache['entries']} entries, bypasses {cache['bypasses']}")
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    if db_session.engine is None:
+        raise SystemExit("DATABASE_URL is not configured.")
+    driver = install_redis(args.real_redis)
+    db_counter = DbStatementCounter()
+    db_counter.attach()
+
+    run_id = uuid.uuid4().hex[:8]
+    agent_ids = [f"bench-{run_id}-{i}" for i in range(args.agents)]
+    agent_configs = [build_agent_config(a, args) for a in agent_ids]
+    await prepare_database(agent_configs)
+
+    runners = [BenchmarkAgentRunner(a, c, args) for a, c in zip(agent_ids, agent_configs)]
+    workers = [CountingHistorySaverWorker(), CountingTokenUsageWorker()]
+    tasks = [asyncio.create_task(component.run()) for component in runners + workers]
+    load = LoadDriver(driver, agent_ids, args.turn_timeout)
+    try:
+        await load.wait_for_runners()
+        await load.start()
+
+        if args.warmup:
+            await load.run_users(min(args.users, len(agent_ids)), args.warmup, 0, tag=f"{run_id}-warmup",
+                                 chat_per_turn=args.semantic_cache)
+            await drain_workers(driver, workers, args.turn_timeout)
+
+        db_counter.reset()
+        CountingRedis.command_counts.clear()
+        redis_before = redis_command_total()
+        started = time.perf_counter()
+        latencies = await load.run_users(args.users, args.turns, args.think_ms, tag=run_id,
+                                         chat_per_turn=args.semantic_cache)
+        wall_seconds = time.perf_counter() - started
+        drain_seconds = await drain_workers(driver, workers, args.turn_timeout)
+        summary = summarize(latencies, wall_seconds, drain_seconds, db_counter.snapshot(),
+                            redis_command_total() - redis_before, CountingRedis.command_counts)
+        if args.semantic_cache:
+            summary["semantic_cache"] = [runner.semantic_cache.snapshot() for runner in runners if runner.semantic_cache is not None]
+    finally:
+        await load.stop()
+        for component in runners + workers:
+            component.initiate_shutdown()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if not args.keep_data:
+            await cleanup_database(agent_ids)
+        await driver.aclose()
+        await redis_service.close_redis_pool()
+        await db_session.close_db_engine()
+
+    return {
+        "benchmark": "agent_turn",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "host": {"python": platform.python_version(), "platform": platform.platform()},
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "summary": summary,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=8, help="concurrent simulated users (one chat each)")
+    parser.add_argument("--turns", type=int, default=25, help="turns per user")
+    parser.add_argument("--agents", type=int, default=1, help="agent runners, users are spread round-robin")
+    parser.add_argument("--warmup", type=int, default=2, help="warm-up turns per agent, not measured")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pause between a user's turns")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0, help="latency of every fake model call")
+    parser.add_argument("--completion-tokens", type=int, default=64, help="completion size of every fake model call")
+    parser.add_argument("--history-depth", type=int, default=10, help="contextMemoryDepth of the agent")
+    parser.add_argument("--rag", action="store_true", help="route every turn through retrieve/grade/generate")
+    parser.add_argument("--rag-docs", type=int, default=3, help="documents returned by the fake knowledge base")
+    parser.add_argument("--semantic-cache", action="store_true", help="enable the semantic answer cache of the agents")
+    parser.add_argument("--real-redis", action="store_true", help="use settings.REDIS_URL instead of fakeredis")
+    parser.add_argument("--codec", choices=["json", "msgpack"], default=settings.MESSAGE_CODEC,
+                        help="payload codec of all channels and queues (MESSAGE_CODEC)")
+    parser.add_argument("--turn-timeout", type=float, default=60.0, help="seconds to wait for one response")
+    parser.add_argument("--keep-data", action="store_true", help="keep benchmark rows in the database")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="result JSON path (default: benchmarks/results/agent_turn_<utc>.json)")
+    parser.add_argument("--compare", help="previous result JSON to compare with")
+    args = parser.parse_args()
+
+    settings.MESSAGE_CODEC = args.codec
+    logging.basicConfig(level=args.log_level, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    result = asyncio.run(run(args))
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"agent_turn_{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print_report(result, baseline)
+    print(f"saved: {output}")
+
+
+if __name__ == "__main__":
+    main()
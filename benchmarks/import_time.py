@@ -0,0 +1,185 @@
+"""
+Cold-start import budget for the process entry points.
+
+Every agent runner and integration is a separate process, so whatever its entry
+module imports at load time is paid on each start and restart. This check imports
+each entry module in a fresh interpreter (--repeat times, median is reported) and
+fails (exit code 1) when:
+
+- a module that must be loaded on demand is already imported: knowledge-base,
+  web-search, scraping, voice/vision provider SDKs and the semantic answer cache
+  are only needed by agents whose config enables them;
+- import time exceeds --budget-ms;
+- import time regressed by more than --max-regression percent against a previous
+  result (--compare previous.json).
+
+Peak RSS after import is reported alongside. The result is stored as JSON in
+benchmarks/results/ so runs can be compared.
+
+    python -m benchmarks.import_time [--repeat 5] [--budget-ms 4000] [--compare previous.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = [
+    "app.agent_runner.runner_main",
+    "app.integrations.telegram.telegram_bot_main",
+    "app.integrations.whatsapp.whatsapp_main",
+]
+
+# Loaded only when an agent's config enables the feature (see langgraph/tools.py,
+# common/tools_registry.py, services/voice, services/media/image_orchestrator.py,
+# services/semantic_cache.py)
+ON_DEMAND_MODULES = [
+    "qdrant_client",
+    "langchain_qdrant",
+    "langchain_community",
+    "tavily",
+    "cloudscraper",
+    "google.cloud",
+    "pydub",
+    "app.services.voice.stt.openai_stt",
+    "app.services.voice.stt.google_stt",
+    "app.services.voice.stt.yandex_stt",
+    "app.services.voice.tts.openai_tts",
+    "app.services.voice.tts.google_tts",
+    "app.services.voice.tts.yandex_tts",
+    "app.services.media.providers.openai_vision_provider",
+    "app.services.media.providers.google_vision_provider",
+    "app.services.media.providers.claude_vision_provider",
+    "app.services.semantic_cache",
+]
+
+CHILD_SCRIPT = """
+import importlib, json, resource, sys, time
+started = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - started
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"seconds": seconds, "max_rss_kb": rss_kb, "modules": sorted(sys.modules)}))
+"""
+
+
+def measure_once(module: str) -> Dict[str, Any]:
+    completed = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT, module],
+        cwd=PROJECT_ROOT, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"import of {module} failed:\n{completed.stderr.strip()}")
+    # app.core.config may print at import time, the measurement is the last line
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def loaded_on_demand_modules(modules: List[str]) -> List[str]:
+    loaded = set(modules)
+    return [
+        name for name in ON_DEMAND_MODULES
+        if name in loaded or any(m.startswith(name + ".") for m in loaded)
+    ]
+
+
+def measure(module: str, repeat: int) -> Dict[str, Any]:
+    # The first run warms the bytecode and file caches and is not measured
+    first = measure_once(module)
+    runs = [measure_once(module) for _ in range(repeat)]
+    seconds = sorted(run["seconds"] for run in runs)
+    return {
+        "import_ms": {
+            "median": statistics.median(seconds) * 1000,
+            "min": seconds[0] * 1000,
+            "max": seconds[-1] * 1000,
+        },
+        "max_rss_mb": statistics.median(run["max_rss_kb"] for run in runs) / 1024,
+        "modules": len(first["modules"]),
+        "on_demand_loaded": loaded_on_demand_modules(first["modules"]),
+    }
+
+
+def check(result: Dict[str, Any], baseline: Optional[Dict[str, Any]], budget_ms: Optional[float],
+          max_regression: float) -> List[str]:
+    failures = []
+    for module, entry in result["entry_points"].items():
+        median = entry["import_ms"]["median"]
+        if entry["on_demand_loaded"]:
+            failures.append(f"{module}: imports on-demand modules at load time: {', '.join(entry['on_demand_loaded'])}")
+        if budget_ms is not None and median > budget_ms:
+            failures.append(f"{module}: import took {median:.0f} ms, budget {budget_ms:.0f} ms")
+        base = baseline and baseline["entry_points"].get(module)
+        if base:
+            base_median = base["import_ms"]["median"]
+            if base_median and (median - base_median) / base_median * 100 > max_regression:
+                failures.append(f"{module}: import time {median:.0f} ms regressed from {base_median:.0f} ms "
+                                f"(> {max_regression:.0f}%)")
+    return failures
+
+
+def print_report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    header = f"{'entry point':<46} {'import, ms':>11} {'rss, MB':>8} {'modules':>8}"
+    if baseline:
+        header += f" {'baseline':>9} {'change':>8}"
+    print(header)
+    for module, entry in result["entry_points"].items():
+        median = entry["import_ms"]["median"]
+        line = f"{module:<46} {median:>11.0f} {entry['max_rss_mb']:>8.1f} {entry['modules']:>8}"
+        base = baseline and baseline["entry_points"].get(module)
+        if base:
+            base_median = base["import_ms"]["median"]
+            change = f"{(median - base_median) / base_median * 100:+.1f}%" if base_median else "n/a"
+            line += f" {base_median:>9.0f} {change:>8}"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="measured imports per entry point (fresh interpreter each)")
+    parser.add_argument("--module", action="append", help="entry module to measure (default: all process entry points)")
+    parser.add_argument("--budget-ms", type=float, help="fail if the median import time of an entry point exceeds this")
+    parser.add_argument("--max-regression", type=float, default=20.0, help="allowed slowdown vs --compare, percent")
+    parser.add_argument("--output", help="result JSON path (default: benchmarks/results/import_time_<utc>.json)")
+    parser.add_argument("--compare", help="previous result JSON to compare with")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    result = {
+        "benchmark": "import_time",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "host": {"python": platform.python_version(), "platform": platform.platform()},
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "entry_points": {module: measure(module, args.repeat) for module in args.module or ENTRY_POINTS},
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"import_time_{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print_report(result, baseline)
+    print(f"saved: {output}")
+
+    failures = check(result, baseline, args.budget_ms, args.max_regression)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Micro-benchmark: TTS intent keyword detection.
+
+Compares the previous per-keyword regex loop with the precompiled
+KeywordMatcher for growing keyword sets and message lengths.
+
+    python -m benchmarks.intent_matcher [--repeat 2000]
+"""
+
+import argparse
+import random
+import re
+import timeit
+from typing import List
+
+from app.services.voice.intent_utils import get_keyword_matcher
+
+WORDS = ["привет", "как", "дела", "расскажи", "про", "погоду", "завтра", "в", "москве",
+         "пожалуйста", "спасибо", "hello", "what", "is", "the", "price", "of", "delivery"]
+
+
+def legacy_detect(text: str, keywords: List[str]) -> bool:
+    text_lower = text.lower()
+    for keyword in keywords:
+        if re.search(r'\b' + re.escape(keyword.lower()) + r'\b', text_lower):
+            return True
+    return False
+
+
+def make_keywords(count: int, rng: random.Random) -> List[str]:
+    base = ["голос", "скажи", "произнеси", "озвучь"]
+    alphabet = "абвгдежзиклмнопрстуфхцчшщэюя"
+    extra = ["".join(rng.choice(alphabet) for _ in range(rng.randint(4, 10))) for _ in range(max(0, count - len(base)))]
+    return (base + extra)[:count]
+
+
+def make_text(words: int, rng: random.Random) -> str:
+    # No keywords in the text: worst case, the whole message is scanned
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000, help="calls per measurement")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'keywords':>8} {'words':>6} {'legacy us':>10} {'compiled us':>12} {'speedup':>8}")
+    for keyword_count in (4, 50, 500):
+        keywords = make_keywords(keyword_count, rng)
+        get_keyword_matcher(keywords)  # compiled outside the timing, as after the first message
+        for word_count in (10, 100, 1000):
+            text = make_text(word_count, rng)
+            legacy = timeit.timeit(lambda: legacy_detect(text, keywords), number=args.repeat)
+            compiled = timeit.timeit(lambda: get_keyword_matcher(keywords).matches(text), number=args.repeat)
+            legacy_us = legacy / args.repeat * 1e6
+            compiled_us = compiled / args.repeat * 1e6
+            print(f"{keyword_count:>8} {word_count:>6} {legacy_us:>10.1f} {compiled_us:>12.1f} {legacy_us / compiled_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Load generator: a fake Telegram that posts updates to the webhook ingress.
+
+Sends synthetic text-message updates the way Telegram delivers them — one POST
+per update to {base_url}/api/v1/telegram/webhook/{agent_id} with the
+X-Telegram-Bot-Api-Secret-Token header — to a running manager API with
+TELEGRAM_WEBHOOK_ENABLED=true. The secret is read from Redis (the hash the
+webhook host keeps for every running bot) unless --secret is given.
+
+With several uvicorn workers behind the URL, updates for a bot hosted by
+another worker are forwarded to it, so the report covers the forwarding path too.
+
+Reports status code counts, p50/p95/p99 ingress latency and throughput.
+
+    python -m benchmarks.telegram_webhook --base-url http://localhost:8000 \\
+        --agent-id <agent> [--updates 1000] [--concurrency 50] [--chats 20]
+"""
+
+import argparse
+import asyncio
+import itertools
+import math
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import httpx
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.integrations.telegram.telegram_webhook_host import TELEGRAM_WEBHOOK_PATH, TELEGRAM_WEBHOOK_SECRETS_KEY
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def build_update(update_id: int, chat_id: int, text: str) -> Dict[str, Any]:
+    """A private-chat text message update in the Bot API format."""
+    user = {"id": chat_id, "is_bot": False, "first_name": f"Load{chat_id}", "language_code": "en"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            "text": text,
+        },
+    }
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def read_secret(agent_id: str) -> Optional[str]:
+    client = redis.from_url(str(settings.REDIS_URL), decode_responses=True)
+    try:
+        return await client.hget(TELEGRAM_WEBHOOK_SECRETS_KEY, agent_id)
+    finally:
+        await client.aclose()
+
+
+async def post_updates(client: httpx.AsyncClient, url: str, secret: str, updates: int,
+                       concurrency: int, chats: int, first_update_id: int = 1) -> Dict[str, Any]:
+    """Posts `updates` updates with at most `concurrency` requests in flight."""
+    update_ids = itertools.count(first_update_id)
+    statuses: Counter = Counter()
+    latencies: List[float] = []
+
+    async def sender(remaining: List[int]) -> None:
+        while remaining:
+            remaining.pop()
+            update_id = next(update_ids)
+            update = build_update(update_id, chat_id=100000 + update_id % chats, text=f"load test message {update_id}")
+            started = time.perf_counter()
+            try:
+                response = await client.post(url, json=update, headers={SECRET_HEADER: secret})
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    remaining = list(range(updates))
+    started = time.perf_counter()
+    await asyncio.gather(*(sender(remaining) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "updates": updates,
+        "elapsed_s": elapsed,
+        "throughput_rps": updates / elapsed if elapsed else 0.0,
+        "statuses": dict(statuses),
+        "latency_ms": {f"p{p}": percentile(latencies, p) * 1000 for p in (50, 95, 99)},
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+    secret = args.secret or await read_secret(args.agent_id)
+    if not secret:
+        raise SystemExit(f"No webhook secret for agent {args.agent_id}: is its Telegram bot running in webhook mode?")
+    url = f"{args.base_url.rstrip('/')}{settings.API_V1_STR}{TELEGRAM_WEBHOOK_PATH.format(agent_id=args.agent_id)}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        result = await post_updates(client, url, secret, args.updates, args.concurrency, args.chats,
+                                    first_update_id=args.first_update_id)
+
+    print(f"{result['updates']} updates in {result['elapsed_s']:.2f}s ({result['throughput_rps']:.1f} updates/s)")
+    print("status codes: " + ", ".join(f"{code}={count}" for code, count in sorted(result["statuses"].items())))
+    print("latency ms:   " + ", ".join(f"{name}={value:.1f}" for name, value in result["latency_ms"].items()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000", help="manager API URL")
+    parser.add_argument("--agent-id", required=True)
+    parser.add_argument("--secret", help="webhook secret (default: read from Redis)")
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50, help="requests in flight")
+    parser.add_argument("--chats", type=int, default=20, help="distinct fake users")
+    parser.add_argument("--first-update-id", type=int, default=int(time.time()))
+    parser.add_argument("--timeout", type=float, default=10.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
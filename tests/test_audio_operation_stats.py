@@ -0,0 +1,67 @@
+import struct
+
+import pytest
+
+from app.core import tracing
+from app.core.config import settings
+from app.core.tracing import STAGE_AUDIO_PROBE, STAGE_AUDIO_TRANSCODE, Tracer
+from app.services import redis_service
+from app.services.voice import audio_processing
+
+fakeredis_aioredis = pytest.importorskip("fakeredis.aioredis")
+
+
+@pytest.fixture
+def redis_cli(monkeypatch):
+    client = fakeredis_aioredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(redis_service, "get_redis", lambda *args, **kwargs: client)
+    process_tracer = Tracer()
+    process_tracer.configure("api", exporter=None)
+    monkeypatch.setattr(tracing, "tracer", process_tracer)
+    monkeypatch.setattr(audio_processing, "tracer", process_tracer)
+    return client
+
+
+def _wav(data_size=3200):
+    fmt = struct.pack("<HHIIHH", 1, 1, 16000, 32000, 2, 16)
+    return (b"RIFF" + (36 + data_size).to_bytes(4, "little") + b"WAVE" + b"fmt " + (16).to_bytes(4, "little")
+            + fmt + b"data" + data_size.to_bytes(4, "little") + b"\0" * data_size)
+
+
+def _rows(stats):
+    return {(row["stage"], row["operation"]): row["count"] for row in stats}
+
+
+async def test_operations_are_recorded_by_outcome(redis_cli, monkeypatch):
+    assert audio_processing.probe_audio(_wav()).duration_seconds == pytest.approx(0.1)
+    assert audio_processing.probe_audio(b"not audio at all") is None
+    monkeypatch.setattr(settings, "FFMPEG_BINARY", "/nonexistent/ffmpeg")
+    with pytest.raises(audio_processing.AudioTranscodeError):
+        await audio_processing.transcode_to_wav(b"data")
+
+    stats = await audio_processing.collect_audio_operation_stats()
+
+    assert _rows(stats) == {
+        (STAGE_AUDIO_PROBE, "ok"): 1,
+        (STAGE_AUDIO_PROBE, "unsupported"): 1,
+        (STAGE_AUDIO_TRANSCODE, "error"): 1,
+    }
+
+
+async def test_collect_merges_other_services_from_redis(redis_cli):
+    other = Tracer()
+    other.configure("telegram_bot", exporter=None)
+    other.observe(STAGE_AUDIO_TRANSCODE, "ok", 0.2)
+    other.observe(STAGE_AUDIO_TRANSCODE, "ok", 0.4)
+    other.observe(tracing.STAGE_STT, "transcribe", 1.0)
+    await other.push_metrics(redis_cli)
+    audio_processing.probe_audio(_wav())
+
+    stats = await audio_processing.collect_audio_operation_stats()
+
+    # Non-audio stages are left to /metrics/pipeline.
+    assert _rows(stats) == {(STAGE_AUDIO_TRANSCODE, "ok"): 2, (STAGE_AUDIO_PROBE, "ok"): 1}
+    transcode = next(row for row in stats if row["stage"] == STAGE_AUDIO_TRANSCODE)
+    assert transcode["avg_seconds"] == pytest.approx(0.3)
+    # Collecting again does not count the current process twice.
+    assert _rows(await audio_processing.collect_audio_operation_stats()) == _rows(stats)
@@ -0,0 +1,84 @@
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timezone
+
+from sqlalchemy.dialects import postgresql
+
+from app.core.config import settings
+from app.db.crud import chat_crud
+from app.workers import partition_maintenance_worker as worker_module
+from app.workers.partition_maintenance_worker import PartitionMaintenanceWorker
+
+
+class FakeResult:
+    rowcount = 3
+
+
+class FakeSession:
+    """Compiles statements for PostgreSQL and records them."""
+
+    def __init__(self):
+        self.statements = []
+        self.committed = False
+
+    async def execute(self, stmt, params=None):
+        self.statements.append(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+        return FakeResult()
+
+    async def commit(self):
+        self.committed = True
+
+    async def rollback(self):
+        pass
+
+
+async def test_refresh_recomputes_summaries_from_remaining_messages():
+    db = FakeSession()
+    cutoff = datetime(2026, 4, 1, tzinfo=timezone.utc)
+
+    assert await chat_crud.db_refresh_chat_thread_summaries_before(db, cutoff) == 3
+
+    sql = " ".join(str(db.statements[0]).split())
+    assert sql.startswith("UPDATE chat_threads SET first_message_content=anon_1.content, "
+                          "first_message_timestamp=anon_1.timestamp, message_count=anon_1.message_count FROM (")
+    assert sql.endswith("WHERE chat_threads.agent_id = anon_1.agent_id AND chat_threads.thread_id = anon_1.thread_id")
+    assert "SELECT DISTINCT ON (chat_messages.agent_id, chat_messages.thread_id)" in sql
+    assert "count(*) OVER (PARTITION BY chat_messages.agent_id, chat_messages.thread_id) AS message_count" in sql
+    assert "WHERE chat_threads.first_message_timestamp < '2026-04-01 00:00:00+00:00'" in sql
+    assert "ORDER BY chat_messages.agent_id, chat_messages.thread_id, chat_messages.timestamp, chat_messages.id" in sql
+    assert db.committed
+
+
+async def test_retention_deletes_then_refreshes_thread_summaries(monkeypatch):
+    calls = []
+
+    async def apply_retention(db, table, months, drop):
+        calls.append(("retention", table))
+        return ["chat_messages_p202603"] if table == "chat_messages" else []
+
+    async def delete_inactive(db, cutoff):
+        calls.append(("delete", cutoff))
+        return 1
+
+    async def refresh(db, cutoff):
+        calls.append(("refresh", cutoff))
+        return 2
+
+    @asynccontextmanager
+    async def session_factory():
+        yield FakeSession()
+
+    monkeypatch.setattr(worker_module, "db_apply_partition_retention", apply_retention)
+    monkeypatch.setattr(worker_module, "db_delete_chat_threads_inactive_before", delete_inactive)
+    monkeypatch.setattr(worker_module, "db_refresh_chat_thread_summaries_before", refresh)
+    monkeypatch.setattr(worker_module, "current_month", lambda: date(2026, 10, 1))
+    monkeypatch.setattr(settings, "CHAT_MESSAGES_RETENTION_MONTHS", 6)
+    worker = PartitionMaintenanceWorker.__new__(PartitionMaintenanceWorker)
+    worker._component_id = "partition_maintenance_worker"
+    worker.logger = worker_module.logging.getLogger("test.partition_maintenance")
+    worker.async_session_factory = session_factory
+
+    await worker._apply_retention()
+
+    cutoff = datetime(2026, 4, 1, tzinfo=timezone.utc)
+    assert calls == [("retention", "chat_messages"), ("delete", cutoff), ("refresh", cutoff),
+                     ("retention", "token_usage_logs")]
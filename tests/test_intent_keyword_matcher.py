@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from app.services.voice import intent_utils
+from app.services.voice.intent_utils import KeywordMatcher, VoiceIntentDetector, get_keyword_matcher
+from benchmarks.intent_matcher import legacy_detect
+
+
+@pytest.mark.parametrize("keywords, text, expected", [
+    # Whole words only, not substrings.
+    (["голос"], "Ответь голосом", None),
+    (["голос"], "Ответь, голос!", "голос"),
+    (["price"], "prices and priced", None),
+    # Keywords sharing a prefix in the trie.
+    (["голос", "голосом"], "ответь голосом", "голосом"),
+    (["голос", "голосом"], "голосов много", None),
+    (["голосом", "голос"], "мой голос", "голос"),
+    (["ab", "abc", "abd"], "x abd y", "abd"),
+    # Regex metacharacters are literal.
+    (["c++", "a.b"], "axb", None),
+    (["a.b", "(x)"], "see a.b here", "a.b"),
+    (["[0-9]"], "room 5", None),
+    # Case and Unicode.
+    (["СКАЖИ"], "скажи вслух", "скажи"),
+    (["ёлка"], "Новогодняя ЁЛКА", "ёлка"),
+    (["café"], "Un CAFÉ noir", "café"),
+    (["озвучь"], "озвучьте", None),
+])
+def test_search(keywords, text, expected):
+    assert KeywordMatcher(keywords).search(text) == expected
+
+
+def test_blank_keywords_are_ignored():
+    # The per-keyword regex matched any word for "" - an empty config entry is not a keyword.
+    matcher = KeywordMatcher(["", "  "])
+    assert matcher.keywords == ()
+    assert not matcher.matches("any text")
+
+
+def test_matches_legacy_per_keyword_regex():
+    rng = random.Random(43)
+    alphabet = "абвгдАБВГёЁabcAB.+*?()[]|^$\\ -'ß"
+    words = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(200)]
+    for _ in range(2000):
+        keywords = [k for k in rng.sample(words, rng.randint(1, 6)) if k.strip()]
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(0, 8)))
+        assert KeywordMatcher(keywords).matches(text) == legacy_detect(text, keywords), (keywords, text)
+
+
+def test_matcher_is_cached_per_keyword_set(monkeypatch):
+    monkeypatch.setattr(intent_utils, "_keyword_matchers", intent_utils.OrderedDict())
+    monkeypatch.setattr(intent_utils, "KEYWORD_MATCHER_CACHE_SIZE", 2)
+    first = get_keyword_matcher(["голос"])
+    assert get_keyword_matcher(["голос"]) is first
+    get_keyword_matcher(["скажи"])
+    get_keyword_matcher(["озвучь"])
+    assert get_keyword_matcher(["голос"]) is not first
+
+
+def test_detector_uses_matcher():
+    detector = VoiceIntentDetector()
+    assert detector.detect_tts_intent("Скажи это ГОЛОСОМ", ["голосом"])
+    assert not detector.detect_tts_intent("Скажи это", [])
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from app.core import message_codec
+from app.core.message_codec import (
+    PAYLOAD_VERSION, PAYLOAD_VERSION_FIELD, MessageCodecError, decode_message, encode_message, message_to_json_text,
+)
+from app.core.tracing import SENT_AT_FIELD, TRACEPARENT_FIELD
+
+
+@pytest.fixture(params=["json", "msgpack"])
+def codec(request, monkeypatch):
+    if request.param == "msgpack" and message_codec.msgpack is None:
+        pytest.skip("msgpack is not installed")
+    monkeypatch.setattr(message_codec.settings, "MESSAGE_CODEC", request.param)
+    monkeypatch.setattr(message_codec, "_writer_codec", None)
+    return request.param
+
+
+def test_round_trip(codec):
+    payload = {"chat_id": "c1", "text": "Привет", "image_urls": ["u1"], "n": 1}
+    assert decode_message(encode_message(payload)) == payload
+
+
+def test_encode_does_not_mutate_payload(codec):
+    payload = {"chat_id": "c1"}
+    encode_message(payload)
+    assert payload == {"chat_id": "c1"}
+
+
+def test_legacy_message_without_version_is_accepted():
+    assert decode_message(b'{"chat_id": "c1"}') == {"chat_id": "c1"}
+
+
+def test_newer_version_is_rejected():
+    data = json.dumps({PAYLOAD_VERSION_FIELD: PAYLOAD_VERSION + 1}).encode()
+    with pytest.raises(MessageCodecError):
+        decode_message(data)
+
+
+@pytest.mark.parametrize("data", [b"not json", b"[1]", b""])
+def test_invalid_messages_are_rejected(data):
+    with pytest.raises(MessageCodecError):
+        decode_message(data)
+
+
+def test_json_text_for_clients_strips_envelope_fields():
+    payload = {"chat_id": "c1", "response": "ok", TRACEPARENT_FIELD: "00-x-y-01", SENT_AT_FIELD: 1.0,
+               PAYLOAD_VERSION_FIELD: PAYLOAD_VERSION}
+    assert json.loads(message_to_json_text(payload)) == {"chat_id": "c1", "response": "ok"}
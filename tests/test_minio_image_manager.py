@@ -0,0 +1,132 @@
+import asyncio
+import io
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.media.image_settings import image_settings
+from app.services.media.minio_image_manager import MinIOImageManager
+from app.services.storage import ObjectStorageError, StorageObject
+
+fakeredis_aioredis = pytest.importorskip("fakeredis.aioredis")
+pytest.importorskip("lupa")
+Image = pytest.importorskip("PIL.Image")
+
+
+class FakeStorage:
+    def __init__(self):
+        self.objects = {}
+        self.puts = []
+        self.fail_keys = set()
+        self.on_stat = None
+
+    async def stat_object(self, bucket, key):
+        if self.on_stat is not None:
+            hook, self.on_stat = self.on_stat, None
+            await hook()
+        return self.objects.get(key)
+
+    async def put_object(self, bucket, key, data, content_type=None, metadata=None):
+        self.puts.append(key)
+        self.objects[key] = {"size": len(data), "last_modified": datetime.now(timezone.utc)}
+
+    async def remove_objects(self, bucket, keys):
+        errors = []
+        for key in keys:
+            if key in self.fail_keys:
+                errors.append(ObjectStorageError("InternalError", "boom", key=key))
+            else:
+                self.objects.pop(key, None)
+        return errors
+
+    async def list_objects(self, bucket, prefix="", recursive=True, max_keys=1000):
+        for key, info in sorted(self.objects.items()):
+            if key.startswith(prefix):
+                yield StorageObject(key=key, last_modified=info["last_modified"])
+
+
+def _png_bytes():
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), (255, 0, 0)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+async def manager():
+    manager = MinIOImageManager(redis_client=fakeredis_aioredis.FakeRedis(decode_responses=True))
+    manager.client = FakeStorage()
+    manager._initialized = True
+    manager.CLAIM_WAIT_INTERVAL = 0.01
+    yield manager
+    await manager.redis_client.aclose()
+
+
+async def _store_old_image(manager, data):
+    digest = await manager.compute_digest(data)
+    key = image_settings.generate_content_object_path(digest)
+    await manager.client.put_object(manager.bucket_name, key, data)
+    await manager.redis_client.zadd(manager.LAST_REF_KEY, {digest: time.time() - 10 * 86400})
+    return digest, key
+
+
+async def test_upload_refreshes_reference_before_existence_check(manager):
+    data = _png_bytes()
+    digest, key = await _store_old_image(manager, data)
+
+    # Cleanup runs between the existence check and the new reference.
+    async def run_cleanup():
+        assert await manager.cleanup_unreferenced_images(retention_days=1) == 0
+    manager.client.on_stat = run_cleanup
+
+    assert await manager.upload_user_image(data, "agent", "user") == key
+    assert key in manager.client.objects
+    assert manager.client.puts == [key]  # only the initial store
+    assert await manager.redis_client.zscore(manager.LAST_REF_KEY, digest) > time.time() - 60
+
+
+async def test_cleanup_rechecks_reference_time_before_delete(manager):
+    digest, key = await _store_old_image(manager, _png_bytes())
+    cutoff = time.time() - 86400
+    await manager._touch_image(digest)
+
+    assert await manager._claim_for_cleanup([digest], cutoff) == {}
+    assert key in manager.client.objects
+
+
+async def test_upload_waits_for_claimed_image_and_uploads_again(manager):
+    data = _png_bytes()
+    digest, key = await _store_old_image(manager, data)
+    assert digest in await manager._claim_for_cleanup([digest], time.time() - 86400)
+
+    async def finish_cleanup():
+        await asyncio.sleep(0.05)
+        manager.client.objects.pop(key)
+        await manager.redis_client.zrem(manager.LAST_REF_KEY, digest)
+
+    finisher = asyncio.create_task(finish_cleanup())
+    assert await manager.upload_user_image(data, "agent", "user") == key
+    await finisher
+
+    assert manager.client.puts == [key, key]
+    assert key in manager.client.objects
+
+
+async def test_failed_delete_keeps_reference_time(manager):
+    digest, key = await _store_old_image(manager, _png_bytes())
+    old_score = await manager.redis_client.zscore(manager.LAST_REF_KEY, digest)
+    manager.client.fail_keys.add(key)
+
+    assert await manager.cleanup_unreferenced_images(retention_days=1) == 0
+    assert await manager.redis_client.zscore(manager.LAST_REF_KEY, digest) == pytest.approx(old_score)
+
+
+async def test_cleanup_removes_old_images_and_legacy_keys(manager):
+    digest, key = await _store_old_image(manager, _png_bytes())
+    now = datetime.now(timezone.utc)
+    manager.client.objects["agent_a/user_u/2024/01/01/00/old.jpg"] = {"last_modified": now - timedelta(days=10)}
+    manager.client.objects["agent_a/user_u/2024/01/02/00/new.jpg"] = {"last_modified": now}
+
+    assert await manager.cleanup_unreferenced_images(retention_days=1) == 2
+    assert set(manager.client.objects) == {"agent_a/user_u/2024/01/02/00/new.jpg"}
+    assert await manager.redis_client.zscore(manager.LAST_REF_KEY, digest) is None
@@ -0,0 +1,87 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+from app.db.crud import partition_crud
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return self._rows
+
+
+class FakeSession:
+    """Records SQL text; answers the catalog and DEFAULT-partition queries from fixtures."""
+
+    def __init__(self, partitions=(), default_months=()):
+        self.partitions = [(name,) for name in partitions]
+        self.default_months = [(value,) for value in default_months]
+        self.statements = []
+        self.committed = False
+
+    async def execute(self, stmt, params=None):
+        sql = str(stmt)
+        self.statements.append(sql)
+        if "pg_inherits" in sql:
+            return FakeResult(self.partitions)
+        if "date_trunc" in sql:
+            return FakeResult(self.default_months)
+        return FakeResult([])
+
+    async def commit(self):
+        self.committed = True
+
+    async def rollback(self):
+        pass
+
+
+@pytest.fixture
+def october(monkeypatch):
+    monkeypatch.setattr(partition_crud, "current_month", lambda now=None: date(2026, 10, 1))
+
+
+def test_bounds_are_utc_timestamps():
+    assert partition_crud.partition_bounds(date(2026, 12, 1)) == (
+        "FOR VALUES FROM ('2026-12-01 00:00:00+00') TO ('2027-01-01 00:00:00+00')"
+    )
+
+
+def test_current_month_is_utc():
+    now = datetime(2026, 10, 31, 23, 30, tzinfo=timezone.utc)
+    assert partition_crud.current_month(now) == date(2026, 10, 1)
+
+
+async def test_creates_default_and_missing_months(october):
+    db = FakeSession(partitions=["chat_messages_p202610", "chat_messages_default"])
+
+    created = await partition_crud.db_ensure_monthly_partitions(db, "chat_messages", 1)
+
+    assert created == ["chat_messages_p202611"]
+    assert db.committed
+    assert any("chat_messages_default PARTITION OF chat_messages DEFAULT" in sql for sql in db.statements)
+    attach = [sql for sql in db.statements if "ATTACH PARTITION" in sql]
+    assert attach == ["ALTER TABLE chat_messages ATTACH PARTITION chat_messages_p202611 "
+                      "FOR VALUES FROM ('2026-11-01 00:00:00+00') TO ('2026-12-01 00:00:00+00')"]
+
+
+async def test_rows_in_default_partition_get_their_own_partition(october):
+    db = FakeSession(partitions=["token_usage_logs_p202610"], default_months=[datetime(2025, 3, 1)])
+
+    created = await partition_crud.db_ensure_monthly_partitions(db, "token_usage_logs", 0)
+
+    assert created == ["token_usage_logs_p202503"]
+    moves = [sql for sql in db.statements if sql.startswith(("INSERT", "DELETE"))]
+    assert len(moves) == 2
+    assert all("'2025-03-01 00:00:00+00'" in sql and "'2025-04-01 00:00:00+00'" in sql for sql in moves)
+    # Rows are moved before the partition is attached
+    insert_at = next(i for i, sql in enumerate(db.statements) if sql.startswith("INSERT"))
+    attach_at = next(i for i, sql in enumerate(db.statements) if "ATTACH PARTITION" in sql)
+    assert insert_at < attach_at
+
+
+async def test_default_partition_is_not_listed_as_monthly():
+    db = FakeSession(partitions=["chat_messages_p202610", "chat_messages_default"])
+    assert await partition_crud.db_list_partitions(db, "chat_messages") == [("chat_messages_p202610", date(2026, 10, 1))]
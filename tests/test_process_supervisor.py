@@ -0,0 +1,61 @@
+import asyncio
+import os
+import signal
+import sys
+
+from app.core.base.process_supervisor import ChildProcessSupervisor
+
+IGNORES_SIGTERM = (
+    "import signal, sys, time\n"
+    "signal.signal(signal.SIGTERM, signal.SIG_IGN)\n"
+    "print('ready', flush=True)\n"
+    "time.sleep(30)\n"
+)
+
+
+async def _start_child(supervisor, exits):
+    process = await asyncio.create_subprocess_exec(sys.executable, "-c", IGNORES_SIGTERM, stdout=asyncio.subprocess.PIPE)
+    # The handler is installed before "ready", so SIGTERM is ignored from here on.
+    assert await process.stdout.readline() == b"ready\n"
+
+    async def on_exit(pid, returncode, expected):
+        exits.append((pid, returncode, expected))
+
+    supervisor.watch(process, "worker", on_exit)
+    return process
+
+
+async def _wait_for(condition):
+    for _ in range(300):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+async def test_crash_after_failed_terminate_is_unexpected():
+    supervisor = ChildProcessSupervisor()
+    exits = []
+    process = await _start_child(supervisor, exits)
+
+    assert await supervisor.terminate(process.pid, timeout=0.2) is False
+    assert process.pid not in supervisor._stopping
+    assert supervisor.is_alive(process.pid)
+
+    # The process survived the stop request; a later crash must not count as a stop.
+    os.kill(process.pid, signal.SIGKILL)
+    await _wait_for(lambda: exits)
+    assert exits == [(process.pid, -signal.SIGKILL, False)]
+    assert supervisor.metrics.unexpected_exits == 1
+
+
+async def test_forced_terminate_is_expected_exit():
+    supervisor = ChildProcessSupervisor()
+    exits = []
+    process = await _start_child(supervisor, exits)
+
+    assert await supervisor.terminate(process.pid, timeout=0.2, force=True) is True
+    await _wait_for(lambda: exits)
+    assert exits == [(process.pid, -signal.SIGKILL, True)]
+    assert supervisor._stopping == set()
+    assert (supervisor.metrics.kills, supervisor.metrics.unexpected_exits) == (1, 0)
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.core.config import settings
+from app.services.redis_service import PubSubMultiplexer, SharedPubSub
+
+fakeredis_aioredis = pytest.importorskip("fakeredis.aioredis")
+
+
+@pytest.fixture
+async def redis_cli():
+    client = fakeredis_aioredis.FakeRedis()
+    yield client
+    await client.aclose()
+
+
+@pytest.fixture
+async def multiplexer(redis_cli):
+    multiplexer = PubSubMultiplexer(redis_cli)
+    yield multiplexer
+    await multiplexer.close()
+
+
+async def _numsub(redis_cli, channel: str) -> int:
+    return dict(await redis_cli.pubsub_numsub(channel)).get(channel.encode(), 0)
+
+
+async def _publish_until_received(redis_cli, channel, data, subscription):
+    # The shared connection confirms SUBSCRIBE asynchronously; retry until delivered.
+    for _ in range(50):
+        await redis_cli.publish(channel, data)
+        message = await subscription.get_message(timeout=0.05)
+        if message is not None:
+            # Drop duplicates of earlier attempts that arrived late.
+            await asyncio.sleep(0.05)
+            while await subscription.get_message() is not None:
+                pass
+            return message
+    raise AssertionError("message was not delivered")
+
+
+async def test_subscribers_share_one_redis_subscription(redis_cli, multiplexer):
+    first, second = _subscription(multiplexer), _subscription(multiplexer)
+    await first.subscribe("agent:1:output")
+    await second.subscribe("agent:1:output")
+
+    await _publish_until_received(redis_cli, "agent:1:output", b"warmup", first)
+    while await second.get_message() is not None:
+        pass
+    await redis_cli.publish("agent:1:output", b"hello")
+    assert (await first.get_message(timeout=1.0))["data"] == b"hello"
+    assert (await second.get_message(timeout=1.0))["data"] == b"hello"
+    assert await _numsub(redis_cli, "agent:1:output") == 1
+    assert multiplexer.stats() == {"channels": 1, "subscriptions": 2}
+
+
+async def test_last_unsubscribe_releases_channel_and_ends_listen(redis_cli, multiplexer):
+    subscription = _subscription(multiplexer)
+    await subscription.subscribe("control")
+    await _publish_until_received(redis_cli, "control", b"ping", subscription)
+
+    listener = asyncio.create_task(_collect(subscription))
+    await asyncio.sleep(0)
+    await subscription.aclose()
+
+    assert await asyncio.wait_for(listener, 1.0) == []
+    assert multiplexer.stats() == {"channels": 0, "subscriptions": 0}
+    # The blocked reader is woken by the UNSUBSCRIBE confirmation and stops.
+    await asyncio.wait_for(multiplexer._reader, 1.0)
+    assert await _numsub(redis_cli, "control") == 0
+
+
+async def test_connection_error_reaches_subscribers_and_resubscribes(redis_cli, multiplexer, monkeypatch):
+    monkeypatch.setattr(settings, "REDIS_RECONNECT_INTERVAL", 0.01)
+    subscription = _subscription(multiplexer)
+    await subscription.subscribe("invalidations")
+    await _publish_until_received(redis_cli, "invalidations", b"before", subscription)
+
+    broken = multiplexer._pubsub
+
+    async def fail(**kwargs):
+        raise RedisConnectionError("connection reset")
+
+    monkeypatch.setattr(broken, "get_message", fail)
+    # The reader blocks in its current read; the next message wakes it and the following read fails.
+    await redis_cli.publish("invalidations", b"wakeup")
+    assert (await subscription.get_message(timeout=3.0))["data"] == b"wakeup"
+    with pytest.raises(RedisConnectionError):
+        await subscription.get_message(timeout=3.0)
+
+    message = await _publish_until_received(redis_cli, "invalidations", b"after", subscription)
+    assert message["data"] == b"after"
+    assert multiplexer._pubsub is not broken
+
+
+def _subscription(multiplexer):
+    return SharedPubSub(multiplexer)
+
+
+async def _collect(subscription):
+    return [message async for message in subscription.listen()]
@@ -0,0 +1,189 @@
+import logging
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.agent_runner.agent_runner import AgentRunner
+from app.services import semantic_cache
+from app.services.semantic_cache import InMemoryVectorIndex, SemanticAnswerCache, normalize_question
+
+
+class FakeEmbeddings:
+    """Returns fixed vectors per normalized question and counts calls."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.calls = 0
+
+    async def aembed_query(self, text):
+        self.calls += 1
+        return self.vectors[text]
+
+
+# --- InMemoryVectorIndex ---
+
+def test_index_search_uses_cosine_similarity():
+    index = InMemoryVectorIndex()
+    index.add("a", [1.0, 0.0])
+    index.add("b", [0.0, 2.0])
+
+    key, score = index.search([10.0, 1.0])
+    assert key == "a"
+    assert score == pytest.approx(10 / (101 ** 0.5), rel=1e-5)
+    # Vectors are normalized: a scaled copy is an exact match.
+    assert index.search([0.0, 0.5]) == ("b", pytest.approx(1.0))
+    assert InMemoryVectorIndex().search([1.0, 0.0]) is None
+
+
+def test_index_grows_past_initial_capacity():
+    index = InMemoryVectorIndex()
+    for i in range(40):
+        index.add(f"k{i}", [float(i), 1.0, 0.0] if i else [0.0, 0.0, 1.0])
+    assert len(index) == 40
+    assert index.search([0.0, 0.0, 1.0])[0] == "k0"
+    assert index.search([39.0, 1.0, 0.0])[0] == "k39"
+
+
+def test_index_remove_moves_last_row_and_add_replaces():
+    index = InMemoryVectorIndex()
+    index.add("a", [1.0, 0.0, 0.0])
+    index.add("b", [0.0, 1.0, 0.0])
+    index.add("c", [0.0, 0.0, 1.0])
+
+    index.remove("a")
+    index.remove("missing")
+    assert len(index) == 2
+    assert index.search([1.0, 0.0, 0.0])[1] == pytest.approx(0.0)
+    # "c" took the freed row and is still found by its own vector.
+    assert index.search([0.0, 0.0, 1.0]) == ("c", pytest.approx(1.0))
+
+    index.add("b", [1.0, 0.0, 0.0])
+    assert len(index) == 2
+    assert index.search([1.0, 0.0, 0.0]) == ("b", pytest.approx(1.0))
+
+
+def test_index_dimension_mismatch_and_clear():
+    index = InMemoryVectorIndex()
+    index.add("a", [1.0, 0.0])
+    with pytest.raises(ValueError):
+        index.add("b", [1.0, 0.0, 0.0])
+    assert index.search([1.0, 0.0, 0.0]) is None
+
+    index.clear()
+    assert len(index) == 0
+    index.add("b", [1.0, 0.0, 0.0])
+    assert index.search([1.0, 0.0, 0.0])[0] == "b"
+
+
+# --- SemanticAnswerCache ---
+
+def _cache(vectors, **kwargs):
+    kwargs.setdefault("similarity_threshold", 0.9)
+    kwargs.setdefault("ttl_seconds", 60)
+    kwargs.setdefault("max_entries", 10)
+    embeddings = FakeEmbeddings(vectors)
+    return SemanticAnswerCache("agent-1", embeddings, **kwargs), embeddings
+
+
+async def test_exact_hit_skips_embedding_and_semantic_hit_respects_threshold():
+    cache, embeddings = _cache({
+        "какие у вас часы работы": [1.0, 0.0],
+        "когда вы работаете": [0.95, 0.05],
+        "сколько стоит доставка": [0.0, 1.0],
+    })
+    miss = await cache.lookup("Какие у вас часы работы?")
+    assert miss.entry is None
+    assert cache.store(miss, "С 9 до 21")
+
+    exact = await cache.lookup("какие  у вас ЧАСЫ работы")
+    assert exact.entry.answer == "С 9 до 21" and exact.similarity == 1.0
+    assert embeddings.calls == 1
+
+    semantic = await cache.lookup("Когда вы работаете")
+    assert semantic.entry.answer == "С 9 до 21"
+    assert (await cache.lookup("Сколько стоит доставка")).entry is None
+    assert (cache.hits_exact, cache.hits_semantic, cache.misses) == (1, 1, 2)
+
+
+async def test_entries_expire_and_least_recently_used_is_evicted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, "monotonic", lambda: now[0])
+    vectors = {q: v for q, v in (("a", [1.0, 0.0, 0.0]), ("b", [0.0, 1.0, 0.0]), ("c", [0.0, 0.0, 1.0]))}
+    cache, _ = _cache(vectors, max_entries=2, ttl_seconds=10)
+
+    for question in ("a", "b"):
+        cache.store(await cache.lookup(question), question.upper())
+    await cache.lookup("a")  # "b" becomes the least recently used
+    cache.store(await cache.lookup("c"), "C")
+    assert cache.evictions == 1
+    assert (await cache.lookup("b")).entry is None
+
+    now[0] += 11
+    assert (await cache.lookup("a")).entry is None
+    assert cache.expirations >= 1
+
+
+def test_invalidation_is_filtered_by_knowledge_base():
+    cache, _ = _cache({}, knowledge_base_ids=["kb-1"])
+    cache._apply_invalidation('{"agent_id": null, "knowledge_base_id": "kb-2"}')
+    cache._apply_invalidation('{"agent_id": "agent-2", "knowledge_base_id": null}')
+    assert cache.invalidations == 0
+    cache._apply_invalidation(b'{"agent_id": null, "knowledge_base_id": "kb-1"}')
+    assert cache.invalidations == 1
+
+
+def test_normalize_question():
+    assert normalize_question("  Ещё  РАЗ, пожалуйста!! ") == "еще раз пожалуйста"
+
+
+# --- AgentRunner: the cache is shared by all threads of the agent ---
+
+class FakeGraph:
+    checkpointer = object()
+
+    def __init__(self, thread_messages):
+        self.thread_messages = thread_messages
+
+    async def aget_state(self, config):
+        return SimpleNamespace(values={"messages": self.thread_messages.get(config["configurable"]["thread_id"], [])})
+
+
+def _runner(thread_messages, enable_context_memory=True):
+    runner = AgentRunner("agent-1", None, logging.LoggerAdapter(logging.getLogger("test.agent_runner"), {}))
+    runner.agent_config = {"config": {"simple": {"settings": {"model": {"enableContextMemory": enable_context_memory}}}}}
+    runner.agent_app = FakeGraph(thread_messages)
+    runner.semantic_cache, _ = _cache({"how much is delivery": [1.0, 0.0]})
+    return runner
+
+
+async def test_follow_up_in_a_thread_with_context_bypasses_cache():
+    memory = {"chat-a": [HumanMessage(content="Tell me about product X"), AIMessage(content="X is ...")]}
+    runner = _runner(memory)
+
+    assert await runner._lookup_semantic_cache("How much is delivery?", [], [], "chat-a") is None
+    assert await runner._lookup_semantic_cache("How much is delivery?", [], [HumanMessage(content="hi")], "chat-b") is None
+    assert runner.semantic_cache.bypasses == {"context": 2}
+
+    lookup = await runner._lookup_semantic_cache("How much is delivery?", [], [], "chat-new")
+    assert lookup is not None and lookup.entry is None
+
+
+async def test_threads_are_not_checked_when_context_memory_is_disabled():
+    runner = _runner({"chat-a": [HumanMessage(content="earlier")]}, enable_context_memory=False)
+    assert await runner._lookup_semantic_cache("How much is delivery?", [], [], "chat-a") is not None
+    assert runner.semantic_cache.bypasses == {}
+
+
+async def test_personalized_turns_bypass_cache():
+    runner = _runner({})
+    authenticated = {"is_authenticated": True, "user_id": "42"}
+    with_profile = {"is_authenticated": False, "user_id": "42", "first_name": "Ann"}
+
+    assert await runner._lookup_semantic_cache("How much is delivery?", [], [], "chat-a", authenticated) is None
+    assert await runner._lookup_semantic_cache("How much is delivery?", [], [], "chat-b", with_profile) is None
+    assert runner.semantic_cache.bypasses == {"personalized": 2}
+
+    # Integrations always send user_id; an anonymous user still uses the cache.
+    anonymous = {"is_authenticated": False, "user_id": "42", "first_name": None}
+    assert await runner._lookup_semantic_cache("How much is delivery?", [], [], "chat-c", anonymous) is not None
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from app.integrations.telegram.telegram_bot import TelegramIntegrationBot
+
+
+class RecordingBot(TelegramIntegrationBot):
+    """Bot with only the photo grouping state; group processing is recorded."""
+
+    def __init__(self):
+        self.logger = logging.getLogger("test.telegram")
+        self.bot = object()
+        self.image_orchestrator = object()
+        self.photo_groups = {}
+        self.photo_buffers = {}
+        self.photo_timers = {}
+        self.photo_group_tasks = set()
+        self.photo_group_timeout = 0.05
+        self.processed = []
+        self.release = asyncio.Event()
+
+    async def _process_photo_group(self, messages):
+        self.processed.append([message.message_id for message in messages])
+        await self.release.wait()
+
+
+def _photo(message_id, user_id=7):
+    return SimpleNamespace(message_id=message_id, media_group_id=None,
+                           chat=SimpleNamespace(id=user_id), from_user=SimpleNamespace(id=user_id))
+
+
+async def _wait_for(condition):
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+@pytest.fixture
+def bot():
+    return RecordingBot()
+
+
+async def test_photos_sent_together_are_grouped(bot):
+    await bot._handle_photo_message(_photo(1))
+    await bot._handle_photo_message(_photo(2))
+    assert bot.processed == []
+
+    await _wait_for(lambda: bot.processed)
+    assert bot.processed == [[1, 2]]
+    bot.release.set()
+    await _wait_for(lambda: not bot.photo_group_tasks)
+
+
+async def test_new_photo_does_not_cancel_group_in_progress(bot):
+    await bot._handle_photo_message(_photo(1))
+    await _wait_for(lambda: bot.processed)
+    processing = next(iter(bot.photo_group_tasks))
+    assert 7 not in bot.photo_timers and 7 not in bot.photo_buffers
+
+    # Arrives while the first group is still being processed.
+    await bot._handle_photo_message(_photo(2))
+    await _wait_for(lambda: len(bot.processed) == 2)
+
+    assert not processing.cancelled()
+    assert bot.processed == [[1], [2]]
+    bot.release.set()
+    await _wait_for(lambda: not bot.photo_group_tasks)
@@ -0,0 +1,190 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.routers import telegram_webhook_api
+from app.core.config import settings
+from app.integrations.telegram import telegram_webhook_host as host_module
+from app.integrations.telegram.telegram_webhook_host import (
+    TELEGRAM_WEBHOOK_BOTS_KEY,
+    TELEGRAM_WEBHOOK_LEADER_KEY,
+    TELEGRAM_WEBHOOK_SECRETS_KEY,
+    TelegramWebhookHost,
+    publish_telegram_webhook_command,
+    stop_telegram_webhook_bot,
+)
+from benchmarks.telegram_webhook import build_update, post_updates
+
+fakeredis = pytest.importorskip("fakeredis")
+fakeredis_aioredis = pytest.importorskip("fakeredis.aioredis")
+pytest.importorskip("lupa")
+
+BOT_SETTINGS = {"botToken": "123:token"}
+
+
+class FakeBot:
+    """Stands in for TelegramIntegrationBot: runs until shut down, records fed updates."""
+
+    def __init__(self, agent_id: str, bot_token: str, webhook_secret: str):
+        self.agent_id = agent_id
+        self.bot_token = bot_token
+        self.webhook_secret = webhook_secret
+        self.needs_restart = False
+        self.updates = []
+        self._shutdown = asyncio.Event()
+
+    async def run(self):
+        await self._shutdown.wait()
+
+    def initiate_shutdown(self):
+        self._shutdown.set()
+
+    def clear_restart_request(self):
+        self.needs_restart = False
+
+    def verify_webhook_secret(self, secret_token):
+        return secret_token == self.webhook_secret
+
+    async def feed_webhook_update(self, update):
+        self.updates.append(update)
+
+
+class FakeBotHost(TelegramWebhookHost):
+    def __init__(self):
+        super().__init__()
+        self.created = []
+
+    def _create_bot(self, agent_id, bot_token, webhook_secret):
+        bot = FakeBot(agent_id, bot_token, webhook_secret)
+        self.created.append(bot)
+        return bot
+
+
+@pytest.fixture
+async def redis_cli(monkeypatch):
+    server = fakeredis.FakeServer()
+    client = fakeredis_aioredis.FakeRedis(server=server, decode_responses=True)
+    pubsub_client = fakeredis_aioredis.FakeRedis(server=server, decode_responses=True)
+    monkeypatch.setattr(host_module, "get_redis", lambda: client)
+    monkeypatch.setattr(host_module, "get_pubsub_redis", lambda: pubsub_client)
+    monkeypatch.setattr(settings, "TELEGRAM_WEBHOOK_BASE_URL", "https://bots.example.com")
+    monkeypatch.setattr(settings, "TELEGRAM_WEBHOOK_ENABLED", True)
+    yield client
+    await client.aclose()
+    await pubsub_client.aclose()
+
+
+@pytest.fixture
+async def hosts(redis_cli):
+    started = []
+
+    async def start_host():
+        host = FakeBotHost()
+        await host.start()
+        started.append(host)
+        return host
+
+    yield start_host
+    for host in started:
+        await host.stop()
+
+
+async def _eventually(predicate, timeout=3.0):
+    async with asyncio.timeout(timeout):
+        while not predicate():
+            await asyncio.sleep(0.01)
+
+
+async def _start_bot(redis_cli, agent_id="agent-1"):
+    # Subscriptions of the hosts are confirmed asynchronously; repeat until a host got the command.
+    for _ in range(100):
+        if await publish_telegram_webhook_command(redis_cli, "start", agent_id, BOT_SETTINGS):
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("no webhook host received the start command")
+
+
+async def test_only_the_leader_hosts_bots(redis_cli, hosts):
+    first, second = await hosts(), await hosts()
+    assert first.is_leader and not second.is_leader
+
+    await _start_bot(redis_cli)
+    await _eventually(lambda: "agent-1" in first._bots)
+    # A duplicate start (every API worker sends one on startup) keeps the running bot.
+    await publish_telegram_webhook_command(redis_cli, "start", "agent-1", BOT_SETTINGS)
+    await asyncio.sleep(0.1)
+
+    assert len(first.created) == 1
+    assert second.created == []
+    assert await redis_cli.hget(TELEGRAM_WEBHOOK_SECRETS_KEY, "agent-1") == first.created[0].webhook_secret
+
+
+async def test_update_from_follower_is_forwarded_to_leader(redis_cli, hosts):
+    leader, follower = await hosts(), await hosts()
+    await _start_bot(redis_cli)
+    await _eventually(lambda: "agent-1" in leader._bots)
+    secret = leader.created[0].webhook_secret
+
+    assert await follower.accept_update("agent-1", "wrong", build_update(1, 10, "hi")) is False
+    assert await follower.accept_update("agent-2", secret, build_update(2, 10, "hi")) is None
+    assert await follower.accept_update("agent-1", secret, build_update(3, 10, "hi")) is True
+
+    await _eventually(lambda: leader.created[0].updates)
+    assert [u["update_id"] for u in leader.created[0].updates] == [3]
+
+
+async def test_stop_waits_for_leader_ack(redis_cli, hosts):
+    leader = await hosts()
+    await _start_bot(redis_cli)
+    await _eventually(lambda: "agent-1" in leader._bots)
+
+    assert await stop_telegram_webhook_bot(redis_cli, "agent-1", timeout=3.0, pubsub_cli=host_module.get_pubsub_redis())
+    assert leader._bots == {} and leader._bot_tasks == {}
+    assert await redis_cli.hget(TELEGRAM_WEBHOOK_BOTS_KEY, "agent-1") is None
+    assert await redis_cli.hget(TELEGRAM_WEBHOOK_SECRETS_KEY, "agent-1") is None
+
+
+async def test_stop_without_leader_returns_immediately(redis_cli):
+    await redis_cli.hset(TELEGRAM_WEBHOOK_BOTS_KEY, "agent-1", json.dumps(BOT_SETTINGS))
+    assert await stop_telegram_webhook_bot(redis_cli, "agent-1", timeout=0.1, pubsub_cli=host_module.get_pubsub_redis())
+    assert await redis_cli.hget(TELEGRAM_WEBHOOK_BOTS_KEY, "agent-1") is None
+
+
+async def test_new_leader_restores_bots_with_the_same_secret(redis_cli, hosts):
+    first, second = await hosts(), await hosts()
+    await _start_bot(redis_cli)
+    await _eventually(lambda: "agent-1" in first._bots)
+    secret = first.created[0].webhook_secret
+
+    # The leader loses its lease (e.g. the worker hangs past the TTL).
+    await redis_cli.delete(TELEGRAM_WEBHOOK_LEADER_KEY)
+    await second._leadership_step()
+    await first._leadership_step()
+
+    assert second.is_leader and not first.is_leader
+    assert first._bots == {}
+    await _eventually(lambda: "agent-1" in second._bots)
+    assert second.created[0].webhook_secret == secret
+
+
+async def test_webhook_route_accepts_fake_telegram_posts(redis_cli, hosts, monkeypatch):
+    leader, follower = await hosts(), await hosts()
+    await _start_bot(redis_cli)
+    await _eventually(lambda: "agent-1" in leader._bots)
+    secret = leader.created[0].webhook_secret
+
+    # The route runs in the follower worker: every update goes through Redis forwarding.
+    app = FastAPI()
+    app.include_router(telegram_webhook_api.router, prefix=settings.API_V1_STR)
+    monkeypatch.setattr(telegram_webhook_api, "telegram_webhook_host", follower)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        url = f"{settings.API_V1_STR}/telegram/webhook/agent-1"
+        result = await post_updates(client, url, secret, updates=20, concurrency=5, chats=3)
+        rejected = await post_updates(client, url, "wrong", updates=2, concurrency=1, chats=1)
+
+    assert result["statuses"] == {"200": 20}
+    assert rejected["statuses"] == {"403": 2}
+    await _eventually(lambda: len(leader.created[0].updates) == 20)
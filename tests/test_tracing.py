@@ -0,0 +1,157 @@
+import pytest
+
+from app.core import tracing
+from app.core.tracing import (
+    Histogram,
+    InMemorySpanExporter,
+    Tracer,
+    extract_trace_context,
+    inject_trace_context,
+    parse_traceparent,
+)
+
+fakeredis_aioredis = pytest.importorskip("fakeredis.aioredis")
+
+
+@pytest.fixture
+def exporter():
+    return InMemorySpanExporter()
+
+
+@pytest.fixture
+def test_tracer(exporter):
+    test_tracer = Tracer()
+    test_tracer.configure("test", exporter)
+    return test_tracer
+
+
+def test_nested_spans_share_trace_and_link_parent(test_tracer, exporter):
+    with test_tracer.start_span("outer", stage="agent") as outer:
+        with test_tracer.start_span("inner", stage="llm") as inner:
+            assert test_tracer.current_span() is inner
+        assert test_tracer.current_span() is outer
+    assert test_tracer.current_span() is None
+
+    spans = {s["name"]: s for s in exporter.get_finished_spans(outer.trace_id)}
+    assert spans["inner"]["trace_id"] == spans["outer"]["trace_id"]
+    assert spans["inner"]["parent_id"] == spans["outer"]["span_id"]
+    assert spans["outer"]["parent_id"] is None
+    # The inner span finishes first.
+    assert [s["name"] for s in exporter.get_finished_spans()] == ["inner", "outer"]
+
+
+def test_span_records_exception(test_tracer, exporter):
+    with pytest.raises(ValueError):
+        with test_tracer.start_span("failing"):
+            raise ValueError("boom")
+    span = exporter.get_finished_spans()[0]
+    assert span["status"] == "error"
+    assert span["error"] == "ValueError: boom"
+
+
+def test_trace_context_round_trip_through_payload(test_tracer):
+    with test_tracer.start_span("publish") as span:
+        payload = inject_trace_context({"text": "hi"})
+    traceparent, sent_at = extract_trace_context(payload)
+    assert traceparent == span.traceparent
+    assert sent_at is not None
+
+    child = test_tracer.start_span("consume", parent=traceparent)
+    assert (child.trace_id, child.parent_id) == (span.trace_id, span.span_id)
+
+
+def test_parse_traceparent_rejects_garbage():
+    assert parse_traceparent("not-a-header") is None
+    assert parse_traceparent(None) is None
+    assert parse_traceparent("00-" + "a" * 32 + "-" + "b" * 16 + "-01") == ("a" * 32, "b" * 16)
+
+
+def test_histogram_bucket_boundaries():
+    histogram = Histogram("h", "test", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.1, 0.5, 1.0, 5.0):
+        histogram.observe(value, stage="s")
+    counts, total, count = histogram._series[("s",)]
+    # Upper bounds are inclusive; values above the last bound go to +Inf.
+    assert counts == [1, 2, 1]
+    assert count == 4
+    assert total == pytest.approx(6.6)
+
+
+def test_histogram_quantile_and_prometheus_output():
+    histogram = Histogram("h", "test", ("stage",), buckets=(0.1, 1.0))
+    for _ in range(10):
+        histogram.observe(0.05, stage="s")
+    assert histogram.quantile(0.5, ("s",)) == pytest.approx(0.05)
+    assert histogram.quantile(0.5, ("missing",)) is None
+
+    histogram.observe(2.0, stage="s")
+    text = histogram.render_prometheus()
+    assert 'h_bucket{stage="s",le="0.1"} 10' in text
+    assert 'h_bucket{stage="s",le="1.0"} 10' in text
+    assert 'h_bucket{stage="s",le="+Inf"} 11' in text
+    assert 'h_count{stage="s"} 11' in text
+
+
+def test_histogram_diff_returns_only_growth():
+    current = Histogram("h", "test", ("stage",), buckets=(1.0,))
+    base = Histogram("h", "test", ("stage",), buckets=(1.0,))
+    current.observe(0.5, stage="a")
+    current.observe(0.5, stage="b")
+    base.merge(current.snapshot())
+    current.observe(2.0, stage="a")
+
+    delta = current.diff(base)
+    assert delta["series"] == [{"labels": {"stage": "a"}, "counts": [0, 1], "sum": 2.0, "count": 1}]
+
+
+@pytest.fixture
+def redis_cli(monkeypatch):
+    client = fakeredis_aioredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(tracing, "tracer", Tracer())
+    return client
+
+
+def _observe(process: Tracer, count: int) -> None:
+    for _ in range(count):
+        process.stage_histogram.observe(0.02, stage="llm", operation="generate")
+
+
+async def test_push_accumulates_per_service(redis_cli):
+    process = Tracer()
+    process.configure("agent_runner", InMemorySpanExporter())
+    _observe(process, 2)
+    await process.push_metrics(redis_cli)
+    _observe(process, 3)
+    await process.push_metrics(redis_cli)
+    # Nothing new to push: counters must not grow again.
+    await process.push_metrics(redis_cli)
+
+    histogram = await tracing.collect_stage_histograms(redis_cli)
+    assert histogram._series[("llm", "generate")][2] == 5
+    assert await redis_cli.ttl(process.metrics_key) == -1
+
+
+async def test_counters_stay_monotonic_after_process_restart(redis_cli):
+    first = Tracer()
+    first.configure("agent_runner", InMemorySpanExporter())
+    _observe(first, 4)
+    await first.push_metrics(redis_cli)
+    before = (await tracing.collect_stage_histograms(redis_cli))._series[("llm", "generate")]
+
+    # A restarted process starts from empty local state.
+    restarted = Tracer()
+    restarted.configure("agent_runner", InMemorySpanExporter())
+    _observe(restarted, 1)
+    await restarted.push_metrics(redis_cli)
+    after = (await tracing.collect_stage_histograms(redis_cli))._series[("llm", "generate")]
+
+    assert after[2] == before[2] + 1
+    assert all(a >= b for a, b in zip(after[0], before[0]))
+
+
+async def test_collect_pushes_local_growth_once(redis_cli):
+    _observe(tracing.tracer, 2)
+    first = await tracing.collect_stage_histograms(redis_cli)
+    second = await tracing.collect_stage_histograms(redis_cli)
+    assert first._series[("llm", "generate")][2] == 2
+    assert second._series[("llm", "generate")][2] == 2
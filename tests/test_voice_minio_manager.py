@@ -0,0 +1,208 @@
+from datetime import date, datetime, timedelta, timezone
+from xml.etree import ElementTree
+
+import httpx
+
+from app.core.config import settings
+from app.services.storage import ObjectStorageClient, ObjectStorageError, StorageObject
+from app.services.voice import minio_manager
+from app.services.voice.minio_manager import MinioFileManager
+
+
+class FakeStorage:
+    def __init__(self, keys=(), lifecycle_supported=True):
+        now = datetime.now(timezone.utc)
+        self.objects = {key: now for key in keys}
+        self.lifecycle_supported = lifecycle_supported
+        self.listed_prefixes = []
+        self.removed_batches = []
+
+    def add(self, key, age_days=0):
+        self.objects[key] = datetime.now(timezone.utc) - timedelta(days=age_days)
+
+    async def list_objects(self, bucket, prefix="", recursive=True, max_keys=1000):
+        self.listed_prefixes.append(prefix)
+        prefixes = set()
+        for key in sorted(self.objects):
+            if not key.startswith(prefix):
+                continue
+            rest = key[len(prefix):]
+            if not recursive and "/" in rest:
+                prefixes.add(prefix + rest.split("/", 1)[0] + "/")
+                continue
+            yield StorageObject(key=key, last_modified=self.objects[key])
+        for common_prefix in sorted(prefixes):
+            yield StorageObject(key=common_prefix, is_prefix=True)
+
+    async def remove_objects(self, bucket, keys):
+        self.removed_batches.append(list(keys))
+        for key in keys:
+            self.objects.pop(key, None)
+        return []
+
+    async def get_object(self, bucket, key):
+        raise ObjectStorageError("NoSuchKey", key=key)
+
+    async def put_object(self, bucket, key, data, content_type=None, metadata=None):
+        self.objects[key] = datetime.now(timezone.utc)
+
+    async def set_bucket_expiration(self, bucket, prefix, days, rule_id):
+        if not self.lifecycle_supported:
+            raise ObjectStorageError("NotImplemented")
+
+
+def _manager(storage, lifecycle_enabled=False):
+    manager = MinioFileManager()
+    manager.client = storage
+    manager._initialized = True
+    manager._lifecycle_enabled = lifecycle_enabled
+    return manager
+
+
+async def test_oldest_partition_ignores_legacy_and_invalid_entries():
+    storage = FakeStorage([
+        "voice/2024/1/2024/01/01/00/legacy",  # legacy agent "2024", user "1"
+        "days/voice/2025/13/01/a/u/00/bad-month",
+        "days/voice/2025/02/30/a/u/00/bad-day",
+        "days/voice/abcd/01/01/a/u/00/not-a-year",
+        "days/voice/2025/03/05/a/u/00/ok",
+    ])
+    assert await _manager(storage)._find_oldest_partition() == date(2025, 3, 5)
+
+
+async def test_fallback_cleanup_sweeps_partitions_and_legacy_files():
+    storage = FakeStorage()
+    old_day = (datetime.utcnow() - timedelta(days=10)).date()
+    storage.add(f"days/voice/{old_day:%Y/%m/%d}/a/u/00/old")
+    storage.add("voice/a/u/2024/01/01/00/old-legacy", age_days=10)
+    storage.add("voice/a/u/2099/01/01/00/new-legacy")
+    storage.add(f"days/voice/{datetime.utcnow():%Y/%m/%d}/a/u/00/new")
+
+    deleted = await _manager(storage).cleanup_old_files(days_old=7)
+
+    assert deleted == 2
+    assert sorted(storage.objects) == [
+        "_meta/cleanup_cursor",
+        f"days/voice/{datetime.utcnow():%Y/%m/%d}/a/u/00/new",
+        "voice/a/u/2099/01/01/00/new-legacy",
+    ]
+
+
+async def test_legacy_files_are_left_to_lifecycle_when_supported():
+    storage = FakeStorage()
+    storage.add("voice/a/u/2024/01/01/00/old-legacy", age_days=10)
+    manager = _manager(storage)
+    assert await manager.ensure_lifecycle_policy(7)
+
+    assert await manager.cleanup_old_files(days_old=7) == 0
+    assert "voice/a/u/2024/01/01/00/old-legacy" in storage.objects
+
+
+def _day_key(days_ago, name, user="u"):
+    day = datetime.utcnow().date() - timedelta(days=days_ago)
+    return f"days/voice/{day:%Y/%m/%d}/a/{user}/00/{name}"
+
+
+async def test_list_user_files_covers_both_layouts_oldest_first(monkeypatch):
+    monkeypatch.setattr(settings, "VOICE_FILE_RETENTION_DAYS", 7)
+    storage = FakeStorage([
+        "voice/a/u/2024/01/01/00/legacy",
+        "voice/a/other/2024/01/01/00/someone-else",
+        _day_key(30, "expired"),
+        _day_key(3, "older"),
+        _day_key(3, "someone-else", user="other"),
+        _day_key(0, "newer"),
+    ])
+    manager = _manager(storage)
+
+    assert await manager.list_user_files("a", "u") == [
+        "voice/a/u/2024/01/01/00/legacy",
+        _day_key(3, "older"),
+        _day_key(0, "newer"),
+    ]
+    # Only the retention window is walked: one listing per day plus the legacy prefix.
+    assert len(storage.listed_prefixes) == 1 + 8
+    assert await manager.list_user_files("a", "u", limit=2) == [
+        "voice/a/u/2024/01/01/00/legacy",
+        _day_key(3, "older"),
+    ]
+    since = datetime.utcnow().date() - timedelta(days=30)
+    assert (await manager.list_user_files("a", "u", since=since))[1] == _day_key(30, "expired")
+
+
+async def test_list_user_files_without_retention_walks_partitions(monkeypatch):
+    monkeypatch.setattr(settings, "VOICE_FILE_RETENTION_DAYS", 0)
+    storage = FakeStorage(["days/voice/2025/03/05/a/u/00/older", "days/voice/2025/03/06/a/u/00/newer"])
+
+    assert await _manager(storage).list_user_files("a", "u") == [
+        "days/voice/2025/03/05/a/u/00/older",
+        "days/voice/2025/03/06/a/u/00/newer",
+    ]
+
+
+async def test_delete_prefix_removes_each_batch_while_listing(monkeypatch):
+    monkeypatch.setattr(minio_manager, "MAX_DELETE_BATCH", 2)
+    storage = FakeStorage([f"days/voice/2025/03/05/a/u/00/{i}" for i in range(5)])
+    listed = []
+    list_objects = storage.list_objects
+
+    async def recording_list_objects(*args, **kwargs):
+        async for obj in list_objects(*args, **kwargs):
+            listed.append(obj.key)
+            yield obj
+
+    storage.list_objects = recording_list_objects
+    listed_at_removal = []
+    remove_objects = storage.remove_objects
+
+    async def recording_remove_objects(bucket, keys):
+        listed_at_removal.append(len(listed))
+        return await remove_objects(bucket, keys)
+
+    storage.remove_objects = recording_remove_objects
+
+    assert await _manager(storage)._delete_prefix("days/voice/2025/03/05/") == (5, 0)
+    assert [len(batch) for batch in storage.removed_batches] == [2, 2, 1]
+    # Each batch went out as soon as it was full, before the rest was listed.
+    assert listed_at_removal == [2, 4, 5]
+    assert storage.objects == {}
+
+
+async def test_set_bucket_expiration_keeps_other_rules():
+    existing = (
+        '<LifecycleConfiguration xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+        "<Rule><ID>keep-me</ID><Filter><Prefix>tmp/</Prefix></Filter><Status>Enabled</Status>"
+        "<Expiration><Days>1</Days></Expiration></Rule>"
+        "<Rule><ID>voice-files-expiration</ID><Filter><Prefix>days/</Prefix></Filter><Status>Enabled</Status>"
+        "<Expiration><Days>99</Days></Expiration></Rule>"
+        "</LifecycleConfiguration>"
+    )
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            return httpx.Response(200, content=existing.encode())
+        sent.append(request.content)
+        return httpx.Response(200)
+
+    client = ObjectStorageClient("minio:9000", "key", "secret")
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    await client.set_bucket_expiration("voice", prefix="days/", days=7, rule_id="voice-files-expiration")
+    await client.close()
+
+    ns = {"s3": "http://s3.amazonaws.com/doc/2006-03-01/"}
+    rules = ElementTree.fromstring(sent[0]).findall("s3:Rule", ns)
+    assert {rule.findtext("s3:ID", namespaces=ns): rule.findtext("s3:Expiration/s3:Days", namespaces=ns)
+            for rule in rules} == {"keep-me": "1", "voice-files-expiration": "7"}
+
+
+async def test_set_bucket_expiration_without_existing_configuration():
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            return httpx.Response(404, content=b"<Error><Code>NoSuchLifecycleConfiguration</Code></Error>")
+        return httpx.Response(200)
+
+    client = ObjectStorageClient("minio:9000", "key", "secret")
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    await client.set_bucket_expiration("voice", prefix="days/", days=7, rule_id="voice-files-expiration")
+    await client.close()
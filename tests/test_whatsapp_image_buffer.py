@@ -0,0 +1,77 @@
+import asyncio
+import logging
+
+import pytest
+
+from app.integrations.whatsapp.whatsapp_bot import WhatsAppIntegrationBot
+
+
+class RecordingBot(WhatsAppIntegrationBot):
+    """Bot with only the image grouping state; group processing is recorded."""
+
+    def __init__(self):
+        self.logger = logging.getLogger("test.whatsapp")
+        self.image_orchestrator = object()
+        self.image_buffers = {}
+        self.image_timers = {}
+        self.image_group_tasks = set()
+        self.image_group_timeout = 0.05
+        self.processed = []
+        self.release = asyncio.Event()
+
+    async def _process_image_group(self, chat_id, buffered):
+        self.processed.append([response["id"] for response, _ in buffered])
+        await self.release.wait()
+
+
+def _album_image(message_id):
+    return {"id": message_id, "parentMsgKey": "album-1"}
+
+
+async def _wait_for(condition):
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+@pytest.fixture
+def bot():
+    return RecordingBot()
+
+
+async def test_single_image_is_processed_without_delay(bot):
+    await bot._handle_image_message({"id": "m1"}, "chat", {})
+    assert not bot.image_timers
+    await asyncio.sleep(0)
+    assert bot.processed == [["m1"]]
+    bot.release.set()
+    await _wait_for(lambda: not bot.image_group_tasks)
+
+
+async def test_album_images_are_grouped(bot):
+    await bot._handle_image_message(_album_image("m1"), "chat", {})
+    await bot._handle_image_message(_album_image("m2"), "chat", {})
+    assert bot.processed == []
+
+    await _wait_for(lambda: bot.processed)
+    assert bot.processed == [["m1", "m2"]]
+    bot.release.set()
+    await _wait_for(lambda: not bot.image_group_tasks)
+
+
+async def test_new_image_does_not_cancel_group_in_progress(bot):
+    await bot._handle_image_message(_album_image("m1"), "chat", {})
+    await _wait_for(lambda: bot.processed)
+    processing = next(iter(bot.image_group_tasks))
+    assert "chat" not in bot.image_timers and "chat" not in bot.image_buffers
+
+    # Arrives while the first group is still being processed.
+    await bot._handle_image_message(_album_image("m2"), "chat", {})
+    await _wait_for(lambda: len(bot.processed) == 2)
+
+    assert not processing.cancelled()
+    assert bot.processed == [["m1"], ["m2"]]
+    bot.release.set()
+    await _wait_for(lambda: not bot.image_group_tasks)
@@ -0,0 +1,58 @@
+import base64
+
+import pytest
+
+from app.integrations.whatsapp.media_download import Base64FieldExtractor, MediaTooLargeError
+
+# Every byte value: the encoding contains "+" and "/", which JSON may escape as "\/".
+MEDIA = bytes(range(256)) * 3 + b"\x01"  # length % 3 == 1: the value ends with "=="
+ENCODED = base64.b64encode(MEDIA)
+
+PAYLOADS = {
+    "base64_field_with_escapes": b'{"type": "data", "base64": "' + ENCODED.replace(b"/", b"\\/") + b'"}',
+    "data_url": b'{"mimetype": "image/jpeg", "data" : "data:image/jpeg;base64,' + ENCODED + b'", "size": 769}',
+    "json_string": b'  \n"' + ENCODED + b'"',
+}
+
+
+def _extract(*chunks, max_bytes=None):
+    extractor = Base64FieldExtractor(max_bytes=max_bytes)
+    for chunk in chunks:
+        extractor.feed(chunk)
+    return extractor
+
+
+@pytest.mark.parametrize("payload", PAYLOADS.values(), ids=PAYLOADS.keys())
+def test_split_at_every_byte_position(payload):
+    for position in range(len(payload) + 1):
+        extractor = _extract(payload[:position], payload[position:])
+        assert extractor.done, position
+        assert extractor.result() == MEDIA, position
+
+
+@pytest.mark.parametrize("payload", PAYLOADS.values(), ids=PAYLOADS.keys())
+def test_fed_one_byte_at_a_time(payload):
+    extractor = _extract(*(payload[i:i + 1] for i in range(len(payload))))
+    assert extractor.result() == MEDIA
+
+
+def test_missing_field():
+    extractor = _extract(b'{"status": "error", ', b'"message": "media not found"}')
+    assert not extractor.found and not extractor.done
+    assert extractor.result() is None
+
+
+@pytest.mark.parametrize("payload", PAYLOADS.values(), ids=PAYLOADS.keys())
+def test_truncated_payload_has_no_result(payload):
+    closing_quote = payload.index(b'=="') + 2
+    for cut in (closing_quote, closing_quote - 1, len(payload) // 2):
+        extractor = _extract(payload[:cut])
+        assert not extractor.done, cut
+        assert extractor.result() is None, cut
+
+
+def test_size_limit_stops_decoding():
+    with pytest.raises(MediaTooLargeError) as error:
+        _extract(PAYLOADS["data_url"][:400], PAYLOADS["data_url"][400:], max_bytes=100)
+    assert error.value.limit == 100
+    assert _extract(PAYLOADS["data_url"], max_bytes=len(MEDIA)).result() == MEDIA
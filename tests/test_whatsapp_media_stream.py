@@ -0,0 +1,156 @@
+import base64
+import json
+import logging
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.integrations.whatsapp.media_download import MediaTooLargeError
+from app.integrations.whatsapp.whatsapp_bot import WhatsAppIntegrationBot
+from app.services import http_client
+from app.services.http_client import MediaStreamError, open_media_stream
+
+AUDIO = bytes(range(256)) * 40 + b"tail"  # not a multiple of 3 or of the chunk size
+AUDIO_URL = "http://storage.test/voice/reply.ogg"
+
+
+class TrackingStream(httpx.AsyncByteStream):
+    """Response body served in chunks; records how much was read and whether it was closed."""
+
+    def __init__(self, data: bytes, chunk_size: int = 1000):
+        self.chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+        self.served = 0
+        self.closed = False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            self.served += 1
+            yield chunk
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeWppconnect:
+    """Storage (GET) and wppconnect-server (POST) behind httpx.MockTransport."""
+
+    def __init__(self, audio_status=200, send_status=200, media_body=AUDIO, media_headers=None):
+        self.audio_status = audio_status
+        self.send_status = send_status
+        self.media_body = media_body
+        self.media_headers = media_headers or {}
+        self.streams = []
+        self.sent = []
+
+    def _stream(self, data):
+        stream = TrackingStream(data)
+        self.streams.append(stream)
+        return stream
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            return httpx.Response(self.audio_status, stream=self._stream(AUDIO if self.audio_status == 200 else b"missing"))
+        if request.url.path.endswith("/send-voice-base64"):
+            self.sent.append(json.loads(request.content))
+            return httpx.Response(self.send_status, json={"status": "success"})
+        if request.url.path.endswith("/download-media"):
+            return httpx.Response(200, headers=self.media_headers, stream=self._stream(self.media_body))
+        return httpx.Response(404)
+
+
+class StreamingBot(WhatsAppIntegrationBot):
+    """Bot with only what media streaming needs."""
+
+    def __init__(self, server: FakeWppconnect):
+        self.logger = logging.getLogger("test.whatsapp")
+        self.session_name = "session"
+        self.wppconnect_base_url = "http://wppconnect.test"
+        self.http_client = httpx.AsyncClient(base_url=self.wppconnect_base_url,
+                                             transport=httpx.MockTransport(server.handler))
+
+    async def update_last_active_time(self, timestamp=None):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeWppconnect()
+    monkeypatch.setattr(settings, "MEDIA_DIRECT_STORAGE_READ", False)
+    monkeypatch.setattr(http_client, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(server.handler)))
+    return server
+
+
+@pytest.fixture
+async def bot(server):
+    bot = StreamingBot(server)
+    yield bot
+    await bot.http_client.aclose()
+    await http_client.close_http_client()
+
+
+async def test_open_media_stream_reads_in_chunks_and_closes(server):
+    async with open_media_stream(AUDIO_URL, chunk_size=512) as chunks:
+        received = [chunk async for chunk in chunks]
+
+    assert b"".join(received) == AUDIO
+    assert server.streams[0].closed
+
+
+async def test_open_media_stream_http_error_closes_response(server):
+    server.audio_status = 404
+    with pytest.raises(MediaStreamError):
+        async with open_media_stream(AUDIO_URL):
+            pass
+    assert server.streams[0].closed
+
+
+async def test_open_media_stream_closes_when_consumer_stops_early(server):
+    with pytest.raises(RuntimeError):
+        async with open_media_stream(AUDIO_URL, chunk_size=512) as chunks:
+            async for _ in chunks:
+                raise RuntimeError("consumer failed")
+    stream = server.streams[0]
+    assert stream.closed and stream.served < len(stream.chunks)
+
+
+async def test_voice_is_relayed_as_streamed_base64(bot, server):
+    assert await bot._send_voice_message("79990000000@c.us", AUDIO_URL)
+
+    assert server.sent == [{"phone": "79990000000@c.us", "isGroup": False,
+                            "base64Ptt": base64.b64encode(AUDIO).decode()}]
+    assert server.streams[0].closed
+
+
+async def test_voice_relay_errors_close_the_audio_stream(bot, server):
+    server.send_status = 500
+    assert not await bot._send_voice_message("79990000000@c.us", AUDIO_URL)
+    server.audio_status = 404
+    assert not await bot._send_voice_message("79990000000@c.us", AUDIO_URL)
+
+    assert len(server.sent) == 1
+    assert [stream.closed for stream in server.streams] == [True, True]
+
+
+async def test_download_decodes_json_base64_while_streaming(bot, server):
+    server.media_body = json.dumps({"mimetype": "audio/ogg", "base64": base64.b64encode(AUDIO).decode()}).encode()
+    server.media_headers = {"content-type": "application/json"}
+
+    assert await bot._download_whatsapp_media(None, "audio/ogg", "msg-1", max_bytes=len(AUDIO)) == AUDIO
+    assert server.streams[0].closed
+
+
+async def test_download_size_limit_stops_reading_and_closes(bot, server):
+    server.media_headers = {"content-type": "audio/ogg"}
+    with pytest.raises(MediaTooLargeError):
+        await bot._download_whatsapp_media(None, "audio/ogg", "msg-1", max_bytes=2500)
+    stream = server.streams[0]
+    assert stream.closed and stream.served == 3 < len(stream.chunks)
+
+
+async def test_download_rejects_by_content_length_before_reading(bot, server):
+    server.media_headers = {"content-type": "audio/ogg", "content-length": str(len(AUDIO))}
+    with pytest.raises(MediaTooLargeError):
+        await bot._download_whatsapp_media(None, "audio/ogg", "msg-1", max_bytes=1000)
+    stream = server.streams[0]
+    assert stream.closed and stream.served == 0